@@ -1,8 +1,9 @@
 from app import create_app, socketio
-from flask import send_from_directory, render_template, make_response
+from flask import render_template, request, jsonify
 from flask_socketio import join_room
 from flask_jwt_extended import decode_token
 from app.models import Usuario
+from app.utils import imagens
 import os
 
 application = create_app()
@@ -15,11 +16,11 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload
 def serve_upload(filename):
     if not os.path.exists(UPLOAD_FOLDER):
         os.makedirs(UPLOAD_FOLDER)
-    response = make_response(send_from_directory(UPLOAD_FOLDER, filename))
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    try:
+        tamanho = imagens.tamanho_miniatura(request.args.get('tamanho'))
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    return imagens.responder_arquivo(UPLOAD_FOLDER, filename, tamanho)
 
 @app.route('/')
 def index():
@@ -33,7 +33,7 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = 'uploads'
 
     db.init_app(app)
-    CORS(app)
+    CORS(app, expose_headers=['ETag'])
     jwt = JWTManager(app)
     socketio.init_app(app, cors_allowed_origins="*")
 
@@ -118,6 +118,9 @@ def create_app():
         app.register_blueprint(producao.bp)
         app.register_blueprint(estoque_ativo.bp)
 
+        from app.utils.cache_referencia import registrar_eventos
+        registrar_eventos()
+
         def run_hr_migration():
             try:
                 from sqlalchemy import text
@@ -125,6 +128,8 @@ def create_app():
                     ("foto_path", "VARCHAR(255)"),
                     ("foto_data", "BYTEA"),
                     ("foto_mimetype", "VARCHAR(50)"),
+                    ("foto_hash", "VARCHAR(64)"),
+                    ("foto_tamanho", "INTEGER"),
                     ("percentual_comissao", "NUMERIC(5,2) DEFAULT 0"),
                     ("telefone", "VARCHAR(20)"),
                     ("cpf", "VARCHAR(14)"),
@@ -234,6 +239,295 @@ def create_app():
                 print(f"Producao migration check: {e}")
         
         run_producao_migration()
+        
+        def run_fornecedores_endereco_migration():
+            try:
+                from sqlalchemy import text
+                columns_to_add = [
+                    ("chave_endereco", "VARCHAR(400)"),
+                    ("chave_cep_numero", "VARCHAR(40)")
+                ]
+                
+                with db.engine.connect() as conn:
+                    result = conn.execute(text("""
+                        SELECT table_name FROM information_schema.tables 
+                        WHERE table_name = 'fornecedores'
+                    """))
+                    
+                    if result.fetchone() is not None:
+                        for column_name, column_type in columns_to_add:
+                            result = conn.execute(text(f"""
+                                SELECT column_name 
+                                FROM information_schema.columns 
+                                WHERE table_name = 'fornecedores' AND column_name = '{column_name}'
+                            """))
+                            
+                            if result.fetchone() is None:
+                                conn.execute(text(f"ALTER TABLE fornecedores ADD COLUMN {column_name} {column_type}"))
+                                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_fornecedores_{column_name} ON fornecedores({column_name})"))
+                                conn.commit()
+                                print(f"✓ Added column fornecedores.{column_name}")
+                        
+                        # A verificação de endereço duplicado compara só as chaves:
+                        # fornecedores ainda sem chave precisam ser preenchidos aqui
+                        from app.models import Fornecedor
+                        ultimo_id = 0
+                        preenchidos = 0
+                        while True:
+                            linhas = conn.execute(text("""
+                                SELECT id, rua, numero, cidade, estado, cep
+                                FROM fornecedores
+                                WHERE id > :ultimo_id
+                                  AND chave_endereco IS NULL AND chave_cep_numero IS NULL
+                                  AND (rua IS NOT NULL OR cep IS NOT NULL)
+                                ORDER BY id
+                                LIMIT 500
+                            """), {'ultimo_id': ultimo_id}).fetchall()
+                            if not linhas:
+                                break
+                            
+                            parametros = []
+                            for linha in linhas:
+                                chave_endereco, chave_cep_numero = Fornecedor.gerar_chaves_endereco(
+                                    linha.rua, linha.numero, linha.cidade, linha.estado, linha.cep
+                                )
+                                if chave_endereco or chave_cep_numero:
+                                    parametros.append({
+                                        'id': linha.id,
+                                        'chave_endereco': chave_endereco,
+                                        'chave_cep_numero': chave_cep_numero
+                                    })
+                            if parametros:
+                                conn.execute(text("""
+                                    UPDATE fornecedores
+                                    SET chave_endereco = :chave_endereco, chave_cep_numero = :chave_cep_numero
+                                    WHERE id = :id
+                                """), parametros)
+                                conn.commit()
+                                preenchidos += len(parametros)
+                            ultimo_id = linhas[-1].id
+                        
+                        if preenchidos:
+                            print(f"✓ Filled address keys for {preenchidos} fornecedores")
+            except Exception as e:
+                print(f"Fornecedores endereco migration check: {e}")
+        
+        run_fornecedores_endereco_migration()
+
+        def run_lotes_status_migration():
+            try:
+                from sqlalchemy import text
+                from app.utils.status_lote import normalizar_status_existentes
+
+                with db.engine.connect() as conn:
+                    result = conn.execute(text("""
+                        SELECT table_name FROM information_schema.tables 
+                        WHERE table_name = 'lotes'
+                    """))
+                    
+                    if result.fetchone() is not None:
+                        result = conn.execute(text("""
+                            SELECT column_name 
+                            FROM information_schema.columns 
+                            WHERE table_name = 'lotes' AND column_name = 'disponivel_producao'
+                        """))
+                        
+                        if result.fetchone() is None:
+                            conn.execute(text("ALTER TABLE lotes ADD COLUMN disponivel_producao BOOLEAN NOT NULL DEFAULT FALSE"))
+                            conn.execute(text("ALTER TABLE lotes ALTER COLUMN status SET DEFAULT 'ABERTO'"))
+                            normalizar_status_existentes(conn)
+                            conn.execute(text("""
+                                CREATE INDEX IF NOT EXISTS idx_lotes_disponivel_producao
+                                ON lotes (id) WHERE disponivel_producao
+                            """))
+                            conn.commit()
+                            print("✓ Added column lotes.disponivel_producao and normalized lot statuses")
+            except Exception as e:
+                print(f"Lotes status migration check: {e}")
+        
+        run_lotes_status_migration()
+
+        def run_lotes_material_migration():
+            try:
+                from sqlalchemy import text
+                columns_to_add = [
+                    ("material_id", "INTEGER REFERENCES materiais_base(id)"),
+                    ("material_nome", "VARCHAR(200)")
+                ]
+                
+                with db.engine.connect() as conn:
+                    result = conn.execute(text("""
+                        SELECT table_name FROM information_schema.tables 
+                        WHERE table_name = 'lotes'
+                    """))
+                    
+                    if result.fetchone() is not None:
+                        adicionadas = False
+                        for column_name, column_type in columns_to_add:
+                            result = conn.execute(text(f"""
+                                SELECT column_name 
+                                FROM information_schema.columns 
+                                WHERE table_name = 'lotes' AND column_name = '{column_name}'
+                            """))
+                            
+                            if result.fetchone() is None:
+                                conn.execute(text(f"ALTER TABLE lotes ADD COLUMN {column_name} {column_type}"))
+                                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_lotes_{column_name} ON lotes({column_name})"))
+                                adicionadas = True
+                                print(f"✓ Added column lotes.{column_name}")
+                        
+                        if adicionadas:
+                            # Material gravado nas observações ('MATERIAL:<nome> | ...')
+                            conn.execute(text("""
+                                UPDATE lotes
+                                SET material_nome = LEFT(NULLIF(TRIM(regexp_replace(split_part(observacoes, '|', 1), '^MATERIAL(_MANUAL)?:', '')), ''), 200)
+                                WHERE material_nome IS NULL AND observacoes ~ '^MATERIAL(_MANUAL)?:'
+                            """))
+                            conn.execute(text("""
+                                UPDATE lotes l SET material_id = m.id
+                                FROM materiais_base m
+                                WHERE l.material_id IS NULL AND l.material_nome = m.nome
+                            """))
+                        conn.commit()
+            except Exception as e:
+                print(f"Lotes material migration check: {e}")
+        
+        run_lotes_material_migration()
+
+        def run_bags_acumulados_migration():
+            try:
+                from sqlalchemy import text
+                
+                with db.engine.connect() as conn:
+                    result = conn.execute(text("""
+                        SELECT table_name FROM information_schema.tables 
+                        WHERE table_name = 'bags_producao'
+                    """))
+                    
+                    if result.fetchone() is not None:
+                        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_item_separado_bag ON itens_separados_producao (bag_id)"))
+                        conn.commit()
+                        result = conn.execute(text("""
+                            SELECT column_name 
+                            FROM information_schema.columns 
+                            WHERE table_name = 'bags_producao' AND column_name = 'custo_acumulado'
+                        """))
+                        
+                        if result.fetchone() is None:
+                            conn.execute(text("ALTER TABLE bags_producao ADD COLUMN custo_acumulado NUMERIC(12, 2) NOT NULL DEFAULT 0"))
+                            # Partir de acumuladores corretos (antes só o peso era mantido, e sem garantia)
+                            conn.execute(text("""
+                                UPDATE bags_producao b
+                                SET peso_acumulado = t.peso, custo_acumulado = t.custo, quantidade_itens = t.itens
+                                FROM (
+                                    SELECT bag.id,
+                                           COALESCE(SUM(i.peso_kg), 0) AS peso,
+                                           COALESCE(SUM(i.custo_proporcional), 0) AS custo,
+                                           COUNT(i.id) AS itens
+                                    FROM bags_producao bag
+                                    LEFT JOIN itens_separados_producao i ON i.bag_id = bag.id
+                                    GROUP BY bag.id
+                                ) t
+                                WHERE b.id = t.id
+                            """))
+                            conn.commit()
+                            print("✓ Added column bags_producao.custo_acumulado and recalculated bag accumulators")
+            except Exception as e:
+                print(f"Bags acumulados migration check: {e}")
+        
+        run_bags_acumulados_migration()
+
+        def run_localizacoes_migration():
+            try:
+                from sqlalchemy import text
+                from app.services.localizacao_service import reconciliar
+                
+                with db.engine.connect() as conn:
+                    result = conn.execute(text("""
+                        SELECT table_name FROM information_schema.tables 
+                        WHERE table_name = 'lotes'
+                    """))
+                    
+                    if result.fetchone() is not None:
+                        result = conn.execute(text("""
+                            SELECT column_name 
+                            FROM information_schema.columns 
+                            WHERE table_name = 'lotes' AND column_name = 'localizacao_id'
+                        """))
+                        
+                        if result.fetchone() is None:
+                            conn.execute(text("""
+                                CREATE TABLE IF NOT EXISTS localizacoes (
+                                    id SERIAL PRIMARY KEY,
+                                    codigo VARCHAR(100) NOT NULL UNIQUE,
+                                    descricao VARCHAR(200),
+                                    ativo BOOLEAN NOT NULL DEFAULT TRUE,
+                                    capacidade_kg DOUBLE PRECISION,
+                                    quantidade_lotes INTEGER NOT NULL DEFAULT 0,
+                                    peso_kg DOUBLE PRECISION NOT NULL DEFAULT 0,
+                                    data_criacao TIMESTAMP NOT NULL DEFAULT NOW(),
+                                    data_atualizacao TIMESTAMP DEFAULT NOW()
+                                )
+                            """))
+                            conn.execute(text("ALTER TABLE lotes ADD COLUMN localizacao_id INTEGER REFERENCES localizacoes(id)"))
+                            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_lotes_localizacao_id ON lotes (localizacao_id)"))
+                            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_lotes_localizacao_atual ON lotes (localizacao_atual)"))
+                            reconciliar(conn)
+                            conn.commit()
+                            print("✓ Created table localizacoes and column lotes.localizacao_id")
+            except Exception as e:
+                print(f"Localizacoes migration check: {e}")
+        
+        run_localizacoes_migration()
+
+        def run_scanner_media_migration():
+            try:
+                from sqlalchemy import text
+                columns_to_add = [
+                    ("image_hash", "VARCHAR(64)"),
+                    ("image_size", "INTEGER")
+                ]
+                
+                with db.engine.connect() as conn:
+                    result = conn.execute(text("""
+                        SELECT table_name FROM information_schema.tables 
+                        WHERE table_name = 'scanner_analyses'
+                    """))
+                    
+                    if result.fetchone() is not None:
+                        for column_name, column_type in columns_to_add:
+                            result = conn.execute(text(f"""
+                                SELECT column_name 
+                                FROM information_schema.columns 
+                                WHERE table_name = 'scanner_analyses' AND column_name = '{column_name}'
+                            """))
+                            
+                            if result.fetchone() is None:
+                                conn.execute(text(f"ALTER TABLE scanner_analyses ADD COLUMN {column_name} {column_type}"))
+                                conn.commit()
+                                print(f"✓ Added column scanner_analyses.{column_name} (execute executar_migracao_032.py para mover as imagens)")
+            except Exception as e:
+                print(f"Scanner media migration check: {e}")
+        
+        run_scanner_media_migration()
+
+        def run_gps_logs_migration():
+            try:
+                from sqlalchemy import text
+                with db.engine.connect() as conn:
+                    result = conn.execute(text("""
+                        SELECT table_name FROM information_schema.tables 
+                        WHERE table_name = 'gps_logs'
+                    """))
+                    
+                    if result.fetchone() is not None:
+                        # Pontos de rastreio são lidos e deduplicados por OS + horário
+                        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_gps_logs_os_timestamp ON gps_logs (os_id, timestamp)"))
+                        conn.commit()
+            except Exception as e:
+                print(f"GPS logs migration check: {e}")
+        
+        run_gps_logs_migration()
         db.create_all()
 
         # Inicializar tabelas de preço
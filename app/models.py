@@ -1,10 +1,52 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import validates
 from datetime import datetime
+import re
 import uuid
 from typing import Any
 
+from app.utils import imagens, media_store, status_lote
+
 db = SQLAlchemy()
 
+class HistoricoEventosMixin:
+    """
+    Leitura da auditoria de entidades com histórico em eventos_entidade.
+    A coluna JSON `auditoria` guarda apenas as entradas anteriores à migração;
+    novas ações são gravadas como linhas em eventos_entidade (append-only).
+    """
+
+    @property
+    def historico_auditoria(self):
+        eventos = getattr(self, '_eventos_precarregados', None)
+        if eventos is None:
+            if self.id is None:
+                eventos = []
+            else:
+                eventos = EventoEntidade.query.filter_by(
+                    entidade=self.__tablename__, entidade_id=self.id
+                ).order_by(EventoEntidade.ts, EventoEntidade.id).all()
+        return list(self.auditoria or []) + [e.to_entrada_auditoria() for e in eventos]
+
+def precarregar_eventos(objetos):
+    """Carrega em uma consulta os eventos de vários objetos (evita N+1 em listagens)"""
+    por_entidade = {}
+    for obj in objetos:
+        if obj is not None and obj.id is not None:
+            por_entidade.setdefault(obj.__tablename__, {})[obj.id] = obj
+            obj._eventos_precarregados = []
+
+    for entidade, por_id in por_entidade.items():
+        eventos = EventoEntidade.query.filter(
+            EventoEntidade.entidade == entidade,
+            EventoEntidade.entidade_id.in_(list(por_id.keys()))
+        ).order_by(EventoEntidade.ts, EventoEntidade.id).all()
+        for evento in eventos:
+            por_id[evento.entidade_id]._eventos_precarregados.append(evento)
+
+    return objetos
+
 class Perfil(db.Model):  # type: ignore
     __tablename__ = 'perfis'
 
@@ -48,8 +90,11 @@ class Usuario(db.Model):  # type: ignore
     ativo = db.Column(db.Boolean, default=True, nullable=False)
     criado_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
     foto_path = db.Column(db.String(255), nullable=True)
-    foto_data = db.Column(db.LargeBinary, nullable=True)  # Armazena imagem como bytes
+    # Legado: bytes da foto no banco. deferred para não ser lido a cada Usuario.query.get()
+    foto_data = db.deferred(db.Column(db.LargeBinary, nullable=True))
     foto_mimetype = db.Column(db.String(50), nullable=True)  # Tipo MIME da imagem
+    foto_hash = db.Column(db.String(64), nullable=True)  # SHA-256 no media_store
+    foto_tamanho = db.Column(db.Integer, nullable=True)
     percentual_comissao = db.Column(db.Float, nullable=True, default=0.0)
     telefone = db.Column(db.String(20), nullable=True)
     cpf = db.Column(db.String(14), nullable=True)
@@ -76,9 +121,38 @@ class Usuario(db.Model):  # type: ignore
             'telefone': self.telefone,
             'cpf': self.cpf,
             'percentual_comissao': float(self.percentual_comissao) if self.percentual_comissao else 0.0,
-            'foto_path': self.foto_path
+            'foto_path': self.foto_path,
+            'foto_url': self.foto_url
         }
 
+    @property
+    def foto_url(self):
+        """URL da foto com a versão do conteúdo (cacheável como imutável)"""
+        if self.foto_hash or self.foto_path or self.foto_mimetype:
+            return imagens.url(f'/api/rh/usuarios/{self.id}/foto', self.foto_hash)
+        return None
+
+    def definir_foto(self, conteudo, mimetype=None):
+        """Grava a foto no media_store e guarda só hash/tamanho/mimetype (None remove a foto)"""
+        if not conteudo:
+            self.foto_hash = None
+            self.foto_tamanho = None
+            self.foto_mimetype = None
+        else:
+            midia = media_store.salvar(conteudo, mimetype or 'image/jpeg')
+            self.foto_hash = midia.hash
+            self.foto_tamanho = midia.tamanho
+            self.foto_mimetype = midia.mimetype
+        self.foto_data = None
+
+    def obter_foto_bytes(self):
+        """Bytes da foto (media_store ou, para registros ainda não migrados, a coluna legada)"""
+        if self.foto_hash:
+            conteudo = media_store.ler(self.foto_hash)
+            if conteudo is not None:
+                return conteudo
+        return self.foto_data
+
     def has_permission(self, permission: str) -> bool:
         if self.perfil:
             return self.perfil.has_permission(permission)
@@ -301,6 +375,10 @@ class Fornecedor(db.Model):  # type: ignore
     tabela_preco_aprovada_em = db.Column(db.DateTime, nullable=True)
     tabela_preco_aprovada_por_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
 
+    # Chaves normalizadas para detecção de endereço duplicado (mantidas automaticamente ao gravar)
+    chave_endereco = db.Column(db.String(400), nullable=True, index=True)
+    chave_cep_numero = db.Column(db.String(40), nullable=True, index=True)
+
     precos = db.relationship('FornecedorTipoLotePreco', backref='fornecedor', lazy=True, cascade='all, delete-orphan')
     solicitacoes = db.relationship('Solicitacao', backref='fornecedor', lazy=True, cascade='all, delete-orphan')
     lotes = db.relationship('Lote', backref='fornecedor', lazy=True)
@@ -315,6 +393,28 @@ class Fornecedor(db.Model):  # type: ignore
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
 
+    @staticmethod
+    def gerar_chaves_endereco(rua, numero, cidade, estado, cep):
+        """Retorna (chave_endereco, chave_cep_numero) normalizadas para comparação de endereços"""
+        rua_normalizada = (rua or '').strip().lower()
+        numero_normalizado = str(numero or '').strip()
+        cidade_normalizada = (cidade or '').strip().lower()
+        estado_normalizado = (estado or '').strip().upper()
+        cep_normalizado = re.sub(r'[^\d]', '', cep) if cep else ''
+
+        chave_endereco = None
+        if rua_normalizada and cidade_normalizada and estado_normalizado:
+            chave_endereco = f'{rua_normalizada}|{numero_normalizado}|{cidade_normalizada}|{estado_normalizado}'[:400]
+
+        chave_cep_numero = f'{cep_normalizado}|{numero_normalizado}'[:40] if cep_normalizado else None
+
+        return chave_endereco, chave_cep_numero
+
+    def atualizar_chaves_endereco(self):
+        self.chave_endereco, self.chave_cep_numero = Fornecedor.gerar_chaves_endereco(
+            self.rua, self.numero, self.cidade, self.estado, self.cep
+        )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -366,6 +466,11 @@ class Fornecedor(db.Model):  # type: ignore
             'tabela_preco_aprovada_por_nome': self.tabela_preco_aprovada_por.nome if self.tabela_preco_aprovada_por else None
         }
 
+@event.listens_for(Fornecedor, 'before_insert')
+@event.listens_for(Fornecedor, 'before_update')
+def _fornecedor_atualizar_chaves_endereco(mapper, connection, target):
+    target.atualizar_chaves_endereco()
+
 class FornecedorFuncionarioAtribuicao(db.Model):  # type: ignore
     """Tabela de atribuição de fornecedores a funcionários (admin atribui fornecedores a funcionários)"""
     __tablename__ = 'fornecedor_funcionario_atribuicao'
@@ -706,11 +811,13 @@ class ItemSolicitacao(db.Model):  # type: ignore
             'lote_numero': self.lote.numero_lote if self.lote else None
         }
 
-class Lote(db.Model):  # type: ignore
+class Lote(HistoricoEventosMixin, db.Model):  # type: ignore
     __tablename__ = 'lotes'
     __table_args__ = (
         db.Index('idx_numero_lote', 'numero_lote'),
         db.Index('idx_fornecedor_tipo_status', 'fornecedor_id', 'tipo_lote_id', 'status'),
+        db.Index('idx_lotes_disponivel_producao', 'id', postgresql_where=db.text('disponivel_producao')),
+        db.Index('idx_lotes_localizacao_atual', 'localizacao_atual'),
         db.UniqueConstraint('conferencia_id', name='uq_lote_conferencia_id'),
     )
 
@@ -732,10 +839,13 @@ class Lote(db.Model):  # type: ignore
     classificacao_predominante = db.Column(db.String(10), nullable=True)
     qualidade_recebida = db.Column(db.String(50), nullable=True)
 
-    status = db.Column(db.String(50), default='aberto', nullable=False)
+    status = db.Column(db.String(50), default=status_lote.ABERTO, nullable=False)
+    disponivel_producao = db.Column(db.Boolean, default=False, nullable=False)
     tipo_retirada = db.Column(db.String(20))
 
     localizacao_atual = db.Column(db.String(100), nullable=True)
+    # Mantido junto com localizacao_atual pelas movimentações (app.services.localizacao_service)
+    localizacao_id = db.Column(db.Integer, db.ForeignKey('localizacoes.id'), nullable=True, index=True)
     reservado = db.Column(db.Boolean, default=False, nullable=False)
     reservado_para = db.Column(db.String(200), nullable=True)
     reservado_por_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
@@ -760,6 +870,10 @@ class Lote(db.Model):  # type: ignore
     observacoes = db.Column(db.Text)
     auditoria = db.Column(db.JSON, default=lambda: [], nullable=True)
 
+    # Material do lote (preenchido na separação); material_nome também cobre materiais manuais sem cadastro
+    material_id = db.Column(db.Integer, db.ForeignKey('materiais_base.id'), nullable=True, index=True)
+    material_nome = db.Column(db.String(200), nullable=True, index=True)
+
     lote_pai_id = db.Column(db.Integer, db.ForeignKey('lotes.id'), nullable=True)
 
     itens = db.relationship('ItemSolicitacao', backref='lote', lazy=True)
@@ -774,12 +888,40 @@ class Lote(db.Model):  # type: ignore
     separacao = db.relationship('LoteSeparacao', backref='lote', uselist=False, cascade='all, delete-orphan')
     reservado_por = db.relationship('Usuario', foreign_keys=[reservado_por_id], backref='lotes_reservados')
     bloqueado_por = db.relationship('Usuario', foreign_keys=[bloqueado_por_id], backref='lotes_bloqueados')
+    material = db.relationship('MaterialBase', foreign_keys=[material_id])
+    localizacao = db.relationship('Localizacao', foreign_keys=[localizacao_id], backref='lotes')
 
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
         if not kwargs.get('numero_lote'):
-            ano = datetime.now().year
-            self.numero_lote = f"{ano}-{str(uuid.uuid4().hex[:5]).upper()}"
+            self.numero_lote = Lote.gerar_numero_lote()
+
+    @staticmethod
+    def gerar_numero_lote():
+        """
+        Gera número de lote no formato LT-YYYY-NNNNN
+
+        O prefixo LT- separa a sequência dos números aleatórios antigos
+        (YYYY-XXXXX), então a numeração só continua a partir de valores que
+        ela mesma gerou e nunca colide com eles.
+        """
+        from app.utils.sequencias import proximo_codigo
+        return proximo_codigo(f'LT-{datetime.now().year}', largura=5, coluna=Lote.numero_lote)
+
+    @staticmethod
+    def extrair_material_observacoes(observacoes):
+        """Nome do material gravado no formato legado 'MATERIAL:<nome> | ...' ou 'MATERIAL_MANUAL:<nome> | ...'"""
+        if not observacoes:
+            return None
+        for prefixo in ('MATERIAL_MANUAL:', 'MATERIAL:'):
+            if observacoes.startswith(prefixo):
+                nome = observacoes.split('|')[0][len(prefixo):].strip()
+                return nome[:200] or None
+        return None
+
+    @validates('status')
+    def _normalizar_status(self, key, valor):
+        return status_lote.normalizar_status(valor)
 
     def to_dict(self):
         data = {
@@ -793,7 +935,11 @@ class Lote(db.Model):  # type: ignore
             'valor_total': float(self.valor_total) if self.valor_total else 0.0,
             'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
             'status': self.status,
+            'disponivel_producao': self.disponivel_producao,
+            'material_id': self.material_id,
+            'material_nome': self.material_nome,
             'localizacao_atual': self.localizacao_atual,
+            'localizacao_id': self.localizacao_id,
             'observacoes': self.observacoes,
             'oc_id': self.oc_id,
             'os_id': self.os_id,
@@ -866,6 +1012,15 @@ class Lote(db.Model):  # type: ignore
 
         return data
 
+@event.listens_for(Lote, 'before_insert')
+@event.listens_for(Lote, 'before_update')
+def _lote_atualizar_campos_derivados(mapper, connection, target):
+    if target.status is None:
+        target.status = status_lote.ABERTO
+    target.disponivel_producao = status_lote.disponivel_producao(target.status)
+    if target.material_nome is None:
+        target.material_nome = Lote.extrair_material_observacoes(target.observacoes)
+
 class EntradaEstoque(db.Model):  # type: ignore
     __tablename__ = 'entradas_estoque'
 
@@ -1060,6 +1215,58 @@ class AuditoriaLog(db.Model):  # type: ignore
             'data_acao': self.data_acao.isoformat() if self.data_acao else None
         }
 
+class EventoEntidade(db.Model):  # type: ignore
+    """Histórico append-only de ações sobre entidades (substitui os arrays JSON `auditoria`)"""
+    __tablename__ = 'eventos_entidade'
+    __table_args__ = (
+        db.Index('idx_eventos_entidade_entidade_ts', 'entidade', 'entidade_id', 'ts'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    entidade = db.Column(db.String(50), nullable=False)
+    entidade_id = db.Column(db.Integer, nullable=False)
+    acao = db.Column(db.String(100), nullable=False)
+    usuario_id = db.Column(db.Integer, nullable=True)
+    ts = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Apenas os campos específicos da ação (delta), nunca snapshots completos
+    dados = db.Column(db.JSON, nullable=True)
+    ip = db.Column(db.String(50), nullable=True)
+    user_agent = db.Column(db.String(500), nullable=True)
+    gps = db.Column(db.JSON, nullable=True)
+    device_id = db.Column(db.String(255), nullable=True)
+
+    def to_entrada_auditoria(self):
+        """Formato das entradas do antigo array JSON `auditoria`"""
+        entrada = {
+            'acao': self.acao,
+            'usuario_id': self.usuario_id,
+            'timestamp': self.ts.isoformat() if self.ts else None,
+            'ip': self.ip
+        }
+        if self.user_agent is not None:
+            entrada['user_agent'] = self.user_agent
+        if self.gps is not None:
+            entrada['gps'] = self.gps
+        if self.device_id is not None:
+            entrada['device_id'] = self.device_id
+        entrada.update(self.dados or {})
+        return entrada
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'entidade': self.entidade,
+            'entidade_id': self.entidade_id,
+            'acao': self.acao,
+            'usuario_id': self.usuario_id,
+            'ts': self.ts.isoformat() if self.ts else None,
+            'dados': self.dados or {},
+            'ip': self.ip,
+            'user_agent': self.user_agent,
+            'gps': self.gps,
+            'device_id': self.device_id
+        }
+
 class OrdemCompra(db.Model):  # type: ignore
     __tablename__ = 'ordens_compra'
     __table_args__ = (
@@ -1148,7 +1355,7 @@ class AuditoriaOC(db.Model):  # type: ignore
             'data': self.data.isoformat() if self.data else None
         }
 
-class OrdemServico(db.Model):  # type: ignore
+class OrdemServico(HistoricoEventosMixin, db.Model):  # type: ignore
     __tablename__ = 'ordens_servico'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -1204,7 +1411,7 @@ class OrdemServico(db.Model):  # type: ignore
             'attachments': self.attachments,
             'created_by': self.created_by,
             'criador_nome': self.criador.nome if self.criador else None,
-            'auditoria': self.auditoria,
+            'auditoria': self.historico_auditoria,
             'criado_em': self.criado_em.isoformat() if self.criado_em else None,
             'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None
         }
@@ -1245,6 +1452,9 @@ class RotaOperacional(db.Model):  # type: ignore
 
 class GPSLog(db.Model):  # type: ignore
     __tablename__ = 'gps_logs'
+    __table_args__ = (
+        db.Index('idx_gps_logs_os_timestamp', 'os_id', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     os_id = db.Column(db.Integer, db.ForeignKey('ordens_servico.id'), nullable=False)
@@ -1274,7 +1484,53 @@ class GPSLog(db.Model):  # type: ignore
             'dados_adicionais': self.dados_adicionais
         }
 
-class ConferenciaRecebimento(db.Model):  # type: ignore
+class ResumoTrajetoOS(db.Model):  # type: ignore
+    """
+    Resumo do trajeto de uma OS, calculado a partir dos gps_logs ao finalizar
+
+    Guarda km percorridos, duração, paradas e o trajeto simplificado
+    (Douglas-Peucker) para exibição, evitando reler todos os pontos.
+    """
+    __tablename__ = 'resumos_trajeto_os'
+    __table_args__ = (
+        db.Index('idx_resumo_trajeto_motorista_fim', 'motorista_id', 'fim'),
+    )
+
+    os_id = db.Column(db.Integer, db.ForeignKey('ordens_servico.id', ondelete='CASCADE'), primary_key=True)
+    motorista_id = db.Column(db.Integer, db.ForeignKey('motoristas.id'), nullable=True)
+    km_total = db.Column(db.Float, nullable=False, default=0)
+    duracao_segundos = db.Column(db.Integer, nullable=False, default=0)
+    tempo_parado_segundos = db.Column(db.Integer, nullable=False, default=0)
+    paradas = db.Column(db.Integer, nullable=False, default=0)
+    total_pontos = db.Column(db.Integer, nullable=False, default=0)
+    pontos_descartados = db.Column(db.Integer, nullable=False, default=0)
+    trajeto = db.Column(db.JSON, nullable=True)  # [[lat, lng, epoch], ...] simplificado
+    inicio = db.Column(db.DateTime, nullable=True)
+    fim = db.Column(db.DateTime, nullable=True)
+    calculado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    ordem_servico = db.relationship('OrdemServico', backref=db.backref('resumo_trajeto', uselist=False, passive_deletes=True))
+
+    def to_dict(self, incluir_trajeto=False):
+        dados = {
+            'os_id': self.os_id,
+            'motorista_id': self.motorista_id,
+            'km_total': self.km_total,
+            'duracao_segundos': self.duracao_segundos,
+            'tempo_parado_segundos': self.tempo_parado_segundos,
+            'paradas': self.paradas,
+            'total_pontos': self.total_pontos,
+            'pontos_descartados': self.pontos_descartados,
+            'pontos_trajeto': len(self.trajeto or []),
+            'inicio': self.inicio.isoformat() if self.inicio else None,
+            'fim': self.fim.isoformat() if self.fim else None,
+            'calculado_em': self.calculado_em.isoformat() if self.calculado_em else None
+        }
+        if incluir_trajeto:
+            dados['trajeto'] = self.trajeto or []
+        return dados
+
+class ConferenciaRecebimento(HistoricoEventosMixin, db.Model):  # type: ignore
     __tablename__ = 'conferencias_recebimento'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -1327,7 +1583,7 @@ class ConferenciaRecebimento(db.Model):  # type: ignore
             'conferencia_status': self.conferencia_status,
             'conferente_id': self.conferente_id,
             'conferente_nome': self.conferente.nome if self.conferente else None,
-            'auditoria': self.auditoria,
+            'auditoria': self.historico_auditoria,
             'criado_em': self.criado_em.isoformat() if self.criado_em else None,
             'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
             'decisao_adm': self.decisao_adm,
@@ -1380,7 +1636,7 @@ class MovimentacaoEstoque(db.Model):  # type: ignore
             'auditoria': self.auditoria
         }
 
-class LoteSeparacao(db.Model):  # type: ignore
+class LoteSeparacao(HistoricoEventosMixin, db.Model):  # type: ignore
     __tablename__ = 'lotes_separacao'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -1419,14 +1675,14 @@ class LoteSeparacao(db.Model):  # type: ignore
             'peso_total_sublotes': self.peso_total_sublotes,
             'peso_total_residuos': self.peso_total_residuos,
             'observacoes': self.observacoes,
-            'auditoria': self.auditoria,
+            'auditoria': self.historico_auditoria,
             'gps_inicio': self.gps_inicio,
             'gps_fim': self.gps_fim,
             'ip_inicio': self.ip_inicio,
             'device_id': self.device_id
         }
 
-class Residuo(db.Model):  # type: ignore
+class Residuo(HistoricoEventosMixin, db.Model):  # type: ignore
     __tablename__ = 'residuos'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -1465,10 +1721,10 @@ class Residuo(db.Model):  # type: ignore
             'data_aprovacao': self.data_aprovacao.isoformat() if self.data_aprovacao else None,
             'motivo_decisao': self.motivo_decisao,
             'criado_em': self.criado_em.isoformat() if self.criado_em else None,
-            'auditoria': self.auditoria
+            'auditoria': self.historico_auditoria
         }
 
-class Inventario(db.Model):  # type: ignore
+class Inventario(HistoricoEventosMixin, db.Model):  # type: ignore
     __tablename__ = 'inventarios'
     __table_args__ = (
         db.Index('idx_status_data', 'status', 'data_inicio'),
@@ -1512,7 +1768,7 @@ class Inventario(db.Model):  # type: ignore
             'finalizador_nome': self.finalizador.nome if self.finalizador else None,
             'observacoes': self.observacoes,
             'divergencias_consolidadas': self.divergencias_consolidadas,
-            'auditoria': self.auditoria
+            'auditoria': self.historico_auditoria
         }
 
 class InventarioContagem(db.Model):  # type: ignore
@@ -1940,8 +2196,11 @@ class ScannerAnalysis(db.Model):  # type: ignore
     confidence = db.Column(db.Float, nullable=True)
     components_count = db.Column(db.Integer, nullable=True)
     density_score = db.Column(db.Float, nullable=True)
-    image_data = db.Column(db.LargeBinary, nullable=True)
+    # Legado: bytes da imagem no banco (deferred); novas imagens ficam no media_store
+    image_data = db.deferred(db.Column(db.LargeBinary, nullable=True))
     image_mimetype = db.Column(db.String(50), nullable=True)
+    image_hash = db.Column(db.String(64), nullable=True)
+    image_size = db.Column(db.Integer, nullable=True)
     raw_response = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
@@ -1950,7 +2209,7 @@ class ScannerAnalysis(db.Model):  # type: ignore
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
 
-    def to_dict(self, include_image: bool = False):
+    def to_dict(self):
         result = {
             'id': self.id,
             'usuario_id': self.usuario_id,
@@ -1960,15 +2219,64 @@ class ScannerAnalysis(db.Model):  # type: ignore
             'confidence': self.confidence,
             'components_count': self.components_count,
             'density_score': self.density_score,
-            'has_image': self.image_data is not None,
+            'has_image': self.has_image,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
-        if include_image and self.image_data:
-            import base64
-            result['image_base64'] = base64.b64encode(self.image_data).decode('utf-8')
+        if self.has_image:
+            # Só URLs: os bytes vão pela rota da imagem (cacheável), nunca em base64 no JSON
+            base = f'/api/scanner/analysis/{self.id}/image'
+            recurso = ScannerAnalysis.recurso_assinado(self.id, self.usuario_id)
+            result['image_url'] = imagens.url(base, self.image_hash, recurso=recurso)
+            result['thumbnail_url'] = imagens.url(base, self.image_hash, 256, recurso=recurso)
             result['image_mimetype'] = self.image_mimetype
+            result['image_size'] = self.image_size
         return result
 
+    @staticmethod
+    def recurso_assinado(analysis_id, usuario_id):
+        """Recurso das URLs assinadas da imagem (vinculado ao dono da análise)"""
+        return f'scanner:{analysis_id}:u{usuario_id}'
+
+    @property
+    def has_image(self):
+        # image_mimetype é gravado junto com a imagem: evita carregar a coluna deferred
+        return self.image_hash is not None or self.image_mimetype is not None
+
+    def set_image(self, content, mimetype=None):
+        """Grava a imagem no media_store e guarda só hash/tamanho/mimetype na linha"""
+        midia = media_store.salvar(content, mimetype or 'image/jpeg')
+        self.image_hash = midia.hash
+        self.image_size = midia.tamanho
+        self.image_mimetype = midia.mimetype
+        self.image_data = None
+
+    def get_image_bytes(self):
+        if self.image_hash:
+            content = media_store.ler(self.image_hash)
+            if content is not None:
+                return content
+        return self.image_data
+
+
+class ScannerImagemHash(db.Model):  # type: ignore
+    """
+    Índice de hash perceptual (dHash 64 bits) das imagens do scanner
+
+    O hash é dividido em 4 faixas de 16 bits indexadas: duas imagens a até 3 bits
+    de distância têm pelo menos uma faixa idêntica, então a busca por vizinhos
+    consulta só as linhas que batem em alguma faixa.
+    """
+    __tablename__ = 'scanner_imagem_hashes'
+
+    analysis_id = db.Column(db.Integer, db.ForeignKey('scanner_analyses.id', ondelete='CASCADE'), primary_key=True)
+    phash = db.Column(db.BigInteger, nullable=False)  # 64 bits com sinal (BIGINT)
+    faixa0 = db.Column(db.Integer, nullable=False, index=True)
+    faixa1 = db.Column(db.Integer, nullable=False, index=True)
+    faixa2 = db.Column(db.Integer, nullable=False, index=True)
+    faixa3 = db.Column(db.Integer, nullable=False, index=True)
+
+    analysis = db.relationship('ScannerAnalysis', backref=db.backref('imagem_hash', uselist=False, passive_deletes=True))
+
 
 class VisitaFornecedor(db.Model):  # type: ignore
     """Registro de visitas a potenciais fornecedores"""
@@ -2137,18 +2445,9 @@ class OrdemProducao(db.Model):  # type: ignore
     def gerar_numero_op():
         """Gera número único para OP no formato OP-YYYYMMDD-XXXX"""
         from datetime import datetime
+        from app.utils.sequencias import proximo_codigo
         hoje = datetime.now().strftime('%Y%m%d')
-        ultima_op = OrdemProducao.query.filter(
-            OrdemProducao.numero_op.like(f'OP-{hoje}-%')
-        ).order_by(OrdemProducao.id.desc()).first()
-        
-        if ultima_op:
-            ultimo_seq = int(ultima_op.numero_op.split('-')[-1])
-            novo_seq = ultimo_seq + 1
-        else:
-            novo_seq = 1
-        
-        return f'OP-{hoje}-{novo_seq:04d}'
+        return proximo_codigo(f'OP-{hoje}', coluna=OrdemProducao.numero_op)
 
     def to_dict(self):
         return {
@@ -2192,6 +2491,7 @@ class ItemSeparadoProducao(db.Model):  # type: ignore
     __table_args__ = (
         db.Index('idx_item_separado_op', 'ordem_producao_id'),
         db.Index('idx_item_separado_classificacao', 'classificacao_grade_id'),
+        db.Index('idx_item_separado_bag', 'bag_id'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -2264,7 +2564,9 @@ class BagProducao(db.Model):  # type: ignore
     classificacao_grade_id = db.Column(db.Integer, db.ForeignKey('classificacoes_grade.id'), nullable=False)
     
     # Peso e quantidade acumulados
+    # Mantidos por app.services.bag_service (UPDATE relativo + reconciliação)
     peso_acumulado = db.Column(db.Numeric(10, 3), nullable=False, default=0)
+    custo_acumulado = db.Column(db.Numeric(12, 2), nullable=False, default=0)
     quantidade_itens = db.Column(db.Integer, nullable=False, default=0)
     peso_capacidade_max = db.Column(db.Numeric(10, 3), nullable=True, default=50)  # Peso máximo do bag
     
@@ -2304,18 +2606,9 @@ class BagProducao(db.Model):  # type: ignore
     @staticmethod
     def gerar_codigo_bag(classificacao_nome):
         """Gera código único para Bag no formato BAG-CATEGORIA-XXXX"""
+        from app.utils.sequencias import proximo_codigo
         categoria_cod = classificacao_nome[:10].upper().replace(' ', '_')
-        ultimo_bag = BagProducao.query.filter(
-            BagProducao.codigo.like(f'BAG-{categoria_cod}-%')
-        ).order_by(BagProducao.id.desc()).first()
-        
-        if ultimo_bag:
-            ultimo_seq = int(ultimo_bag.codigo.split('-')[-1])
-            novo_seq = ultimo_seq + 1
-        else:
-            novo_seq = 1
-        
-        return f'BAG-{categoria_cod}-{novo_seq:04d}'
+        return proximo_codigo(f'BAG-{categoria_cod}', coluna=BagProducao.codigo)
 
     @property
     def percentual_ocupacao(self):
@@ -2341,6 +2634,7 @@ class BagProducao(db.Model):  # type: ignore
             'categorias_mistas': self.categorias_mistas,
             'categoria_exibicao': self.categoria_exibicao,
             'peso_acumulado': float(self.peso_acumulado) if self.peso_acumulado else 0,
+            'custo_acumulado': float(self.custo_acumulado) if self.custo_acumulado else 0,
             'quantidade_itens': self.quantidade_itens or 0,
             'peso_capacidade_max': float(self.peso_capacidade_max) if self.peso_capacidade_max else 50,
             'percentual_ocupacao': round(self.percentual_ocupacao, 2),
@@ -2357,4 +2651,100 @@ class BagProducao(db.Model):  # type: ignore
             'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
             'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None,
             'observacoes': self.observacoes
-        }
\ No newline at end of file
+        }
+
+class GeoCache(db.Model):  # type: ignore
+    """Cache persistente de geocoding (coordenada → endereço, CEP → endereço, endereço → CEP)"""
+    __tablename__ = 'geocache'
+    __table_args__ = (
+        db.UniqueConstraint('tipo', 'chave', name='uq_geocache_tipo_chave'),
+        db.Index('idx_geocache_expira', 'expira_em'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Tipo da chave: coordenada (geohash), cep (8 dígitos) ou endereco (rua|cidade|uf normalizados)
+    tipo = db.Column(db.String(20), nullable=False)
+    chave = db.Column(db.String(300), nullable=False)
+    dados = db.Column(db.JSON, nullable=False, default=dict)
+    sucesso = db.Column(db.Boolean, default=True, nullable=False)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'chave': self.chave,
+            'dados': self.dados or {},
+            'sucesso': self.sucesso,
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
+            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None,
+            'expira_em': self.expira_em.isoformat() if self.expira_em else None
+        }
+
+class VersaoReferencia(db.Model):  # type: ignore
+    """Contador de versão por domínio de dados de referência (invalida caches/ETags ao gravar)"""
+    __tablename__ = 'versoes_referencia'
+
+    dominio = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.BigInteger, nullable=False, default=1)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'dominio': self.dominio,
+            'versao': self.versao,
+            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None
+        }
+
+class Sequencia(db.Model):  # type: ignore
+    """Último valor alocado por chave de código (BAG-<categoria>, MAT, OP-<data>, ...)"""
+    __tablename__ = 'sequencias'
+
+    chave = db.Column(db.String(100), primary_key=True)
+    valor = db.Column(db.BigInteger, nullable=False, default=0)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'chave': self.chave,
+            'valor': self.valor,
+            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None
+        }
+
+class Localizacao(db.Model):  # type: ignore
+    """Posição física do armazém (rua/rack) com ocupação mantida a cada movimentação"""
+    __tablename__ = 'localizacoes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    codigo = db.Column(db.String(100), unique=True, nullable=False)
+    descricao = db.Column(db.String(200), nullable=True)
+    ativo = db.Column(db.Boolean, default=True, nullable=False)
+    capacidade_kg = db.Column(db.Float, nullable=True)
+
+    # Ocupação: lotes com localizacao_id = id (corrigida por scripts/reconciliar_localizacoes.py)
+    quantidade_lotes = db.Column(db.Integer, default=0, nullable=False)
+    peso_kg = db.Column(db.Float, default=0, nullable=False)
+
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def percentual_ocupacao(self):
+        if self.capacidade_kg:
+            return round(min(100, (self.peso_kg or 0) / self.capacidade_kg * 100), 2)
+        return None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'codigo': self.codigo,
+            'descricao': self.descricao,
+            'ativo': self.ativo,
+            'capacidade_kg': self.capacidade_kg,
+            'quantidade_lotes': self.quantidade_lotes or 0,
+            'peso_kg': round(self.peso_kg or 0, 2),
+            'percentual_ocupacao': self.percentual_ocupacao,
+            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None
+        }
@@ -1,7 +1,7 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
-import requests
+from app.services import http_client
 import os
 import uuid
 import json
@@ -59,7 +59,7 @@ Quando nao souber algo, admita e sugira onde encontrar a informacao."""
             'stream': False
         }
         
-        response = requests.post(
+        response = http_client.post(
             'https://api.perplexity.ai/chat/completions',
             headers=headers,
             json=payload,
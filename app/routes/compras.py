@@ -1,29 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import Solicitacao, ItemSolicitacao, Lote, Fornecedor, TipoLote, Usuario, db
+from app.utils.sequencias import proximo_codigo
 from datetime import datetime
 
 bp = Blueprint('compras', __name__, url_prefix='/api/compras')
 
 def gerar_codigo_lote():
     """Gera código de lote no formato AAAAMMDD-SEQ (ex: 20251117-001)"""
-    hoje = datetime.now()
-    data_str = hoje.strftime('%Y%m%d')
-    
-    ultimo_lote = db.session.query(Lote).filter(
-        Lote.numero_lote.like(f'{data_str}-%')
-    ).order_by(Lote.numero_lote.desc()).first()
-    
-    if ultimo_lote:
-        try:
-            ultima_seq = int(ultimo_lote.numero_lote.split('-')[1])
-            proxima_seq = ultima_seq + 1
-        except (IndexError, ValueError):
-            proxima_seq = 1
-    else:
-        proxima_seq = 1
-    
-    return f"{data_str}-{proxima_seq:03d}"
+    data_str = datetime.now().strftime('%Y%m%d')
+    return proximo_codigo(data_str, largura=3, coluna=Lote.numero_lote)
 
 @bp.route('', methods=['POST'])
 @jwt_required()
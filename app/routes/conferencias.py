@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, ConferenciaRecebimento, OrdemServico, OrdemCompra, Usuario, Notificacao, EntradaEstoque, Lote
+from app.models import db, precarregar_eventos, ConferenciaRecebimento, OrdemServico, OrdemCompra, Usuario, Notificacao, EntradaEstoque, Lote
 from app.auth import admin_required
+from app.utils.auditoria import registrar_evento
+from app.services.imagem_upload import salvar_em_pasta
 from datetime import datetime
 import uuid
 import os
@@ -15,20 +17,7 @@ def calcular_percentual_diferenca(peso_fornecedor, peso_real):
     return abs((peso_real - peso_fornecedor) / peso_fornecedor) * 100
 
 def registrar_auditoria_conferencia(conferencia, acao, usuario_id, detalhes=None, gps=None, device_id=None):
-    entrada_auditoria = {
-        'acao': acao,
-        'usuario_id': usuario_id,
-        'timestamp': datetime.utcnow().isoformat(),
-        'detalhes': detalhes or {},
-        'ip': request.remote_addr,
-        'user_agent': request.headers.get('User-Agent'),
-        'gps': gps,
-        'device_id': device_id
-    }
-    
-    if conferencia.auditoria is None:
-        conferencia.auditoria = []
-    conferencia.auditoria.append(entrada_auditoria)
+    registrar_evento(conferencia, acao, usuario_id, dados={'detalhes': detalhes or {}}, gps=gps, device_id=device_id)
 
 def criar_lote_apos_conferencia(conferencia, usuario_id, decisao='ACEITAR', percentual_desconto=None, motivo='', gps=None, device_id=None):
     from app.models import MovimentacaoEstoque, LoteSeparacao
@@ -56,13 +45,7 @@ def criar_lote_apos_conferencia(conferencia, usuario_id, decisao='ACEITAR', perc
         if decisao == 'ACEITAR_COM_DESCONTO' and percentual_desconto:
             peso_liquido = peso_final * (1 - percentual_desconto / 100)
         
-        # WARNING: Race condition - count()+1 pode gerar números duplicados em alta concorrência
-        # TODO: Migrar para sequence do PostgreSQL ou usar UUID para número de lote
-        ano = datetime.now().year
-        numero_sequencial = Lote.query.filter(
-            Lote.numero_lote.like(f"{ano}-%")  # type: ignore
-        ).count() + 1
-        numero_lote = f"{ano}-{str(numero_sequencial).zfill(5)}"
+        numero_lote = Lote.gerar_numero_lote()
         
         # Sistema migrado para materiais - usar tipo_lote genérico (ID 1)
         # Tipo de lote genérico criado na migração 017
@@ -101,26 +84,23 @@ def criar_lote_apos_conferencia(conferencia, usuario_id, decisao='ACEITAR', perc
             conferente_id=conferencia.conferente_id,
             anexos=conferencia.fotos_pesagem or [],
             divergencias=divergencias_registradas,
-            auditoria=[{
-                'acao': 'LOTE_CRIADO_APOS_CONFERENCIA',
-                'usuario_id': usuario_id,
-                'timestamp': datetime.utcnow().isoformat(),
-                'ip': request.remote_addr,
-                'device_id': conferencia.device_id_conferencia or device_id,
-                'gps': conferencia.gps_conferencia or gps,
-                'detalhes': {
-                    'conferencia_id': conferencia.id,
-                    'os_id': os.id,
-                    'oc_id': oc.id,
-                    'decisao': decisao,
-                    'divergencia': conferencia.divergencia,
-                    'tipo_divergencia': conferencia.tipo_divergencia
-                }
-            }],
             data_criacao=datetime.utcnow()
         )
         db.session.add(lote)
         db.session.flush()
+        registrar_evento(
+            lote, 'LOTE_CRIADO_APOS_CONFERENCIA', usuario_id,
+            dados={'detalhes': {
+                'conferencia_id': conferencia.id,
+                'os_id': os.id,
+                'oc_id': oc.id,
+                'decisao': decisao,
+                'divergencia': conferencia.divergencia,
+                'tipo_divergencia': conferencia.tipo_divergencia
+            }},
+            gps=conferencia.gps_conferencia or gps,
+            device_id=conferencia.device_id_conferencia or device_id
+        )
         
         if oc.solicitacao and oc.solicitacao.itens:
             for item in oc.solicitacao.itens:
@@ -165,20 +145,14 @@ def criar_lote_apos_conferencia(conferencia, usuario_id, decisao='ACEITAR', perc
         
         separacao = LoteSeparacao(
             lote_id=lote.id,
-            status='AGUARDANDO_SEPARACAO',
-            auditoria=[{
-                'acao': 'SEPARACAO_CRIADA_AUTOMATICAMENTE',
-                'usuario_id': usuario_id,
-                'timestamp': datetime.utcnow().isoformat(),
-                'ip': request.remote_addr,
-                'user_agent': request.headers.get('User-Agent'),
-                'gps': gps,
-                'device_id': device_id,
-                'divergencia_conferencia': conferencia.divergencia,
-                'decisao_adm': decisao
-            }]
+            status='AGUARDANDO_SEPARACAO'
         )
         db.session.add(separacao)
+        registrar_evento(
+            separacao, 'SEPARACAO_CRIADA_AUTOMATICAMENTE', usuario_id,
+            dados={'divergencia_conferencia': conferencia.divergencia, 'decisao_adm': decisao},
+            gps=gps, device_id=device_id
+        )
         
         # Flush para detectar IntegrityError antes do commit final
         db.session.flush()
@@ -212,6 +186,7 @@ def listar_conferencias():
             query = query.filter_by(conferencia_status=status)
         
         conferencias = query.order_by(ConferenciaRecebimento.criado_em.desc()).all()
+        precarregar_eventos(conferencias)
         
         resultado = []
         for conf in conferencias:
@@ -620,9 +595,9 @@ def upload_foto(id):
             filename = secure_filename(foto.filename)
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             nome_arquivo = f'{timestamp}_{filename}'
-            caminho_arquivo = os.path.join(pasta_evidencias, nome_arquivo)
-            
-            foto.save(caminho_arquivo)
+            caminho_arquivo, imagem = salvar_em_pasta(
+                foto.read(), pasta_evidencias, nome_arquivo, 'evidencia', foto.mimetype
+            )
             
             if conferencia.fotos_pesagem is None:
                 conferencia.fotos_pesagem = []
@@ -635,7 +610,9 @@ def upload_foto(id):
                 usuario_id, 
                 detalhes={
                     'caminho_arquivo': caminho_arquivo,
-                    'nome_original': foto.filename
+                    'nome_original': foto.filename,
+                    'tamanho_original': imagem.tamanho_original,
+                    'tamanho_final': imagem.tamanho_final
                 },
                 gps=None,
                 device_id=None
@@ -646,6 +623,7 @@ def upload_foto(id):
             return jsonify({
                 'mensagem': 'Foto enviada com sucesso',
                 'caminho': caminho_arquivo,
+                'imagem': imagem.resumo(),
                 'conferencia': conferencia.to_dict()
             }), 200
     
@@ -1,11 +1,12 @@
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required
-from app.models import db, Fornecedor, Solicitacao, Lote, EntradaEstoque, FornecedorTipoLotePreco, ItemSolicitacao, TipoLote, OrdemCompra, Usuario, Motorista, OrdemServico
+from app.models import db, Fornecedor, Solicitacao, Lote, EntradaEstoque, FornecedorTipoLotePreco, ItemSolicitacao, TipoLote, OrdemCompra, Usuario, Motorista, OrdemServico, ResumoTrajetoOS
 from app.auth import admin_ou_auditor_required
 from sqlalchemy import func, extract, case, and_, or_
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-import requests
+from app.services import http_client
+from app.utils import status_lote
 
 bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
 
@@ -20,7 +21,7 @@ def obter_estatisticas():
     
     # Valor total de lotes aprovados
     valor_total = db.session.query(func.sum(Lote.valor_total)).filter(
-        Lote.status == 'aprovado'
+        Lote.status == status_lote.APROVADO
     ).scalar() or 0
     
     # Quilos por tipo de lote
@@ -145,7 +146,7 @@ def obter_metricas_financeiras():
         ).filter(
             Fornecedor.comprador_responsavel_id == comprador.id,
             Lote.data_criacao >= mes_atual,
-            Lote.status == 'aprovado'
+            Lote.status == status_lote.APROVADO
         ).scalar() or 0
         
         valor_semana = db.session.query(func.sum(Lote.valor_total)).join(
@@ -153,7 +154,7 @@ def obter_metricas_financeiras():
         ).filter(
             Fornecedor.comprador_responsavel_id == comprador.id,
             Lote.data_criacao >= inicio_semana,
-            Lote.status == 'aprovado'
+            Lote.status == status_lote.APROVADO
         ).scalar() or 0
         
         qtd_compras = db.session.query(func.count(Lote.id)).join(
@@ -161,7 +162,7 @@ def obter_metricas_financeiras():
         ).filter(
             Fornecedor.comprador_responsavel_id == comprador.id,
             Lote.data_criacao >= mes_atual,
-            Lote.status == 'aprovado'
+            Lote.status == status_lote.APROVADO
         ).scalar() or 0
         
         ticket_medio = (float(valor_mes) / qtd_compras) if qtd_compras > 0 else 0
@@ -192,7 +193,7 @@ def obter_metricas_financeiras():
         valor_total = db.session.query(func.sum(Lote.valor_total)).filter(
             Lote.data_criacao >= inicio_mes,
             Lote.data_criacao < fim_mes,
-            Lote.status == 'aprovado'
+            Lote.status == status_lote.APROVADO
         ).scalar() or 0
         
         gastos_mensais_ultimos_6_meses.append({
@@ -219,33 +220,36 @@ def obter_metricas_logistica():
     hoje = datetime.now()
     mes_atual = datetime(hoje.year, hoje.month, 1)
     
-    motoristas = Motorista.query.filter(Motorista.ativo == True).all()
+    # Uma consulta agrupada: OS do mês por motorista + resumos de trajeto (km e duração)
+    linhas = db.session.query(
+        Motorista.nome,
+        func.count(OrdemServico.id),
+        func.count(case((OrdemServico.status == 'FINALIZADA', 1))),
+        func.coalesce(func.sum(ResumoTrajetoOS.km_total), 0),
+        func.avg(case(
+            (OrdemServico.status == 'FINALIZADA', ResumoTrajetoOS.duracao_segundos)
+        ))
+    ).outerjoin(
+        OrdemServico, and_(
+            OrdemServico.motorista_id == Motorista.id,
+            OrdemServico.criado_em >= mes_atual
+        )
+    ).outerjoin(
+        ResumoTrajetoOS, ResumoTrajetoOS.os_id == OrdemServico.id
+    ).filter(
+        Motorista.ativo == True
+    ).group_by(Motorista.id, Motorista.nome).order_by(Motorista.id).all()
     
     metricas_motoristas = []
-    for motorista in motoristas:
-        total_os = OrdemServico.query.filter(
-            OrdemServico.motorista_id == motorista.id,
-            OrdemServico.criado_em >= mes_atual
-        ).count()
-        
-        os_concluidas = OrdemServico.query.filter(
-            OrdemServico.motorista_id == motorista.id,
-            OrdemServico.status == 'FINALIZADA',
-            OrdemServico.criado_em >= mes_atual
-        ).count()
-        
-        km_total = 0  # OrdemServico não possui campo km_total
-        
-        tempo_medio_minutos = 0  # OrdemServico não possui campos data_conclusao e data_inicio
-        
+    for nome, total_os, os_concluidas, km_total, duracao_media in linhas:
         taxa_conclusao = (os_concluidas / total_os * 100) if total_os > 0 else 0
         
         metricas_motoristas.append({
-            'nome': motorista.nome,
+            'nome': nome,
             'total_os': total_os,
             'os_concluidas': os_concluidas,
-            'km_total': float(km_total),
-            'tempo_medio_horas': float(tempo_medio_minutos) / 60,
+            'km_total': round(float(km_total), 2),
+            'tempo_medio_horas': float(duracao_media or 0) / 3600,
             'taxa_conclusao': round(taxa_conclusao, 2)
         })
     
@@ -295,13 +299,13 @@ def obter_analise_fornecedores():
         
         peso_total = db.session.query(func.sum(Lote.peso_total_kg)).filter(
             Lote.fornecedor_id == fornecedor.id,
-            Lote.status == 'aprovado',
+            Lote.status == status_lote.APROVADO,
             Lote.data_criacao >= mes_atual
         ).scalar() or 0
         
         valor_total = db.session.query(func.sum(Lote.valor_total)).filter(
             Lote.fornecedor_id == fornecedor.id,
-            Lote.status == 'aprovado',
+            Lote.status == status_lote.APROVADO,
             Lote.data_criacao >= mes_atual
         ).scalar() or 0
         
@@ -480,7 +484,7 @@ def obter_indicadores_externos():
         for api in apis:
             try:
                 print(f'🔄 Tentando API: {api["url"]}')
-                response = requests.get(
+                response = http_client.get(
                     api['url'], 
                     timeout=5,
                     headers={'User-Agent': 'Mozilla/5.0'}
@@ -506,9 +510,10 @@ def obter_indicadores_externos():
         hoje = datetime.now()
         
         try:
-            resp_historico = requests.get(
+            resp_historico = http_client.get(
                 'https://economia.awesomeapi.com.br/json/daily/USD-BRL/30',
                 timeout=5,
+                cache_ttl=3600,
                 headers={'User-Agent': 'Mozilla/5.0'}
             )
             
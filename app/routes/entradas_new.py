@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import EntradaEstoque, Lote, Usuario, db
 from app.auth import admin_required
+from app.utils import status_lote
 from datetime import datetime
 
 bp = Blueprint('entradas', __name__, url_prefix='/api/entradas')
@@ -61,7 +62,7 @@ def criar_entrada():
         if not lote:
             return jsonify({'erro': 'Lote não encontrado'}), 404
         
-        if lote.status != 'aprovado':
+        if lote.status != status_lote.APROVADO:
             return jsonify({'erro': 'Apenas lotes aprovados podem ter entrada no estoque'}), 400
         
         entrada_existente = EntradaEstoque.query.filter_by(lote_id=lote.id).first()
@@ -108,7 +109,7 @@ def processar_entrada(id):
             entrada.observacoes = (entrada.observacoes or '') + '\n' + data['observacoes']
         
         if entrada.lote:
-            entrada.lote.status = 'estoque'
+            entrada.lote.status = status_lote.EM_ESTOQUE
             entrada.lote.data_fechamento = datetime.utcnow()
         
         db.session.commit()
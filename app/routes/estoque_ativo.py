@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, Lote, BagProducao, ItemSeparadoProducao, ClassificacaoGrade, ItemSolicitacao, MaterialBase, Usuario
-from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm import joinedload, selectinload, aliased
 from sqlalchemy import func
+from app.utils import status_lote
+from app.services import bag_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,7 +12,10 @@ logger = logging.getLogger(__name__)
 bp = Blueprint('estoque_ativo', __name__, url_prefix='/api/estoque-ativo')
 
 # Status de lotes ativos (incluindo sublotes criados na separação)
-LOTES_ATIVOS_STATUS = ['em_estoque', 'disponivel', 'aprovado', 'em_producao', 'CRIADO_SEPARACAO', 'PROCESSADO', 'criado_separacao', 'processado']
+LOTES_ATIVOS_STATUS = [
+    status_lote.EM_ESTOQUE, status_lote.APROVADO, status_lote.EM_PRODUCAO,
+    status_lote.CRIADO_SEPARACAO, status_lote.PROCESSADO
+]
 
 @bp.route('/dashboard', methods=['GET'])
 @jwt_required()
@@ -25,7 +30,7 @@ def dashboard_estoque_ativo():
 
         # Contar lotes principais em produção
         em_producao = Lote.query.filter(
-            Lote.status == 'em_producao',
+            Lote.status == status_lote.EM_PRODUCAO,
             Lote.bloqueado == False,
             Lote.lote_pai_id.is_(None)
         ).count()
@@ -80,7 +85,7 @@ def listar_lotes_ativos():
         )
 
         if status:
-            query = query.filter(Lote.status == status)
+            query = query.filter(Lote.status == status_lote.normalizar_status(status))
         else:
             query = query.filter(Lote.status.in_(LOTES_ATIVOS_STATUS))
 
@@ -158,40 +163,30 @@ def listar_bags_estoque():
 
         bags = query.order_by(BagProducao.data_criacao.desc()).limit(200).all()
 
+        # Peso/quantidade vêm dos acumuladores do bag; o detalhamento por classificação
+        # é uma consulta agrupada para todos os bags. Os itens individuais só são
+        # incluídos com ?incluir_itens=true (a tela busca em /bags/<id>/itens ao expandir)
+        incluir_itens = request.args.get('incluir_itens', 'false').lower() == 'true'
+        composicao = bag_service.composicao_por_classificacao(bag.id for bag in bags)
+
+        itens_por_bag = {}
+        if incluir_itens and bags:
+            itens = ItemSeparadoProducao.query.options(
+                joinedload(ItemSeparadoProducao.classificacao_grade),
+                joinedload(ItemSeparadoProducao.ordem_producao)
+            ).filter(
+                ItemSeparadoProducao.bag_id.in_([bag.id for bag in bags])
+            ).order_by(ItemSeparadoProducao.id).all()
+            for item in itens:
+                itens_por_bag.setdefault(item.bag_id, []).append(item.to_dict())
+
         resultado = []
         for bag in bags:
             bag_dict = bag.to_dict()
-            
-            itens = ItemSeparadoProducao.query.filter_by(bag_id=bag.id).all()
-            itens_data = []
-            tem_lotes_origem = False
-            
-            # Agregar itens por classificação
-            itens_por_classificacao = {}
-            for item in itens:
-                item_dict = item.to_dict()
-                itens_data.append(item_dict)
-                if item.ordem_producao_id:
-                    tem_lotes_origem = True
-                
-                # Agregar por classificação
-                classif_nome = item.classificacao_grade.nome if item.classificacao_grade else 'Sem classificação'
-                if classif_nome not in itens_por_classificacao:
-                    itens_por_classificacao[classif_nome] = {
-                        'nome': classif_nome,
-                        'peso_total_kg': 0,
-                        'quantidade_itens': 0
-                    }
-                itens_por_classificacao[classif_nome]['peso_total_kg'] += float(item.peso_kg or 0)
-                itens_por_classificacao[classif_nome]['quantidade_itens'] += 1
-            
-            bag_dict['itens'] = itens_data
-            bag_dict['origem_lotes'] = tem_lotes_origem
-            bag_dict['itens_por_classificacao'] = sorted(
-                itens_por_classificacao.values(),
-                key=lambda x: x['peso_total_kg'],
-                reverse=True
-            )
+            bag_dict['itens_por_classificacao'] = composicao.get(bag.id, [])
+            bag_dict['origem_lotes'] = bool(bag.lotes_origem) or bool(bag.quantidade_itens)
+            if incluir_itens:
+                bag_dict['itens'] = itens_por_bag.get(bag.id, [])
             
             # Determinar categoria exibição
             if bag.classificacao_grade:
@@ -276,28 +271,48 @@ def obter_resumo_estoque():
         # Filtra apenas bags ativos que contam como estoque
         bags_ativos = ['devolvido_estoque', 'cheio', 'aberto', 'enviado_refinaria']
         
-        # Query principal: peso e custo por classificação (usando custo_proporcional dos itens separados)
-        resultados = db.session.query(
+        # Totais por categoria a partir dos acumuladores dos bags (um bag por
+        # categoria, sem reler os itens separados)
+        totais_categoria = db.session.query(
             ClassificacaoGrade.categoria,
+            db.func.sum(BagProducao.peso_acumulado).label('peso_total'),
+            db.func.sum(BagProducao.custo_acumulado).label('custo_total')
+        ).join(
+            BagProducao.classificacao_grade
+        ).filter(
+            BagProducao.status.in_(bags_ativos),
+            BagProducao.quantidade_itens > 0
+        ).group_by(
+            ClassificacaoGrade.categoria
+        ).all()
+        
+        # Detalhamento por classificação a partir dos itens (o bag mistura várias
+        # classificações da mesma categoria). O item entra na categoria do seu bag
+        # para os totais baterem com os da categoria; o índice em bag_id mantém a
+        # junção barata
+        ClassificacaoBag = aliased(ClassificacaoGrade)
+        por_classificacao = db.session.query(
+            ClassificacaoBag.categoria,
             ClassificacaoGrade.nome,
-            ClassificacaoGrade.id,
             db.func.sum(ItemSeparadoProducao.peso_kg).label('peso_total'),
             db.func.sum(ItemSeparadoProducao.custo_proporcional).label('custo_total')
         ).join(
             ItemSeparadoProducao.classificacao_grade
         ).join(
             ItemSeparadoProducao.bag
+        ).join(
+            ClassificacaoBag, ClassificacaoBag.id == BagProducao.classificacao_grade_id
         ).filter(
             BagProducao.status.in_(bags_ativos)
         ).group_by(
-            ClassificacaoGrade.categoria,
+            ClassificacaoBag.categoria,
             ClassificacaoGrade.nome,
             ClassificacaoGrade.id
         ).all()
         
         # Estruturar resposta
         dados = {}
-        for cat, classif_nome, classif_id, peso, custo in resultados:
+        for cat, peso, custo in totais_categoria:
             cat_key = cat or 'OUTROS'
             if cat_key not in dados:
                 dados[cat_key] = {
@@ -306,13 +321,17 @@ def obter_resumo_estoque():
                     'total_valor': 0.0,
                     'classificacoes': []
                 }
+            dados[cat_key]['peso_total'] += float(peso or 0)
+            dados[cat_key]['total_valor'] += float(custo or 0)
+        
+        for cat, classif_nome, peso, custo in por_classificacao:
+            cat_key = cat or 'OUTROS'
+            if cat_key not in dados:
+                continue
             
             p = float(peso or 0)
             c = float(custo or 0)
             
-            dados[cat_key]['peso_total'] += p
-            dados[cat_key]['total_valor'] += c
-            
             # Dados da classificação
             classif_data = {
                 'nome': classif_nome,
@@ -339,6 +339,17 @@ def upload_tabela_precos(fornecedor_id):
         precos_criados = []
         erros = []
         
+        # Índice em memória (nome/código sem diferenciar maiúsculas) em vez de um ILIKE por linha
+        # (nome tem prioridade sobre código em caso de colisão)
+        materiais = MaterialBase.query.all()
+        materiais_por_chave = {}
+        for material in materiais:
+            if material.codigo:
+                materiais_por_chave[material.codigo.strip().lower()] = material
+        for material in materiais:
+            if material.nome:
+                materiais_por_chave[material.nome.strip().lower()] = material
+        
         for idx, row in df.iterrows():
             try:
                 nome_material = str(row[coluna_material]).strip()
@@ -351,12 +362,7 @@ def upload_tabela_precos(fornecedor_id):
                     erros.append(f'Linha {idx + 2}: Preço inválido para material "{nome_material}"')
                     continue
                 
-                material = MaterialBase.query.filter(
-                    db.or_(
-                        MaterialBase.nome.ilike(nome_material),
-                        MaterialBase.codigo.ilike(nome_material)
-                    )
-                ).first()
+                material = materiais_por_chave.get(nome_material.lower())
                 
                 if not material:
                     erros.append(f'Linha {idx + 2}: Material "{nome_material}" não encontrado')
@@ -2,6 +2,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import Fornecedor, FornecedorTipoLotePreco, FornecedorTipoLoteClassificacao, Vendedor, TipoLote, Usuario, FornecedorFuncionarioAtribuicao, db
 from app.auth import admin_required
+from app.services import http_client
+from app.utils.geolocation import consultar_cep
+from app.utils.busca import aplicar_busca, LIMITE_BUSCA_PADRAO
 import requests
 import re
 import logging
@@ -91,62 +94,42 @@ def verificar_conflito_endereco(rua, numero, cidade, estado, cep, fornecedor_id_
     if not rua or not cidade or not estado:
         return None
     
-    cep_normalizado = re.sub(r'[^\d]', '', cep) if cep else None
-    rua_normalizada = rua.strip().lower() if rua else ''
-    numero_normalizado = str(numero).strip() if numero else ''
-    cidade_normalizada = cidade.strip().lower() if cidade else ''
-    estado_normalizado = estado.strip().upper() if estado else ''
+    chave_endereco, chave_cep_numero = Fornecedor.gerar_chaves_endereco(rua, numero, cidade, estado, cep)
     
-    query = Fornecedor.query.filter(
-        Fornecedor.ativo == True
+    condicoes = [Fornecedor.chave_endereco == chave_endereco]
+    if chave_cep_numero:
+        condicoes.append(Fornecedor.chave_cep_numero == chave_cep_numero)
+    
+    query = db.session.query(Fornecedor, Usuario.nome).outerjoin(
+        Usuario, Usuario.id == Fornecedor.comprador_responsavel_id
+    ).filter(
+        Fornecedor.ativo == True,
+        db.or_(*condicoes)
     )
     
     if fornecedor_id_excluir:
         query = query.filter(Fornecedor.id != fornecedor_id_excluir)
     
-    fornecedores = query.all()
+    resultado = query.order_by(Fornecedor.id).first()
     
-    for fornecedor in fornecedores:
-        fornecedor_rua = (fornecedor.rua or '').strip().lower()
-        fornecedor_numero = str(fornecedor.numero or '').strip()
-        fornecedor_cidade = (fornecedor.cidade or '').strip().lower()
-        fornecedor_estado = (fornecedor.estado or '').strip().upper()
-        fornecedor_cep = re.sub(r'[^\d]', '', fornecedor.cep) if fornecedor.cep else None
-        
-        endereco_igual = (
-            rua_normalizada == fornecedor_rua and
-            numero_normalizado == fornecedor_numero and
-            cidade_normalizada == fornecedor_cidade and
-            estado_normalizado == fornecedor_estado
-        )
-        
-        if cep_normalizado and fornecedor_cep:
-            endereco_igual = endereco_igual or (
-                cep_normalizado == fornecedor_cep and
-                numero_normalizado == fornecedor_numero
-            )
-        
-        if endereco_igual:
-            comprador_nome = 'Não atribuído'
-            if fornecedor.comprador_responsavel_id:
-                comprador = Usuario.query.get(fornecedor.comprador_responsavel_id)
-                if comprador:
-                    comprador_nome = comprador.nome
-            
-            mensagem = f'CNPJ já cadastrado\n'
-            mensagem += f'Fornecedor: {fornecedor.nome}\n'
-            mensagem += f'Comprador Responsável: {comprador_nome}\n'
-            mensagem += f'Endereço: {fornecedor.rua}, {fornecedor.numero} - {fornecedor.cidade}/{fornecedor.estado}'
-            
-            return {
-                'conflito': True,
-                'fornecedor_id': fornecedor.id,
-                'fornecedor_nome': fornecedor.nome,
-                'comprador_responsavel': comprador_nome,
-                'mensagem': mensagem
-            }
+    if not resultado:
+        return None
     
-    return None
+    fornecedor, comprador_nome = resultado
+    comprador_nome = comprador_nome or 'Não atribuído'
+    
+    mensagem = f'CNPJ já cadastrado\n'
+    mensagem += f'Fornecedor: {fornecedor.nome}\n'
+    mensagem += f'Comprador Responsável: {comprador_nome}\n'
+    mensagem += f'Endereço: {fornecedor.rua}, {fornecedor.numero} - {fornecedor.cidade}/{fornecedor.estado}'
+    
+    return {
+        'conflito': True,
+        'fornecedor_id': fornecedor.id,
+        'fornecedor_nome': fornecedor.nome,
+        'comprador_responsavel': comprador_nome,
+        'mensagem': mensagem
+    }
 
 @bp.route('/verificar-endereco', methods=['POST'])
 @jwt_required()
@@ -190,12 +173,10 @@ def buscar_cep(cep):
         
         # Consulta API ViaCEP
         logger.info(f'Buscando CEP: {cep_limpo}')
-        response = requests.get(f'https://viacep.com.br/ws/{cep_limpo}/json/', timeout=5)
-        
-        if response.status_code != 200:
-            return jsonify({'erro': 'Erro ao consultar CEP. Tente novamente.'}), response.status_code
+        dados = consultar_cep(cep_limpo)
         
-        dados = response.json()
+        if dados is None:
+            return jsonify({'erro': 'Erro ao consultar CEP. Tente novamente.'}), 502
         
         # Verifica se o CEP foi encontrado
         if 'erro' in dados and dados['erro']:
@@ -247,7 +228,8 @@ def listar_fornecedores():
         if not usuario:
             return jsonify({'erro': 'Usuário não encontrado'}), 404
         
-        busca = request.args.get('busca', '')
+        busca = request.args.get('busca', '').strip()
+        limite = request.args.get('limite', type=int)
         vendedor_id = request.args.get('vendedor_id', type=int)
         cidade = request.args.get('cidade', '')
         forma_pagamento = request.args.get('forma_pagamento', '')
@@ -262,17 +244,6 @@ def listar_fornecedores():
                 Fornecedor.comprador_responsavel_id == usuario_id
             )
         
-        if busca:
-            query = query.filter(
-                db.or_(
-                    Fornecedor.nome.ilike(f'%{busca}%'),
-                    Fornecedor.nome_social.ilike(f'%{busca}%'),
-                    Fornecedor.cnpj.ilike(f'%{busca}%'),
-                    Fornecedor.cpf.ilike(f'%{busca}%'),
-                    Fornecedor.email.ilike(f'%{busca}%')
-                )
-            )
-        
         if vendedor_id:
             query = query.filter_by(vendedor_id=vendedor_id)
         
@@ -285,7 +256,16 @@ def listar_fornecedores():
         if condicao_pagamento:
             query = query.filter_by(condicao_pagamento=condicao_pagamento)
         
-        fornecedores = query.order_by(Fornecedor.nome).all()
+        # Com busca: ordenado por relevância e limitado (padrão LIMITE_BUSCA_PADRAO)
+        query = aplicar_busca(
+            query,
+            [Fornecedor.nome, Fornecedor.nome_social, Fornecedor.cnpj, Fornecedor.cpf, Fornecedor.email],
+            busca,
+            ordem_padrao=Fornecedor.nome,
+            limite=(limite or LIMITE_BUSCA_PADRAO) if busca else limite
+        )
+        
+        fornecedores = query.all()
         return jsonify([fornecedor.to_dict() for fornecedor in fornecedores]), 200
     
     except Exception as e:
@@ -1085,7 +1065,7 @@ def consultar_cnpj(cnpj):
         
         for api in apis:
             try:
-                response = requests.get(api['url'], timeout=10)
+                response = http_client.get(api['url'], timeout=8, cache_ttl=3600)
                 
                 if response.status_code == 200:
                     data = response.json()
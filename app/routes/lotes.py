@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, Lote, TipoLote, Fornecedor, OrdemCompra, OrdemServico, ConferenciaRecebimento
 from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
+from app.utils import status_lote
 
 bp = Blueprint('lotes', __name__, url_prefix='/api/lotes')
 
@@ -16,7 +17,7 @@ def listar_lotes():
     query = Lote.query
 
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter_by(status=status_lote.normalizar_status(status))
 
     if fornecedor_id:
         query = query.filter_by(fornecedor_id=fornecedor_id)
@@ -116,10 +117,10 @@ def aprovar_lote(id):
     if not lote:
         return jsonify({'erro': 'Lote não encontrado'}), 404
 
-    if lote.status != 'aberto':
+    if lote.status != status_lote.ABERTO:
         return jsonify({'erro': 'Apenas lotes com status "aberto" podem ser aprovados'}), 400
 
-    lote.status = 'aprovado'
+    status_lote.alterar_status(lote, status_lote.APROVADO)
     lote.data_fechamento = datetime.utcnow()
 
     compra = Compra(
@@ -149,10 +150,10 @@ def rejeitar_lote(id):
     if not lote:
         return jsonify({'erro': 'Lote não encontrado'}), 404
 
-    if lote.status != 'aberto':
+    if lote.status != status_lote.ABERTO:
         return jsonify({'erro': 'Apenas lotes com status "aberto" podem ser rejeitados'}), 400
 
-    lote.status = 'rejeitado'
+    status_lote.alterar_status(lote, status_lote.REJEITADO)
     lote.data_fechamento = datetime.utcnow()
     lote.observacoes = data.get('observacoes', 'Lote rejeitado')
 
@@ -167,12 +168,12 @@ def rejeitar_lote(id):
 @bp.route('/estatisticas', methods=['GET'])
 @jwt_required()
 def obter_estatisticas():
-    total_abertos = Lote.query.filter_by(status='aberto').count()
-    total_aprovados = Lote.query.filter_by(status='aprovado').count()
-    total_rejeitados = Lote.query.filter_by(status='rejeitado').count()
+    total_abertos = Lote.query.filter_by(status=status_lote.ABERTO).count()
+    total_aprovados = Lote.query.filter_by(status=status_lote.APROVADO).count()
+    total_rejeitados = Lote.query.filter_by(status=status_lote.REJEITADO).count()
 
-    peso_total = db.session.query(db.func.sum(Lote.peso_total_kg)).filter_by(status='aprovado').scalar() or 0
-    valor_total = db.session.query(db.func.sum(Lote.valor_total)).filter_by(status='aprovado').scalar() or 0
+    peso_total = db.session.query(db.func.sum(Lote.peso_total_kg)).filter_by(status=status_lote.APROVADO).scalar() or 0
+    valor_total = db.session.query(db.func.sum(Lote.valor_total)).filter_by(status=status_lote.APROVADO).scalar() or 0
 
     return jsonify({
         'lotes_abertos': total_abertos,
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import Lote, ItemSolicitacao, Solicitacao, EntradaEstoque, Usuario, db
 from app.auth import admin_required
+from app.utils import status_lote
 from datetime import datetime
 import uuid
 
@@ -18,7 +19,7 @@ def listar_lotes():
         query = Lote.query
         
         if status:
-            query = query.filter_by(status=status)
+            query = query.filter_by(status=status_lote.normalizar_status(status))
         
         if fornecedor_id:
             query = query.filter_by(fornecedor_id=fornecedor_id)
@@ -138,9 +139,12 @@ def atualizar_lote(id):
             lote.observacoes = data['observacoes']
         
         if 'status' in data:
-            lote.status = data['status']
+            try:
+                status_lote.alterar_status(lote, data['status'])
+            except ValueError as e:
+                return jsonify({'erro': str(e)}), 400
             
-            if data['status'] == 'fechado' and not lote.data_fechamento:
+            if lote.status == status_lote.FECHADO and not lote.data_fechamento:
                 lote.data_fechamento = datetime.utcnow()
         
         db.session.commit()
@@ -160,10 +164,10 @@ def aprovar_lote(id):
         if not lote:
             return jsonify({'erro': 'Lote não encontrado'}), 404
         
-        if lote.status == 'aprovado':
+        if lote.status == status_lote.APROVADO:
             return jsonify({'erro': 'Lote já foi aprovado'}), 400
         
-        lote.status = 'aprovado'
+        lote.status = status_lote.APROVADO
         lote.data_aprovacao = datetime.utcnow()
         
         entrada_existente = EntradaEstoque.query.filter_by(lote_id=lote.id).first()
@@ -263,7 +267,7 @@ def deletar_lote(id):
         if not lote:
             return jsonify({'erro': 'Lote não encontrado'}), 404
         
-        if lote.status in ['aprovado', 'fechado']:
+        if lote.status in (status_lote.APROVADO, status_lote.FECHADO):
             return jsonify({'erro': 'Não é possível deletar lotes aprovados ou fechados'}), 400
         
         if lote.entrada_estoque:
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, MaterialBase, TabelaPreco, TabelaPrecoItem, Usuario
 from app.auth import admin_required
+from app.utils.cache_referencia import resposta_referencia
+from app.utils.sequencias import proximo_codigo
 import pandas as pd
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
@@ -40,16 +42,7 @@ def garantir_tabelas_preco():
 bp = Blueprint('materiais_base', __name__, url_prefix='/api/materiais-base')
 
 def gerar_codigo_automatico():
-    ultimo_material = MaterialBase.query.order_by(MaterialBase.id.desc()).first()
-    if ultimo_material and ultimo_material.codigo:
-        try:
-            numero = int(ultimo_material.codigo.replace('MAT', ''))
-            return f'MAT{numero + 1:03d}'
-        except:
-            pass
-
-    proximo_id = MaterialBase.query.count() + 1
-    return f'MAT{proximo_id:03d}'
+    return proximo_codigo('MAT', largura=3, separador='', coluna=MaterialBase.codigo)
 
 @bp.route('', methods=['GET'])
 @jwt_required()
@@ -58,24 +51,31 @@ def listar_materiais():
     try:
         usuario_id = get_jwt_identity()
         usuario = Usuario.query.get(usuario_id)
-
-        materiais = MaterialBase.query.filter_by(ativo=True).order_by(MaterialBase.nome).all()
-
-        # Se não for admin, remover informações de preços/estrelas
-        if usuario and usuario.tipo != 'admin':
-            return jsonify([{
-                'id': m.id,
-                'codigo': m.codigo,
-                'nome': m.nome,
-                'classificacao': m.classificacao,
-                'descricao': m.descricao,
-                'ativo': m.ativo,
-                'data_cadastro': m.data_cadastro.isoformat() if m.data_cadastro else None,
-                'data_atualizacao': m.data_atualizacao.isoformat() if m.data_atualizacao else None
-            } for m in materiais]), 200
-
-        # Admin vê tudo
-        return jsonify([m.to_dict() for m in materiais]), 200
+        eh_admin = not (usuario and usuario.tipo != 'admin')
+
+        def gerar():
+            materiais = MaterialBase.query.filter_by(ativo=True).order_by(MaterialBase.nome).all()
+
+            # Se não for admin, remover informações de preços/estrelas
+            if not eh_admin:
+                return [{
+                    'id': m.id,
+                    'codigo': m.codigo,
+                    'nome': m.nome,
+                    'classificacao': m.classificacao,
+                    'descricao': m.descricao,
+                    'ativo': m.ativo,
+                    'data_cadastro': m.data_cadastro.isoformat() if m.data_cadastro else None,
+                    'data_atualizacao': m.data_atualizacao.isoformat() if m.data_atualizacao else None
+                } for m in materiais]
+
+            # Admin vê tudo
+            return [m.to_dict() for m in materiais]
+
+        return resposta_referencia(
+            'materiais_base.listar', ['materiais', 'tabelas_preco'], gerar,
+            variante='admin' if eh_admin else 'comprador'
+        )
     except Exception as e:
         logger.error(f'Erro ao listar materiais: {str(e)}')
         return jsonify({'erro': f'Erro ao listar materiais: {str(e)}'}), 500
@@ -1,11 +1,11 @@
 from flask import Blueprint, jsonify, request
-import requests
 import os
 from datetime import datetime, timedelta
 from functools import lru_cache
 import time
 import json
 import urllib3
+from app.services import http_client
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 bp = Blueprint('metais', __name__, url_prefix='/api/metais')
@@ -106,7 +106,7 @@ METAL_SYMBOLS = {
 
 def get_metals_live_api():
     try:
-        response = requests.get('https://api.metals.live/v1/spot', timeout=10, verify=False)
+        response = http_client.get('https://api.metals.live/v1/spot', timeout=6, verify=False)
         if response.status_code == 200:
             data = response.json()
             if not data or not isinstance(data, list):
@@ -130,7 +130,7 @@ def get_metals_live_api():
 
 def get_gold_api_free():
     try:
-        response = requests.get('https://api.goldpricez.com/v1/rates/currency/usd/metal/xau', timeout=10)
+        response = http_client.get('https://api.goldpricez.com/v1/rates/currency/usd/metal/xau', timeout=6)
         if response.status_code == 200:
             data = response.json()
             if 'price_gram_24k' in data:
@@ -149,7 +149,7 @@ def get_gold_api_free():
 
 def get_awesome_api_currencies():
     try:
-        response = requests.get('https://economia.awesomeapi.com.br/json/last/USD-BRL', timeout=10)
+        response = http_client.get('https://economia.awesomeapi.com.br/json/last/USD-BRL', timeout=6, cache_ttl=CACHE_DURATION)
         if response.status_code == 200:
             data = response.json()
             if 'USDBRL' in data:
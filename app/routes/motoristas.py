@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, Motorista, Veiculo, Usuario
 from app.auth import permission_required, admin_required, perfil_required, hash_senha
 from app.utils.auditoria import registrar_criacao, registrar_atualizacao, registrar_exclusao
+from app.services import rastreamento_service
 
 bp = Blueprint('motoristas', __name__)
 
@@ -152,6 +153,8 @@ def atualizar_motorista(motorista_id):
             motorista.ativo = data['ativo']
         
         db.session.commit()
+        if motorista.usuario_id:
+            rastreamento_service.esquecer_motorista(motorista.usuario_id)
         
         usuario_id = int(get_jwt_identity())
         registrar_atualizacao(usuario_id, 'motorista', motorista.id, alteracoes)
@@ -173,6 +176,8 @@ def deletar_motorista(motorista_id):
         
         motorista.ativo = False
         db.session.commit()
+        if motorista.usuario_id:
+            rastreamento_service.esquecer_motorista(motorista.usuario_id)
         
         registrar_atualizacao(usuario_id, 'motorista', motorista.id, {'ativo': False, 'acao': 'desativado'})
         
@@ -2,7 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import OrdemCompra, AuditoriaOC, Solicitacao, Fornecedor, Usuario, ItemSolicitacao, OrdemServico, db
 from app.auth import admin_required
-from app.utils.auditoria import registrar_auditoria_oc
+from app.utils.auditoria import registrar_auditoria_oc, registrar_evento
 from datetime import datetime
 
 bp = Blueprint('ordens_compra', __name__, url_prefix='/api/ordens-compra')
@@ -28,18 +28,7 @@ def criar_snapshot_fornecedor(fornecedor):
 
 def registrar_auditoria_os(os, acao, usuario_id, detalhes=None):
     """Registra ação de auditoria na OS"""
-    entrada_auditoria = {
-        'acao': acao,
-        'usuario_id': usuario_id,
-        'timestamp': datetime.utcnow().isoformat(),
-        'detalhes': detalhes or {},
-        'ip': request.remote_addr,
-        'user_agent': request.headers.get('User-Agent')
-    }
-    
-    if os.auditoria is None:
-        os.auditoria = []
-    os.auditoria.append(entrada_auditoria)
+    registrar_evento(os, acao, usuario_id, dados={'detalhes': detalhes or {}})
 
 @bp.route('', methods=['GET'])
 @jwt_required()
@@ -1,8 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, OrdemServico, OrdemCompra, Fornecedor, Motorista, Veiculo, Usuario, Notificacao, GPSLog, ConferenciaRecebimento
+from app.models import db, precarregar_eventos, OrdemServico, OrdemCompra, Fornecedor, Motorista, Veiculo, Usuario, Notificacao, GPSLog, ConferenciaRecebimento, ResumoTrajetoOS
 from app.auth import admin_required
-from datetime import datetime
+from app.utils.auditoria import registrar_evento as registrar_evento_entidade
+from app.services import rastreamento_service, trajeto_service, planejamento_rotas
+from app import socketio
+from sqlalchemy import insert
+from datetime import datetime, date
 
 bp = Blueprint('ordens_servico', __name__)
 
@@ -24,18 +28,25 @@ def criar_snapshot_fornecedor(fornecedor):
     }
 
 def registrar_auditoria_os(os, acao, usuario_id, detalhes=None):
-    entrada_auditoria = {
-        'acao': acao,
-        'usuario_id': usuario_id,
-        'timestamp': datetime.utcnow().isoformat(),
-        'detalhes': detalhes or {},
-        'ip': request.remote_addr,
-        'user_agent': request.headers.get('User-Agent')
-    }
-    
-    if os.auditoria is None:
-        os.auditoria = []
-    os.auditoria.append(entrada_auditoria)
+    registrar_evento_entidade(os, acao, usuario_id, dados={'detalhes': detalhes or {}})
+
+def notificar_admins(titulo, mensagem):
+    """Cria a notificação para todos os administradores num único INSERT"""
+    admin_ids = [admin_id for (admin_id,) in db.session.query(Usuario.id).filter(
+        db.or_(
+            Usuario.tipo == 'admin',
+            Usuario.perfil.has(nome='Administrador')
+        )
+    ).all()]
+    if admin_ids:
+        db.session.execute(insert(Notificacao), [{
+            'usuario_id': admin_id,
+            'titulo': titulo,
+            'mensagem': mensagem,
+            'tipo': 'alerta_motorista',
+            'url': '/logistica.html',
+            'lida': False
+        } for admin_id in admin_ids])
 
 @bp.route('', methods=['GET'])
 @jwt_required()
@@ -79,6 +90,7 @@ def listar_os():
                 return jsonify([]), 200
         
         os_list = query.order_by(OrdemServico.criado_em.desc()).all()
+        precarregar_eventos(os_list)
         
         return jsonify([os.to_dict() for os in os_list]), 200
     
@@ -106,8 +118,14 @@ def obter_os(id):
         os_dict = os.to_dict()
         
         os_dict['ordem_compra'] = os.ordem_compra.to_dict() if os.ordem_compra else None
-        os_dict['gps_eventos'] = [gps.to_dict() for gps in os.eventos_gps]
+        # Pontos de rastreio ficam de fora (podem ser milhares); o trajeto está em /trajeto
+        eventos_gps = GPSLog.query.filter(
+            GPSLog.os_id == os.id,
+            GPSLog.evento != rastreamento_service.EVENTO_RASTREIO
+        ).order_by(GPSLog.timestamp).all()
+        os_dict['gps_eventos'] = [gps.to_dict() for gps in eventos_gps]
         os_dict['rotas'] = [rota.to_dict() for rota in os.rotas_operacionais]
+        os_dict['resumo_trajeto'] = os.resumo_trajeto.to_dict() if os.resumo_trajeto else None
         
         return jsonify(os_dict), 200
     
@@ -331,7 +349,6 @@ def iniciar_rota(id):
 def registrar_evento(id):
     try:
         usuario_id = get_jwt_identity()
-        usuario = Usuario.query.get(usuario_id)
         data = request.get_json()
         
         if not data or not data.get('evento') or not data.get('gps'):
@@ -341,8 +358,8 @@ def registrar_evento(id):
         if not os:
             return jsonify({'erro': 'Ordem de Serviço não encontrada'}), 404
         
-        motorista = Motorista.query.filter_by(usuario_id=usuario_id).first()
-        if not motorista or os.motorista_id != motorista.id:
+        motorista_id = rastreamento_service.motorista_id_do_usuario(usuario_id)
+        if not motorista_id or os.motorista_id != motorista_id:
             return jsonify({'erro': 'Apenas o motorista atribuído pode registrar eventos'}), 403
         
         evento = data['evento'].upper()
@@ -377,40 +394,16 @@ def registrar_evento(id):
             os.status = 'ENTREGUE'
         elif evento == 'FORNECEDOR_FECHADO':
             os.status = 'IMPEDIDO'
-            admins = Usuario.query.filter(
-                db.or_(
-                    Usuario.tipo == 'admin',
-                    Usuario.perfil.has(nome='Administrador')
-                )
-            ).all()
-            for admin in admins:
-                notificacao = Notificacao(
-                    usuario_id=admin.id,
-                    titulo='Fornecedor Fechado',
-                    mensagem=f'OS {os.numero_os}: Motorista registrou que o fornecedor está fechado. Motivo: {data.get("motivo", "Não informado")}',
-                    tipo='alerta_motorista',
-                    url='/logistica.html',
-                    lida=False
-                )
-                db.session.add(notificacao)
+            notificar_admins(
+                'Fornecedor Fechado',
+                f'OS {os.numero_os}: Motorista registrou que o fornecedor está fechado. Motivo: {data.get("motivo", "Não informado")}'
+            )
         elif evento == 'FORNECEDOR_NAO_ENCONTRADO':
             os.status = 'IMPEDIDO'
-            admins = Usuario.query.filter(
-                db.or_(
-                    Usuario.tipo == 'admin',
-                    Usuario.perfil.has(nome='Administrador')
-                )
-            ).all()
-            for admin in admins:
-                notificacao = Notificacao(
-                    usuario_id=admin.id,
-                    titulo='Fornecedor Não Encontrado',
-                    mensagem=f'OS {os.numero_os}: Motorista não conseguiu localizar o fornecedor. Motivo: {data.get("motivo", "Não informado")}',
-                    tipo='alerta_motorista',
-                    url='/logistica.html',
-                    lida=False
-                )
-                db.session.add(notificacao)
+            notificar_admins(
+                'Fornecedor Não Encontrado',
+                f'OS {os.numero_os}: Motorista não conseguiu localizar o fornecedor. Motivo: {data.get("motivo", "Não informado")}'
+            )
         elif evento == 'FINALIZEI':
             os.status = 'FINALIZADA'
             
@@ -431,17 +424,13 @@ def registrar_evento(id):
                         oc_id=os.oc_id,
                         peso_fornecedor=peso_previsto,
                         quantidade_prevista=quantidade_prevista,
-                        conferencia_status='PENDENTE',
-                        auditoria=[{
-                            'acao': 'CRIACAO_AUTOMATICA',
-                            'usuario_id': usuario_id,
-                            'timestamp': datetime.utcnow().isoformat(),
-                            'detalhes': {'os_id': os.id, 'oc_id': os.oc_id, 'criado_por': 'FINALIZACAO_OS'},
-                            'ip': request.remote_addr,
-                            'user_agent': request.headers.get('User-Agent')
-                        }]
+                        conferencia_status='PENDENTE'
                     )
                     db.session.add(conferencia)
+                    registrar_evento_entidade(
+                        conferencia, 'CRIACAO_AUTOMATICA', usuario_id,
+                        dados={'detalhes': {'os_id': os.id, 'oc_id': os.oc_id, 'criado_por': 'FINALIZACAO_OS'}}
+                    )
                     
                     conferentes = Usuario.query.join(Usuario.perfil).filter(
                         db.or_(
@@ -468,6 +457,9 @@ def registrar_evento(id):
         
         db.session.commit()
         
+        if evento == 'FINALIZEI':
+            trajeto_service.agendar_resumo(os.id)
+        
         return jsonify({
             'mensagem': f'Evento {evento} registrado com sucesso',
             'os': os.to_dict()
@@ -477,6 +469,100 @@ def registrar_evento(id):
         db.session.rollback()
         return jsonify({'erro': f'Erro ao registrar evento: {str(e)}'}), 500
 
+@bp.route('/<int:id>/gps/batch', methods=['POST'])
+@jwt_required()
+def registrar_gps_lote(id):
+    """
+    Recebe os pontos de rastreio acumulados pelo app do motorista
+    
+    Body: {'pontos': [{'latitude', 'longitude', 'timestamp', 'precisao'?, 'velocidade'?, 'direcao'?}],
+           'device_id'?}
+    timestamp em ISO 8601 ou epoch (s/ms). Pontos já recebidos são ignorados,
+    então o app pode reenviar o lote inteiro se a resposta não chegar.
+    """
+    try:
+        usuario_id = get_jwt_identity()
+        data = request.get_json() or {}
+        pontos = data.get('pontos')
+        
+        if not isinstance(pontos, list) or not pontos:
+            return jsonify({'erro': 'pontos é obrigatório (lista não vazia)'}), 400
+        
+        if len(pontos) > rastreamento_service.MAX_PONTOS_LOTE:
+            return jsonify({'erro': f'Máximo de {rastreamento_service.MAX_PONTOS_LOTE} pontos por lote'}), 400
+        
+        os_dados = db.session.query(OrdemServico.motorista_id, OrdemServico.status).filter(
+            OrdemServico.id == id
+        ).first()
+        if not os_dados:
+            return jsonify({'erro': 'Ordem de Serviço não encontrada'}), 404
+        
+        motorista_id = rastreamento_service.motorista_id_do_usuario(usuario_id)
+        if not motorista_id or os_dados.motorista_id != motorista_id:
+            return jsonify({'erro': 'Apenas o motorista atribuído pode enviar o rastreio'}), 403
+        
+        if os_dados.status == 'CANCELADA':
+            return jsonify({'erro': 'OS cancelada não recebe rastreio'}), 409
+        
+        resultado = rastreamento_service.inserir_pontos(
+            id, pontos, device_id=data.get('device_id'), ip=request.remote_addr
+        )
+        db.session.commit()
+        
+        if resultado['ultimo_ponto']:
+            socketio.emit('localizacao_motorista', {
+                'os_id': id,
+                'motorista_id': motorista_id,
+                **resultado['ultimo_ponto']
+            }, room='admins')
+        
+        return jsonify(resultado), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': f'Erro ao registrar rastreio: {str(e)}'}), 500
+
+@bp.route('/<int:id>/trajeto', methods=['GET'])
+@jwt_required()
+def obter_trajeto(id):
+    """
+    Resumo e trajeto simplificado da OS
+    
+    Query params:
+        recalcular: true para recalcular a partir dos gps_logs (admin)
+    """
+    try:
+        usuario_id = get_jwt_identity()
+        usuario = Usuario.query.get(usuario_id)
+        if not usuario:
+            return jsonify({'erro': 'Usuário não encontrado'}), 404
+        
+        os_dados = db.session.query(OrdemServico.motorista_id, OrdemServico.status).filter(OrdemServico.id == id).first()
+        if not os_dados:
+            return jsonify({'erro': 'Ordem de Serviço não encontrada'}), 404
+        
+        perfil_nome = usuario.perfil.nome if usuario.perfil else None
+        if perfil_nome == 'Motorista' or usuario.tipo == 'motorista':
+            if os_dados.motorista_id != rastreamento_service.motorista_id_do_usuario(usuario_id):
+                return jsonify({'erro': 'Acesso negado'}), 403
+        
+        if os_dados.status != 'FINALIZADA':
+            # OS em andamento: calcula na hora, sem gravar (o resumo é gravado ao finalizar)
+            resumo = trajeto_service.resumo_atual(id, os_dados.motorista_id)
+            return jsonify(resumo.to_dict(incluir_trajeto=True)), 200
+        
+        resumo = db.session.get(ResumoTrajetoOS, id)
+        eh_admin = usuario.tipo == 'admin' or perfil_nome == 'Administrador'
+        if resumo is None or (eh_admin and request.args.get('recalcular', 'false').lower() == 'true'):
+            resumo = trajeto_service.calcular_resumo(id)
+            db.session.commit()
+        
+        return jsonify(resumo.to_dict(incluir_trajeto=True)), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': f'Erro ao obter trajeto: {str(e)}'}), 500
+
 @bp.route('/<int:id>/cancelar-impedido', methods=['PUT'])
 @admin_required
 def cancelar_os_impedido(id):
@@ -673,17 +759,13 @@ def marcar_recebido(id):
                 oc_id=os.oc_id,
                 peso_fornecedor=peso_previsto,
                 quantidade_prevista=quantidade_prevista,
-                conferencia_status='PENDENTE',
-                auditoria=[{
-                    'acao': 'CRIACAO_RECEBIMENTO_FORNECEDOR',
-                    'usuario_id': usuario_id,
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'detalhes': {'os_id': os.id, 'oc_id': os.oc_id, 'criado_por': 'RECEBIMENTO_FORNECEDOR_ENTREGA'},
-                    'ip': request.remote_addr,
-                    'user_agent': request.headers.get('User-Agent')
-                }]
+                conferencia_status='PENDENTE'
             )
             db.session.add(conferencia)
+            registrar_evento_entidade(
+                conferencia, 'CRIACAO_RECEBIMENTO_FORNECEDOR', usuario_id,
+                dados={'detalhes': {'os_id': os.id, 'oc_id': os.oc_id, 'criado_por': 'RECEBIMENTO_FORNECEDOR_ENTREGA'}}
+            )
             
             conferentes = Usuario.query.join(Usuario.perfil).filter(
                 db.or_(
@@ -714,6 +796,61 @@ def marcar_recebido(id):
         db.session.rollback()
         return jsonify({'erro': f'Erro ao marcar como recebido: {str(e)}'}), 500
 
+@bp.route('/roteirizar', methods=['POST'])
+@admin_required
+def roteirizar_dia():
+    """
+    Monta as rotas de coleta do dia para as OS pendentes
+    
+    Body (todos opcionais):
+        data: YYYY-MM-DD (padrão: hoje)
+        base: {'latitude', 'longitude'} (padrão: LOGISTICA_BASE_LATITUDE/LONGITUDE)
+        motorista_ids: restringe a frota
+        hora_saida, hora_retorno: HH:MM
+        confirmar: false (padrão) só devolve o plano; true atribui as OS
+    """
+    try:
+        usuario_id = get_jwt_identity()
+        data = request.get_json() or {}
+        
+        try:
+            dia = date.fromisoformat(data['data']) if data.get('data') else date.today()
+            base = data.get('base')
+            if base:
+                base = (float(base['latitude']), float(base['longitude']))
+            planejamento_rotas.configuracao(data.get('hora_saida'), data.get('hora_retorno'))
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'erro': f'Parâmetros inválidos: {str(e)}'}), 400
+        
+        try:
+            plano = planejamento_rotas.planejar(
+                dia,
+                base=base,
+                motorista_ids=data.get('motorista_ids'),
+                hora_saida=data.get('hora_saida'),
+                hora_retorno=data.get('hora_retorno'),
+                requisicao_http=True
+            )
+        except ValueError as e:
+            return jsonify({'erro': str(e)}), 400
+        
+        if not data.get('confirmar'):
+            return jsonify({'plano': plano, 'confirmado': False}), 200
+        
+        resultado = planejamento_rotas.aplicar(plano, usuario_id)
+        db.session.commit()
+        
+        return jsonify({
+            'mensagem': f"{resultado['agendadas']} OS agendada(s) em {len(plano['rotas'])} rota(s)",
+            'plano': plano,
+            'confirmado': True,
+            **resultado
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': f'Erro ao roteirizar: {str(e)}'}), 500
+
 @bp.route('/estatisticas', methods=['GET'])
 @jwt_required()
 def obter_estatisticas():
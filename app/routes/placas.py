@@ -1,11 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import Fornecedor, Usuario, Vendedor, Placa, db
+from app.services.imagem_upload import salvar_em_pasta
+from app.services.gemini_analyzer import gerar_textos
 from werkzeug.utils import secure_filename
 import os
 from datetime import datetime
-from google import genai
-from google.genai import types
 import io
 
 placas_bp = Blueprint('placas', __name__)
@@ -18,12 +18,9 @@ def allowed_file(filename):
 
 def analisar_placa_automatica(imagem_bytes):
     try:
-        # Integração com Gemini AI blueprint
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
+        # Integração com Gemini AI (cliente compartilhado e cache em gemini_analyzer)
+        if not os.environ.get("GEMINI_API_KEY") and os.environ.get("GEMINI_BACKEND", "gemini").lower() != 'stub':
             return {'erro': 'Chave da API do Gemini não configurada'}
-            
-        client = genai.Client(api_key=api_key)
         
         prompt = """Você é um especialista em classificação de placas eletrônicas (PCBs). 
 Analise esta imagem de placa eletrônica e classifique como LEVE, MÉDIA ou PESADA.
@@ -47,21 +44,14 @@ Classificação: [LEVE/MÉDIA/PESADA] — [justificativa em 1 frase]
 
 Não adicione informações extras, apenas a classificação e justificativa."""
         
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=[
-                types.Part.from_bytes(
-                    data=imagem_bytes,
-                    mime_type="image/jpeg",
-                ),
-                prompt
-            ],
-        )
+        resposta = gerar_textos([imagem_bytes], prompt)[0]
         
-        if not response.text:
-            return {'erro': 'Gemini não retornou resposta'}
+        if 'erro' in resposta:
+            if resposta['erro'] == 'Resposta vazia':
+                return {'erro': 'Gemini não retornou resposta'}
+            return {'erro': f"Erro ao processar imagem: {resposta['erro']}"}
         
-        resultado_texto = response.text.strip()
+        resultado_texto = resposta['texto']
         print(f"[GEMINI] Resposta completa: {resultado_texto}")
         
         # Detectar classificação
@@ -233,13 +223,11 @@ def create_placa():
     if 'imagem' in request.files:
         file = request.files['imagem']
         if file and allowed_file(file.filename):
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
             filename = secure_filename(file.filename)
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             filename = f"{timestamp}_{filename}"
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(filepath)
-            imagem_url = f'/uploads/placas/{filename}'
+            filepath, _ = salvar_em_pasta(file.read(), UPLOAD_FOLDER, filename, 'placa', file.mimetype)
+            imagem_url = f'/uploads/placas/{os.path.basename(filepath)}'
     
     data = request.form if request.form else request.get_json()
     
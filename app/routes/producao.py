@@ -1,10 +1,16 @@
 from flask import Blueprint, jsonify, request, render_template, send_file, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import (
-    db, Usuario, Fornecedor, Lote, ClassificacaoGrade,
+    db, Usuario, Fornecedor, Lote, TipoLote, ClassificacaoGrade,
     OrdemProducao, ItemSeparadoProducao, BagProducao
 )
 from app.auth import admin_required
+from app.utils import status_lote
+from app.utils.cache_referencia import resposta_referencia
+from app.services import bag_service
+from sqlalchemy import func, literal_column
+from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from datetime import datetime
 from decimal import Decimal
 from io import BytesIO
@@ -30,14 +36,20 @@ def listar_classificacoes():
         categoria = request.args.get('categoria')
         ativo = request.args.get('ativo', 'true').lower() == 'true'
 
-        query = ClassificacaoGrade.query
-        if categoria:
-            query = query.filter(ClassificacaoGrade.categoria == categoria)
-        if ativo is not None:
-            query = query.filter(ClassificacaoGrade.ativo == ativo)
+        def gerar():
+            query = ClassificacaoGrade.query
+            if categoria:
+                query = query.filter(ClassificacaoGrade.categoria == categoria)
+            if ativo is not None:
+                query = query.filter(ClassificacaoGrade.ativo == ativo)
+
+            classificacoes = query.order_by(ClassificacaoGrade.categoria, ClassificacaoGrade.nome).all()
+            return [c.to_dict() for c in classificacoes]
 
-        classificacoes = query.order_by(ClassificacaoGrade.categoria, ClassificacaoGrade.nome).all()
-        return jsonify([c.to_dict() for c in classificacoes])
+        return resposta_referencia(
+            'producao.classificacoes', ['classificacoes'], gerar,
+            variante=f'{categoria or ""}|{ativo}'
+        )
     except Exception as e:
         logger.error(f'Erro ao listar classificações: {str(e)}')
         return jsonify({'erro': str(e)}), 500
@@ -340,7 +352,7 @@ def criar_ordem():
 
                     if novo_peso <= 0:
                         # Lote foi completamente consumido
-                        lote.status = 'em_producao'
+                        lote.status = status_lote.EM_PRODUCAO
                         lote.peso_liquido = Decimal('0')
                         logger.info(f'Lote {lote.numero_lote} completamente consumido para OP {numero_op}')
                     else:
@@ -350,7 +362,7 @@ def criar_ordem():
             elif peso_total_disponivel > 0:
                 # Consumir todos os lotes completamente (Entrada >= Total Disponível / ou igual)
                 for lote in lotes_para_deduzir:
-                    lote.status = 'em_producao'
+                    lote.status = status_lote.EM_PRODUCAO
                     lote.peso_liquido = Decimal('0')
                     logger.info(f'Lote {lote.numero_lote} marcado como em_producao para OP {numero_op}')
         
@@ -419,6 +431,33 @@ def iniciar_separacao(id):
         return jsonify({'erro': str(e)}), 500
 
 
+def _totais_itens(op_id):
+    """Peso, valor estimado e quantidade de itens separados da OP, somados no banco"""
+    peso, valor, quantidade = db.session.query(
+        func.coalesce(func.sum(ItemSeparadoProducao.peso_kg), 0),
+        func.coalesce(func.sum(ItemSeparadoProducao.valor_estimado), 0),
+        func.count(ItemSeparadoProducao.id)
+    ).filter(ItemSeparadoProducao.ordem_producao_id == op_id).one()
+    return {'peso_kg': float(peso), 'valor_estimado': float(valor), 'quantidade': quantidade}
+
+
+def _bags_com_categorias_mistas(op_id):
+    """Códigos dos bags em que os itens da OP caíram com mais de uma categoria"""
+    categoria = func.coalesce(ClassificacaoGrade.categoria, 'OUTROS')
+    linhas = db.session.query(BagProducao.codigo).select_from(ItemSeparadoProducao).join(
+        BagProducao, BagProducao.id == ItemSeparadoProducao.bag_id
+    ).outerjoin(
+        ClassificacaoGrade, ClassificacaoGrade.id == ItemSeparadoProducao.classificacao_grade_id
+    ).filter(
+        ItemSeparadoProducao.ordem_producao_id == op_id
+    ).group_by(
+        BagProducao.id, BagProducao.codigo
+    ).having(
+        func.count(func.distinct(categoria)) > 1
+    ).order_by(BagProducao.codigo).all()
+    return [linha.codigo for linha in linhas]
+
+
 @bp.route('/ordens/<int:id>/finalizar', methods=['POST'])
 @jwt_required()
 def finalizar_ordem(id):
@@ -458,48 +497,40 @@ def finalizar_ordem(id):
             db.session.add(bag_misto)
             db.session.flush()
 
-            # Mover TODOS os itens para este bag
-            # E remover bags antigos se ficarem vazios (verificar se eram exclusivos desta OP ou abertos globais)
-            # Simplificação: apenas mover itens. Bags antigos abertos ficam lá (vazios ou não).
-            for item in ordem.itens_separados:
-                # Se item já tinha bag e bag ficou vazio, talvez devêssemos gerenciar, 
-                # mas bags "Abertos" são globais, então ok deixá-los.
-                item.bag_id = bag_misto.id
+            # Mover TODOS os itens para este bag num único UPDATE.
+            # Bags "abertos" antigos são globais, então ficam lá (vazios ou não).
+            bags_anteriores = [bag_id for (bag_id,) in db.session.query(ItemSeparadoProducao.bag_id).filter(
+                ItemSeparadoProducao.ordem_producao_id == ordem.id,
+                ItemSeparadoProducao.bag_id.isnot(None)
+            ).distinct().all()]
+
+            ItemSeparadoProducao.query.filter(
+                ItemSeparadoProducao.ordem_producao_id == ordem.id
+            ).update({ItemSeparadoProducao.bag_id: bag_misto.id}, synchronize_session=False)
+
+            # Acumuladores de origem e destino recalculados na mesma transação
+            bag_service.reconciliar(bags_anteriores + [bag_misto.id])
         
         else:
             # Modo Separado (Padrão) - Itens já devem estar em seus bags corretos via adicionar_item
             # Validar apenas se algum BAG INDIVIDUAL ficou misto acidentalmente
-            bags_analise = {}
-            for item in ordem.itens_separados:
-                if item.bag_id:
-                    if item.bag_id not in bags_analise:
-                        bags_analise[item.bag_id] = set()
-                    cat = item.classificacao_grade.categoria if item.classificacao_grade else 'OUTROS'
-                    bags_analise[item.bag_id].add(cat)
-            
-            bags_com_mix = []
-            for bag_id, cats in bags_analise.items():
-                if len(cats) > 1:
-                    bag = BagProducao.query.get(bag_id)
-                    bags_com_mix.append(bag.codigo)
+            bags_com_mix = _bags_com_categorias_mistas(ordem.id)
             
             if bags_com_mix and not categoria_manual:
-                # Se detectou bag real misto e usuário não mandou nome manual (embora modo separado não devesse aceitar nome manual pra bag específico aqui fácil)
-                # Na verdade, se modo separado e deu mix no bag, temos um problema de lógica de inserção ou bag global sujo.
-                # Vamos permitir passar, mas marcar o bag como misto se não tiver nome?
-                # Ou retornar erro pedindo para usuário resolver (e.g. escolhendo modo Misto)
+                # Bag misto no modo separado indica bag global sujo: pedir ao usuário o modo Misto
                 return jsonify({
                     'erro': f'Bags com categorias mistas detectados: {", ".join(bags_com_mix)}. Escolha "Criar Bag Único Misto" ou verifique os itens.',
                     'categorias_mistas': True,
                     'modo_sugerido': 'misto'
                 }), 400
 
-        peso_total_separado = sum(float(item.peso_kg) for item in ordem.itens_separados)
+        totais = _totais_itens(ordem.id)
+        peso_total_separado = totais['peso_kg']
         peso_entrada = float(ordem.peso_entrada) if ordem.peso_entrada else 0
         peso_perdas = peso_entrada - peso_total_separado
         percentual_perda = (peso_perdas / peso_entrada * 100) if peso_entrada > 0 else 0
 
-        valor_estimado_total = sum(float(item.valor_estimado or 0) for item in ordem.itens_separados)
+        valor_estimado_total = totais['valor_estimado']
         custo_total = float(ordem.custo_total) if ordem.custo_total else 0
         lucro_prejuizo = valor_estimado_total - custo_total
 
@@ -512,19 +543,28 @@ def finalizar_ordem(id):
         ordem.finalizado_por_id = current_user_id
         ordem.data_finalizacao = datetime.utcnow()
 
-        # Atualizar bags - Fechar bags da OP ou apenas marcar status
-        bag_ids = set(item.bag_id for item in ordem.itens_separados if item.bag_id)
-        for bag_id in bag_ids:
-            bag = BagProducao.query.get(bag_id)
-            if bag:
-                if bag.status == 'aberto':
-                    bag.status = 'cheio'
-                    bag.data_atualizacao = datetime.utcnow()
-                
-                # Se foi modo misto, já setamos acima. Se modo separado, verificar se precisa marcar misto (caso raro aceito)
-                if modo_criacao == 'separado' and categoria_manual and len(bag_ids) == 1:
-                     bag.categoria_manual = categoria_manual
-                     bag.categorias_mistas = True
+        # Fechar de uma vez os bags abertos que receberam itens da OP
+        bags_da_ordem = db.session.query(ItemSeparadoProducao.bag_id).filter(
+            ItemSeparadoProducao.ordem_producao_id == ordem.id,
+            ItemSeparadoProducao.bag_id.isnot(None)
+        ).distinct()
+
+        BagProducao.query.filter(
+            BagProducao.id.in_(bags_da_ordem),
+            BagProducao.status == 'aberto'
+        ).update({
+            BagProducao.status: 'cheio',
+            BagProducao.data_atualizacao: datetime.utcnow()
+        }, synchronize_session=False)
+
+        # Se foi modo misto, já setamos acima. Se modo separado, marcar misto (caso raro aceito)
+        if modo_criacao == 'separado' and categoria_manual:
+            bag_ids = [bag_id for (bag_id,) in bags_da_ordem.all()]
+            if len(bag_ids) == 1:
+                BagProducao.query.filter(BagProducao.id == bag_ids[0]).update({
+                    BagProducao.categoria_manual: categoria_manual,
+                    BagProducao.categorias_mistas: True
+                }, synchronize_session=False)
 
         db.session.commit()
         return jsonify(ordem.to_dict())
@@ -570,8 +610,15 @@ def cancelar_ordem(id):
 def listar_itens_ordem(op_id):
     """Lista itens separados de uma OP"""
     try:
-        ordem = OrdemProducao.query.get_or_404(op_id)
-        return jsonify([item.to_dict() for item in ordem.itens_separados])
+        OrdemProducao.query.get_or_404(op_id)
+        itens = ItemSeparadoProducao.query.options(
+            joinedload(ItemSeparadoProducao.classificacao_grade),
+            joinedload(ItemSeparadoProducao.bag),
+            joinedload(ItemSeparadoProducao.separado_por)
+        ).filter(
+            ItemSeparadoProducao.ordem_producao_id == op_id
+        ).order_by(ItemSeparadoProducao.id).all()
+        return jsonify([item.to_dict() for item in itens])
     except Exception as e:
         logger.error(f'Erro ao listar itens da ordem {op_id}: {str(e)}')
         return jsonify({'erro': str(e)}), 500
@@ -580,7 +627,12 @@ def listar_itens_ordem(op_id):
 @bp.route('/ordens/<int:op_id>/itens', methods=['POST'])
 @jwt_required()
 def adicionar_item(op_id):
-    """Adiciona um item separado a uma OP"""
+    """Adiciona um item separado a uma OP
+    
+    Aceita um item ({classificacao_grade_id, nome_item, peso_kg, ...}) ou
+    vários de uma vez ({itens: [...]}). As classificações são buscadas numa
+    única consulta e o bag de cada categoria é resolvido uma vez por requisição.
+    """
     try:
         current_user_id = get_jwt_identity()
         ordem = OrdemProducao.query.get_or_404(op_id)
@@ -588,70 +640,94 @@ def adicionar_item(op_id):
         if ordem.status not in ['aberta', 'em_separacao']:
             return jsonify({'erro': 'Não é possível adicionar itens a esta OP'}), 400
 
-        dados = request.get_json()
-        classificacao = ClassificacaoGrade.query.get(dados.get('classificacao_grade_id'))
+        dados = request.get_json() or {}
+        em_lote = isinstance(dados.get('itens'), list)
+        itens_dados = dados['itens'] if em_lote else [dados]
 
-        if not classificacao:
+        if not itens_dados:
+            return jsonify({'erro': 'Nenhum item informado'}), 400
+
+        ids_classificacao = set()
+        for item_dados in itens_dados:
+            try:
+                ids_classificacao.add(int(item_dados.get('classificacao_grade_id')))
+            except (TypeError, ValueError):
+                return jsonify({'erro': 'Classificação não encontrada'}), 404
+
+        classificacoes = {
+            c.id: c for c in ClassificacaoGrade.query.filter(ClassificacaoGrade.id.in_(ids_classificacao)).all()
+        }
+        if len(classificacoes) != len(ids_classificacao):
             return jsonify({'erro': 'Classificação não encontrada'}), 404
 
-        peso_kg = Decimal(str(dados.get('peso_kg', 0)))
+        pesos = [Decimal(str(item_dados.get('peso_kg', 0))) for item_dados in itens_dados]
+        peso_solicitado = float(sum(pesos))
         
         # Validar que o peso total separado não excede o peso de entrada da OP
         peso_entrada = float(ordem.peso_entrada) if ordem.peso_entrada else 0
-        peso_ja_separado = sum(float(item.peso_kg) for item in ordem.itens_separados)
-        peso_total_apos_adicao = peso_ja_separado + float(peso_kg)
+        peso_ja_separado = _totais_itens(op_id)['peso_kg']
+        peso_total_apos_adicao = peso_ja_separado + peso_solicitado
         peso_disponivel = peso_entrada - peso_ja_separado
         
         if peso_total_apos_adicao > peso_entrada:
             return jsonify({
-                'erro': f'Peso excede o limite da OP. Disponível: {peso_disponivel:.2f}kg, Solicitado: {float(peso_kg):.2f}kg',
+                'erro': f'Peso excede o limite da OP. Disponível: {peso_disponivel:.2f}kg, Solicitado: {peso_solicitado:.2f}kg',
                 'peso_entrada': peso_entrada,
                 'peso_ja_separado': peso_ja_separado,
                 'peso_disponivel': peso_disponivel,
-                'peso_solicitado': float(peso_kg)
+                'peso_solicitado': peso_solicitado
             }), 400
         
         custo_total = float(ordem.custo_total) if ordem.custo_total else 0
-        custo_proporcional = (float(peso_kg) / peso_entrada) * custo_total if peso_entrada > 0 else 0
-
-        preco_kg = float(classificacao.preco_estimado_kg) if classificacao.preco_estimado_kg else 0
-        valor_estimado = float(peso_kg) * preco_kg
-
-        item = ItemSeparadoProducao(
-            ordem_producao_id=op_id,
-            classificacao_grade_id=dados.get('classificacao_grade_id'),
-            nome_item=dados.get('nome_item'),
-            peso_kg=peso_kg,
-            quantidade=dados.get('quantidade', 1),
-            custo_proporcional=Decimal(str(custo_proporcional)),
-            valor_estimado=Decimal(str(valor_estimado)),
-            separado_por_id=current_user_id,
-            observacoes=dados.get('observacoes')
-        )
+        bags_por_categoria = {}
+        itens = []
+
+        for item_dados, peso_kg in zip(itens_dados, pesos):
+            classificacao = classificacoes[int(item_dados.get('classificacao_grade_id'))]
+            custo_proporcional = (float(peso_kg) / peso_entrada) * custo_total if peso_entrada > 0 else 0
+
+            preco_kg = float(classificacao.preco_estimado_kg) if classificacao.preco_estimado_kg else 0
+            valor_estimado = float(peso_kg) * preco_kg
+
+            item = ItemSeparadoProducao(
+                ordem_producao_id=op_id,
+                classificacao_grade_id=classificacao.id,
+                nome_item=item_dados.get('nome_item'),
+                peso_kg=peso_kg,
+                quantidade=item_dados.get('quantidade', 1),
+                custo_proporcional=Decimal(str(custo_proporcional)),
+                valor_estimado=Decimal(str(valor_estimado)),
+                separado_por_id=current_user_id,
+                observacoes=item_dados.get('observacoes')
+            )
+
+            bag = encontrar_ou_criar_bag(classificacao, current_user_id, cache=bags_por_categoria)
+            if bag:
+                item.bag_id = bag.id
+                bag_service.registrar_item(bag, item)
 
-        bag = encontrar_ou_criar_bag(classificacao, current_user_id)
-        if bag:
-            item.bag_id = bag.id
-            bag.peso_acumulado = Decimal(str(float(bag.peso_acumulado or 0) + float(peso_kg)))
-            bag.quantidade_itens = (bag.quantidade_itens or 0) + 1
+                if ordem.id not in (bag.lotes_origem or []):
+                    lotes = list(bag.lotes_origem or [])
+                    lotes.append(ordem.id)
+                    bag.lotes_origem = lotes
 
-            if ordem.id not in (bag.lotes_origem or []):
-                lotes = bag.lotes_origem or []
-                lotes.append(ordem.id)
-                bag.lotes_origem = lotes
+                if float(bag.peso_acumulado) >= float(bag.peso_capacidade_max or 50):
+                    bag.status = 'cheio'
 
-            if float(bag.peso_acumulado) >= float(bag.peso_capacidade_max or 50):
-                bag.status = 'cheio'
+            db.session.add(item)
+            itens.append(item)
 
         if ordem.status == 'aberta':
             ordem.status = 'em_separacao'
             ordem.data_inicio_separacao = datetime.utcnow()
 
-        db.session.add(item)
         db.session.commit()
 
-        return jsonify(item.to_dict()), 201
+        if em_lote:
+            return jsonify({'itens': [item.to_dict() for item in itens], 'total': len(itens)}), 201
+        return jsonify(itens[0].to_dict()), 201
     except ValueError as e:
+        db.session.rollback()
         logger.error(f'Erro de valor ao adicionar item na ordem {op_id}: {str(e)}')
         return jsonify({'erro': str(e)}), 400
     except Exception as e:
@@ -676,8 +752,7 @@ def remover_item(id):
 
         if item.bag:
             bag = item.bag
-            bag.peso_acumulado = Decimal(str(max(0, float(bag.peso_acumulado or 0) - float(item.peso_kg))))
-            bag.quantidade_itens = max(0, (bag.quantidade_itens or 1) - 1)
+            bag_service.retirar_item(bag, item)
             if bag.status == 'cheio':
                 bag.status = 'aberto'
 
@@ -695,9 +770,12 @@ def remover_item(id):
 # BAGS
 # ============================
 
-def encontrar_ou_criar_bag(classificacao, usuario_id):
+def encontrar_ou_criar_bag(classificacao, usuario_id, cache=None):
     """Encontra um bag aberto ou cria um novo para a categoria da classificação.
     
+    cache: dict opcional (nome do bag → bag) compartilhado entre os itens de uma
+    mesma requisição, para consultar o bag de cada categoria uma única vez.
+    
     Sistema de 4 bags principais:
     - High: para HIGH_GRADE ou 'high'
     - MG1: para MID_GRADE_1 ou 'mg1'
@@ -735,10 +813,15 @@ def encontrar_ou_criar_bag(classificacao, usuario_id):
     elif cat_lower in ['low_grade', 'low']:
         categorias_equivalentes = ['LOW_GRADE', 'low', 'LOW']
     
+    if cache is not None:
+        bag = cache.get(nome_bag)
+        if bag is not None and bag.status == 'aberto':
+            return bag
+
     bag = BagProducao.query.join(ClassificacaoGrade).filter(
         ClassificacaoGrade.categoria.in_(categorias_equivalentes),
         BagProducao.status == 'aberto'
-    ).first()
+    ).order_by(BagProducao.id).first()
 
     if not bag:
         # Criar novo bag para a categoria
@@ -757,6 +840,8 @@ def encontrar_ou_criar_bag(classificacao, usuario_id):
     else:
         logger.info(f'Usando bag existente: {bag.codigo} para categoria {categoria}')
     
+    if cache is not None:
+        cache[nome_bag] = bag
     return bag
 
 
@@ -792,26 +877,10 @@ def listar_lotes_estoque():
     Inclui lotes principais e sublotes (materiais separados) com status ativo.
     """
     try:
-        # Status válidos para lotes disponíveis para produção
-        # Expandindo para incluir qualquer status que indique disponibilidade ou aprovação
-        status_disponiveis = [
-            'em_estoque', 'disponivel', 'aprovado',
-            'CRIADO_SEPARACAO', 'criado_separacao', 'Em Estoque',
-            'em_conferencia', 'conferido', 'aprovada', 'APROVADA',
-            'APROVADO', 'concluido', 'CONCLUIDO', 'RECEBIDO', 'recebido',
-            'aprovada_adm', 'APROVADA_ADM', 'concluido_conferencia',
-            'liberado', 'LIBERADO', 'disponivel_producao', 'ATIVO', 'ativo'
-        ]
-
-        # Debug: Log de todos os lotes no banco
-        all_lotes = Lote.query.all()
-        logger.info(f"DEBUG: Total de lotes no banco: {len(all_lotes)}")
-        for l in all_lotes:
-            logger.info(f"Lote ID: {l.id}, Numero: {l.numero_lote}, Status: '{l.status}', Bloqueado: {l.bloqueado}")
-
         # Buscar lotes que estão em estoque e disponíveis (inclui sublotes)
+        # disponivel_producao é derivado do status (ver app/utils/status_lote.py) e tem índice parcial
         lotes = Lote.query.filter(
-            Lote.status.in_(status_disponiveis)
+            Lote.disponivel_producao == True
         ).order_by(Lote.id.desc()).limit(200).all()
 
         resultado = []
@@ -924,69 +993,36 @@ def listar_lotes_estoque():
 @jwt_required()
 def listar_estoque_agregado():
     """Lista materiais agregados do estoque para seleção na criação de OP.
-    Agrupa sublotes por nome do material e calcula peso total disponível.
+    Agrupa os lotes disponíveis por material e calcula peso total disponível.
+    A agregação é feita no banco, sobre todo o estoque disponível.
     """
     try:
-        # Status válidos para lotes disponíveis
-        status_disponiveis = [
-            'em_estoque', 'disponivel', 'aprovado',
-            'CRIADO_SEPARACAO', 'criado_separacao', 'Em Estoque',
-            'em_conferencia', 'conferido', 'aprovada', 'APROVADA',
-            'APROVADO', 'concluido', 'CONCLUIDO', 'RECEBIDO', 'recebido',
-            'aprovada_adm', 'APROVADA_ADM', 'concluido_conferencia',
-            'liberado', 'LIBERADO', 'disponivel_producao', 'ATIVO', 'ativo'
-        ]
-
-        # Buscar sublotes disponíveis
-        lotes = Lote.query.filter(
-            Lote.status.in_(status_disponiveis)
-        ).order_by(Lote.id.desc()).limit(500).all()
-
-        # Agrupar por nome do material
-        materiais = {}
-        for l in lotes:
-            # Extrair nome do material das observações ou tipo_lote
-            material_nome = None
-            
-            # Prioridade 1: Observações com MATERIAL: ou MATERIAL_MANUAL:
-            if l.observacoes:
-                if l.observacoes.startswith('MATERIAL:'):
-                    material_nome = l.observacoes.split('|')[0].replace('MATERIAL:', '').strip()
-                elif l.observacoes.startswith('MATERIAL_MANUAL:'):
-                    material_nome = l.observacoes.split('|')[0].replace('MATERIAL_MANUAL:', '').strip()
-            
-            # Prioridade 2: Tipo de lote
-            if not material_nome and l.tipo_lote:
-                material_nome = l.tipo_lote.nome
-            
-            # Se ainda não tem nome, usar genérico
-            if not material_nome:
-                material_nome = 'Material não identificado'
-            
-            peso = float(l.peso_liquido or l.peso_total_kg or 0)
-            
-            if material_nome not in materiais:
-                materiais[material_nome] = {
-                    'material_nome': material_nome,
-                    'peso_total_kg': 0,
-                    'quantidade_lotes': 0,
-                    'lotes_ids': []
-                }
-            
-            materiais[material_nome]['peso_total_kg'] += peso
-            materiais[material_nome]['quantidade_lotes'] += 1
-            materiais[material_nome]['lotes_ids'].append(l.id)
-
-        # Converter para lista e ordenar por peso
-        resultado = sorted(
-            materiais.values(), 
-            key=lambda x: x['peso_total_kg'], 
-            reverse=True
-        )
-        
-        # Arredondar pesos
-        for m in resultado:
-            m['peso_total_kg'] = round(m['peso_total_kg'], 2)
+        # Material do lote: coluna material_nome (separação) ou nome do tipo de lote
+        # (literal sem parâmetro e rótulo diferente de lotes.material_nome para o GROUP BY casar com o SELECT)
+        material = func.coalesce(
+            Lote.material_nome, TipoLote.nome, literal_column("'Material não identificado'")
+        ).label('nome_material')
+        # peso_liquido zerado cai para o peso total, como no cálculo por lote
+        peso = func.coalesce(func.nullif(Lote.peso_liquido, 0), Lote.peso_total_kg, 0)
+        peso_total = func.sum(peso)
+
+        linhas = db.session.query(
+            material,
+            peso_total.label('peso_total_kg'),
+            func.count(Lote.id).label('quantidade_lotes'),
+            func.array_agg(aggregate_order_by(Lote.id, Lote.id.desc())).label('lotes_ids')
+        ).outerjoin(
+            TipoLote, TipoLote.id == Lote.tipo_lote_id
+        ).filter(
+            Lote.disponivel_producao == True
+        ).group_by(material).order_by(peso_total.desc()).all()
+
+        resultado = [{
+            'material_nome': linha.nome_material,
+            'peso_total_kg': round(float(linha.peso_total_kg or 0), 2),
+            'quantidade_lotes': linha.quantidade_lotes,
+            'lotes_ids': list(linha.lotes_ids or [])
+        } for linha in linhas]
 
         logger.info(f'Retornando {len(resultado)} materiais agregados')
         return jsonify(resultado), 200
@@ -1114,7 +1150,12 @@ def listar_bags_producao():
         status = request.args.get('status')
         categoria = request.args.get('categoria')
         
-        query = BagProducao.query
+        query = BagProducao.query.options(
+            joinedload(BagProducao.classificacao_grade),
+            joinedload(BagProducao.criado_por),
+            joinedload(BagProducao.responsavel),
+            joinedload(BagProducao.enviado_por)
+        )
         
         if status:
             query = query.filter(BagProducao.status == status)
@@ -1131,30 +1172,13 @@ def listar_bags_producao():
             
         bags = query.order_by(BagProducao.data_criacao.desc()).all()
         
-        # Processar cada bag para incluir detalhamento de itens
+        # Detalhamento por classificação de todos os bags numa única consulta agrupada
+        composicao = bag_service.composicao_por_classificacao(bag.id for bag in bags)
+        
         resultado = []
         for bag in bags:
             bag_dict = bag.to_dict()
-            
-            # Agregar itens por classificação dentro do bag
-            itens_por_classificacao = {}
-            for item in bag.itens:
-                classif_nome = item.classificacao_grade.nome if item.classificacao_grade else 'Sem classificação'
-                if classif_nome not in itens_por_classificacao:
-                    itens_por_classificacao[classif_nome] = {
-                        'nome': classif_nome,
-                        'peso_total_kg': 0,
-                        'quantidade_itens': 0
-                    }
-                itens_por_classificacao[classif_nome]['peso_total_kg'] += float(item.peso_kg or 0)
-                itens_por_classificacao[classif_nome]['quantidade_itens'] += 1
-            
-            # Converter para lista ordenada por peso
-            bag_dict['itens_por_classificacao'] = sorted(
-                itens_por_classificacao.values(),
-                key=lambda x: x['peso_total_kg'],
-                reverse=True
-            )
+            bag_dict['itens_por_classificacao'] = composicao.get(bag.id, [])
             
             # Determinar categoria exibição
             if bag.classificacao_grade:
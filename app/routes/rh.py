@@ -1,8 +1,11 @@
-from flask import Blueprint, request, jsonify, send_file, Response
+from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, Usuario, Solicitacao, Fornecedor, AuditoriaLog, Perfil, Motorista
 from app.auth import admin_required, hash_senha
 from app.utils.auditoria import registrar_criacao, registrar_atualizacao, registrar_exclusao
+from app.utils import imagens
+from app.services.imagem_upload import normalizar
+from app.services import rastreamento_service
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
 import os
@@ -14,20 +17,25 @@ bp = Blueprint('rh', __name__, url_prefix='/api/rh')
 
 @bp.route('/usuarios/<int:id>/foto', methods=['GET'])
 def obter_foto_usuario(id):
-    """Retorna a foto do usuário armazenada no banco de dados (público para img tags)"""
+    """Retorna a foto do usuário (público para img tags). ?tamanho=64|256 devolve a miniatura"""
+    try:
+        tamanho = imagens.tamanho_miniatura(request.args.get('tamanho'))
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+
     usuario = Usuario.query.get(id)
-    if not usuario or not usuario.foto_data:
+    if not usuario:
         return '', 404
-    
-    return Response(
-        usuario.foto_data,
-        mimetype=usuario.foto_mimetype or 'image/jpeg',
-        headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        }
+
+    resposta = imagens.responder(
+        usuario.foto_hash,
+        usuario.foto_mimetype,
+        usuario.obter_foto_bytes,
+        tamanho=tamanho
     )
+    if resposta is None:
+        return '', 404
+    return resposta
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -42,6 +50,15 @@ def ensure_upload_folder():
     if not os.path.exists(UPLOAD_FOLDER):
         os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+def salvar_foto_usuario(usuario, file):
+    """Normaliza a foto enviada e grava no media_store. Retorna a ImagemNormalizada"""
+    imagem = normalizar(file.read(), 'foto_usuario', file.content_type)
+    extensao = imagem.extensao or file.filename.rsplit('.', 1)[1].lower()
+    usuario.definir_foto(imagem.conteudo, imagem.mimetype if imagem.alterada else (file.content_type or 'image/jpeg'))
+    filename = secure_filename(f"usuario_{usuario.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{extensao}")
+    usuario.foto_path = f"{UPLOAD_PATH_PREFIX}/{filename}"
+    return imagem
+
 @bp.route('/usuarios', methods=['GET'])
 @admin_required
 def listar_usuarios_rh():
@@ -128,11 +145,7 @@ def criar_usuario_rh():
     if 'foto' in request.files:
         file = request.files['foto']
         if file and file.filename and allowed_file(file.filename):
-            foto_bytes = file.read()
-            usuario.foto_data = foto_bytes
-            usuario.foto_mimetype = file.content_type or 'image/jpeg'
-            filename = secure_filename(f"usuario_{usuario.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{file.filename.rsplit('.', 1)[1].lower()}")
-            usuario.foto_path = f"usuarios/{filename}"
+            salvar_foto_usuario(usuario, file)
     
     if perfil.nome == 'Motorista':
         cpf_limpo = (data.get('cpf') or '').replace('.', '').replace('-', '')
@@ -245,15 +258,9 @@ def atualizar_usuario_rh(id):
     if 'foto' in request.files:
         file = request.files['foto']
         if file and file.filename and allowed_file(file.filename):
-            # Salvar imagem no banco de dados (Railway-friendly)
-            foto_bytes = file.read()
-            
             alteracoes['antes']['foto_path'] = usuario.foto_path
             
-            usuario.foto_data = foto_bytes
-            usuario.foto_mimetype = file.content_type or 'image/jpeg'
-            filename = secure_filename(f"usuario_{id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{file.filename.rsplit('.', 1)[1].lower()}")
-            usuario.foto_path = f"usuarios/{filename}"
+            salvar_foto_usuario(usuario, file)
             
             alteracoes['depois']['foto_path'] = usuario.foto_path
     
@@ -280,6 +287,7 @@ def atualizar_usuario_rh(id):
                 motorista_existente.cpf = usuario.cpf.replace('.', '').replace('-', '')
     
     db.session.commit()
+    rastreamento_service.esquecer_motorista(usuario.id)
     
     registrar_atualizacao(admin_id, 'Usuario', usuario.id, alteracoes)
     
@@ -307,6 +315,7 @@ def deletar_usuario_rh(id):
     
     db.session.delete(usuario)
     db.session.commit()
+    rastreamento_service.esquecer_motorista(id)
     
     return jsonify({'mensagem': 'Usuário deletado com sucesso'}), 200
 
@@ -330,14 +339,9 @@ def upload_foto_usuario(id):
     if not allowed_file(file.filename):
         return jsonify({'erro': 'Tipo de arquivo não permitido. Use PNG, JPG, JPEG, GIF ou WEBP'}), 400
     
-    # Salvar imagem no banco de dados (Railway-friendly)
-    foto_bytes = file.read()
     foto_anterior = usuario.foto_path
     
-    usuario.foto_data = foto_bytes
-    usuario.foto_mimetype = file.content_type or 'image/jpeg'
-    filename = secure_filename(f"usuario_{id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{file.filename.rsplit('.', 1)[1].lower()}")
-    usuario.foto_path = f"usuarios/{filename}"
+    imagem = salvar_foto_usuario(usuario, file)
     
     db.session.commit()
     
@@ -348,7 +352,9 @@ def upload_foto_usuario(id):
     
     return jsonify({
         'mensagem': 'Foto atualizada com sucesso',
-        'foto_path': usuario.foto_path
+        'foto_path': usuario.foto_path,
+        'foto_url': usuario.foto_url,
+        'imagem': imagem.resumo()
     }), 200
 
 @bp.route('/usuarios/<int:id>/foto', methods=['DELETE'])
@@ -362,8 +368,7 @@ def remover_foto_usuario(id):
     
     foto_anterior = usuario.foto_path
     usuario.foto_path = None
-    usuario.foto_data = None
-    usuario.foto_mimetype = None
+    usuario.definir_foto(None)
     db.session.commit()
     
     registrar_atualizacao(admin_id, 'Usuario', usuario.id, {
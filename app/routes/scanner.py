@@ -1,5 +1,6 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import defer
 from app.models import db, Usuario, ScannerConfig, ScannerAnalysis
 from app.services.pcb_analyzer import (
     analyze_pcb_image as opencv_analyze_pcb,
@@ -8,9 +9,14 @@ from app.services.pcb_analyzer import (
 )
 from app.services.perplexity_formatter import (
     build_explanation_with_perplexity,
+    explicacao_em_cache,
     is_perplexity_configured
 )
+from app import socketio
 from app.auth import admin_required
+from app.utils import imagens
+from app.services.imagem_upload import normalizar
+from app.services import scanner_dedup
 from datetime import datetime
 import base64
 import os
@@ -34,6 +40,65 @@ def get_scanner_config():
         db.session.commit()
     return config
 
+def _salvar_analise(usuario_id, dados, raw_response, image_bytes, image_mimetype, phash):
+    """Grava a análise (imagem normalizada + hash perceptual). Retorna o id ou None"""
+    try:
+        analysis = ScannerAnalysis(
+            usuario_id=int(usuario_id),
+            grade=dados['grade'],
+            type_guess=dados['type_guess'],
+            explanation=dados['explanation'],
+            confidence=dados['confidence'],
+            components_count=dados['components_count'],
+            density_score=dados['density_score'],
+            raw_response=raw_response
+        )
+        # A análise usa a imagem original; o que fica guardado é a versão normalizada
+        imagem = normalizar(image_bytes, 'scanner', image_mimetype)
+        analysis.set_image(imagem.conteudo, imagem.mimetype if imagem.alterada else image_mimetype)
+        db.session.add(analysis)
+        db.session.flush()
+        scanner_dedup.indexar(analysis, phash)
+        db.session.commit()
+        return analysis.id
+    except Exception as e:
+        print(f'Erro ao salvar analise: {e}')
+        db.session.rollback()
+        return None
+
+def _agendar_explicacao(analysis_id, usuario_id, grade, components_count, density_score, explicacao_local):
+    """
+    Gera a explicação do Perplexity fora da requisição
+
+    Quando chega, substitui a explicação local da análise (visível no GET da
+    análise) e é enviada ao comprador pelo evento Socket.IO 'scanner_explicacao'.
+    """
+    app = current_app._get_current_object()
+
+    def tarefa():
+        texto = build_explanation_with_perplexity(grade, components_count, density_score)
+        if not texto:
+            return
+        with app.app_context():
+            try:
+                atualizadas = ScannerAnalysis.query.filter_by(
+                    id=analysis_id,
+                    explanation=explicacao_local
+                ).update({'explanation': texto}, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f'Erro ao gravar explicacao da analise {analysis_id}: {e}')
+                return
+        if atualizadas:
+            socketio.emit('scanner_explicacao', {
+                'id': analysis_id,
+                'explanation': texto,
+                'perplexity_used': True
+            }, room=f'user_{usuario_id}')
+
+    socketio.start_background_task(tarefa)
+
 @bp.route('/api/scanner/analyze', methods=['POST'])
 @jwt_required()
 def analyze_pcb():
@@ -72,6 +137,37 @@ def analyze_pcb():
         if not image_data:
             return jsonify({'erro': 'Imagem nao fornecida. Por favor, envie uma imagem da placa para analise.'}), 400
         
+        # Mesma placa / mesma foto já analisada: reaproveita nota e explicação
+        phash = scanner_dedup.calcular_dhash(image_bytes)
+        forcar = request.args.get('forcar', 'false').lower() == 'true'
+        semelhante = None if forcar else scanner_dedup.buscar_semelhante(phash)
+        if semelhante:
+            anterior, distancia = semelhante
+            dados = {
+                'grade': anterior.grade,
+                'type_guess': anterior.type_guess,
+                'explanation': anterior.explanation,
+                'confidence': anterior.confidence or 0,
+                'components_count': anterior.components_count,
+                'density_score': anterior.density_score
+            }
+            analysis_id = _salvar_analise(
+                usuario_id, dados,
+                f"{{'dedup_de': {anterior.id}, 'distancia_hash': {distancia}}}",
+                image_bytes, image_mimetype, phash
+            )
+            return jsonify({
+                'id': analysis_id,
+                **dados,
+                'confidence': round(dados['confidence'], 2),
+                'board_detected': True,
+                'timestamp': datetime.now().isoformat(),
+                'analysis_method': 'phash_cache',
+                'perplexity_used': False,
+                'duplicata_de': anterior.id,
+                'distancia_hash': distancia
+            }), 200
+        
         analysis_result = opencv_analyze_pcb(image_data)
         
         if 'error' in analysis_result:
@@ -99,33 +195,28 @@ def analyze_pcb():
         
         type_guess = get_type_guess_from_analysis(analysis_result)
         
-        explanation = build_explanation_with_perplexity(grade, components_count, density_score)
+        # O texto do Perplexity só entra na resposta se já estiver em cache; senão a
+        # explicação local vai agora e a do Perplexity é gerada em segundo plano
+        explanation = explicacao_em_cache(grade, components_count, density_score)
+        perplexity_used = explanation is not None
         
         if not explanation:
             explanation = generate_local_explanation(grade, components_count, density_score, board_detected)
         
         confidence = min(0.95, 0.5 + (min(density_score * 10000, 0.3)) + (min(components_count, 50) / 100))
         
-        analysis_id = None
-        try:
-            analysis = ScannerAnalysis(
-                usuario_id=int(usuario_id),
-                grade=grade,
-                type_guess=type_guess,
-                explanation=explanation,
-                confidence=confidence,
-                components_count=components_count,
-                density_score=density_score,
-                image_data=image_bytes,
-                image_mimetype=image_mimetype,
-                raw_response=str(analysis_result)
-            )
-            db.session.add(analysis)
-            db.session.commit()
-            analysis_id = analysis.id
-        except Exception as e:
-            print(f'Erro ao salvar analise: {e}')
-            db.session.rollback()
+        analysis_id = _salvar_analise(usuario_id, {
+            'grade': grade,
+            'type_guess': type_guess,
+            'explanation': explanation,
+            'confidence': confidence,
+            'components_count': components_count,
+            'density_score': density_score
+        }, str(analysis_result), image_bytes, image_mimetype, phash)
+        
+        explanation_pending = analysis_id is not None and not perplexity_used and is_perplexity_configured()
+        if explanation_pending:
+            _agendar_explicacao(analysis_id, usuario_id, grade, components_count, density_score, explanation)
         
         response = {
             'id': analysis_id,
@@ -138,7 +229,8 @@ def analyze_pcb():
             'confidence': round(confidence, 2),
             'timestamp': datetime.now().isoformat(),
             'analysis_method': 'opencv',
-            'perplexity_used': is_perplexity_configured()
+            'perplexity_used': perplexity_used,
+            'explanation_pending': explanation_pending
         }
         
         return jsonify(response), 200
@@ -231,15 +323,17 @@ def scanner_history():
     try:
         usuario_id = get_jwt_identity()
         limit = request.args.get('limit', 20, type=int)
-        include_images = request.args.get('include_images', 'false').lower() == 'true'
         
-        analyses = ScannerAnalysis.query.filter_by(
+        # include_images é aceito por compatibilidade: a resposta traz image_url/thumbnail_url
+        analyses = ScannerAnalysis.query.options(
+            defer(ScannerAnalysis.raw_response)
+        ).filter_by(
             usuario_id=int(usuario_id)
         ).order_by(
             ScannerAnalysis.created_at.desc()
         ).limit(limit).all()
         
-        return jsonify([a.to_dict(include_image=include_images) for a in analyses]), 200
+        return jsonify([a.to_dict() for a in analyses]), 200
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -249,9 +343,10 @@ def scanner_history():
 def get_analysis(analysis_id):
     try:
         usuario_id = get_jwt_identity()
-        include_image = request.args.get('include_image', 'true').lower() == 'true'
         
-        analysis = ScannerAnalysis.query.filter_by(
+        analysis = ScannerAnalysis.query.options(
+            defer(ScannerAnalysis.raw_response)
+        ).filter_by(
             id=analysis_id,
             usuario_id=int(usuario_id)
         ).first()
@@ -259,31 +354,49 @@ def get_analysis(analysis_id):
         if not analysis:
             return jsonify({'erro': 'Analise nao encontrada'}), 404
         
-        return jsonify(analysis.to_dict(include_image=include_image)), 200
+        return jsonify(analysis.to_dict()), 200
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
 @bp.route('/api/scanner/analysis/<int:analysis_id>/image', methods=['GET'])
-@jwt_required()
+@jwt_required(optional=True)
 def get_analysis_image(analysis_id):
+    """Imagem da análise: com token JWT do dono ou com a URL assinada de image_url/thumbnail_url"""
     try:
         usuario_id = get_jwt_identity()
+        tamanho = imagens.tamanho_miniatura(request.args.get('tamanho'))
         
-        analysis = ScannerAnalysis.query.filter_by(
-            id=analysis_id,
-            usuario_id=int(usuario_id)
-        ).first()
+        analysis = ScannerAnalysis.query.options(
+            defer(ScannerAnalysis.raw_response)
+        ).filter_by(id=analysis_id).first()
         
-        if not analysis or not analysis.image_data:
-            return jsonify({'erro': 'Imagem nao encontrada'}), 404
-        
-        from flask import Response
-        return Response(
-            analysis.image_data,
-            mimetype=analysis.image_mimetype or 'image/jpeg'
+        assinada = analysis is not None and imagens.assinatura_valida(
+            ScannerAnalysis.recurso_assinado(analysis.id, analysis.usuario_id),
+            request.args.get('exp'),
+            request.args.get('assinatura')
         )
+        if not assinada:
+            if not usuario_id:
+                return jsonify({'erro': 'Token ausente ou URL sem assinatura valida (ou expirada)'}), 401
+            if analysis is not None and analysis.usuario_id != int(usuario_id):
+                analysis = None
+        
+        resposta = None
+        if analysis and analysis.has_image:
+            resposta = imagens.responder(
+                analysis.image_hash,
+                analysis.image_mimetype,
+                analysis.get_image_bytes,
+                tamanho=tamanho,
+                privado=True
+            )
+        if resposta is None:
+            return jsonify({'erro': 'Imagem nao encontrada'}), 404
+        return resposta
         
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
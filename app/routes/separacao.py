@@ -1,31 +1,135 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, Lote, LoteSeparacao, Residuo, Usuario, Notificacao, MovimentacaoEstoque
+from app.models import (
+    db, precarregar_eventos, Lote, LoteSeparacao, Residuo, Usuario, Notificacao, MovimentacaoEstoque,
+    ItemSolicitacao, MaterialBase, TipoLote
+)
 from app.auth import admin_required
+from app.utils.auditoria import registrar_evento
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
 from decimal import Decimal
 
 bp = Blueprint('separacao', __name__, url_prefix='/api/separacao')
 
 def registrar_auditoria_separacao(separacao, acao, usuario_id, detalhes=None, gps=None, device_id=None):
-    entrada_auditoria = {
-        'acao': acao,
-        'usuario_id': usuario_id,
-        'timestamp': datetime.utcnow().isoformat(),
-        'detalhes': detalhes or {},
-        'ip': request.remote_addr,
-        'user_agent': request.headers.get('User-Agent'),
-        'gps': gps,
-        'device_id': device_id
+    registrar_evento(separacao, acao, usuario_id, dados={'detalhes': detalhes or {}}, gps=gps, device_id=device_id)
+
+def _query_fila(compacto=False):
+    """
+    Read model da fila: separação, operador e lote (com fornecedor, tipo e conferente)
+    vêm num único SELECT com joins; os itens do lote, quando pedidos, numa
+    consulta extra para todas as entradas (selectinload), já com material e tipo.
+    """
+    opcoes_lote = [
+        joinedload(Lote.fornecedor),
+        joinedload(Lote.tipo_lote),
+        joinedload(Lote.conferente)
+    ]
+    if not compacto:
+        opcoes_lote.append(
+            selectinload(Lote.itens).options(
+                joinedload(ItemSolicitacao.material),
+                joinedload(ItemSolicitacao.tipo_lote)
+            )
+        )
+
+    return LoteSeparacao.query.options(
+        joinedload(LoteSeparacao.operador),
+        joinedload(LoteSeparacao.lote).options(*opcoes_lote)
+    )
+
+
+def _item_fila_dict(item):
+    return {
+        'id': item.id,
+        'peso_kg': item.peso_kg,
+        'material_id': item.material_id,
+        'material_nome': item.material.nome if item.material else None,
+        'material_codigo': item.material.codigo if item.material else None,
+        'tipo_lote_id': item.tipo_lote_id,
+        'tipo_lote_nome': item.tipo_lote.nome if item.tipo_lote else None,
+        'estrelas_final': item.estrelas_final,
+        'classificacao': item.classificacao if item.classificacao else (item.material.classificacao if item.material else None)
+    }
+
+
+def _resumo_materiais(lote_ids):
+    """Peso por material de cada lote numa consulta agrupada: {lote_id: [{'nome', 'peso_kg'}]}"""
+    if not lote_ids:
+        return {}
+
+    nome = func.coalesce(MaterialBase.nome, TipoLote.nome, 'Material não identificado')
+    linhas = db.session.query(
+        ItemSolicitacao.lote_id,
+        nome.label('nome'),
+        func.sum(ItemSolicitacao.peso_kg).label('peso_kg'),
+        func.count(ItemSolicitacao.id).label('itens')
+    ).outerjoin(
+        MaterialBase, MaterialBase.id == ItemSolicitacao.material_id
+    ).outerjoin(
+        TipoLote, TipoLote.id == ItemSolicitacao.tipo_lote_id
+    ).filter(
+        ItemSolicitacao.lote_id.in_(lote_ids)
+    ).group_by(
+        ItemSolicitacao.lote_id, MaterialBase.nome, TipoLote.nome
+    ).order_by(
+        ItemSolicitacao.lote_id, func.sum(ItemSolicitacao.peso_kg).desc()
+    ).all()
+
+    resumo = {}
+    for linha in linhas:
+        resumo.setdefault(linha.lote_id, []).append({
+            'nome': linha.nome,
+            'peso_kg': float(linha.peso_kg or 0),
+            'itens': linha.itens
+        })
+    return resumo
+
+
+def _lote_fila_dict(lote, compacto=False, materiais=None):
+    lote_dict = {
+        'id': lote.id,
+        'numero_lote': lote.numero_lote,
+        'peso_total_kg': lote.peso_total_kg,
+        'peso_bruto_recebido': lote.peso_bruto_recebido,
+        'peso_liquido': lote.peso_liquido,
+        'qualidade_recebida': lote.qualidade_recebida,
+        'fornecedor_nome': lote.fornecedor.nome if lote.fornecedor else None,
+        'tipo_lote_nome': lote.tipo_lote.nome if lote.tipo_lote else None,
+        'conferente_nome': lote.conferente.nome if lote.conferente else None,
+        'data_criacao': lote.data_criacao.isoformat() if lote.data_criacao else None
     }
 
-    if separacao.auditoria is None:
-        separacao.auditoria = []
-    separacao.auditoria.append(entrada_auditoria)
+    if compacto:
+        # itens_info e anexos ficam para GET /api/separacao/<id>/detalhes (ao expandir a entrada)
+        lote_dict['materiais_resumo'] = materiais or []
+        lote_dict['total_itens'] = sum(m['itens'] for m in materiais or [])
+    else:
+        lote_dict['anexos'] = lote.anexos
+        lote_dict['itens_info'] = [_item_fila_dict(item) for item in lote.itens]
+
+    return lote_dict
+
+
+def _pode_acessar_fila(usuario):
+    perfil_nome = usuario.perfil.nome if usuario.perfil else None
+    return perfil_nome in ['Separação', 'Administrador', 'Producao', 'Produção'] or usuario.tipo == 'admin'
+
 
 @bp.route('/fila', methods=['GET'])
 @jwt_required()
 def obter_fila_separacao():
+    """
+    Fila de separação por status
+
+    Query params:
+        status: Status das separações (padrão AGUARDANDO_SEPARACAO)
+        compacto: true → sem itens_info/anexos/auditoria; traz materiais_resumo e total_itens
+        page / per_page: Paginação; quando informados a resposta vira
+            {'separacoes', 'total', 'pages', 'current_page'}
+    """
     try:
         usuario_id = get_jwt_identity()
         usuario = Usuario.query.get(usuario_id)
@@ -33,59 +137,87 @@ def obter_fila_separacao():
         if not usuario:
             return jsonify({'erro': 'Usuário não encontrado'}), 404
 
-        perfil_nome = usuario.perfil.nome if usuario.perfil else None
-        if perfil_nome not in ['Separação', 'Administrador', 'Producao', 'Produção'] and usuario.tipo != 'admin':
+        if not _pode_acessar_fila(usuario):
             return jsonify({'erro': 'Acesso negado. Apenas operadores de separação podem acessar a fila'}), 403
 
         status_filtro = request.args.get('status', 'AGUARDANDO_SEPARACAO')
+        compacto = request.args.get('compacto', 'false').lower() == 'true'
+        paginado = 'page' in request.args or 'per_page' in request.args
+
+        query = _query_fila(compacto).filter(
+            LoteSeparacao.status == status_filtro
+        ).order_by(LoteSeparacao.id)
+
+        if paginado:
+            page = request.args.get('page', 1, type=int)
+            per_page = min(request.args.get('per_page', 20, type=int), 100)
+            paginacao = query.paginate(page=page, per_page=per_page, error_out=False)
+            separacoes = paginacao.items
+        else:
+            separacoes = query.all()
 
-        query = LoteSeparacao.query.filter_by(status=status_filtro)
-
-        separacoes = query.order_by(LoteSeparacao.id).all()
+        materiais = {}
+        if compacto:
+            materiais = _resumo_materiais([s.lote_id for s in separacoes])
+        else:
+            precarregar_eventos(separacoes)
 
         resultado = []
         for separacao in separacoes:
+            if compacto:
+                # Evita a consulta de eventos por entrada; a auditoria sai do payload compacto
+                separacao._eventos_precarregados = []
             separacao_dict = separacao.to_dict()
+            if compacto:
+                separacao_dict.pop('auditoria', None)
 
             if separacao.lote:
-                # Incluir informações dos materiais/itens do lote
-                itens_info = []
-                for item in separacao.lote.itens:
-                    item_info = {
-                        'id': item.id,
-                        'peso_kg': item.peso_kg,
-                        'material_id': item.material_id,
-                        'material_nome': item.material.nome if item.material else None,
-                        'material_codigo': item.material.codigo if item.material else None,
-                        'tipo_lote_id': item.tipo_lote_id,
-                        'tipo_lote_nome': item.tipo_lote.nome if item.tipo_lote else None,
-                        'estrelas_final': item.estrelas_final,
-                        'classificacao': item.classificacao if item.classificacao else (item.material.classificacao if item.material else None)
-                    }
-                    itens_info.append(item_info)
-                
-                separacao_dict['lote_detalhes'] = {
-                    'id': separacao.lote.id,
-                    'numero_lote': separacao.lote.numero_lote,
-                    'peso_total_kg': separacao.lote.peso_total_kg,
-                    'peso_bruto_recebido': separacao.lote.peso_bruto_recebido,
-                    'peso_liquido': separacao.lote.peso_liquido,
-                    'qualidade_recebida': separacao.lote.qualidade_recebida,
-                    'fornecedor_nome': separacao.lote.fornecedor.nome if separacao.lote.fornecedor else None,
-                    'tipo_lote_nome': separacao.lote.tipo_lote.nome if separacao.lote.tipo_lote else None,
-                    'conferente_nome': separacao.lote.conferente.nome if separacao.lote.conferente else None,
-                    'data_criacao': separacao.lote.data_criacao.isoformat() if separacao.lote.data_criacao else None,
-                    'anexos': separacao.lote.anexos,
-                    'itens_info': itens_info
-                }
+                separacao_dict['lote_detalhes'] = _lote_fila_dict(
+                    separacao.lote, compacto, materiais.get(separacao.lote_id)
+                )
 
             resultado.append(separacao_dict)
 
+        if paginado:
+            return jsonify({
+                'separacoes': resultado,
+                'total': paginacao.total,
+                'pages': paginacao.pages,
+                'current_page': paginacao.page
+            }), 200
+
         return jsonify(resultado), 200
 
     except Exception as e:
         return jsonify({'erro': f'Erro ao obter fila de separação: {str(e)}'}), 500
 
+@bp.route('/<int:id>/detalhes', methods=['GET'])
+@jwt_required()
+def obter_detalhes_fila(id):
+    """Entrada completa da fila (itens_info, anexos e auditoria), usada ao expandir no modo compacto"""
+    try:
+        usuario = Usuario.query.get(get_jwt_identity())
+
+        if not usuario:
+            return jsonify({'erro': 'Usuário não encontrado'}), 404
+
+        if not _pode_acessar_fila(usuario):
+            return jsonify({'erro': 'Acesso negado. Apenas operadores de separação podem acessar a fila'}), 403
+
+        separacao = _query_fila().filter(LoteSeparacao.id == id).first()
+        if not separacao:
+            return jsonify({'erro': 'Separação não encontrada'}), 404
+
+        precarregar_eventos([separacao])
+        separacao_dict = separacao.to_dict()
+        if separacao.lote:
+            separacao_dict['lote_detalhes'] = _lote_fila_dict(separacao.lote)
+
+        return jsonify(separacao_dict), 200
+
+    except Exception as e:
+        return jsonify({'erro': f'Erro ao obter detalhes da separação: {str(e)}'}), 500
+
 @bp.route('/<int:id>/iniciar', methods=['POST'])
 @jwt_required()
 def iniciar_separacao(id):
@@ -193,21 +325,19 @@ def criar_sublote(id):
         # LOG DE DEBUG - MUITO IMPORTANTE
         print(f"DEBUG VALOR SUBLOTE: peso_sublote={peso_sublote}, peso_pai={peso_lote_pai}, valor_pai={valor_total_pai}, RESULTADO={valor_sublote}")
 
-        ano = datetime.now().year
-        numero_sequencial = Lote.query.filter(
-            Lote.numero_lote.like(f"{ano}-%")  # type: ignore
-        ).count() + 1
-        numero_lote = f"{ano}-{str(numero_sequencial).zfill(5)}"
+        numero_lote = Lote.gerar_numero_lote()
 
         tipo_lote_id = data.get('tipo_lote_id')
         tipo_lote_nome = data.get('tipo_lote_nome')
         material_nome = data.get('material_nome') or tipo_lote_nome
+        material_id = None
 
         # NOVO FLUXO: Se material_id foi fornecido, usar para buscar um TipoLote correspondente
         if data.get('material_id'):
             from app.models import TipoLote, MaterialBase
             material = MaterialBase.query.get(data['material_id'])
             if material:
+                material_id = material.id
                 material_nome = material.nome
                 # Tenta encontrar um TipoLote com o mesmo nome do material
                 tipo_lote = TipoLote.query.filter_by(nome=material.nome).first()
@@ -272,25 +402,25 @@ def criar_sublote(id):
             lote_pai_id=lote_pai.id,  # Vincula ao lote pai
             quantidade_itens=data.get('quantidade', 1),
             observacoes=f"MATERIAL:{material_nome} | {data.get('observacoes', '')}" if material_nome else data.get('observacoes', ''),
+            material_id=material_id,
+            material_nome=material_nome[:200] if material_nome else None,
             anexos=data.get('fotos', []),
-            auditoria=[{
-                'acao': 'SUBLOTE_CRIADO_NA_SEPARACAO',
-                'usuario_id': usuario_id,
-                'timestamp': datetime.utcnow().isoformat(),
-                'ip': request.remote_addr,
-                'user_agent': request.headers.get('User-Agent'),
-                'gps': data.get('gps'),
-                'device_id': data.get('device_id') or separacao.device_id,
-                'separacao_id': separacao.id,
-                'lote_pai_id': lote_pai.id,
-                'lote_pai_numero': lote_pai.numero_lote,
-                'valor_proporcional': float(valor_sublote)
-            }],
             data_criacao=datetime.utcnow()
         )
 
         db.session.add(sublote)
         db.session.flush()  # Garantir que o sublote seja criado antes de continuar
+        registrar_evento(
+            sublote, 'SUBLOTE_CRIADO_NA_SEPARACAO', usuario_id,
+            dados={
+                'separacao_id': separacao.id,
+                'lote_pai_id': lote_pai.id,
+                'lote_pai_numero': lote_pai.numero_lote,
+                'valor_proporcional': float(valor_sublote)
+            },
+            gps=data.get('gps'),
+            device_id=data.get('device_id') or separacao.device_id
+        )
         
         print(f'\n✅ Sublote criado: {sublote.numero_lote} (ID: {sublote.id})')
         print(f'   Lote pai: {lote_pai.numero_lote} (ID: {lote_pai.id})')
@@ -363,19 +493,15 @@ def criar_residuo(id):
             justificativa=data['justificativa'],
             fotos=data.get('fotos', []),
             status='AGUARDANDO_APROVACAO',
-            auditoria=[{
-                'acao': 'RESIDUO_CRIADO',
-                'usuario_id': usuario_id,
-                'timestamp': datetime.utcnow().isoformat(),
-                'ip': request.remote_addr,
-                'user_agent': request.headers.get('User-Agent'),
-                'gps': data.get('gps'),
-                'device_id': data.get('device_id') or separacao.device_id
-            }],
             criado_em=datetime.utcnow()
         )
 
         db.session.add(residuo)
+        registrar_evento(
+            residuo, 'RESIDUO_CRIADO', usuario_id,
+            gps=data.get('gps'),
+            device_id=data.get('device_id') or separacao.device_id
+        )
 
         separacao.peso_total_residuos = (separacao.peso_total_residuos or 0) + data['peso']
 
@@ -521,15 +647,7 @@ def aprovar_residuo(id):
         residuo.data_aprovacao = datetime.utcnow()
         residuo.motivo_decisao = data.get('motivo', '')
 
-        if residuo.auditoria is None:
-            residuo.auditoria = []
-        residuo.auditoria.append({
-            'acao': f'RESIDUO_{decisao}',
-            'usuario_id': usuario_id,
-            'timestamp': datetime.utcnow().isoformat(),
-            'ip': request.remote_addr,
-            'motivo': data.get('motivo', '')
-        })
+        registrar_evento(residuo, f'RESIDUO_{decisao}', usuario_id, dados={'motivo': data.get('motivo', '')})
 
         if residuo.separacao and residuo.separacao.operador_id:
             notificacao = Notificacao(
@@ -568,6 +686,7 @@ def listar_residuos():
             query = Residuo.query.filter_by(status=status)
             
         residuos = query.order_by(Residuo.criado_em.desc()).all()
+        precarregar_eventos(residuos)
         
         print(f'   Total de resíduos encontrados: {len(residuos)}')
 
@@ -5,9 +5,9 @@ from app.models import (
     FornecedorTipoLoteClassificacao, TipoLotePreco, Usuario, Configuracao, Lote, EntradaEstoque
 )
 from app.auth import admin_required
+from app.services.imagem_upload import salvar_em_pasta
 from datetime import datetime
 import os
-import base64
 from werkzeug.utils import secure_filename
 import uuid
 
@@ -40,27 +40,38 @@ def geocode_reverso():
 @bp.route('/analisar-imagem', methods=['POST'])
 @jwt_required()
 def analisar_imagem():
-    """Endpoint para análise de imagem com Gemini AI"""
+    """
+    Endpoint para análise de imagem com Gemini AI
+
+    Aceita um arquivo em 'imagem' ou vários em 'imagens' (analisados em paralelo;
+    resposta {'resultados': [...]} na ordem de envio)
+    """
     try:
         from app.services.gemini_analyzer import analyze_images
         
-        if 'imagem' not in request.files:
-            return jsonify({'erro': 'Nenhuma imagem foi enviada'}), 400
-        
-        file = request.files['imagem']
+        arquivos = request.files.getlist('imagens')
+        lote = bool(arquivos)
+        if not lote:
+            if 'imagem' not in request.files:
+                return jsonify({'erro': 'Nenhuma imagem foi enviada'}), 400
+            arquivos = [request.files['imagem']]
         
-        if file.filename == '':
+        if any(file.filename == '' for file in arquivos):
             return jsonify({'erro': 'Arquivo sem nome'}), 400
         
-        # Ler bytes da imagem
-        imagem_bytes = file.read()
+        # Ler bytes das imagens
+        imagens_bytes = [file.read() for file in arquivos]
+        mime_types = [file.mimetype or 'image/jpeg' for file in arquivos]
         
         # Analisar usando Gemini (para solicitações de lote)
-        resultados = analyze_images([imagem_bytes], use_case='solicitacao')
+        resultados = analyze_images(imagens_bytes, use_case='solicitacao', mime_types=mime_types)
         
         if not resultados or len(resultados) == 0:
             return jsonify({'erro': 'Erro ao analisar imagem'}), 500
         
+        if lote:
+            return jsonify({'resultados': resultados, 'total': len(resultados)}), 200
+        
         resultado = resultados[0]
         
         return jsonify(resultado), 200
@@ -84,16 +95,18 @@ def upload_imagem():
         # Gerar nome único
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4()}_{filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
         
-        # Salvar arquivo
-        file.save(filepath)
+        # Normalizar (orientação, tamanho, sem EXIF) e salvar
+        filepath, imagem = salvar_em_pasta(
+            file.read(), UPLOAD_FOLDER, unique_filename, 'item_solicitacao', file.mimetype
+        )
         
         # Retornar caminho relativo
         return jsonify({
             'sucesso': True,
             'caminho': filepath,
-            'url': f'/uploads/{unique_filename}'
+            'url': f'/uploads/{os.path.basename(filepath)}',
+            'imagem': imagem.resumo()
         }), 200
     
     except Exception as e:
@@ -102,15 +115,12 @@ def upload_imagem():
 def analisar_imagem_com_ia(imagem_path):
     """Analisa imagem usando Gemini AI para classificar lote e fornecer justificativa"""
     try:
-        import google.genai as genai
+        from app.services.gemini_analyzer import gerar_textos
         
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
+        if not os.getenv('GEMINI_API_KEY') and os.getenv('GEMINI_BACKEND', 'gemini').lower() != 'stub':
             print("AVISO: GEMINI_API_KEY não configurada")
             return None
         
-        client = genai.Client(api_key=api_key)
-        
         with open(imagem_path, 'rb') as f:
             image_data = f.read()
         
@@ -129,12 +139,12 @@ Exemplo:
 Classificação: LEVE
 Justificativa: A placa apresenta poucos componentes SMD e muita área de cobre exposta, indicando baixa densidade de componentes e circuito simples."""
 
-        response = client.models.generate_content(
-            model='gemini-2.0-flash-exp',
-            contents=[prompt, {'mime_type': 'image/jpeg', 'data': base64.b64encode(image_data).decode()}]
-        )
+        # Bytes enviados direto (Part.from_bytes), cliente compartilhado e cache por hash
+        resposta = gerar_textos([image_data], prompt)[0]
+        if 'erro' in resposta:
+            raise RuntimeError(resposta['erro'])
         
-        resposta_texto = response.text.strip()
+        resposta_texto = resposta['texto']
         
         classificacao = None
         justificativa = ""
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required
 from app.models import db, TabelaPreco, TabelaPrecoItem, MaterialBase
 from app.auth import admin_required
+from app.utils.busca import condicao_busca
+from app.utils.cache_referencia import resposta_referencia
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
 from io import BytesIO
@@ -13,8 +15,11 @@ bp = Blueprint('tabelas_preco', __name__, url_prefix='/api/tabelas-preco')
 @jwt_required()
 def listar_tabelas():
     try:
-        tabelas = TabelaPreco.query.order_by(TabelaPreco.nivel_estrelas).all()
-        return jsonify([tabela.to_dict() for tabela in tabelas]), 200
+        def gerar():
+            tabelas = TabelaPreco.query.order_by(TabelaPreco.nivel_estrelas).all()
+            return [tabela.to_dict() for tabela in tabelas]
+
+        return resposta_referencia('tabelas_preco.listar', ['tabelas_preco'], gerar)
     
     except Exception as e:
         return jsonify({'erro': f'Erro ao listar tabelas: {str(e)}'}), 500
@@ -53,10 +58,7 @@ def listar_precos(id):
         
         if busca:
             query = query.join(MaterialBase).filter(
-                db.or_(
-                    MaterialBase.nome.ilike(f'%{busca}%'),
-                    MaterialBase.codigo.ilike(f'%{busca}%')
-                )
+                condicao_busca([MaterialBase.nome, MaterialBase.codigo], busca.strip())
             )
         
         if classificacao and classificacao in ['leve', 'medio', 'pesado']:
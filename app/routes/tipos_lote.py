@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required
 from app.models import TipoLote, TipoLotePreco, db, FornecedorTipoLoteClassificacao, Fornecedor
 from app.auth import admin_required
 from app.utils.excel_template import criar_modelo_importacao_tipos_lote
+from app.utils.sequencias import proximo_codigo
 import pandas as pd
 import io
 import openpyxl
@@ -12,16 +13,7 @@ from datetime import datetime
 bp = Blueprint('tipos_lote', __name__, url_prefix='/api/tipos-lote')
 
 def gerar_codigo_automatico():
-    ultimo_tipo = TipoLote.query.order_by(TipoLote.id.desc()).first()
-    if ultimo_tipo and ultimo_tipo.codigo:
-        try:
-            numero = int(ultimo_tipo.codigo.replace('TL', ''))
-            return f'TL{numero + 1:03d}'
-        except:
-            pass
-    
-    proximo_id = TipoLote.query.count() + 1
-    return f'TL{proximo_id:03d}'
+    return proximo_codigo('TL', largura=3, separador='', coluna=TipoLote.codigo)
 
 @bp.route('', methods=['GET'])
 @jwt_required()
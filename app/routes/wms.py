@@ -1,8 +1,14 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, Lote, ItemSolicitacao, Fornecedor, TipoLote, MovimentacaoEstoque, MaterialBase, Usuario, Inventario, InventarioContagem
+from app.models import db, precarregar_eventos, Lote, ItemSolicitacao, Fornecedor, TipoLote, MovimentacaoEstoque, MaterialBase, Usuario, Inventario, InventarioContagem, Localizacao
 from app.auth import admin_required
+from app.services import inventario_service, localizacao_service
+from app.utils.auditoria import registrar_evento, registrar_eventos_em_lote, calcular_alteracoes
+from app.utils import status_lote
+from app.utils.busca import aplicar_busca
+from app.utils.cache_referencia import resposta_referencia, marcar_alterado
 from datetime import datetime
+from sqlalchemy import insert, or_, update
 from sqlalchemy.orm import joinedload, selectinload
 import json
 
@@ -25,7 +31,7 @@ def listar_lotes_wms():
         query = Lote.query
 
         if status:
-            query = query.filter_by(status=status)
+            query = query.filter_by(status=status_lote.normalizar_status(status))
         if fornecedor_id:
             query = query.filter_by(fornecedor_id=fornecedor_id)
         if tipo_lote_id:
@@ -253,26 +259,18 @@ def bloquear_lote(lote_id):
         if not usuario:
             return jsonify({'erro': 'Usuário não encontrado'}), 404
 
-        dados_before = lote.to_dict()
-
         lote.bloqueado = True
         lote.tipo_bloqueio = tipo_bloqueio
         lote.motivo_bloqueio = motivo
         lote.bloqueado_por_id = usuario_id
         lote.bloqueado_em = datetime.utcnow()
 
-        auditoria = lote.auditoria or []
-        auditoria.append({
-            'acao': 'BLOQUEAR_LOTE',
-            'usuario_id': usuario_id,
-            'usuario_nome': usuario.nome if usuario else 'Desconhecido',
+        registrar_evento(lote, 'BLOQUEAR_LOTE', usuario_id, dados={
+            'usuario_nome': usuario.nome,
             'tipo_bloqueio': tipo_bloqueio,
             'motivo': motivo,
-            'timestamp': datetime.utcnow().isoformat(),
-            'ip': request.remote_addr,
-            'dados_before': dados_before
+            'alteracoes': calcular_alteracoes(lote)
         })
-        lote.auditoria = auditoria
 
         db.session.commit()
 
@@ -302,24 +300,17 @@ def desbloquear_lote(lote_id):
         if not usuario:
             return jsonify({'erro': 'Usuário não encontrado'}), 404
 
-        dados_before = lote.to_dict()
         tipo_bloqueio_anterior = lote.tipo_bloqueio
 
         lote.bloqueado = False
         lote.tipo_bloqueio = None
         lote.motivo_bloqueio = None
 
-        auditoria = lote.auditoria or []
-        auditoria.append({
-            'acao': 'DESBLOQUEAR_LOTE',
-            'usuario_id': usuario_id,
-            'usuario_nome': usuario.nome if usuario else 'Desconhecido',
+        registrar_evento(lote, 'DESBLOQUEAR_LOTE', usuario_id, dados={
+            'usuario_nome': usuario.nome,
             'tipo_bloqueio_anterior': tipo_bloqueio_anterior,
-            'timestamp': datetime.utcnow().isoformat(),
-            'ip': request.remote_addr,
-            'dados_before': dados_before
+            'alteracoes': calcular_alteracoes(lote)
         })
-        lote.auditoria = auditoria
 
         db.session.commit()
 
@@ -355,24 +346,16 @@ def reservar_lote(lote_id):
         if not usuario:
             return jsonify({'erro': 'Usuário não encontrado'}), 404
 
-        dados_before = lote.to_dict()
-
         lote.reservado = True
         lote.reservado_para = reservado_para
         lote.reservado_por_id = usuario_id
         lote.reservado_em = datetime.utcnow()
 
-        auditoria = lote.auditoria or []
-        auditoria.append({
-            'acao': 'RESERVAR_LOTE',
-            'usuario_id': usuario_id,
-            'usuario_nome': usuario.nome if usuario else 'Desconhecido',
+        registrar_evento(lote, 'RESERVAR_LOTE', usuario_id, dados={
+            'usuario_nome': usuario.nome,
             'reservado_para': reservado_para,
-            'timestamp': datetime.utcnow().isoformat(),
-            'ip': request.remote_addr,
-            'dados_before': dados_before
+            'alteracoes': calcular_alteracoes(lote)
         })
-        lote.auditoria = auditoria
 
         db.session.commit()
 
@@ -402,7 +385,6 @@ def liberar_reserva_lote(lote_id):
         if not usuario:
             return jsonify({'erro': 'Usuário não encontrado'}), 404
 
-        dados_before = lote.to_dict()
         reservado_para_anterior = lote.reservado_para
 
         lote.reservado = False
@@ -410,17 +392,11 @@ def liberar_reserva_lote(lote_id):
         lote.reservado_por_id = None
         lote.reservado_em = None
 
-        auditoria = lote.auditoria or []
-        auditoria.append({
-            'acao': 'LIBERAR_RESERVA',
-            'usuario_id': usuario_id,
-            'usuario_nome': usuario.nome if usuario else 'Desconhecido',
+        registrar_evento(lote, 'LIBERAR_RESERVA', usuario_id, dados={
+            'usuario_nome': usuario.nome,
             'reservado_para_anterior': reservado_para_anterior,
-            'timestamp': datetime.utcnow().isoformat(),
-            'ip': request.remote_addr,
-            'dados_before': dados_before
+            'alteracoes': calcular_alteracoes(lote)
         })
-        lote.auditoria = auditoria
 
         db.session.commit()
 
@@ -463,8 +439,6 @@ def movimentar_lote(lote_id):
         if not usuario:
             return jsonify({'erro': 'Usuário não encontrado'}), 404
 
-        dados_before = lote.to_dict()
-
         movimentacao = MovimentacaoEstoque(
             lote_id=lote_id,
             tipo=tipo,
@@ -474,12 +448,12 @@ def movimentar_lote(lote_id):
             peso=peso,
             usuario_id=usuario_id,
             observacoes=observacoes,
-            dados_before=dados_before
+            dados_before={'localizacao_atual': lote.localizacao_atual}
         )
 
-        lote.localizacao_atual = localizacao_destino
+        localizacao_service.mover_lote(lote, localizacao_destino)
 
-        movimentacao.dados_after = lote.to_dict()
+        movimentacao.dados_after = {'localizacao_atual': localizacao_destino}
 
         auditoria_mov = [{
             'usuario_id': usuario_id,
@@ -491,19 +465,12 @@ def movimentar_lote(lote_id):
         }]
         movimentacao.auditoria = auditoria_mov
 
-        auditoria_lote = lote.auditoria or []
-        auditoria_lote.append({
-            'acao': 'MOVIMENTACAO',
-            'usuario_id': usuario_id,
-            'usuario_nome': usuario.nome if usuario else 'Desconhecido',
+        registrar_evento(lote, 'MOVIMENTACAO', usuario_id, dados={
+            'usuario_nome': usuario.nome,
             'tipo': tipo,
             'localizacao_origem': movimentacao.localizacao_origem,
-            'localizacao_destino': localizacao_destino,
-            'timestamp': datetime.utcnow().isoformat(),
-            'ip': request.remote_addr,
-            'gps': gps
-        })
-        lote.auditoria = auditoria_lote
+            'localizacao_destino': localizacao_destino
+        }, gps=gps)
 
         db.session.add(movimentacao)
         db.session.commit()
@@ -518,6 +485,191 @@ def movimentar_lote(lote_id):
         db.session.rollback()
         return jsonify({'erro': f'Erro ao movimentar lote: {str(e)}'}), 500
 
+MAX_LOTES_MOVIMENTACAO = 500
+
+
+@bp.route('/movimentacoes/lote', methods=['POST'])
+@jwt_required()
+def movimentar_lotes_em_lote():
+    """
+    Movimenta vários lotes numa única transação (ex.: realocar um rack inteiro)
+
+    Body:
+        localizacao_destino: Destino padrão de todos os lotes
+        lotes: [{lote_id | numero_lote, localizacao_destino?, quantidade?, peso?}]
+            (ou simplesmente lote_ids / numeros_lote)
+        tipo, observacoes, gps, device_id: Iguais aos de /lotes/<id>/movimentar
+        atomico: true → se algum lote for inválido nada é movimentado
+
+    Cada lote é validado isoladamente e volta em 'resultados'. As movimentações e
+    os eventos são gravados com INSERT em massa e os lotes com um UPDATE por destino.
+    """
+    try:
+        data = request.get_json() or {}
+        tipo = data.get('tipo', 'transferencia')
+        destino_padrao = data.get('localizacao_destino')
+        observacoes = data.get('observacoes', '')
+        gps = data.get('gps')
+        device_id = data.get('device_id')
+        atomico = bool(data.get('atomico', False))
+
+        pedidos = [p if isinstance(p, dict) else {'lote_id': p} for p in data.get('lotes') or []]
+        pedidos += [{'lote_id': lote_id} for lote_id in data.get('lote_ids') or []]
+        pedidos += [{'numero_lote': numero} for numero in data.get('numeros_lote') or []]
+
+        if not pedidos:
+            return jsonify({'erro': 'Informe os lotes a movimentar'}), 400
+        if len(pedidos) > MAX_LOTES_MOVIMENTACAO:
+            return jsonify({'erro': f'Máximo de {MAX_LOTES_MOVIMENTACAO} lotes por requisição'}), 400
+
+        usuario_id = get_jwt_identity()
+        usuario = Usuario.query.get(usuario_id)
+
+        if not usuario:
+            return jsonify({'erro': 'Usuário não encontrado'}), 404
+
+        ids = {p.get('lote_id') for p in pedidos if p.get('lote_id') is not None}
+        numeros = {p.get('numero_lote') for p in pedidos if p.get('numero_lote')}
+        filtros = []
+        if ids:
+            filtros.append(Lote.id.in_(ids))
+        if numeros:
+            filtros.append(Lote.numero_lote.in_(numeros))
+
+        lotes = Lote.query.with_entities(
+            Lote.id, Lote.numero_lote, Lote.localizacao_atual, Lote.bloqueado, Lote.peso_total_kg
+        ).filter(or_(*filtros)).all() if filtros else []
+        por_id = {l.id: l for l in lotes}
+        por_numero = {l.numero_lote: l for l in lotes}
+
+        resultados = []
+        validos = []
+        vistos = set()
+        for pedido in pedidos:
+            lote = por_id.get(pedido.get('lote_id')) or por_numero.get(pedido.get('numero_lote'))
+            destino = pedido.get('localizacao_destino') or destino_padrao
+            resultado = {
+                'lote_id': lote.id if lote else pedido.get('lote_id'),
+                'numero_lote': lote.numero_lote if lote else pedido.get('numero_lote'),
+                'localizacao_origem': lote.localizacao_atual if lote else None,
+                'localizacao_destino': destino,
+                'sucesso': False
+            }
+
+            if not lote:
+                resultado['erro'] = 'Lote não encontrado'
+            elif lote.id in vistos:
+                resultado['erro'] = 'Lote repetido na requisição'
+            elif lote.bloqueado:
+                resultado['erro'] = 'Não é possível movimentar lote bloqueado'
+            elif not destino:
+                resultado['erro'] = 'Localização destino é obrigatória'
+            elif destino == lote.localizacao_atual:
+                resultado['erro'] = 'Lote já está na localização destino'
+            else:
+                resultado['sucesso'] = True
+                validos.append((lote, destino, pedido))
+
+            if lote:
+                vistos.add(lote.id)
+            resultados.append(resultado)
+
+        erros = len(resultados) - len(validos)
+        if not validos or (atomico and erros):
+            return jsonify({
+                'erro': 'Nenhum lote movimentado',
+                'movimentados': 0,
+                'erros': erros,
+                'resultados': resultados
+            }), 400
+
+        agora = datetime.utcnow()
+        auditoria_mov = [{
+            'usuario_id': usuario_id,
+            'usuario_nome': usuario.nome,
+            'timestamp': agora.isoformat(),
+            'ip': request.remote_addr,
+            'gps': gps,
+            'device_id': device_id,
+            'lote_operacao': True
+        }]
+
+        # Lotes bloqueados entre a validação e o UPDATE não são movidos
+        destinos = {}
+        for lote, destino, _ in validos:
+            destinos.setdefault(destino, []).append(lote.id)
+        ids_localizacao = localizacao_service.garantir_localizacoes(destinos.keys())
+        movidos = set()
+        for destino, lote_ids in destinos.items():
+            linhas = db.session.execute(
+                update(Lote).where(
+                    Lote.id.in_(lote_ids),
+                    Lote.bloqueado.isnot(True)
+                ).values(
+                    localizacao_atual=destino,
+                    localizacao_id=ids_localizacao.get(destino)
+                ).returning(Lote.id),
+                execution_options={'synchronize_session': False}
+            ).fetchall()
+            movidos.update(linha[0] for linha in linhas)
+
+        if len(movidos) != len(validos):
+            for resultado in resultados:
+                if resultado['sucesso'] and resultado['lote_id'] not in movidos:
+                    resultado['sucesso'] = False
+                    resultado['erro'] = 'Não é possível movimentar lote bloqueado'
+            validos = [v for v in validos if v[0].id in movidos]
+            erros = len(resultados) - len(validos)
+            if not validos or atomico:
+                db.session.rollback()
+                return jsonify({
+                    'erro': 'Nenhum lote movimentado',
+                    'movimentados': 0,
+                    'erros': erros,
+                    'resultados': resultados
+                }), 400
+
+        localizacao_service.aplicar_movimentos([
+            (lote.localizacao_atual, destino, lote.peso_total_kg) for lote, destino, _ in validos
+        ])
+
+        db.session.execute(insert(MovimentacaoEstoque), [{
+            'lote_id': lote.id,
+            'tipo': tipo,
+            'localizacao_origem': lote.localizacao_atual,
+            'localizacao_destino': destino,
+            'quantidade': pedido.get('quantidade'),
+            'peso': pedido.get('peso'),
+            'usuario_id': usuario_id,
+            'data_movimentacao': agora,
+            'observacoes': pedido.get('observacoes', observacoes),
+            'dados_before': {'localizacao_atual': lote.localizacao_atual},
+            'dados_after': {'localizacao_atual': destino},
+            'auditoria': auditoria_mov
+        } for lote, destino, pedido in validos])
+
+        registrar_eventos_em_lote('lotes', 'MOVIMENTACAO', [(lote.id, {
+            'usuario_nome': usuario.nome,
+            'tipo': tipo,
+            'localizacao_origem': lote.localizacao_atual,
+            'localizacao_destino': destino
+        }) for lote, destino, _ in validos], usuario_id=usuario_id, gps=gps, device_id=device_id)
+
+        # INSERT em massa não passa pelo flush: invalidar o cache de localizações manualmente
+        marcar_alterado('localizacoes')
+        db.session.commit()
+
+        return jsonify({
+            'mensagem': f'{len(validos)} lote(s) movimentado(s)',
+            'movimentados': len(validos),
+            'erros': erros,
+            'resultados': resultados
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': f'Erro ao movimentar lotes: {str(e)}'}), 500
+
 @bp.route('/movimentacoes', methods=['GET'])
 @jwt_required()
 def listar_movimentacoes():
@@ -576,9 +728,9 @@ def reverter_movimentacao(mov_id):
             dados_before={'movimentacao_revertida_id': mov_id}
         )
 
-        lote.localizacao_atual = movimentacao.localizacao_origem
+        localizacao_service.mover_lote(lote, movimentacao.localizacao_origem)
 
-        nova_movimentacao.dados_after = lote.to_dict()
+        nova_movimentacao.dados_after = {'localizacao_atual': lote.localizacao_atual}
 
         auditoria_mov = [{
             'usuario_id': usuario_id,
@@ -623,35 +775,20 @@ def iniciar_inventario():
             observacoes=observacoes
         )
 
-        auditoria = [{
-            'acao': 'CRIAR_INVENTARIO',
-            'usuario_id': usuario_id,
-            'timestamp': datetime.utcnow().isoformat(),
-            'ip': request.remote_addr,
-            'tipo': tipo,
-            'localizacao': localizacao
-        }]
-        inventario.auditoria = auditoria
-
-        if localizacao:
-            lotes = Lote.query.filter_by(localizacao_atual=localizacao).all()
-        else:
-            lotes = Lote.query.filter(Lote.status.in_(['EM_ESTOQUE', 'BLOQUEADO_QC', 'BLOQUEADO_INVENTARIO'])).all()
-
-        for lote in lotes:
-            lote.bloqueado = True
-            lote.tipo_bloqueio = 'INVENTARIO'
-            lote.motivo_bloqueio = f'Inventário {inventario.numero_inventario}'
-            lote.bloqueado_por_id = usuario_id
-            lote.bloqueado_em = datetime.utcnow()
-
         db.session.add(inventario)
+        lotes_bloqueados = inventario_service.bloquear_lotes(inventario, usuario_id)
+
+        registrar_evento(inventario, 'CRIAR_INVENTARIO', usuario_id, dados={
+            'tipo': tipo,
+            'localizacao': localizacao,
+            'lotes_bloqueados': lotes_bloqueados
+        })
         db.session.commit()
 
         return jsonify({
-            'mensagem': f'Inventário iniciado. {len(lotes)} lotes bloqueados.',
+            'mensagem': f'Inventário iniciado. {lotes_bloqueados} lotes bloqueados.',
             'inventario': inventario.to_dict(),
-            'lotes_bloqueados': len(lotes)
+            'lotes_bloqueados': lotes_bloqueados
         }), 201
 
     except Exception as e:
@@ -744,38 +881,14 @@ def finalizar_inventario(inv_id):
         inventario.data_finalizacao = datetime.utcnow()
         inventario.finalizado_por_id = usuario_id
 
-        if inventario.localizacao:
-            lotes = Lote.query.filter_by(
-                localizacao_atual=inventario.localizacao,
-                bloqueado=True,
-                tipo_bloqueio='INVENTARIO'
-            ).all()
-        else:
-            lotes = Lote.query.filter_by(
-                bloqueado=True,
-                tipo_bloqueio='INVENTARIO'
-            ).all()
+        lotes_desbloqueados = inventario_service.desbloquear_lotes(inventario)
 
-        for lote in lotes:
-            if lote.motivo_bloqueio and inventario.numero_inventario in lote.motivo_bloqueio:
-                lote.bloqueado = False
-                lote.tipo_bloqueio = None
-                lote.motivo_bloqueio = None
-
-        auditoria = inventario.auditoria or []
-        auditoria.append({
-            'acao': 'FINALIZAR_INVENTARIO',
-            'usuario_id': usuario_id,
-            'timestamp': datetime.utcnow().isoformat(),
-            'ip': request.remote_addr,
-            'lotes_desbloqueados': len(lotes)
-        })
-        inventario.auditoria = auditoria
+        registrar_evento(inventario, 'FINALIZAR_INVENTARIO', usuario_id, dados={'lotes_desbloqueados': lotes_desbloqueados})
 
         db.session.commit()
 
         return jsonify({
-            'mensagem': f'Inventário finalizado. {len(lotes)} lotes desbloqueados.',
+            'mensagem': f'Inventário finalizado. {lotes_desbloqueados} lotes desbloqueados.',
             'inventario': inventario.to_dict()
         }), 200
 
@@ -791,64 +904,31 @@ def consolidar_inventario(inv_id):
         if not inventario:
             return jsonify({'erro': 'Inventário não encontrado'}), 404
 
-        contagens = InventarioContagem.query.filter_by(inventario_id=inv_id).all()
-
-        lotes_contados = {}
-        for contagem in contagens:
-            if contagem.lote_id not in lotes_contados:
-                lotes_contados[contagem.lote_id] = {
-                    'lote_numero': contagem.lote.numero_lote,
-                    'contagens': {}
-                }
-
-            lotes_contados[contagem.lote_id]['contagens'][contagem.numero_contagem] = {
-                'quantidade': contagem.quantidade_contada,
-                'peso': contagem.peso_contado,
-                'localizacao': contagem.localizacao_encontrada,
-                'contador': contagem.contador.nome
-            }
+        data = request.get_json(silent=True) or {}
+        try:
+            tolerancia = inventario_service.obter_tolerancia(data)
+        except (TypeError, ValueError):
+            return jsonify({'erro': 'Tolerância inválida'}), 400
 
-        divergencias = []
-        for lote_id, dados in lotes_contados.items():
-            contagens_dict = dados['contagens']
-
-            if len(contagens_dict) >= 2:
-                contagem_1 = contagens_dict.get(1, {}).get('peso')
-                contagem_2 = contagens_dict.get(2, {}).get('peso')
-                contagem_3 = contagens_dict.get(3, {}).get('peso')
-
-                lote = Lote.query.get(lote_id)
-                peso_sistema = lote.peso_total_kg if lote else 0
-
-                if contagem_1 != contagem_2:
-                    divergencias.append({
-                        'lote_id': lote_id,
-                        'lote_numero': dados['lote_numero'],
-                        'peso_sistema': peso_sistema,
-                        'contagem_1': contagem_1,
-                        'contagem_2': contagem_2,
-                        'contagem_3': contagem_3,
-                        'status': 'DIVERGENTE'
-                    })
+        resultado = inventario_service.consolidar(inventario, tolerancia)
+        divergencias = resultado['divergencias']
 
         inventario.divergencias_consolidadas = divergencias
 
-        auditoria = inventario.auditoria or []
-        auditoria.append({
-            'acao': 'CONSOLIDAR_INVENTARIO',
-            'usuario_id': get_jwt_identity(),
-            'timestamp': datetime.utcnow().isoformat(),
-            'ip': request.remote_addr,
-            'total_divergencias': len(divergencias)
+        registrar_evento(inventario, 'CONSOLIDAR_INVENTARIO', get_jwt_identity(), dados={
+            'total_divergencias': len(divergencias),
+            'tolerancia': tolerancia,
+            'resumo': resultado['resumo']
         })
-        inventario.auditoria = auditoria
 
         db.session.commit()
 
         return jsonify({
             'mensagem': 'Inventário consolidado',
-            'total_lotes': len(lotes_contados),
-            'divergencias': divergencias
+            'total_lotes': resultado['total_lotes'],
+            'divergencias': divergencias,
+            'resumo': resultado['resumo'],
+            'tolerancia': tolerancia
         }), 200
 
     except Exception as e:
@@ -867,6 +947,7 @@ def listar_inventarios():
             query = query.filter_by(status=status)
 
         inventarios = query.order_by(Inventario.data_inicio.desc()).all()
+        precarregar_eventos(inventarios)
 
         resultado = []
         for inv in inventarios:
@@ -908,7 +989,7 @@ def obter_auditoria_lote(lote_id):
         return jsonify({
             'lote_id': lote_id,
             'numero_lote': lote.numero_lote,
-            'auditoria': lote.auditoria or []
+            'auditoria': lote.historico_auditoria
         }), 200
 
     except Exception as e:
@@ -935,11 +1016,19 @@ def obter_estatisticas():
             db.func.count(Lote.id)
         ).group_by(Lote.status).all()
 
+        # Ocupação mantida na tabela localizacoes (sem agrupar todos os lotes)
         lotes_por_localizacao = db.session.query(
-            Lote.localizacao_atual,
+            Localizacao.codigo,
+            Localizacao.quantidade_lotes,
+            Localizacao.peso_kg
+        ).filter(Localizacao.quantidade_lotes > 0).order_by(Localizacao.codigo).all()
+
+        sem_localizacao = db.session.query(
             db.func.count(Lote.id),
             db.func.sum(Lote.peso_total_kg)
-        ).group_by(Lote.localizacao_atual).all()
+        ).filter(Lote.localizacao_id.is_(None)).one()
+        if sem_localizacao[0]:
+            lotes_por_localizacao.append((None, sem_localizacao[0], sem_localizacao[1]))
 
         movimentacoes_recentes = MovimentacaoEstoque.query.order_by(
             MovimentacaoEstoque.data_movimentacao.desc()
@@ -979,7 +1068,10 @@ def listar_lotes_ativos():
 
         # Query base
         query = Lote.query.filter(
-            Lote.status.in_(['recebido', 'em_conferencia', 'conferido', 'aprovado', 'em_estoque', 'disponivel'])
+            Lote.status.in_([
+                status_lote.RECEBIDO, status_lote.EM_CONFERENCIA, status_lote.CONFERIDO,
+                status_lote.APROVADO, status_lote.EM_ESTOQUE
+            ])
         )
 
         # Aplicar filtros
@@ -990,7 +1082,7 @@ def listar_lotes_ativos():
             query = query.filter(Lote.fornecedor_id == fornecedor_id)
 
         if status and status != 'todos':
-            query = query.filter(Lote.status == status)
+            query = query.filter(Lote.status == status_lote.normalizar_status(status))
 
         if localizacao and localizacao != 'todos':
             query = query.filter(Lote.localizacao_atual == localizacao)
@@ -1006,15 +1098,28 @@ def listar_lotes_ativos():
 @bp.route('/materiais-opcoes', methods=['GET'])
 @jwt_required()
 def obter_materiais_opcoes():
-    """Retorna lista de materiais para filtro"""
+    """Retorna lista de materiais para filtro (aceita ?busca= e ?limite= para autocomplete)"""
     try:
-        materiais = db.session.query(MaterialBase).filter_by(ativo=True).order_by(MaterialBase.nome).all()
+        busca = request.args.get('busca')
+        limite = request.args.get('limite', type=int)
+
+        def gerar():
+            query = db.session.query(MaterialBase.id, MaterialBase.nome, MaterialBase.codigo).filter(
+                MaterialBase.ativo == True
+            )
+            materiais = aplicar_busca(
+                query, [MaterialBase.nome, MaterialBase.codigo], busca,
+                ordem_padrao=MaterialBase.nome, limite=limite
+            ).all()
+            return [{
+                'id': m.id,
+                'nome': m.nome,
+                'codigo': m.codigo
+            } for m in materiais]
 
-        return jsonify([{
-            'id': m.id,
-            'nome': m.nome,
-            'codigo': m.codigo
-        } for m in materiais]), 200
+        if busca or limite:
+            return jsonify(gerar()), 200
+        return resposta_referencia('wms.materiais_opcoes', ['materiais'], gerar)
 
     except Exception as e:
         print(f'Erro ao obter materiais: {e}')
@@ -1023,14 +1128,25 @@ def obter_materiais_opcoes():
 @bp.route('/fornecedores-opcoes', methods=['GET'])
 @jwt_required()
 def obter_fornecedores_opcoes():
-    """Retorna lista de fornecedores para filtro"""
+    """Retorna lista de fornecedores para filtro (aceita ?busca= e ?limite= para autocomplete)"""
     try:
-        fornecedores = db.session.query(Fornecedor).filter_by(ativo=True).order_by(Fornecedor.nome).all()
+        busca = request.args.get('busca')
+        limite = request.args.get('limite', type=int)
+
+        def gerar():
+            query = db.session.query(Fornecedor.id, Fornecedor.nome).filter(Fornecedor.ativo == True)
+            fornecedores = aplicar_busca(
+                query, [Fornecedor.nome, Fornecedor.nome_social, Fornecedor.cnpj, Fornecedor.cpf], busca,
+                ordem_padrao=Fornecedor.nome, limite=limite
+            ).all()
+            return [{
+                'id': f.id,
+                'nome': f.nome
+            } for f in fornecedores]
 
-        return jsonify([{
-            'id': f.id,
-            'nome': f.nome
-        } for f in fornecedores]), 200
+        if busca or limite:
+            return jsonify(gerar()), 200
+        return resposta_referencia('wms.fornecedores_opcoes', ['fornecedores'], gerar)
 
     except Exception as e:
         print(f'Erro ao obter fornecedores: {e}')
@@ -1041,46 +1157,11 @@ def obter_fornecedores_opcoes():
 def obter_status_opcoes():
     """Retorna lista de status possíveis para filtro"""
     try:
-        # Status padrão do sistema
-        status_default = [
-            'recebido',
-            'em_conferencia',
-            'conferido',
-            'aprovado',
-            'em_estoque',
-            'disponivel',
-            'reservado',
-            'separado',
-            'bloqueado',
-            'finalizado'
-        ]
-
-        # Buscar status únicos do banco (caso existam outros)
-        status_db = db.session.query(Lote.status).distinct().filter(Lote.status.isnot(None)).all()
-        status_db_list = [s[0] for s in status_db if s[0]]
-
-        # Combinar e remover duplicatas
-        all_status = list(set(status_default + status_db_list))
-        all_status.sort()
-
-        # Formatação para exibição
-        status_map = {
-            'recebido': 'Recebido',
-            'em_conferencia': 'Em Conferência',
-            'conferido': 'Conferido',
-            'aprovado': 'Aprovado',
-            'em_estoque': 'Em Estoque',
-            'disponivel': 'Disponível',
-            'reservado': 'Reservado',
-            'separado': 'Separado',
-            'bloqueado': 'Bloqueado',
-            'finalizado': 'Finalizado'
-        }
-
-        return jsonify([{
-            'value': s,
-            'label': status_map.get(s, s.replace('_', ' ').title())
-        } for s in all_status]), 200
+        def gerar():
+            # Status canônicos: não depende mais de SELECT DISTINCT na tabela de lotes
+            return status_lote.opcoes_status()
+
+        return resposta_referencia('wms.status_opcoes', ['lotes_status'], gerar)
 
     except Exception as e:
         print(f'Erro ao obter status: {e}')
@@ -1091,32 +1172,63 @@ def obter_status_opcoes():
 def obter_localizacao_opcoes():
     """Retorna lista de localizações para filtro"""
     try:
-        # Localizações padrão do sistema
-        localizacoes_default = [
-            'A1', 'A2', 'A3', 'A4', 'A5',
-            'B1', 'B2', 'B3', 'B4', 'B5',
-            'C1', 'C2', 'C3', 'C4', 'C5',
-            'D1', 'D2', 'D3', 'D4', 'D5'
-        ]
+        def gerar():
+            # Tabela indexada de localizações + posições padrão do armazém
+            localizacoes = db.session.query(Localizacao.codigo).filter(
+                Localizacao.ativo == True
+            ).all()
+            return sorted(set(localizacao_service.LOCALIZACOES_PADRAO) | {l[0] for l in localizacoes})
 
-        # Buscar localizações únicas do banco
-        localizacoes_lotes = db.session.query(Lote.localizacao_atual).distinct().filter(
-            Lote.localizacao_atual.isnot(None)
-        ).all()
+        return resposta_referencia('wms.localizacao_opcoes', ['localizacoes'], gerar)
 
-        localizacoes_mov = db.session.query(MovimentacaoEstoque.localizacao_destino).distinct().filter(
-            MovimentacaoEstoque.localizacao_destino.isnot(None)
-        ).all()
+    except Exception as e:
+        print(f'Erro ao obter localizações: {e}')
+        return jsonify({'erro': str(e)}), 500
 
-        # Combinar todas as localizações
-        loc_lotes = [l[0] for l in localizacoes_lotes if l[0]]
-        loc_mov = [l[0] for l in localizacoes_mov if l[0]]
+@bp.route('/localizacoes', methods=['GET'])
+@jwt_required()
+def listar_localizacoes():
+    """Localizações com ocupação (quantidade de lotes e kg) para o mapa do WMS"""
+    try:
+        query = Localizacao.query
+        if request.args.get('ocupadas', 'false').lower() == 'true':
+            query = query.filter(Localizacao.quantidade_lotes > 0)
+        if request.args.get('incluir_inativas', 'false').lower() != 'true':
+            query = query.filter(Localizacao.ativo == True)
 
-        all_localizacoes = list(set(localizacoes_default + loc_lotes + loc_mov))
-        all_localizacoes.sort()
+        localizacoes = query.order_by(Localizacao.codigo).all()
+        return jsonify([loc.to_dict() for loc in localizacoes]), 200
 
-        return jsonify(all_localizacoes), 200
+    except Exception as e:
+        return jsonify({'erro': f'Erro ao listar localizações: {str(e)}'}), 500
+
+@bp.route('/localizacoes/<string:codigo>/lotes', methods=['GET'])
+@jwt_required()
+def listar_lotes_localizacao(codigo):
+    """Lotes de uma localização (busca indexada por localizacao_id)"""
+    try:
+        localizacao = Localizacao.query.filter_by(codigo=codigo).first()
+        if not localizacao:
+            return jsonify({'erro': 'Localização não encontrada'}), 404
+
+        lotes = Lote.query.options(
+            joinedload(Lote.fornecedor),
+            joinedload(Lote.tipo_lote)
+        ).filter(Lote.localizacao_id == localizacao.id).order_by(Lote.id).limit(500).all()
+
+        return jsonify({
+            'localizacao': localizacao.to_dict(),
+            'lotes': [{
+                'id': lote.id,
+                'numero_lote': lote.numero_lote,
+                'status': lote.status,
+                'peso_total_kg': lote.peso_total_kg,
+                'fornecedor_nome': lote.fornecedor.nome if lote.fornecedor else None,
+                'tipo_lote_nome': lote.tipo_lote.nome if lote.tipo_lote else None,
+                'bloqueado': lote.bloqueado,
+                'reservado': lote.reservado
+            } for lote in lotes]
+        }), 200
 
     except Exception as e:
-        print(f'Erro ao obter localizações: {e}')
-        return jsonify({'erro': str(e)}), 500
\ No newline at end of file
+        return jsonify({'erro': f'Erro ao listar lotes da localização: {str(e)}'}), 500
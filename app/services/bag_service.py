@@ -0,0 +1,142 @@
+"""
+Acumuladores dos bags de produção (peso, custo e quantidade de itens)
+
+BagProducao.peso_acumulado, custo_acumulado e quantidade_itens são a fonte
+dos painéis de estoque, que assim leem uma linha por bag em vez de somar os
+itens. Os acumuladores mudam sempre com UPDATE relativo (valor = valor + delta)
+na transação de quem adiciona, remove ou move o item, então duas estações
+gravando no mesmo bag não perdem incrementos e um rollback desfaz os dois.
+
+reconciliar() recalcula os acumuladores a partir dos itens e corrige apenas
+os bags que divergirem (job: scripts/reconciliar_bags.py).
+"""
+
+from decimal import Decimal
+
+from sqlalchemy import func, text
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models import db, ItemSeparadoProducao, ClassificacaoGrade
+
+_SQL_AJUSTAR = text("""
+    UPDATE bags_producao
+    SET peso_acumulado = GREATEST(0, COALESCE(peso_acumulado, 0) + :peso),
+        custo_acumulado = GREATEST(0, COALESCE(custo_acumulado, 0) + :custo),
+        quantidade_itens = GREATEST(0, COALESCE(quantidade_itens, 0) + :itens),
+        data_atualizacao = NOW()
+    WHERE id = :bag_id
+    RETURNING peso_acumulado, custo_acumulado, quantidade_itens
+""")
+
+_SQL_RECONCILIAR = """
+    UPDATE bags_producao b
+    SET peso_acumulado = t.peso,
+        custo_acumulado = t.custo,
+        quantidade_itens = t.itens
+    FROM (
+        SELECT bag.id,
+               COALESCE(SUM(i.peso_kg), 0) AS peso,
+               COALESCE(SUM(i.custo_proporcional), 0) AS custo,
+               COUNT(i.id) AS itens
+        FROM bags_producao bag
+        LEFT JOIN itens_separados_producao i ON i.bag_id = bag.id
+        {filtro_bags}
+        GROUP BY bag.id
+    ) t
+    WHERE b.id = t.id
+      AND (b.peso_acumulado IS DISTINCT FROM t.peso
+           OR b.custo_acumulado IS DISTINCT FROM t.custo
+           OR b.quantidade_itens IS DISTINCT FROM t.itens)
+    RETURNING b.id
+"""
+
+
+def _decimal(valor):
+    return Decimal(str(valor or 0))
+
+
+def ajustar_acumulados(bag, peso=0, custo=0, itens=0):
+    """
+    Soma os deltas aos acumuladores do bag no banco e atualiza o objeto em memória
+
+    O bag precisa já ter id (use flush antes se acabou de ser criado).
+    """
+    linha = db.session.execute(_SQL_AJUSTAR, {
+        'bag_id': bag.id,
+        'peso': _decimal(peso),
+        'custo': _decimal(custo),
+        'itens': int(itens)
+    }).first()
+    if linha is not None:
+        # Valores vindos do banco: não marcam o bag como alterado
+        set_committed_value(bag, 'peso_acumulado', linha.peso_acumulado)
+        set_committed_value(bag, 'custo_acumulado', linha.custo_acumulado)
+        set_committed_value(bag, 'quantidade_itens', linha.quantidade_itens)
+    return bag
+
+
+def registrar_item(bag, item):
+    """Item entrou no bag"""
+    return ajustar_acumulados(bag, item.peso_kg, item.custo_proporcional, 1)
+
+
+def retirar_item(bag, item):
+    """Item saiu do bag (removido ou movido para outro)"""
+    return ajustar_acumulados(bag, -_decimal(item.peso_kg), -_decimal(item.custo_proporcional), -1)
+
+
+def reconciliar(bag_ids=None):
+    """
+    Recalcula os acumuladores a partir dos itens
+
+    Args:
+        bag_ids: Restringe aos bags informados (None = todos)
+
+    Returns:
+        Lista de ids dos bags que estavam divergentes e foram corrigidos
+    """
+    if bag_ids is not None:
+        bag_ids = sorted({int(b) for b in bag_ids if b})
+        if not bag_ids:
+            return []
+        sql = text(_SQL_RECONCILIAR.format(filtro_bags='WHERE bag.id = ANY(:bag_ids)'))
+        linhas = db.session.execute(sql, {'bag_ids': bag_ids}).fetchall()
+    else:
+        linhas = db.session.execute(text(_SQL_RECONCILIAR.format(filtro_bags=''))).fetchall()
+    return [linha[0] for linha in linhas]
+
+
+def composicao_por_classificacao(bag_ids):
+    """
+    Peso e quantidade de itens por classificação dentro de cada bag (uma consulta)
+
+    Returns:
+        {bag_id: [{'nome', 'peso_total_kg', 'quantidade_itens'}, ...]} ordenado por peso
+    """
+    bag_ids = list(bag_ids)
+    if not bag_ids:
+        return {}
+
+    linhas = db.session.query(
+        ItemSeparadoProducao.bag_id,
+        func.coalesce(ClassificacaoGrade.nome, 'Sem classificação').label('nome'),
+        func.sum(ItemSeparadoProducao.peso_kg).label('peso'),
+        func.count(ItemSeparadoProducao.id).label('itens')
+    ).outerjoin(
+        ClassificacaoGrade, ClassificacaoGrade.id == ItemSeparadoProducao.classificacao_grade_id
+    ).filter(
+        ItemSeparadoProducao.bag_id.in_(bag_ids)
+    ).group_by(
+        ItemSeparadoProducao.bag_id, ClassificacaoGrade.nome
+    ).order_by(
+        ItemSeparadoProducao.bag_id, func.sum(ItemSeparadoProducao.peso_kg).desc()
+    ).all()
+
+    composicao = {}
+    for linha in linhas:
+        composicao.setdefault(linha.bag_id, []).append({
+            'nome': linha.nome,
+            'peso_total_kg': float(linha.peso or 0),
+            'quantidade_itens': linha.itens
+        })
+    return composicao
@@ -1,90 +1,214 @@
 """
 Serviço centralizado de análise de imagens usando Gemini AI
 Reutilizável para placas eletrônicas e itens de solicitação
+
+- Um genai.Client por processo, reaproveitando as conexões HTTP
+- As imagens de uma chamada são enviadas em paralelo, com no máximo
+  GEMINI_MAX_CONCORRENCIA requisições simultâneas no processo
+- Resultados ficam em cache pelo SHA-256 da imagem + modelo + versão do prompt
+  (hash do texto), então reenviar a mesma foto não gera nova chamada
+- GEMINI_BACKEND=stub responde localmente, sem rede nem chave (testes);
+  GEMINI_STUB_LATENCIA simula o tempo de resposta da API
 """
 
+import hashlib
 import os
-from typing import List, Dict, Literal
-from google import genai
-from google.genai import types
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Literal, Optional
+
+MODELO_PADRAO = "gemini-2.0-flash-exp"
+MAX_CONCORRENCIA = int(os.environ.get("GEMINI_MAX_CONCORRENCIA", "4"))
+CACHE_TTL = int(os.environ.get("GEMINI_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRADAS = 1000
+
+_lock = threading.Lock()
+_vagas = threading.BoundedSemaphore(MAX_CONCORRENCIA)
+_cliente = None
+_cliente_chave = None
+_cache: Dict[tuple, tuple] = {}
+
+
+class GeminiIndisponivel(Exception):
+    """Gemini não configurado ou cliente não pôde ser criado"""
+
+
+def _backend() -> str:
+    return os.environ.get("GEMINI_BACKEND", "gemini").lower()
+
+
+def _obter_cliente():
+    """Cliente compartilhado (recriado só se GEMINI_API_KEY mudar)"""
+    global _cliente, _cliente_chave
+
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise GeminiIndisponivel('Chave da API do Gemini não configurada. Configure GEMINI_API_KEY.')
+
+    with _lock:
+        if _cliente is None or _cliente_chave != api_key:
+            from google import genai
+            _cliente = genai.Client(api_key=api_key)
+            _cliente_chave = api_key
+        return _cliente
+
+
+def _versao_prompt(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+
+
+def _ler_cache(chave: tuple) -> Optional[str]:
+    entrada = _cache.get(chave)
+    if entrada and time.time() < entrada[0]:
+        return entrada[1]
+    return None
+
+
+def _gravar_cache(chave: tuple, texto: str):
+    with _lock:
+        if len(_cache) >= CACHE_MAX_ENTRADAS:
+            # Descarta a entrada que expira primeiro
+            mais_antiga = min(_cache, key=lambda k: _cache[k][0])
+            _cache.pop(mais_antiga, None)
+        _cache[chave] = (time.time() + CACHE_TTL, texto)
+
+
+def limpar_cache():
+    with _lock:
+        _cache.clear()
+
+
+def _resposta_stub(imagem_bytes: bytes) -> str:
+    """Resposta determinística (mesma imagem → mesma classificação) sem chamar a API"""
+    latencia = float(os.environ.get("GEMINI_STUB_LATENCIA", "0"))
+    if latencia:
+        with _vagas:
+            time.sleep(latencia)  # simula o tempo de ida e volta da API
+    classes = ['HIGH', 'MG1', 'MG2', 'LOW']
+    classe = classes[hashlib.sha256(imagem_bytes).digest()[0] % len(classes)]
+    return f"Classificação: {classe} — Resposta simulada (GEMINI_BACKEND=stub)"
+
+
+def _chamar_modelo(imagem_bytes: bytes, prompt: str, model: str, mime_type: str) -> str:
+    if _backend() == 'stub':
+        return _resposta_stub(imagem_bytes)
+
+    from google.genai import types
+
+    cliente = _obter_cliente()
+    with _vagas:
+        response = cliente.models.generate_content(
+            model=model,
+            contents=[
+                types.Part.from_bytes(
+                    data=imagem_bytes,
+                    mime_type=mime_type,
+                ),
+                prompt
+            ],
+        )
+    return (response.text or '').strip()
+
+
+def gerar_textos(
+    images: List[bytes],
+    prompt: str,
+    model: str = MODELO_PADRAO,
+    mime_types: Optional[List[str]] = None
+) -> List[Dict[str, str]]:
+    """
+    Envia cada imagem com o prompt e devolve o texto das respostas, na mesma ordem
+
+    Imagens repetidas (na lista ou já vistas antes) são enviadas uma vez só.
+
+    Returns:
+        Lista de {'texto': str} ou {'erro': str}; 'cache' indica resposta reaproveitada
+    """
+    if not images:
+        return []
+    mime_types = mime_types or ['image/jpeg'] * len(images)
+
+    if _backend() != 'stub':
+        try:
+            _obter_cliente()
+        except Exception as e:
+            return [{'erro': str(e)} for _ in images]
+
+    versao = _versao_prompt(prompt)
+    chaves = [
+        (hashlib.sha256(imagem).hexdigest(), model, versao)
+        for imagem in images
+    ]
+
+    resultados: Dict[tuple, Dict[str, str]] = {}
+    pendentes = {}
+    for chave, imagem, mime_type in zip(chaves, images, mime_types):
+        if chave in resultados or chave in pendentes:
+            continue
+        texto = _ler_cache(chave)
+        if texto is not None:
+            resultados[chave] = {'texto': texto, 'cache': True}
+        else:
+            pendentes[chave] = (imagem, mime_type)
+
+    def processar(item):
+        chave, (imagem, mime_type) = item
+        try:
+            texto = _chamar_modelo(imagem, prompt, model, mime_type)
+        except Exception as e:
+            return chave, {'erro': str(e)}
+        if texto:
+            _gravar_cache(chave, texto)
+            return chave, {'texto': texto}
+        return chave, {'erro': 'Resposta vazia'}
+
+    if len(pendentes) == 1:
+        chave, resultado = processar(next(iter(pendentes.items())))
+        resultados[chave] = resultado
+    elif pendentes:
+        with ThreadPoolExecutor(max_workers=min(len(pendentes), MAX_CONCORRENCIA)) as executor:
+            for chave, resultado in executor.map(processar, pendentes.items()):
+                resultados[chave] = resultado
+
+    return [resultados[chave] for chave in chaves]
 
 
 def analyze_images(
     images: List[bytes],
     use_case: Literal['placa', 'solicitacao'] = 'placa',
-    model: str = "gemini-2.0-flash-exp"
+    model: str = MODELO_PADRAO,
+    mime_types: Optional[List[str]] = None
 ) -> List[Dict[str, str]]:
     """
-    Analisa múltiplas imagens usando Gemini AI
+    Analisa múltiplas imagens usando Gemini AI (em paralelo, com cache)
     
     Args:
         images: Lista de imagens em bytes
         use_case: Tipo de análise ('placa' ou 'solicitacao')
         model: Modelo do Gemini a usar
+        mime_types: Tipo de cada imagem (padrão image/jpeg)
     
     Returns:
         Lista de dicionários com classificacao, justificativa e raw_text
     """
-    
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        return [{
-            'classificacao': 'medio',
-            'justificativa': 'Chave da API do Gemini não configurada. Configure GEMINI_API_KEY.',
-            'raw_text': '',
-            'erro': 'API key não configurada'
-        }] * len(images)
-    
-    try:
-        client = genai.Client(api_key=api_key)
-    except Exception as e:
-        return [{
-            'classificacao': 'medio',
-            'justificativa': f'Erro ao conectar com Gemini: {str(e)}',
-            'raw_text': '',
-            'erro': str(e)
-        }] * len(images)
-    
     prompt = _get_prompt(use_case)
     resultados = []
     
-    for imagem_bytes in images:
-        try:
-            response = client.models.generate_content(
-                model=model,
-                contents=[
-                    types.Part.from_bytes(
-                        data=imagem_bytes,
-                        mime_type="image/jpeg",
-                    ),
-                    prompt
-                ],
-            )
-            
-            if not response.text:
-                resultados.append({
-                    'classificacao': 'mg1',
-                    'justificativa': 'Gemini não retornou resposta para esta imagem',
-                    'raw_text': '',
-                    'erro': 'Resposta vazia'
-                })
-                continue
-            
-            resultado_texto = response.text.strip()
-            print(f"[GEMINI] Resposta completa: {resultado_texto}")
-            
-            # Parsear a resposta
-            parsed = _parse_gemini_response(resultado_texto)
-            resultados.append(parsed)
-        
-        except Exception as e:
+    for resposta in gerar_textos(images, prompt, model, mime_types):
+        if 'erro' in resposta:
+            nao_configurado = 'GEMINI_API_KEY' in resposta['erro']
             resultados.append({
-                'classificacao': 'mg1',
-                'justificativa': f'Erro ao analisar imagem: {str(e)}',
+                'classificacao': 'medio' if nao_configurado else 'mg1',
+                'justificativa': resposta['erro'] if nao_configurado else f"Erro ao analisar imagem: {resposta['erro']}",
                 'raw_text': '',
-                'erro': str(e)
+                'erro': resposta['erro']
             })
+            continue
+        
+        print(f"[GEMINI] Resposta completa: {resposta['texto']}")
+        resultados.append(_parse_gemini_response(resposta['texto']))
     
     return resultados
 
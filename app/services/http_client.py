@@ -0,0 +1,266 @@
+"""
+Cliente HTTP compartilhado para chamadas externas (APIs de metais, câmbio,
+ViaCEP, Nominatim, CNPJ, Perplexity)
+
+- Pool de conexões por host (uma requests.Session por host)
+- Timeout total cooperativo (eventlet.Timeout quando o eventlet está ativo)
+- Cache de respostas com TTL
+- Circuit breaker por host: quando o provedor está fora, devolve o cache
+  (mesmo expirado) ou falha imediatamente sem ocupar o worker
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import eventlet
+    from eventlet import patcher as _eventlet_patcher
+except ImportError:  # pragma: no cover - eventlet é opcional fora do gunicorn
+    eventlet = None
+    _eventlet_patcher = None
+
+
+TIMEOUT_CONEXAO_PADRAO = 3
+TIMEOUT_LEITURA_PADRAO = 8
+POOL_MAXSIZE = 10
+
+FALHAS_PARA_ABRIR = 3
+TEMPO_CIRCUITO_ABERTO = 60
+CACHE_MAX_ENTRADAS = 500
+
+
+class CircuitoAberto(requests.exceptions.ConnectionError):
+    """Provedor marcado como indisponível pelo circuit breaker"""
+
+
+class _Circuito:
+    def __init__(self):
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        # Início da requisição de teste em andamento (0 = nenhuma)
+        self.sonda_desde = 0.0
+        self._lock = threading.Lock()
+
+    def aberto(self) -> bool:
+        """Consulta sem efeito colateral: True enquanto recusa requisições"""
+        agora = time.time()
+        if agora < self.aberto_ate:
+            return True
+        return bool(self.sonda_desde) and agora - self.sonda_desde < TEMPO_CIRCUITO_ABERTO
+
+    def permite(self) -> bool:
+        """
+        Fechado: sempre. Aberto: nunca. Depois do tempo de espera (half-open)
+        libera uma única requisição de teste e recusa as demais até ela
+        terminar. Uma sonda que não reportou em TEMPO_CIRCUITO_ABERTO é
+        considerada perdida e outra é liberada.
+        """
+        with self._lock:
+            if not self.aberto_ate:
+                return True
+            agora = time.time()
+            if agora < self.aberto_ate:
+                return False
+            if self.sonda_desde and agora - self.sonda_desde < TEMPO_CIRCUITO_ABERTO:
+                return False
+            self.sonda_desde = agora
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.falhas = 0
+            self.aberto_ate = 0.0
+            self.sonda_desde = 0.0
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+            # Falha da sonda reabre direto, sem esperar novas FALHAS_PARA_ABRIR
+            if self.sonda_desde or self.falhas >= FALHAS_PARA_ABRIR:
+                self.aberto_ate = time.time() + TEMPO_CIRCUITO_ABERTO
+                self.sonda_desde = 0.0
+
+
+_lock = threading.Lock()
+_sessoes: Dict[str, requests.Session] = {}
+_circuitos: Dict[str, _Circuito] = {}
+_cache: Dict[tuple, Tuple[float, requests.Response]] = {}
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def _sessao(host: str) -> requests.Session:
+    with _lock:
+        sessao = _sessoes.get(host)
+        if sessao is None:
+            sessao = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+            sessao.mount('http://', adapter)
+            sessao.mount('https://', adapter)
+            _sessoes[host] = sessao
+        return sessao
+
+
+def _circuito(host: str) -> _Circuito:
+    with _lock:
+        circuito = _circuitos.get(host)
+        if circuito is None:
+            circuito = _Circuito()
+            _circuitos[host] = circuito
+        return circuito
+
+
+def _chave_cache(metodo: str, url: str, params: Optional[dict]) -> tuple:
+    itens = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return (metodo, url, itens)
+
+
+def _ler_cache(chave: tuple, aceitar_expirado: bool = False) -> Optional[requests.Response]:
+    entrada = _cache.get(chave)
+    if not entrada:
+        return None
+    expira_em, response = entrada
+    if aceitar_expirado or time.time() < expira_em:
+        return response
+    return None
+
+
+def _gravar_cache(chave: tuple, response: requests.Response, ttl: int):
+    with _lock:
+        if len(_cache) >= CACHE_MAX_ENTRADAS:
+            # Descarta a entrada que expira primeiro
+            mais_antiga = min(_cache, key=lambda k: _cache[k][0])
+            _cache.pop(mais_antiga, None)
+        _cache[chave] = (time.time() + ttl, response)
+
+
+def _eventlet_ativo() -> bool:
+    return _eventlet_patcher is not None and _eventlet_patcher.is_monkey_patched('socket')
+
+
+def _executar(sessao: requests.Session, metodo: str, url: str, timeout: Tuple[float, float], **kwargs) -> requests.Response:
+    if not _eventlet_ativo():
+        return sessao.request(metodo, url, timeout=timeout, **kwargs)
+
+    # O timeout do requests vale por operação de socket; com eventlet aplicamos
+    # também um limite total para a green thread não ficar presa num servidor lento
+    limite_total = timeout[0] + timeout[1]
+    try:
+        with eventlet.Timeout(limite_total):
+            return sessao.request(metodo, url, timeout=timeout, **kwargs)
+    except eventlet.Timeout:
+        raise requests.exceptions.Timeout(f'Tempo total de {limite_total}s excedido para {url}')
+
+
+def request(
+    metodo: str,
+    url: str,
+    params: Optional[dict] = None,
+    timeout=None,
+    cache_ttl: int = 0,
+    **kwargs
+) -> requests.Response:
+    """
+    Executa uma requisição HTTP pelo cliente compartilhado
+
+    Args:
+        metodo: Método HTTP ('GET', 'POST', ...)
+        url: URL completa
+        params: Query string
+        timeout: Segundos (float) ou tupla (conexão, leitura)
+        cache_ttl: Segundos para manter respostas 200 em cache (0 = sem cache)
+        **kwargs: Repassados para requests (headers, json, verify, ...)
+
+    Returns:
+        requests.Response
+
+    Raises:
+        CircuitoAberto: provedor indisponível e sem resposta em cache
+        requests.RequestException: erros de rede/timeout
+    """
+    metodo = metodo.upper()
+    if timeout is None:
+        timeout = (TIMEOUT_CONEXAO_PADRAO, TIMEOUT_LEITURA_PADRAO)
+    elif not isinstance(timeout, tuple):
+        timeout = (min(TIMEOUT_CONEXAO_PADRAO, timeout), timeout)
+
+    chave = _chave_cache(metodo, url, params) if cache_ttl else None
+    if chave:
+        em_cache = _ler_cache(chave)
+        if em_cache is not None:
+            return em_cache
+
+    host = _host(url)
+    circuito = _circuito(host)
+    if not circuito.permite():
+        if chave:
+            expirado = _ler_cache(chave, aceitar_expirado=True)
+            if expirado is not None:
+                return expirado
+        raise CircuitoAberto(f'Serviço {host} temporariamente indisponível')
+
+    try:
+        response = _executar(_sessao(host), metodo, url, timeout, params=params, **kwargs)
+    except requests.RequestException:
+        circuito.registrar_falha()
+        if chave:
+            expirado = _ler_cache(chave, aceitar_expirado=True)
+            if expirado is not None:
+                return expirado
+        raise
+
+    if response.status_code >= 500:
+        circuito.registrar_falha()
+        if chave:
+            expirado = _ler_cache(chave, aceitar_expirado=True)
+            if expirado is not None:
+                return expirado
+    else:
+        circuito.registrar_sucesso()
+        if chave and response.status_code == 200:
+            # Força a leitura do corpo para a resposta poder ser reutilizada
+            response.content
+            _gravar_cache(chave, response, cache_ttl)
+
+    return response
+
+
+def get(url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+    return request('GET', url, params=params, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request('POST', url, **kwargs)
+
+
+def circuito_aberto(url_ou_host: str) -> bool:
+    """Indica se o circuito de um host está aberto (útil para degradar sem tentar)"""
+    host = _host(url_ou_host) if '://' in url_ou_host else url_ou_host.lower()
+    circuito = _circuitos.get(host)
+    return bool(circuito and circuito.aberto())
+
+
+def estado_circuitos() -> Dict[str, dict]:
+    """Resumo dos circuitos por host (diagnóstico)"""
+    agora = time.time()
+    return {
+        host: {
+            'falhas': c.falhas,
+            'aberto': c.aberto(),
+            'sondando': bool(c.sonda_desde),
+            'reabre_em': max(0, round(c.aberto_ate - agora, 1))
+        }
+        for host, c in _circuitos.items()
+    }
+
+
+def limpar_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,202 @@
+"""
+Normalização das imagens enviadas pelos celulares (fotos de usuários,
+evidências de conferência, scanner, itens de solicitação, placas)
+
+A imagem é decodificada uma vez, orientada pelo EXIF, reduzida ao lado máximo
+do perfil e regravada em JPEG ou WebP sem metadados (EXIF com GPS e modelo do
+aparelho não são mantidos). Arquivos que não são imagens, GIFs animados ou
+falhas de decodificação seguem sem alteração: o upload nunca falha por aqui.
+
+O Pillow roda numa thread do sistema operacional (eventlet.tpool quando o
+servidor está com monkey_patch), então decodificar uma foto de 12 MB não trava
+o hub do eventlet. Um semáforo limita quantas imagens são processadas ao mesmo
+tempo, o que também limita a memória usada em rajadas de upload.
+
+Configuração (variáveis de ambiente):
+    IMAGEM_FORMATO            JPEG (padrão) ou WEBP
+    IMAGEM_QUALIDADE          Qualidade do encoder (padrão 82)
+    IMAGEM_MAX_LADO           Lado máximo em px para todos os perfis (padrão: valor do perfil)
+    IMAGEM_GUARDAR_ORIGINAL   true para manter o arquivo original em IMAGEM_ORIGINAIS_DIR
+    IMAGEM_ORIGINAIS_DIR      Armazenamento frio dos originais (padrão MEDIA_STORE_DIR/originais)
+    IMAGEM_MAX_PROCESSANDO    Imagens processadas ao mesmo tempo por processo (padrão 2)
+"""
+
+import io
+import os
+import threading
+from typing import NamedTuple, Optional
+
+from werkzeug.utils import secure_filename
+
+from app.utils import media_store
+
+# Lado máximo (px) por tipo de upload
+PERFIS = {
+    'foto_usuario': 1024,
+    'evidencia': 2048,
+    'scanner': 2048,
+    'item_solicitacao': 2048,
+    'placa': 2048,
+}
+
+FORMATO = os.getenv('IMAGEM_FORMATO', 'JPEG').upper()
+QUALIDADE = int(os.getenv('IMAGEM_QUALIDADE', '82'))
+MAX_LADO = int(os.getenv('IMAGEM_MAX_LADO', '0')) or None
+GUARDAR_ORIGINAL = os.getenv('IMAGEM_GUARDAR_ORIGINAL', 'false').lower() == 'true'
+ORIGINAIS_DIR = os.path.abspath(
+    os.getenv('IMAGEM_ORIGINAIS_DIR') or os.path.join(media_store.MEDIA_STORE_DIR, 'originais')
+)
+
+_FORMATOS = {
+    'JPEG': ('image/jpeg', 'jpg'),
+    'WEBP': ('image/webp', 'webp'),
+}
+
+_processando = threading.BoundedSemaphore(int(os.getenv('IMAGEM_MAX_PROCESSANDO', '2')))
+
+
+class ImagemNormalizada(NamedTuple):
+    conteudo: bytes
+    mimetype: str
+    extensao: Optional[str]  # None = mantida como enviada
+    tamanho_original: int
+    tamanho_final: int
+    largura: Optional[int] = None
+    altura: Optional[int] = None
+
+    @property
+    def alterada(self) -> bool:
+        return self.extensao is not None
+
+    def resumo(self):
+        """Antes/depois para logs e respostas da API"""
+        return {
+            'tamanho_original': self.tamanho_original,
+            'tamanho_final': self.tamanho_final,
+            'reducao_percentual': round(100 * (1 - self.tamanho_final / self.tamanho_original), 1)
+            if self.tamanho_original else 0.0,
+            'largura': self.largura,
+            'altura': self.altura,
+            'mimetype': self.mimetype,
+        }
+
+
+def _sem_alteracao(conteudo: bytes, mimetype: Optional[str]) -> ImagemNormalizada:
+    return ImagemNormalizada(conteudo, mimetype or 'application/octet-stream', None, len(conteudo), len(conteudo))
+
+
+def _normalizar(conteudo: bytes, mimetype: Optional[str], max_lado: int, formato: str, qualidade: int) -> ImagemNormalizada:
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return _sem_alteracao(conteudo, mimetype)
+
+    mimetype_final, extensao = _FORMATOS.get(formato, _FORMATOS['JPEG'])
+
+    try:
+        with Image.open(io.BytesIO(conteudo)) as original:
+            if getattr(original, 'is_animated', False):
+                return _sem_alteracao(conteudo, mimetype)
+
+            tinha_metadados = bool(original.info.get('exif') or original.getexif())
+            largura_original, altura_original = original.size
+
+            # JPEG: decodifica direto numa escala reduzida (bem mais rápido e menos memória)
+            original.draft('RGB', (max_lado, max_lado))
+            imagem = ImageOps.exif_transpose(original)
+            imagem.thumbnail((max_lado, max_lado), Image.LANCZOS)
+
+            if formato == 'JPEG' and imagem.mode != 'RGB':
+                if imagem.mode in ('RGBA', 'LA', 'P'):
+                    imagem = imagem.convert('RGBA')
+                    fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+                    fundo.paste(imagem, mask=imagem.getchannel('A'))
+                    imagem = fundo
+                else:
+                    imagem = imagem.convert('RGB')
+            elif formato == 'WEBP' and imagem.mode not in ('RGB', 'RGBA'):
+                imagem = imagem.convert('RGBA' if 'A' in imagem.getbands() else 'RGB')
+
+            saida = io.BytesIO()
+            opcoes = {'quality': qualidade}
+            if formato == 'JPEG':
+                opcoes.update(optimize=True, progressive=True)
+            else:
+                opcoes.update(method=4)
+            imagem.save(saida, formato, **opcoes)
+            novo = saida.getvalue()
+            largura, altura = imagem.size
+    except Exception as e:
+        print(f"⚠️ Imagem mantida sem normalização: {e}")
+        return _sem_alteracao(conteudo, mimetype)
+
+    reduzida = (largura, altura) != (largura_original, altura_original)
+    if not reduzida and not tinha_metadados and len(novo) >= len(conteudo):
+        # Já estava pequena e limpa: regravar só aumentaria o arquivo
+        return _sem_alteracao(conteudo, mimetype)
+
+    return ImagemNormalizada(novo, mimetype_final, extensao, len(conteudo), len(novo), largura, altura)
+
+
+def _executar_fora_do_hub(funcao, *args):
+    try:
+        from eventlet import patcher, tpool
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(funcao, *args)
+    except ImportError:
+        pass
+    return funcao(*args)
+
+
+def guardar_original(conteudo: bytes) -> str:
+    """Copia o original para o armazenamento frio (nome = SHA-256). Retorna o hash"""
+    hash_original = media_store.calcular_hash(conteudo)
+    destino = os.path.join(ORIGINAIS_DIR, hash_original[:2], hash_original[2:4], hash_original)
+    if not os.path.isfile(destino):
+        media_store.gravar_atomico(destino, conteudo)
+    return hash_original
+
+
+def normalizar(conteudo: bytes, perfil: str = 'evidencia', mimetype: Optional[str] = None) -> ImagemNormalizada:
+    """
+    Normaliza a imagem conforme o perfil (ver PERFIS)
+
+    Returns:
+        ImagemNormalizada; extensao é None quando o conteúdo foi mantido como veio
+    """
+    if not conteudo:
+        return _sem_alteracao(conteudo or b'', mimetype)
+
+    max_lado = MAX_LADO or PERFIS.get(perfil, PERFIS['evidencia'])
+    with _processando:
+        resultado = _executar_fora_do_hub(_normalizar, conteudo, mimetype, max_lado, FORMATO, QUALIDADE)
+
+    if GUARDAR_ORIGINAL and resultado.alterada:
+        try:
+            guardar_original(conteudo)
+        except OSError as e:
+            print(f"⚠️ Não foi possível guardar o original: {e}")
+
+    if resultado.alterada:
+        print(f"🖼️ Imagem ({perfil}) normalizada: {resultado.tamanho_original / 1024:.0f} KB → "
+              f"{resultado.tamanho_final / 1024:.0f} KB ({resultado.largura}x{resultado.altura})")
+    return resultado
+
+
+def salvar_em_pasta(conteudo: bytes, pasta: str, nome_arquivo: str, perfil: str = 'evidencia',
+                    mimetype: Optional[str] = None):
+    """
+    Normaliza e grava em pasta/nome_arquivo, trocando a extensão pela do formato final
+
+    Returns:
+        (caminho gravado, ImagemNormalizada)
+    """
+    resultado = normalizar(conteudo, perfil, mimetype)
+    nome_arquivo = secure_filename(nome_arquivo) or 'imagem'
+    if resultado.alterada:
+        nome_arquivo = f'{os.path.splitext(nome_arquivo)[0]}.{resultado.extensao}'
+
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, nome_arquivo)
+    media_store.gravar_atomico(caminho, resultado.conteudo)
+    return caminho, resultado
@@ -0,0 +1,174 @@
+"""
+Operações de inventário em lote (SQL set-based)
+
+Bloqueio/desbloqueio dos lotes são um único UPDATE e a consolidação pivota as
+contagens (1ª, 2ª e 3ª) por lote numa só consulta, já com o peso do sistema.
+As regras de divergência usam tolerância configurável em kg e em percentual.
+"""
+
+import os
+from datetime import datetime
+
+from sqlalchemy import case, func
+
+from app.models import db, Lote, InventarioContagem
+from app.utils import status_lote
+
+TOLERANCIA_KG_PADRAO = float(os.getenv('INVENTARIO_TOLERANCIA_KG', '0.5'))
+TOLERANCIA_PERCENTUAL_PADRAO = float(os.getenv('INVENTARIO_TOLERANCIA_PERCENTUAL', '1.0'))
+
+STATUS_LOTES_INVENTARIAVEIS = (status_lote.EM_ESTOQUE, status_lote.BLOQUEADO_QC, status_lote.BLOQUEADO_INVENTARIO)
+
+
+def obter_tolerancia(data=None):
+    """Tolerância da requisição (tolerancia_kg / tolerancia_percentual) ou a padrão do ambiente"""
+    data = data or {}
+    tolerancia_kg = data.get('tolerancia_kg')
+    tolerancia_percentual = data.get('tolerancia_percentual')
+    return {
+        'kg': float(tolerancia_kg) if tolerancia_kg is not None else TOLERANCIA_KG_PADRAO,
+        'percentual': float(tolerancia_percentual) if tolerancia_percentual is not None else TOLERANCIA_PERCENTUAL_PADRAO
+    }
+
+
+def dentro_tolerancia(a, b, tolerancia):
+    """Dois pesos concordam se a diferença não passa de max(kg, percentual do maior)"""
+    if a is None or b is None:
+        return False
+    limite = max(tolerancia['kg'], max(abs(a), abs(b)) * tolerancia['percentual'] / 100)
+    return abs(a - b) <= limite
+
+
+def _motivo_bloqueio(inventario):
+    return f'Inventário {inventario.numero_inventario}'
+
+
+def bloquear_lotes(inventario, usuario_id):
+    """Bloqueia em um UPDATE os lotes do escopo do inventário. Retorna a quantidade"""
+    query = Lote.query
+    if inventario.localizacao:
+        query = query.filter(Lote.localizacao_atual == inventario.localizacao)
+    else:
+        query = query.filter(Lote.status.in_(STATUS_LOTES_INVENTARIAVEIS))
+
+    return query.update({
+        Lote.bloqueado: True,
+        Lote.tipo_bloqueio: 'INVENTARIO',
+        Lote.motivo_bloqueio: _motivo_bloqueio(inventario),
+        Lote.bloqueado_por_id: usuario_id,
+        Lote.bloqueado_em: datetime.utcnow()
+    }, synchronize_session=False)
+
+
+def desbloquear_lotes(inventario):
+    """Libera em um UPDATE os lotes bloqueados por este inventário. Retorna a quantidade"""
+    return Lote.query.filter(
+        Lote.bloqueado == True,
+        Lote.tipo_bloqueio == 'INVENTARIO',
+        Lote.motivo_bloqueio == _motivo_bloqueio(inventario)
+    ).update({
+        Lote.bloqueado: False,
+        Lote.tipo_bloqueio: None,
+        Lote.motivo_bloqueio: None
+    }, synchronize_session=False)
+
+
+def _pivot_contagens(inventario_id):
+    """Uma linha por lote contado: peso do sistema e as três contagens lado a lado"""
+    def rodada(coluna, numero):
+        return func.max(case((InventarioContagem.numero_contagem == numero, coluna)))
+
+    return db.session.query(
+        Lote.id.label('lote_id'),
+        Lote.numero_lote,
+        Lote.peso_total_kg,
+        rodada(InventarioContagem.peso_contado, 1).label('contagem_1'),
+        rodada(InventarioContagem.peso_contado, 2).label('contagem_2'),
+        rodada(InventarioContagem.peso_contado, 3).label('contagem_3'),
+        func.count(func.distinct(InventarioContagem.numero_contagem)).label('total_contagens')
+    ).join(
+        InventarioContagem, InventarioContagem.lote_id == Lote.id
+    ).filter(
+        InventarioContagem.inventario_id == inventario_id
+    ).group_by(
+        Lote.id, Lote.numero_lote, Lote.peso_total_kg
+    ).order_by(Lote.id).all()
+
+
+def avaliar_lote(peso_sistema, contagem_1, contagem_2, contagem_3, tolerancia):
+    """
+    Aplica as regras de divergência a um lote
+
+    - 1ª e 2ª contagens concordam → peso apurado = 2ª contagem
+    - Discordam sem 3ª contagem → DIVERGENTE (pede recontagem)
+    - 3ª contagem concorda com a 1ª ou a 2ª → desempata, peso apurado = 3ª
+    - Peso apurado fora da tolerância em relação ao sistema → DIVERGENTE_SISTEMA
+
+    Returns:
+        (status, peso_apurado)
+    """
+    if dentro_tolerancia(contagem_1, contagem_2, tolerancia):
+        peso_apurado = contagem_2
+    elif contagem_3 is not None and (
+        dentro_tolerancia(contagem_3, contagem_1, tolerancia) or dentro_tolerancia(contagem_3, contagem_2, tolerancia)
+    ):
+        peso_apurado = contagem_3
+    else:
+        return 'DIVERGENTE', None
+
+    if not dentro_tolerancia(peso_apurado, peso_sistema or 0, tolerancia):
+        return 'DIVERGENTE_SISTEMA', peso_apurado
+    return 'OK', peso_apurado
+
+
+def consolidar(inventario, tolerancia):
+    """
+    Consolida as contagens do inventário
+
+    Returns:
+        dict com 'divergencias' (lotes fora da regra), 'total_lotes' e 'resumo'
+    """
+    linhas = _pivot_contagens(inventario.id)
+
+    divergencias = []
+    resumo = {'OK': 0, 'DIVERGENTE': 0, 'DIVERGENTE_SISTEMA': 0, 'CONTAGEM_INCOMPLETA': 0}
+
+    for linha in linhas:
+        if linha.total_contagens < 2:
+            resumo['CONTAGEM_INCOMPLETA'] += 1
+            continue
+
+        status, peso_apurado = avaliar_lote(
+            linha.peso_total_kg, linha.contagem_1, linha.contagem_2, linha.contagem_3, tolerancia
+        )
+        resumo[status] += 1
+        if status == 'OK':
+            continue
+
+        divergencias.append({
+            'lote_id': linha.lote_id,
+            'lote_numero': linha.numero_lote,
+            'peso_sistema': linha.peso_total_kg,
+            'contagem_1': linha.contagem_1,
+            'contagem_2': linha.contagem_2,
+            'contagem_3': linha.contagem_3,
+            'peso_apurado': peso_apurado,
+            'diferenca_kg': round(peso_apurado - (linha.peso_total_kg or 0), 3) if peso_apurado is not None else None,
+            'status': status
+        })
+
+    # Lotes bloqueados por este inventário que ninguém contou
+    contados = db.session.query(InventarioContagem.lote_id).filter(
+        InventarioContagem.inventario_id == inventario.id
+    )
+    resumo['NAO_CONTADOS'] = Lote.query.filter(
+        Lote.tipo_bloqueio == 'INVENTARIO',
+        Lote.motivo_bloqueio == _motivo_bloqueio(inventario),
+        ~Lote.id.in_(contados)
+    ).count()
+
+    return {
+        'divergencias': divergencias,
+        'total_lotes': len(linhas),
+        'resumo': resumo
+    }
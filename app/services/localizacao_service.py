@@ -0,0 +1,153 @@
+"""
+Localizações do armazém e ocupação por localização
+
+A tabela localizacoes é a lista indexada usada pelos dropdowns e pelo mapa do
+WMS. Cada localização guarda quantidade_lotes e peso_kg, ajustados com UPDATE
+relativo na mesma transação das movimentações. Alterações de peso feitas fora
+das movimentações (conferência, separação) são corrigidas por reconciliar().
+"""
+
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models import db, Localizacao
+from app.utils.cache_referencia import marcar_alterado
+
+# Posições padrão do armazém (ruas A-D, racks 1-5)
+LOCALIZACOES_PADRAO = [f'{rua}{rack}' for rua in 'ABCD' for rack in range(1, 6)]
+
+_SQL_AJUSTAR = text("""
+    UPDATE localizacoes
+    SET quantidade_lotes = GREATEST(0, quantidade_lotes + :lotes),
+        peso_kg = GREATEST(0, peso_kg + :peso),
+        data_atualizacao = NOW()
+    WHERE codigo = :codigo
+""")
+
+_SQLS_RECONCILIAR = [
+    # Códigos usados pelos lotes que ainda não existem na tabela
+    """
+    INSERT INTO localizacoes (codigo, ativo, quantidade_lotes, peso_kg, data_criacao)
+    SELECT DISTINCT localizacao_atual, TRUE, 0, 0, NOW()
+    FROM lotes
+    WHERE localizacao_atual IS NOT NULL AND localizacao_atual <> ''
+    ON CONFLICT (codigo) DO NOTHING
+    """,
+    """
+    UPDATE lotes l SET localizacao_id = loc.id
+    FROM localizacoes loc
+    WHERE loc.codigo = l.localizacao_atual AND l.localizacao_id IS DISTINCT FROM loc.id
+    """,
+    """
+    UPDATE lotes SET localizacao_id = NULL
+    WHERE localizacao_id IS NOT NULL AND (localizacao_atual IS NULL OR localizacao_atual = '')
+    """,
+]
+
+_SQL_RECONCILIAR_OCUPACAO = """
+    UPDATE localizacoes loc
+    SET quantidade_lotes = t.lotes, peso_kg = t.peso, data_atualizacao = NOW()
+    FROM (
+        SELECT l2.id, COUNT(lt.id) AS lotes, COALESCE(SUM(lt.peso_total_kg), 0) AS peso
+        FROM localizacoes l2
+        LEFT JOIN lotes lt ON lt.localizacao_id = l2.id
+        GROUP BY l2.id
+    ) t
+    WHERE loc.id = t.id
+      AND (loc.quantidade_lotes IS DISTINCT FROM t.lotes OR loc.peso_kg IS DISTINCT FROM t.peso)
+    RETURNING loc.codigo
+"""
+
+
+def garantir_localizacoes(codigos):
+    """Cria as localizações que ainda não existem. Retorna {codigo: id}"""
+    codigos = sorted({c for c in codigos if c})
+    if not codigos:
+        return {}
+
+    agora = datetime.utcnow()
+    resultado = db.session.execute(
+        pg_insert(Localizacao).values([{
+            'codigo': codigo,
+            'ativo': True,
+            'quantidade_lotes': 0,
+            'peso_kg': 0,
+            'data_criacao': agora
+        } for codigo in codigos]).on_conflict_do_nothing(index_elements=['codigo'])
+    )
+    if resultado.rowcount:
+        marcar_alterado('localizacoes')
+
+    return dict(db.session.query(Localizacao.codigo, Localizacao.id).filter(
+        Localizacao.codigo.in_(codigos)
+    ).all())
+
+
+def aplicar_movimentos(movimentos):
+    """
+    Ajusta a ocupação de origem e destino das movimentações
+
+    Args:
+        movimentos: Lista de (localizacao_origem, localizacao_destino, peso_kg)
+
+    Returns:
+        {codigo: id} das localizações envolvidas
+    """
+    deltas = defaultdict(lambda: [0, 0.0])
+    for origem, destino, peso in movimentos:
+        peso = float(peso or 0)
+        if origem:
+            deltas[origem][0] -= 1
+            deltas[origem][1] -= peso
+        if destino:
+            deltas[destino][0] += 1
+            deltas[destino][1] += peso
+
+    ids = garantir_localizacoes(deltas.keys())
+
+    # Ordem fixa para que duas transações concorrentes travem as linhas na mesma sequência
+    for codigo in sorted(deltas):
+        lotes, peso = deltas[codigo]
+        if lotes == 0 and abs(peso) < 1e-9:
+            continue
+        db.session.execute(_SQL_AJUSTAR, {'codigo': codigo, 'lotes': lotes, 'peso': peso})
+
+    return ids
+
+
+def mover_lote(lote, destino):
+    """Atualiza localizacao_atual/localizacao_id do lote e a ocupação das duas localizações"""
+    ids = aplicar_movimentos([(lote.localizacao_atual, destino, lote.peso_total_kg)])
+    lote.localizacao_atual = destino
+    lote.localizacao_id = ids.get(destino)
+    return lote
+
+
+def reconciliar(conn=None):
+    """
+    Sincroniza lotes.localizacao_id com localizacao_atual e recalcula a ocupação
+
+    Args:
+        conn: Conexão a usar (migração de startup); padrão é a sessão atual
+
+    Returns:
+        Códigos das localizações cuja ocupação estava divergente
+    """
+    executor = conn if conn is not None else db.session
+    executor.execute(
+        text("""
+            INSERT INTO localizacoes (codigo, ativo, quantidade_lotes, peso_kg, data_criacao)
+            SELECT unnest(CAST(:codigos AS VARCHAR[])), TRUE, 0, 0, NOW()
+            ON CONFLICT (codigo) DO NOTHING
+        """),
+        {'codigos': LOCALIZACOES_PADRAO}
+    )
+    for sql in _SQLS_RECONCILIAR:
+        executor.execute(text(sql))
+    linhas = executor.execute(text(_SQL_RECONCILIAR_OCUPACAO)).fetchall()
+    if conn is None:
+        marcar_alterado('localizacoes')
+    return [linha[0] for linha in linhas]
@@ -1,22 +1,71 @@
 import os
+import threading
+import time
 import requests
-from typing import Optional
+from typing import Dict, Optional, Tuple
+
+from app.services import http_client
 
 PERPLEXITY_API_KEY = os.getenv('PERPLEXITY_API_KEY')
 PERPLEXITY_API_URL = 'https://api.perplexity.ai/chat/completions'
 PERPLEXITY_MODEL = 'llama-3.1-sonar-small-128k-online'
 
+# As explicações dependem só da nota e de faixas dos números, e se repetem muito:
+# ficam em memória por (nota, faixa de componentes, densidade arredondada)
+FAIXA_COMPONENTES = 10
+COMPONENTES_MAXIMO = 200
+CACHE_TTL_EXPLICACAO = 7 * 24 * 3600
+CACHE_MAX_EXPLICACOES = 500
+
+_lock = threading.Lock()
+_explicacoes: Dict[Tuple, Tuple[float, str]] = {}
+
+
+def chave_explicacao(grade: str, components_count: int, density_score: float) -> Tuple:
+    """(nota, início da faixa de componentes, densidade com 2 casas): o que o prompt enxerga"""
+    faixa = min(int(components_count or 0) // FAIXA_COMPONENTES * FAIXA_COMPONENTES, COMPONENTES_MAXIMO)
+    return (grade, faixa, round(float(density_score or 0), 2))
+
+
+def explicacao_em_cache(grade: str, components_count: int, density_score: float) -> Optional[str]:
+    entrada = _explicacoes.get(chave_explicacao(grade, components_count, density_score))
+    if entrada and time.time() < entrada[0]:
+        return entrada[1]
+    return None
+
+
+def _gravar_explicacao(chave: Tuple, texto: str):
+    with _lock:
+        if len(_explicacoes) >= CACHE_MAX_EXPLICACOES:
+            mais_antiga = min(_explicacoes, key=lambda k: _explicacoes[k][0])
+            _explicacoes.pop(mais_antiga, None)
+        _explicacoes[chave] = (time.time() + CACHE_TTL_EXPLICACAO, texto)
+
 
 def build_explanation_with_perplexity(grade: str, components_count: int, density_score: float) -> Optional[str]:
     """
     Usa a API do Perplexity para gerar um parágrafo curto explicando o resultado
     da análise de PCB. Não recebe imagem, apenas dados numéricos.
     
+    O prompt usa as faixas de chave_explicacao(), então a resposta é
+    reaproveitada para todas as placas da mesma faixa.
+    
     Retorna None se a API não estiver configurada ou falhar.
     """
     if not PERPLEXITY_API_KEY:
         return None
     
+    chave = chave_explicacao(grade, components_count, density_score)
+    em_cache = explicacao_em_cache(grade, components_count, density_score)
+    if em_cache:
+        return em_cache
+    
+    _, faixa, densidade = chave
+    if faixa >= COMPONENTES_MAXIMO:
+        componentes_texto = f'{COMPONENTES_MAXIMO} ou mais'
+    else:
+        componentes_texto = f'entre {faixa} e {faixa + FAIXA_COMPONENTES - 1}'
+    
     system_prompt = """Você é um especialista em reciclagem de placas eletrônicas e recuperação de metais preciosos.
 Você receberá dados numéricos sobre a densidade de componentes de uma placa eletrônica analisada.
 Sua tarefa é explicar para um usuário leigo, em português brasileiro simples e direto, por que essa placa foi classificada como LOW, MEDIUM ou HIGH em termos de valor para reciclagem de metais preciosos (principalmente ouro, prata e paládio).
@@ -30,8 +79,8 @@ Seja conciso (máximo 3-4 frases) e foque nos aspectos práticos da classificaç
     
     user_prompt = f"""Dados da análise da placa:
 - Classificação: {grade} ({grade_context.get(grade, '')})
-- Componentes detectados: {components_count}
-- Score de densidade: {density_score:.2f} (0 a 1)
+- Componentes detectados: {componentes_texto}
+- Score de densidade: {densidade:.2f} (0 a 1)
 
 Explique em poucas frases, em português simples e acessível, por que essa placa foi classificada assim e qual seu potencial para reciclagem de metais preciosos como ouro."""
 
@@ -52,7 +101,7 @@ Explique em poucas frases, em português simples e acessível, por que essa plac
             'stream': False
         }
         
-        response = requests.post(
+        response = http_client.post(
             PERPLEXITY_API_URL,
             headers=headers,
             json=payload,
@@ -65,6 +114,7 @@ Explique em poucas frases, em português simples e acessível, por que essa plac
                 message = data['choices'][0].get('message', {})
                 content = message.get('content', '')
                 if content:
+                    _gravar_explicacao(chave, content.strip())
                     return content.strip()
         
         print(f'Perplexity API error: {response.status_code} - {response.text}')
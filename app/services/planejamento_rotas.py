@@ -0,0 +1,298 @@
+"""
+Planejamento das coletas do dia a partir das OS abertas
+
+Junta as OS de coleta ainda sem motorista (status PENDENTE) cuja janela cai no
+dia, as coordenadas dos fornecedores, o peso previsto de cada solicitação e a
+frota disponível (motoristas ativos com veículo), e passa tudo para a
+roteirização (app.services.roteirizacao). Ao aplicar, cada OS recebe
+motorista, veículo e status AGENDADA, e uma RotaOperacional com a sequência
+completa da rota.
+
+OS de "Fornecedor Entrega" não entram (não há coleta) e fornecedores sem
+latitude/longitude são devolvidos à parte para serem atribuídos manualmente.
+
+Configuração (variáveis de ambiente):
+    LOGISTICA_BASE_LATITUDE        Ponto de saída e retorno dos veículos
+    LOGISTICA_BASE_LONGITUDE
+    ROTEIRIZACAO_HORA_SAIDA        HH:MM (padrão 08:00)
+    ROTEIRIZACAO_HORA_RETORNO      HH:MM (padrão 18:00)
+    ROTEIRIZACAO_VELOCIDADE_KMH    Velocidade média (padrão 30)
+    ROTEIRIZACAO_FATOR_ESTRADA     Distância pelas ruas / linha reta (padrão 1.3)
+    ROTEIRIZACAO_TEMPO_SERVICO     Minutos em cada fornecedor (padrão 20)
+    ROTEIRIZACAO_TEMPO_LIMITE      Segundos de melhoria local no script offline (padrão 20)
+    ROTEIRIZACAO_TEMPO_LIMITE_HTTP Segundos de melhoria local pela API (padrão 3)
+
+O cálculo (só NumPy, sem banco) roda numa thread do sistema operacional
+(eventlet.tpool quando o servidor está com monkey_patch), então uma
+roteirização pela API não congela as outras requisições nem o Socket.IO.
+"""
+
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import func, insert, or_
+
+from app.models import (
+    db, Fornecedor, ItemSolicitacao, Motorista, Notificacao, OrdemCompra,
+    OrdemServico, RotaOperacional, Solicitacao, Veiculo
+)
+from app.services.roteirizacao import Configuracao, Parada, VeiculoRota, roteirizar
+from app.utils.auditoria import registrar_eventos_em_lote
+
+STATUS_PLANEJAVEL = 'PENDENTE'
+
+
+def _minutos(hora: str) -> float:
+    horas, minutos = hora.split(':')
+    return int(horas) * 60 + int(minutos)
+
+
+def _hora(minutos: float, dia: date) -> datetime:
+    return datetime.combine(dia, time()) + timedelta(minutes=round(minutos))
+
+
+def base_padrao():
+    """(latitude, longitude) da base pelas variáveis de ambiente, ou None"""
+    latitude = os.getenv('LOGISTICA_BASE_LATITUDE')
+    longitude = os.getenv('LOGISTICA_BASE_LONGITUDE')
+    if not latitude or not longitude:
+        return None
+    return float(latitude), float(longitude)
+
+
+def configuracao(hora_saida: Optional[str] = None, hora_retorno: Optional[str] = None,
+                 requisicao_http: bool = False) -> Configuracao:
+    if requisicao_http:
+        tempo_limite = float(os.getenv('ROTEIRIZACAO_TEMPO_LIMITE_HTTP', '3'))
+    else:
+        tempo_limite = float(os.getenv('ROTEIRIZACAO_TEMPO_LIMITE', '20'))
+    return Configuracao(
+        saida=_minutos(hora_saida or os.getenv('ROTEIRIZACAO_HORA_SAIDA', '08:00')),
+        retorno=_minutos(hora_retorno or os.getenv('ROTEIRIZACAO_HORA_RETORNO', '18:00')),
+        velocidade_kmh=float(os.getenv('ROTEIRIZACAO_VELOCIDADE_KMH', '30')),
+        fator_estrada=float(os.getenv('ROTEIRIZACAO_FATOR_ESTRADA', '1.3')),
+        tempo_limite=tempo_limite,
+    )
+
+
+def _executar_fora_do_hub(funcao, *args):
+    try:
+        from eventlet import patcher, tpool
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(funcao, *args)
+    except ImportError:
+        pass
+    return funcao(*args)
+
+
+def carregar_paradas(dia: date):
+    """
+    OS planejáveis no dia como paradas da roteirização
+
+    Returns:
+        (paradas, {os_id: OrdemServico}, [OS sem coordenadas do fornecedor])
+    """
+    inicio_dia = datetime.combine(dia, time())
+    fim_dia = inicio_dia + timedelta(days=1)
+    tempo_servico = float(os.getenv('ROTEIRIZACAO_TEMPO_SERVICO', '20'))
+
+    linhas = db.session.query(OrdemServico, Fornecedor.latitude, Fornecedor.longitude).join(
+        OrdemCompra, OrdemCompra.id == OrdemServico.oc_id
+    ).join(
+        Solicitacao, Solicitacao.id == OrdemCompra.solicitacao_id
+    ).join(
+        Fornecedor, Fornecedor.id == OrdemCompra.fornecedor_id
+    ).filter(
+        OrdemServico.status == STATUS_PLANEJAVEL,
+        OrdemServico.tipo == 'COLETA',
+        OrdemServico.motorista_id.is_(None),
+        Solicitacao.tipo_retirada != 'entregar',
+        or_(OrdemServico.janela_coleta_inicio.is_(None), OrdemServico.janela_coleta_inicio < fim_dia),
+        or_(OrdemServico.janela_coleta_fim.is_(None), OrdemServico.janela_coleta_fim >= inicio_dia)
+    ).order_by(OrdemServico.id).all()
+
+    ordens = {ordem.id: ordem for ordem, _, _ in linhas}
+    pesos = dict(db.session.query(
+        OrdemServico.id, func.coalesce(func.sum(ItemSolicitacao.peso_kg), 0)
+    ).join(
+        OrdemCompra, OrdemCompra.id == OrdemServico.oc_id
+    ).join(
+        ItemSolicitacao, ItemSolicitacao.solicitacao_id == OrdemCompra.solicitacao_id
+    ).filter(
+        OrdemServico.id.in_(list(ordens) or [0])
+    ).group_by(OrdemServico.id).all())
+
+    paradas = []
+    sem_coordenadas = []
+    for ordem, latitude, longitude in linhas:
+        if latitude is None or longitude is None:
+            sem_coordenadas.append(ordem)
+            continue
+        janela_inicio = janela_fim = None
+        if ordem.janela_coleta_inicio and ordem.janela_coleta_inicio > inicio_dia:
+            janela_inicio = (ordem.janela_coleta_inicio - inicio_dia).total_seconds() / 60
+        if ordem.janela_coleta_fim and ordem.janela_coleta_fim < fim_dia:
+            janela_fim = (ordem.janela_coleta_fim - inicio_dia).total_seconds() / 60
+        paradas.append(Parada(
+            id=ordem.id,
+            latitude=latitude,
+            longitude=longitude,
+            demanda=float(pesos.get(ordem.id, 0)),
+            janela_inicio=janela_inicio,
+            janela_fim=janela_fim,
+            tempo_servico=tempo_servico,
+        ))
+    return paradas, ordens, sem_coordenadas
+
+
+def carregar_frota(motorista_ids: Optional[Iterable[int]] = None):
+    """Motoristas ativos com veículo ativo (um motorista por veículo)"""
+    query = db.session.query(Motorista.id, Veiculo.id, Veiculo.capacidade).join(
+        Veiculo, Veiculo.id == Motorista.veiculo_id
+    ).filter(
+        Motorista.ativo == True,
+        Veiculo.ativo == True
+    )
+    if motorista_ids:
+        query = query.filter(Motorista.id.in_(list(motorista_ids)))
+
+    frota = []
+    veiculos_usados = set()
+    for motorista_id, veiculo_id, capacidade in query.order_by(Motorista.id).all():
+        if veiculo_id in veiculos_usados:
+            continue
+        veiculos_usados.add(veiculo_id)
+        frota.append(VeiculoRota(veiculo_id, capacidade, motorista_id))
+    return frota
+
+
+def planejar(dia: date, base=None, motorista_ids=None, hora_saida=None, hora_retorno=None,
+             requisicao_http: bool = False) -> dict:
+    """
+    Monta (sem gravar) as rotas do dia
+
+    Raises:
+        ValueError: base não informada nem configurada
+    """
+    base = base or base_padrao()
+    if not base:
+        raise ValueError('Informe a base (latitude/longitude) ou configure LOGISTICA_BASE_LATITUDE/LONGITUDE')
+
+    config = configuracao(hora_saida, hora_retorno, requisicao_http)
+    paradas, ordens, sem_coordenadas = carregar_paradas(dia)
+    frota = carregar_frota(motorista_ids)
+    plano = _executar_fora_do_hub(roteirizar, base, paradas, frota, config)
+
+    for numero, rota in enumerate(plano['rotas'], start=1):
+        rota['codigo'] = f'ROTA-{dia:%Y%m%d}-{numero:02d}'
+        rota['saida'] = _hora(rota['saida'], dia).isoformat()
+        rota['retorno'] = _hora(rota['retorno'], dia).isoformat()
+        for parada in rota['paradas']:
+            ordem = ordens[parada['id']]
+            parada['os_id'] = parada.pop('id')
+            parada['numero_os'] = ordem.numero_os
+            parada['fornecedor'] = (ordem.fornecedor_snapshot or {}).get('nome')
+            parada['inicio_atendimento'] = _hora(parada['inicio_atendimento'], dia).isoformat()
+
+    plano['data'] = dia.isoformat()
+    plano['base'] = {'latitude': base[0], 'longitude': base[1]}
+    plano['veiculos_disponiveis'] = len(frota)
+    plano['total_os'] = len(paradas) + len(sem_coordenadas)
+    plano['sem_coordenadas'] = [
+        {'os_id': ordem.id, 'numero_os': ordem.numero_os, 'fornecedor': (ordem.fornecedor_snapshot or {}).get('nome')}
+        for ordem in sem_coordenadas
+    ]
+    return plano
+
+
+def aplicar(plano: dict, usuario_id) -> dict:
+    """
+    Grava o plano (sem commit): motorista/veículo/status nas OS, RotaOperacional
+    e notificação para cada motorista
+
+    OS que mudaram desde o planejamento (já atribuídas ou canceladas) são
+    ignoradas e devolvidas em 'ignoradas'.
+    """
+    ids = [parada['os_id'] for rota in plano['rotas'] for parada in rota['paradas']]
+    ordens = {
+        ordem.id: ordem for ordem in OrdemServico.query.filter(
+            OrdemServico.id.in_(ids or [0])
+        ).with_for_update().all()
+    }
+    usuarios_motoristas = dict(db.session.query(Motorista.id, Motorista.usuario_id).filter(
+        Motorista.id.in_([rota['motorista_id'] for rota in plano['rotas']] or [0])
+    ).all())
+
+    agendadas = 0
+    ignoradas = []
+    notificacoes = []
+    eventos = []
+    for rota in plano['rotas']:
+        pontos = [{
+            'sequencia': parada['sequencia'],
+            'os_id': parada['os_id'],
+            'numero_os': parada['numero_os'],
+            'fornecedor': parada['fornecedor'],
+            'inicio_atendimento': parada['inicio_atendimento'],
+            'km_trecho': parada['km_trecho'],
+        } for parada in rota['paradas']]
+        ultima = rota['paradas'][-1]['os_id']
+        agendadas_rota = 0
+
+        for parada in rota['paradas']:
+            ordem = ordens.get(parada['os_id'])
+            if ordem is None or ordem.status != STATUS_PLANEJAVEL or ordem.motorista_id is not None:
+                ignoradas.append(parada['os_id'])
+                continue
+
+            ordem.motorista_id = rota['motorista_id']
+            ordem.veiculo_id = rota['veiculo_id']
+            ordem.status = 'AGENDADA'
+            ordem.rota = {
+                'codigo': rota['codigo'],
+                'sequencia': parada['sequencia'],
+                'total_paradas': len(rota['paradas']),
+                'inicio_atendimento': parada['inicio_atendimento'],
+            }
+            # km do trecho até a parada; a última leva também a volta à base
+            km_estimado = parada['km_trecho'] + (rota['km_retorno'] if parada['os_id'] == ultima else 0)
+            db.session.add(RotaOperacional(
+                os_id=ordem.id,
+                motorista_id=rota['motorista_id'],
+                veiculo_id=rota['veiculo_id'],
+                pontos={
+                    'codigo': rota['codigo'],
+                    'sequencia': parada['sequencia'],
+                    'km_rota': rota['km'],
+                    'base': plano['base'],
+                    'paradas': pontos,
+                },
+                km_estimado=round(km_estimado, 3),
+            ))
+            eventos.append((ordem.id, {'detalhes': {
+                'codigo': rota['codigo'],
+                'sequencia': parada['sequencia'],
+                'motorista_id': rota['motorista_id'],
+                'veiculo_id': rota['veiculo_id'],
+            }}))
+            agendadas_rota += 1
+
+        usuario_motorista = usuarios_motoristas.get(rota['motorista_id'])
+        if agendadas_rota and usuario_motorista:
+            notificacoes.append({
+                'usuario_id': usuario_motorista,
+                'titulo': 'Nova Rota de Coleta',
+                'mensagem': f"Rota {rota['codigo']}: {agendadas_rota} coleta(s), {rota['km']:.1f} km previstos. "
+                            f"Saída às {rota['saida'][11:16]}.",
+                'url': '/logistica.html',
+                'lida': False,
+            })
+        agendadas += agendadas_rota
+
+    if eventos:
+        registrar_eventos_em_lote(OrdemServico.__tablename__, 'ROTEIRIZACAO', eventos, usuario_id)
+    if notificacoes:
+        db.session.execute(insert(Notificacao), notificacoes)
+
+    return {'agendadas': agendadas, 'ignoradas': ignoradas}
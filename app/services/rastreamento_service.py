@@ -0,0 +1,163 @@
+"""
+Ingestão dos pontos de rastreio enviados pelo app do motorista
+
+O PWA acumula pontos GPS enquanto o motorista está em rota e envia em lotes
+(POST /api/os/<id>/gps/batch). Os pontos viram linhas de gps_logs com evento
+RASTREIO, gravadas num único INSERT em lote. O vínculo usuário → motorista
+fica em memória por alguns minutos, já que é consultado a cada lote.
+
+Reenvios do mesmo lote (rede instável) não duplicam pontos: timestamps já
+gravados para a OS são ignorados.
+"""
+
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.models import db, GPSLog, Motorista
+
+EVENTO_RASTREIO = 'RASTREIO'
+MAX_PONTOS_LOTE = 2000
+TOLERANCIA_FUTURO = timedelta(minutes=5)
+CACHE_TTL_MOTORISTA = 300
+
+_lock = threading.Lock()
+_motoristas: Dict[int, Tuple[float, int]] = {}
+
+
+def motorista_id_do_usuario(usuario_id) -> Optional[int]:
+    """Id do motorista vinculado ao usuário (cacheado por CACHE_TTL_MOTORISTA segundos)"""
+    usuario_id = int(usuario_id)
+    entrada = _motoristas.get(usuario_id)
+    if entrada and time.time() < entrada[0]:
+        return entrada[1]
+
+    motorista_id = db.session.query(Motorista.id).filter_by(usuario_id=usuario_id).scalar()
+    if motorista_id is not None:
+        with _lock:
+            _motoristas[usuario_id] = (time.time() + CACHE_TTL_MOTORISTA, motorista_id)
+    return motorista_id
+
+
+def esquecer_motorista(usuario_id=None):
+    """
+    Remove o vínculo do cache (None limpa tudo)
+
+    Chamado quando motorista ou usuário é alterado, desativado ou excluído.
+    Outros processos do servidor expiram o vínculo em CACHE_TTL_MOTORISTA.
+    """
+    with _lock:
+        if usuario_id is None:
+            _motoristas.clear()
+        else:
+            _motoristas.pop(int(usuario_id), None)
+
+
+def _converter_timestamp(valor) -> Optional[datetime]:
+    """ISO 8601 ou epoch (segundos ou milissegundos) → datetime UTC sem fuso"""
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float)):
+        segundos = valor / 1000 if valor > 1e11 else valor
+        return datetime.fromtimestamp(segundos, tz=timezone.utc).replace(tzinfo=None)
+    momento = datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    if momento.tzinfo is not None:
+        momento = momento.astimezone(timezone.utc).replace(tzinfo=None)
+    return momento
+
+
+def _converter_ponto(ponto: dict, agora: datetime) -> dict:
+    """
+    Valida um ponto do lote
+
+    Raises:
+        ValueError: coordenada ou horário inválido
+    """
+    latitude = float(ponto['latitude'])
+    longitude = float(ponto['longitude'])
+    if not (math.isfinite(latitude) and math.isfinite(longitude)):
+        raise ValueError('coordenada inválida')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('coordenada fora do intervalo')
+
+    momento = _converter_timestamp(ponto.get('timestamp'))
+    if momento is None:
+        raise ValueError('timestamp obrigatório')
+    if momento > agora + TOLERANCIA_FUTURO:
+        raise ValueError('timestamp no futuro')
+
+    precisao = ponto.get('precisao')
+    extras = {
+        chave: ponto[chave] for chave in ('velocidade', 'direcao', 'altitude')
+        if ponto.get(chave) is not None
+    }
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'precisao': float(precisao) if precisao is not None else None,
+        'timestamp': momento,
+        'dados_adicionais': extras or None,
+    }
+
+
+def inserir_pontos(os_id: int, pontos: List[dict], device_id: Optional[str] = None,
+                   ip: Optional[str] = None) -> dict:
+    """
+    Grava os pontos de rastreio da OS (sem commit)
+
+    Returns:
+        {'recebidos', 'inseridos', 'duplicados', 'rejeitados', 'erros', 'ultimo_ponto'}
+    """
+    agora = datetime.utcnow()
+    validos = {}
+    erros = []
+    rejeitados = 0
+    for indice, ponto in enumerate(pontos):
+        try:
+            linha = _converter_ponto(ponto, agora)
+        except (KeyError, TypeError, ValueError, OverflowError, OSError) as e:
+            rejeitados += 1
+            if len(erros) < 20:
+                erros.append({'indice': indice, 'erro': str(e) if not isinstance(e, KeyError) else f'campo {e} obrigatório'})
+            continue
+        # Dois pontos no mesmo instante: fica o último enviado
+        validos[linha['timestamp']] = linha
+
+    duplicados = 0
+    if validos:
+        existentes = {
+            momento for (momento,) in db.session.query(GPSLog.timestamp).filter(
+                GPSLog.os_id == os_id,
+                GPSLog.evento == EVENTO_RASTREIO,
+                GPSLog.timestamp.between(min(validos), max(validos))
+            ).all()
+        }
+        duplicados = sum(1 for momento in validos if momento in existentes)
+        linhas = [
+            dict(linha, os_id=os_id, evento=EVENTO_RASTREIO, device_id=device_id, ip=ip)
+            for momento, linha in sorted(validos.items())
+            if momento not in existentes
+        ]
+    else:
+        linhas = []
+
+    if linhas:
+        db.session.execute(insert(GPSLog), linhas)
+
+    ultimo = linhas[-1] if linhas else None
+    return {
+        'recebidos': len(pontos),
+        'inseridos': len(linhas),
+        'duplicados': duplicados,
+        'rejeitados': rejeitados,
+        'erros': erros,
+        'ultimo_ponto': {
+            'latitude': ultimo['latitude'],
+            'longitude': ultimo['longitude'],
+            'timestamp': ultimo['timestamp'].isoformat()
+        } if ultimo else None
+    }
@@ -0,0 +1,371 @@
+"""
+Roteirização das coletas do dia (roteamento de veículos com capacidade e
+janelas de horário)
+
+Entrada: a base (ponto de saída e retorno), as paradas (fornecedores com
+coordenadas, peso previsto e janela de coleta) e os veículos disponíveis com
+suas capacidades. Saída: uma rota por veículo, na ordem de visita, e as
+paradas que não couberam no dia.
+
+Heurística:
+    1. Matriz de distâncias de uma vez com NumPy (haversine × FATOR_ESTRADA,
+       já que a distância em linha reta subestima o trajeto pelas ruas)
+    2. Construção pelo vizinho mais próximo: cada veículo sai da base para a
+       parada viável mais distante e daí segue sempre para a mais próxima que
+       ainda cabe na carga e na janela
+    3. Melhoria local até não haver ganho (ou TEMPO_LIMITE):
+       - 2-opt dentro de cada rota (inverte trechos que se cruzam)
+       - Or-opt: move sequências de 1 a 3 paradas para outra posição, na
+         mesma rota ou em outra, respeitando capacidade e janelas
+       - Paradas não atendidas são reinseridas onde ficarem mais baratas
+
+Este módulo não acessa o banco: recebe e devolve estruturas simples, para
+ser usado pelo planejamento (planejamento_rotas) e pelo benchmark
+(testar_roteirizacao.py). Horários são minutos desde 00:00 do dia.
+"""
+
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+RAIO_TERRA_KM = 6371.0088
+EPS = 1e-9
+TAMANHO_MAXIMO_SEGMENTO = 3
+
+
+class Parada(NamedTuple):
+    id: int
+    latitude: float
+    longitude: float
+    demanda: float = 0.0                   # kg previstos
+    janela_inicio: Optional[float] = None  # minutos desde 00:00
+    janela_fim: Optional[float] = None
+    tempo_servico: float = 20.0            # minutos no fornecedor
+
+
+class VeiculoRota(NamedTuple):
+    id: int
+    capacidade: Optional[float] = None  # kg; None = sem limite
+    motorista_id: Optional[int] = None
+
+
+class Configuracao(NamedTuple):
+    saida: float = 8 * 60         # horário de saída da base
+    retorno: float = 18 * 60      # horário limite de volta à base
+    velocidade_kmh: float = 30.0
+    fator_estrada: float = 1.3
+    tempo_limite: float = 20.0    # segundos de melhoria local
+
+
+def matriz_distancias_km(latitudes: Sequence[float], longitudes: Sequence[float],
+                         fator_estrada: float = 1.0) -> np.ndarray:
+    """Distâncias (km) entre todos os pares de pontos, calculadas de uma vez"""
+    lat = np.radians(np.asarray(latitudes, dtype=float))[:, None]
+    lng = np.radians(np.asarray(longitudes, dtype=float))[:, None]
+    a = np.sin((lat - lat.T) / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin((lng - lng.T) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))) * fator_estrada
+
+
+class _Roteirizador:
+    """Estado da roteirização; o nó 0 é a base e o nó i é paradas[i - 1]"""
+
+    def __init__(self, base, paradas: Sequence[Parada], veiculos: Sequence[VeiculoRota], config: Configuracao):
+        self.paradas = list(paradas)
+        self.config = config
+        # Maiores primeiro: o vizinho mais próximo enche os veículos grandes antes
+        self.veiculos = sorted(
+            veiculos, key=lambda v: -(v.capacidade if v.capacidade is not None else np.inf)
+        )
+
+        latitudes = [base[0]] + [p.latitude for p in self.paradas]
+        longitudes = [base[1]] + [p.longitude for p in self.paradas]
+        self.D = matriz_distancias_km(latitudes, longitudes, config.fator_estrada)
+        self.T = self.D / config.velocidade_kmh * 60
+        # Listas para acesso escalar (indexar ndarray elemento a elemento é lento)
+        self.Dl = self.D.tolist()
+        self.Tl = self.T.tolist()
+
+        self.demanda = np.array([0.0] + [p.demanda or 0.0 for p in self.paradas])
+        self.inicio = np.array([config.saida] + [
+            p.janela_inicio if p.janela_inicio is not None else -np.inf for p in self.paradas
+        ])
+        self.fim = np.array([config.retorno] + [
+            p.janela_fim if p.janela_fim is not None else np.inf for p in self.paradas
+        ])
+        self.servico = np.array([0.0] + [p.tempo_servico for p in self.paradas])
+        self.capacidade = [v.capacidade if v.capacidade is not None else np.inf for v in self.veiculos]
+
+        self.inicio_l = self.inicio.tolist()
+        self.fim_l = self.fim.tolist()
+        self.servico_l = self.servico.tolist()
+        self.demanda_l = self.demanda.tolist()
+
+    # --- avaliação ---
+
+    def horarios(self, rota: List[int]) -> Optional[List[float]]:
+        """Início do atendimento em cada parada, ou None se alguma janela estourar"""
+        t = self.config.saida
+        anterior = 0
+        inicios = []
+        for no in rota:
+            t += self.Tl[anterior][no]
+            if t < self.inicio_l[no]:
+                t = self.inicio_l[no]  # chegou cedo: espera abrir
+            if t > self.fim_l[no]:
+                return None
+            inicios.append(t)
+            t += self.servico_l[no]
+            anterior = no
+        if t + self.Tl[anterior][0] > self.config.retorno:
+            return None
+        return inicios
+
+    def km(self, rota: List[int]) -> float:
+        if not rota:
+            return 0.0
+        caminho = [0] + rota + [0]
+        return sum(self.Dl[a][b] for a, b in zip(caminho, caminho[1:]))
+
+    def carga(self, rota: List[int]) -> float:
+        return sum(self.demanda_l[no] for no in rota)
+
+    # --- construção ---
+
+    def vizinho_mais_proximo(self):
+        n = len(self.paradas)
+        pendente = np.ones(n + 1, dtype=bool)
+        pendente[0] = False
+        # Parada que não cabe em nenhum veículo nunca será atendida
+        pendente &= self.demanda <= max(self.capacidade, default=0) + EPS
+
+        rotas = []
+        for capacidade in self.capacidade:
+            rota = []
+            atual, t, carga = 0, self.config.saida, 0.0
+            while True:
+                chegada = t + self.T[atual]
+                inicio = np.maximum(chegada, self.inicio)
+                viaveis = (
+                    pendente
+                    & (carga + self.demanda <= capacidade + EPS)
+                    & (inicio <= self.fim)
+                    & (inicio + self.servico + self.T[:, 0] <= self.config.retorno)
+                )
+                if not viaveis.any():
+                    break
+                candidatos = np.flatnonzero(viaveis)
+                if atual == 0:
+                    # Semente: a parada viável mais distante da base. As próximas
+                    # vão sendo pegas no caminho, e a rota não termina espalhada
+                    proximo = int(candidatos[np.argmax(self.D[0, candidatos])])
+                else:
+                    proximo = int(candidatos[np.argmin(self.D[atual, candidatos])])
+                rota.append(proximo)
+                pendente[proximo] = False
+                carga += self.demanda_l[proximo]
+                t = inicio[proximo] + self.servico_l[proximo]
+                atual = proximo
+            rotas.append(rota)
+
+        visitadas = {no for rota in rotas for no in rota}
+        nao_atendidas = [no for no in range(1, n + 1) if no not in visitadas]
+        return rotas, nao_atendidas
+
+    # --- melhoria local ---
+
+    def dois_opt(self, rota: List[int]) -> List[int]:
+        """Inverte trechos enquanto houver ganho (distância simétrica: o interior não muda)"""
+        D = self.D
+        melhorou = True
+        while melhorou and len(rota) >= 2:
+            melhorou = False
+            caminho = np.array([0] + rota + [0])
+            n = len(caminho)
+            for i in range(n - 3):
+                a, b = caminho[i], caminho[i + 1]
+                j = np.arange(i + 2, n - 1)
+                c, d = caminho[j], caminho[j + 1]
+                deltas = D[a, c] + D[b, d] - D[a, b] - D[c, d]
+                for k in np.argsort(deltas):
+                    if deltas[k] >= -EPS:
+                        break
+                    fim_trecho = int(j[k])
+                    nova = rota[:i] + rota[i:fim_trecho][::-1] + rota[fim_trecho:]
+                    if self.horarios(nova) is not None:
+                        rota = nova
+                        melhorou = True
+                        break
+                if melhorou:
+                    break
+        return rota
+
+    def mover_segmento(self, rotas: List[List[int]], cargas: List[float], origem: int) -> bool:
+        """
+        Or-opt: tenta levar uma sequência de 1 a 3 paradas da rota origem para
+        a posição mais barata (mesma rota ou outra). Aplica o primeiro ganho
+        viável e retorna True
+        """
+        D, Dl = self.D, self.Dl
+        rota = rotas[origem]
+        for tamanho in range(min(TAMANHO_MAXIMO_SEGMENTO, len(rota)), 0, -1):
+            for s in range(len(rota) - tamanho + 1):
+                segmento = rota[s:s + tamanho]
+                primeiro, ultimo = segmento[0], segmento[-1]
+                anterior = rota[s - 1] if s > 0 else 0
+                seguinte = rota[s + tamanho] if s + tamanho < len(rota) else 0
+                ganho = Dl[anterior][primeiro] + Dl[ultimo][seguinte] - Dl[anterior][seguinte]
+                if ganho <= EPS:
+                    continue
+                demanda_segmento = sum(self.demanda_l[no] for no in segmento)
+                restante = rota[:s] + rota[s + tamanho:]
+
+                for destino in range(len(rotas)):
+                    if destino == origem:
+                        base = restante
+                    elif cargas[destino] + demanda_segmento > self.capacidade[destino] + EPS:
+                        continue
+                    else:
+                        base = rotas[destino]
+
+                    caminho = np.array([0] + base + [0])
+                    x, y = caminho[:-1], caminho[1:]
+                    custos = [(D[x, primeiro] + D[ultimo, y] - D[x, y], segmento)]
+                    if tamanho > 1:
+                        custos.append((D[x, ultimo] + D[primeiro, y] - D[x, y], segmento[::-1]))
+
+                    for custo, inserido in custos:
+                        for posicao in np.argsort(custo):
+                            if custo[posicao] >= ganho - EPS:
+                                break
+                            posicao = int(posicao)
+                            nova = base[:posicao] + inserido + base[posicao:]
+                            if self.horarios(nova) is None:
+                                continue
+                            if destino == origem:
+                                rotas[origem] = nova
+                            else:
+                                # Tirar paradas não atrasa as demais (desigualdade triangular)
+                                rotas[origem] = restante
+                                rotas[destino] = nova
+                                cargas[origem] -= demanda_segmento
+                                cargas[destino] += demanda_segmento
+                            return True
+        return False
+
+    def inserir_pendentes(self, rotas: List[List[int]], cargas: List[float], pendentes: List[int]) -> List[int]:
+        """Insere cada parada pendente na posição viável mais barata; devolve as que sobraram"""
+        D = self.D
+        sobraram = []
+        for no in sorted(pendentes, key=lambda p: -self.demanda_l[p]):
+            opcoes = []
+            for indice, base in enumerate(rotas):
+                if cargas[indice] + self.demanda_l[no] > self.capacidade[indice] + EPS:
+                    continue
+                caminho = np.array([0] + base + [0])
+                custo = D[caminho[:-1], no] + D[no, caminho[1:]] - D[caminho[:-1], caminho[1:]]
+                opcoes.extend((float(c), indice, posicao) for posicao, c in enumerate(custo))
+            for _, indice, posicao in sorted(opcoes):
+                nova = rotas[indice][:posicao] + [no] + rotas[indice][posicao:]
+                if self.horarios(nova) is not None:
+                    rotas[indice] = nova
+                    cargas[indice] += self.demanda_l[no]
+                    break
+            else:
+                sobraram.append(no)
+        return sobraram
+
+    def resolver(self) -> dict:
+        inicio_execucao = time.perf_counter()
+        limite = inicio_execucao + self.config.tempo_limite
+
+        rotas, pendentes = self.vizinho_mais_proximo()
+        km_inicial = sum(self.km(r) for r in rotas)
+        atendidas_inicial = sum(len(r) for r in rotas)
+        cargas = [self.carga(r) for r in rotas]
+
+        iteracoes = 0
+        while time.perf_counter() < limite:
+            iteracoes += 1
+            if pendentes:
+                pendentes = self.inserir_pendentes(rotas, cargas, pendentes)
+            rotas = [self.dois_opt(r) for r in rotas]
+            melhorou = False
+            for origem in range(len(rotas)):
+                while time.perf_counter() < limite and self.mover_segmento(rotas, cargas, origem):
+                    melhorou = True
+            if not melhorou:
+                break
+
+        return self._resultado(rotas, pendentes, km_inicial, atendidas_inicial, iteracoes,
+                               time.perf_counter() - inicio_execucao)
+
+    def _resultado(self, rotas, pendentes, km_inicial, atendidas_inicial, iteracoes, duracao) -> dict:
+        saida = []
+        for veiculo, capacidade, rota in zip(self.veiculos, self.capacidade, rotas):
+            if not rota:
+                continue
+            inicios = self.horarios(rota)
+            anterior = 0
+            paradas = []
+            for sequencia, (no, inicio) in enumerate(zip(rota, inicios), start=1):
+                paradas.append({
+                    'id': self.paradas[no - 1].id,
+                    'sequencia': sequencia,
+                    'inicio_atendimento': round(inicio, 1),
+                    'km_trecho': round(self.Dl[anterior][no], 3),
+                })
+                anterior = no
+            saida.append({
+                'veiculo_id': veiculo.id,
+                'motorista_id': veiculo.motorista_id,
+                'capacidade': None if capacidade == np.inf else capacidade,
+                'carga': round(self.carga(rota), 2),
+                'km': round(self.km(rota), 3),
+                'km_retorno': round(self.Dl[anterior][0], 3),
+                'saida': self.config.saida,
+                'retorno': round(inicios[-1] + self.servico_l[anterior] + self.Tl[anterior][0], 1),
+                'paradas': paradas,
+            })
+
+        return {
+            'rotas': saida,
+            'nao_atendidas': [self.paradas[no - 1].id for no in pendentes],
+            'km_total': round(sum(r['km'] for r in saida), 3),
+            'km_vizinho_mais_proximo': round(km_inicial, 3),
+            'atendidas_vizinho_mais_proximo': atendidas_inicial,
+            'iteracoes': iteracoes,
+            'tempo_segundos': round(duracao, 3),
+        }
+
+
+def roteirizar(base, paradas: Sequence[Parada], veiculos: Sequence[VeiculoRota],
+               config: Optional[Configuracao] = None) -> Dict:
+    """
+    Monta as rotas do dia
+
+    Args:
+        base: (latitude, longitude) de saída e retorno
+        paradas: Fornecedores a visitar
+        veiculos: Veículos disponíveis (no máximo uma rota por veículo)
+        config: Horários, velocidade média e fator de estrada
+
+    Returns:
+        {'rotas': [{'veiculo_id', 'motorista_id', 'capacidade', 'carga', 'km',
+                    'km_retorno', 'saida', 'retorno', 'paradas': [{'id', 'sequencia',
+                    'inicio_atendimento', 'km_trecho'}]}],
+         'nao_atendidas': [ids], 'km_total', 'km_vizinho_mais_proximo',
+         'atendidas_vizinho_mais_proximo', 'iteracoes', 'tempo_segundos'}
+    """
+    config = config or Configuracao()
+    if not paradas or not veiculos:
+        return {
+            'rotas': [],
+            'nao_atendidas': [p.id for p in paradas],
+            'km_total': 0.0,
+            'km_vizinho_mais_proximo': 0.0,
+            'atendidas_vizinho_mais_proximo': 0,
+            'iteracoes': 0,
+            'tempo_segundos': 0.0,
+        }
+    return _Roteirizador(base, paradas, veiculos, config).resolver()
@@ -0,0 +1,122 @@
+"""
+Reaproveitamento de análises do scanner para imagens quase idênticas
+
+Compradores costumam escanear a mesma placa de novo ou reenviar a mesma foto.
+Cada imagem analisada recebe um dHash de 64 bits (tabela scanner_imagem_hashes);
+uma nova imagem a até SCANNER_PHASH_DISTANCIA bits (distância de Hamming) de
+uma análise anterior recebe a mesma nota e explicação, sem passar de novo pelo
+OpenCV nem pelo Perplexity.
+
+O hash é guardado em 4 faixas de 16 bits indexadas. Pelo princípio da casa dos
+pombos, hashes a até 3 bits de distância têm ao menos uma faixa igual, então a
+busca é exata até 3. Distâncias maiores são aceitas, mas só encontram vizinhos
+que ainda compartilham uma faixa. SCANNER_PHASH_DISTANCIA=-1 desativa.
+"""
+
+import io
+import os
+from typing import Optional, Tuple
+
+from sqlalchemy import or_
+
+from app.models import db, ScannerAnalysis, ScannerImagemHash
+
+DISTANCIA_MAXIMA = int(os.getenv('SCANNER_PHASH_DISTANCIA', '3'))
+FAIXAS = 4
+BITS_FAIXA = 16
+MAX_CANDIDATOS = 200
+
+_MASCARA_64 = (1 << 64) - 1
+_MASCARA_FAIXA = (1 << BITS_FAIXA) - 1
+
+
+def calcular_dhash(conteudo: bytes) -> Optional[int]:
+    """dHash de 64 bits (gradiente horizontal numa miniatura 9x8 em tons de cinza)"""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(conteudo)) as imagem:
+            imagem.draft('L', (64, 64))
+            imagem = ImageOps.exif_transpose(imagem).convert('L').resize((9, 8), Image.LANCZOS)
+            pixels = list(imagem.getdata())
+    except Exception as e:
+        print(f'Nao foi possivel calcular o hash perceptual: {e}')
+        return None
+
+    valor = 0
+    for linha in range(8):
+        for coluna in range(8):
+            esquerda = pixels[linha * 9 + coluna]
+            direita = pixels[linha * 9 + coluna + 1]
+            valor = (valor << 1) | (1 if esquerda > direita else 0)
+    return valor
+
+
+def distancia(a: int, b: int) -> int:
+    return ((a ^ b) & _MASCARA_64).bit_count()
+
+
+def _faixas(valor: int):
+    return [(valor >> (BITS_FAIXA * i)) & _MASCARA_FAIXA for i in range(FAIXAS)]
+
+
+def _para_bigint(valor: int) -> int:
+    return valor - (1 << 64) if valor >= (1 << 63) else valor
+
+
+def _de_bigint(valor: int) -> int:
+    return valor & _MASCARA_64
+
+
+def buscar_semelhante(valor: int, distancia_maxima: Optional[int] = None) -> Optional[Tuple[ScannerAnalysis, int]]:
+    """
+    Análise anterior (com nota) mais próxima do hash, dentro da distância máxima
+
+    Returns:
+        (ScannerAnalysis, distância) ou None
+    """
+    if distancia_maxima is None:
+        distancia_maxima = DISTANCIA_MAXIMA
+    if valor is None or distancia_maxima < 0:
+        return None
+
+    faixas = _faixas(valor)
+    candidatos = db.session.query(
+        ScannerImagemHash.analysis_id, ScannerImagemHash.phash
+    ).filter(or_(
+        ScannerImagemHash.faixa0 == faixas[0],
+        ScannerImagemHash.faixa1 == faixas[1],
+        ScannerImagemHash.faixa2 == faixas[2],
+        ScannerImagemHash.faixa3 == faixas[3],
+    )).order_by(ScannerImagemHash.analysis_id.desc()).limit(MAX_CANDIDATOS).all()
+
+    proximos = sorted(
+        (d, analysis_id)
+        for analysis_id, d in (
+            (analysis_id, distancia(valor, _de_bigint(phash))) for analysis_id, phash in candidatos
+        )
+        if d <= distancia_maxima
+    )
+    for d, analysis_id in proximos:
+        analysis = db.session.get(ScannerAnalysis, analysis_id)
+        if analysis is not None and analysis.grade:
+            return analysis, d
+    return None
+
+
+def indexar(analysis: ScannerAnalysis, valor: Optional[int]) -> None:
+    """Registra o hash da análise (a análise precisa já ter id)"""
+    if valor is None or analysis.id is None:
+        return
+    faixas = _faixas(valor)
+    db.session.merge(ScannerImagemHash(
+        analysis_id=analysis.id,
+        phash=_para_bigint(valor),
+        faixa0=faixas[0],
+        faixa1=faixas[1],
+        faixa2=faixas[2],
+        faixa3=faixas[3],
+    ))
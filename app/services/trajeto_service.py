@@ -0,0 +1,252 @@
+"""
+Resumo dos trajetos das OS a partir dos pontos de gps_logs
+
+Ao finalizar uma OS os pontos de rastreio (e os eventos com GPS) são lidos uma
+vez e viram uma linha em resumos_trajeto_os: km percorridos (haversine
+vetorizado com NumPy), duração, paradas e o trajeto simplificado por
+Douglas-Peucker para exibir no mapa. O km também é gravado em
+RotaOperacional.km_real, e o dashboard de logística soma os resumos em vez de
+percorrer as OS de cada motorista.
+
+Pontos com precisão ruim ou que implicam velocidade impossível (saltos do GPS)
+são descartados antes do cálculo; sem isso alguns metros de erro parado no
+pátio viram quilômetros no fim do mês.
+
+Configuração (variáveis de ambiente):
+    TRAJETO_PRECISAO_MAXIMA   Precisão máxima aceita em metros (padrão 100)
+    TRAJETO_TOLERANCIA_M      Tolerância do Douglas-Peucker em metros (padrão 15)
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+from flask import current_app
+
+from app.models import db, GPSLog, OrdemServico, ResumoTrajetoOS, RotaOperacional
+
+RAIO_TERRA_M = 6371008.8
+PRECISAO_MAXIMA_M = float(os.getenv('TRAJETO_PRECISAO_MAXIMA', '100'))
+TOLERANCIA_SIMPLIFICACAO_M = float(os.getenv('TRAJETO_TOLERANCIA_M', '15'))
+VELOCIDADE_MAXIMA_KMH = 200  # acima disso o deslocamento é erro do GPS
+VELOCIDADE_PARADA_KMH = 3
+TEMPO_MINIMO_PARADA_S = 180
+MAX_PASSADAS_RUIDO = 5
+
+
+def haversine_m(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Distância em metros entre pontos consecutivos (n pontos → n-1 trechos)"""
+    lat = np.radians(latitudes)
+    lng = np.radians(longitudes)
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _velocidades_kmh(distancias: np.ndarray, intervalos: np.ndarray) -> np.ndarray:
+    return distancias / np.maximum(intervalos, 1.0) * 3.6
+
+
+def filtrar_ruido(latitudes, longitudes, momentos, precisoes=None) -> np.ndarray:
+    """
+    Índices dos pontos confiáveis
+
+    Remove pontos com precisão pior que PRECISAO_MAXIMA_M e picos isolados:
+    ponto cuja chegada e saída passam de VELOCIDADE_MAXIMA_KMH.
+    """
+    indices = np.arange(len(latitudes))
+    if precisoes is not None:
+        precisoes = np.asarray(precisoes, dtype=float)
+        # Precisão ausente (NaN) é aceita: eventos antigos não a informavam
+        indices = indices[~(precisoes > PRECISAO_MAXIMA_M)]
+
+    for _ in range(MAX_PASSADAS_RUIDO):
+        if len(indices) < 3:
+            break
+        velocidades = _velocidades_kmh(
+            haversine_m(latitudes[indices], longitudes[indices]),
+            np.diff(momentos[indices])
+        )
+        rapido = velocidades > VELOCIDADE_MAXIMA_KMH
+        pico = np.zeros(len(indices), dtype=bool)
+        pico[1:-1] = rapido[:-1] & rapido[1:]
+        if not pico.any():
+            break
+        indices = indices[~pico]
+    return indices
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerancia: float) -> np.ndarray:
+    """
+    Índices dos pontos mantidos pela simplificação de Douglas-Peucker
+
+    x, y em metros (projeção local). Iterativo, para não estourar a pilha em
+    trajetos longos; as distâncias de cada trecho são calculadas de uma vez.
+    """
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+
+    manter = np.zeros(n, dtype=bool)
+    manter[0] = manter[-1] = True
+    pilha = [(0, n - 1)]
+    while pilha:
+        inicio, fim = pilha.pop()
+        if fim - inicio < 2:
+            continue
+        dx = x[fim] - x[inicio]
+        dy = y[fim] - y[inicio]
+        px = x[inicio + 1:fim] - x[inicio]
+        py = y[inicio + 1:fim] - y[inicio]
+        comprimento = np.hypot(dx, dy)
+        if comprimento == 0:
+            distancias = np.hypot(px, py)
+        else:
+            distancias = np.abs(dx * py - dy * px) / comprimento
+        maior = int(np.argmax(distancias))
+        if distancias[maior] > tolerancia:
+            meio = inicio + 1 + maior
+            manter[meio] = True
+            pilha.append((inicio, meio))
+            pilha.append((meio, fim))
+    return np.flatnonzero(manter)
+
+
+def simplificar(latitudes, longitudes, tolerancia: float = TOLERANCIA_SIMPLIFICACAO_M) -> np.ndarray:
+    """Douglas-Peucker sobre lat/lng (projeção equirretangular em torno do primeiro ponto)"""
+    if len(latitudes) < 3:
+        return np.arange(len(latitudes))
+    lat0 = np.radians(latitudes[0])
+    x = RAIO_TERRA_M * np.radians(longitudes - longitudes[0]) * np.cos(lat0)
+    y = RAIO_TERRA_M * np.radians(latitudes - latitudes[0])
+    return douglas_peucker(x, y, tolerancia)
+
+
+def detectar_paradas(distancias: np.ndarray, intervalos: np.ndarray):
+    """
+    Sequências de trechos abaixo de VELOCIDADE_PARADA_KMH que somam ao menos
+    TEMPO_MINIMO_PARADA_S
+
+    Returns:
+        (quantidade de paradas, segundos parados)
+    """
+    if len(distancias) == 0:
+        return 0, 0.0
+    lento = (_velocidades_kmh(distancias, intervalos) < VELOCIDADE_PARADA_KMH).astype(np.int8)
+    bordas = np.diff(np.concatenate(([0], lento, [0])))
+    inicios = np.flatnonzero(bordas == 1)
+    fins = np.flatnonzero(bordas == -1)
+    acumulado = np.concatenate(([0.0], np.cumsum(intervalos)))
+    duracoes = acumulado[fins] - acumulado[inicios]
+    paradas = duracoes >= TEMPO_MINIMO_PARADA_S
+    return int(paradas.sum()), float(duracoes[paradas].sum())
+
+
+def resumir(latitudes, longitudes, momentos, precisoes=None) -> dict:
+    """
+    Resumo de um trajeto (pontos em ordem cronológica)
+
+    Args:
+        latitudes, longitudes: graus
+        momentos: segundos (epoch)
+        precisoes: metros (NaN quando desconhecida)
+
+    Returns:
+        {'km_total', 'duracao_segundos', 'tempo_parado_segundos', 'paradas',
+         'total_pontos', 'pontos_descartados', 'trajeto'}
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    momentos = np.asarray(momentos, dtype=float)
+    total = len(latitudes)
+
+    indices = filtrar_ruido(latitudes, longitudes, momentos, precisoes)
+    lat, lng, ts = latitudes[indices], longitudes[indices], momentos[indices]
+
+    if len(lat) >= 2:
+        distancias = haversine_m(lat, lng)
+        intervalos = np.diff(ts)
+        paradas, tempo_parado = detectar_paradas(distancias, intervalos)
+        metros = float(distancias.sum())
+        duracao = float(ts[-1] - ts[0])
+    else:
+        paradas, tempo_parado, metros, duracao = 0, 0.0, 0.0, 0.0
+
+    mantidos = simplificar(lat, lng)
+    return {
+        'km_total': round(metros / 1000, 3),
+        'duracao_segundos': int(round(duracao)),
+        'tempo_parado_segundos': int(round(tempo_parado)),
+        'paradas': paradas,
+        'total_pontos': total,
+        'pontos_descartados': total - len(indices),
+        'trajeto': [
+            [round(float(lat[i]), 6), round(float(lng[i]), 6), int(ts[i])]
+            for i in mantidos
+        ],
+    }
+
+
+def resumo_atual(os_id: int, motorista_id: Optional[int]) -> ResumoTrajetoOS:
+    """
+    Resumo da OS a partir dos gps_logs, sem gravar (objeto fora da sessão)
+
+    Usado para OS em andamento, cujo resumo só é gravado ao finalizar.
+    """
+    pontos = db.session.query(
+        GPSLog.latitude, GPSLog.longitude, GPSLog.precisao, GPSLog.timestamp
+    ).filter(GPSLog.os_id == os_id).order_by(GPSLog.timestamp, GPSLog.id).all()
+
+    if pontos:
+        latitudes, longitudes, precisoes, momentos = zip(*pontos)
+        segundos = np.array(momentos, dtype='datetime64[ms]').astype(np.int64) / 1000.0
+        precisoes = np.array([np.nan if p is None else p for p in precisoes], dtype=float)
+        dados = resumir(latitudes, longitudes, segundos, precisoes)
+        inicio, fim = momentos[0], momentos[-1]
+    else:
+        dados = resumir([], [], [])
+        inicio = fim = None
+
+    return ResumoTrajetoOS(
+        os_id=os_id,
+        motorista_id=motorista_id,
+        inicio=inicio,
+        fim=fim,
+        **dados
+    )
+
+
+def calcular_resumo(os_id: int) -> Optional[ResumoTrajetoOS]:
+    """
+    Recalcula o resumo da OS e o km_real das rotas dela (sem commit)
+
+    Returns:
+        ResumoTrajetoOS ou None se a OS não existir
+    """
+    motorista_id = db.session.query(OrdemServico.motorista_id).filter(OrdemServico.id == os_id).first()
+    if motorista_id is None:
+        return None
+
+    resumo = db.session.merge(resumo_atual(os_id, motorista_id[0]))
+
+    RotaOperacional.query.filter_by(os_id=os_id).update(
+        {'km_real': resumo.km_total}, synchronize_session=False
+    )
+    return resumo
+
+
+def agendar_resumo(os_id: int) -> None:
+    """Calcula o resumo fora da requisição (a finalização da OS não espera)"""
+    from app import socketio
+
+    app = current_app._get_current_object()
+
+    def tarefa():
+        with app.app_context():
+            try:
+                calcular_resumo(os_id)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f'Erro ao calcular resumo do trajeto da OS {os_id}: {e}')
+
+    socketio.start_background_task(tarefa)
@@ -1,6 +1,9 @@
-from flask import request
-from app.models import AuditoriaLog, AuditoriaOC, db
-from typing import Optional, Dict, Any
+from flask import request, has_request_context
+from app.models import AuditoriaLog, AuditoriaOC, EventoEntidade, db
+from sqlalchemy import inspect, insert
+from datetime import datetime, date
+from decimal import Decimal
+from typing import Optional, Dict, Any, Iterable
 
 def registrar_auditoria(
     usuario_id: Optional[int],
@@ -94,3 +97,110 @@ def registrar_auditoria_oc(oc_id, usuario_id, acao, status_anterior=None, status
         dispositivo=dispositivo
     )
     db.session.add(auditoria)
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+def calcular_alteracoes(obj, ignorar: Iterable[str] = ('auditoria', 'data_atualizacao')) -> Dict[str, list]:
+    """Delta {campo: [antes, depois]} das colunas alteradas e ainda não gravadas no banco
+
+    Deve ser chamado depois de alterar o objeto e antes do flush/commit.
+    """
+    alteracoes = {}
+    estado = inspect(obj)
+    for coluna in estado.mapper.column_attrs:
+        if coluna.key in ignorar:
+            continue
+        historico = estado.attrs[coluna.key].history
+        if not historico.has_changes():
+            continue
+        antes = historico.deleted[0] if historico.deleted else None
+        depois = historico.added[0] if historico.added else None
+        alteracoes[coluna.key] = [_valor_json(antes), _valor_json(depois)]
+    return alteracoes
+
+def registrar_evento(entidade, acao: str, usuario_id=None, dados: Optional[Dict[str, Any]] = None, gps=None, device_id=None):
+    """Acrescenta um evento ao histórico append-only da entidade (tabela eventos_entidade)
+
+    Não faz commit: o evento é gravado na mesma transação da alteração da entidade.
+
+    Args:
+        entidade: Instância do modelo (Lote, OrdemServico, LoteSeparacao, ...)
+        acao: Nome da ação (ex.: 'BLOQUEAR_LOTE')
+        usuario_id: ID do usuário que realizou a ação
+        dados: Campos específicos da ação (delta compacto, sem snapshots completos)
+        gps: Coordenadas informadas pelo dispositivo
+        device_id: Identificador do dispositivo
+    """
+    if entidade.id is None:
+        db.session.add(entidade)
+        db.session.flush()
+
+    try:
+        usuario_id = int(usuario_id) if usuario_id is not None else None
+    except (TypeError, ValueError):
+        usuario_id = None
+
+    ip = None
+    user_agent = None
+    if has_request_context():
+        ip = request.remote_addr
+        user_agent = (request.headers.get('User-Agent') or '')[:500] or None
+
+    evento = EventoEntidade(
+        entidade=entidade.__tablename__,
+        entidade_id=entidade.id,
+        acao=acao,
+        usuario_id=usuario_id,
+        dados={k: _valor_json(v) for k, v in (dados or {}).items()} or None,
+        ip=ip,
+        user_agent=user_agent,
+        gps=gps,
+        device_id=str(device_id) if device_id is not None else None
+    )
+    db.session.add(evento)
+    return evento
+
+def registrar_eventos_em_lote(tabela: str, acao: str, registros: Iterable[tuple], usuario_id=None, gps=None, device_id=None):
+    """Grava vários eventos da mesma ação com um único INSERT (operações em massa)
+
+    Não faz commit. Os eventos não aparecem em session.new, então não passam
+    pelos listeners de flush.
+
+    Args:
+        tabela: __tablename__ das entidades (ex.: 'lotes')
+        acao: Nome da ação
+        registros: Pares (entidade_id, dados)
+    """
+    try:
+        usuario_id = int(usuario_id) if usuario_id is not None else None
+    except (TypeError, ValueError):
+        usuario_id = None
+
+    ip = None
+    user_agent = None
+    if has_request_context():
+        ip = request.remote_addr
+        user_agent = (request.headers.get('User-Agent') or '')[:500] or None
+
+    agora = datetime.utcnow()
+    linhas = [{
+        'entidade': tabela,
+        'entidade_id': entidade_id,
+        'acao': acao,
+        'usuario_id': usuario_id,
+        'ts': agora,
+        'dados': {k: _valor_json(v) for k, v in (dados or {}).items()} or None,
+        'ip': ip,
+        'user_agent': user_agent,
+        'gps': gps,
+        'device_id': str(device_id) if device_id is not None else None
+    } for entidade_id, dados in registros]
+
+    if linhas:
+        db.session.execute(insert(EventoEntidade), linhas)
+    return len(linhas)
@@ -0,0 +1,104 @@
+"""
+Busca textual com índices trigram (pg_trgm)
+
+Os filtros continuam usando ILIKE '%termo%', que o Postgres resolve pelos
+índices GIN gin_trgm_ops (migração 024) em vez de varrer a tabela. Quando a
+extensão está instalada, os resultados também são ordenados por similaridade
+e termos com pequenos erros de digitação passam a ser encontrados.
+"""
+
+import time
+from typing import Iterable, Optional
+from sqlalchemy import func, literal, text
+
+from app.models import db
+
+LIMITE_BUSCA_PADRAO = 50
+
+# Termos menores que isso não geram trigramas úteis: ficam só no ILIKE
+TAMANHO_MINIMO_SIMILARIDADE = 3
+
+# Ausência da extensão (ou erro na consulta) é verificada de novo depois desse intervalo
+INTERVALO_NOVA_VERIFICACAO = 300
+
+_trgm_disponivel = None
+_verificar_de_novo_em = 0.0
+
+
+def trgm_disponivel() -> bool:
+    """
+    Verifica se a extensão pg_trgm está instalada
+
+    A consulta roda numa conexão própria (um erro não afeta a sessão do
+    chamador). Uma resposta positiva vale para o processo todo; negativa ou
+    erro é refeita após INTERVALO_NOVA_VERIFICACAO segundos.
+    """
+    global _trgm_disponivel, _verificar_de_novo_em
+    if _trgm_disponivel or time.monotonic() < _verificar_de_novo_em:
+        return bool(_trgm_disponivel)
+    try:
+        with db.engine.connect() as conn:
+            resultado = conn.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).first()
+        _trgm_disponivel = resultado is not None
+    except Exception as e:
+        print(f'Erro ao verificar pg_trgm: {e}')
+        _trgm_disponivel = False
+    if not _trgm_disponivel:
+        _verificar_de_novo_em = time.monotonic() + INTERVALO_NOVA_VERIFICACAO
+    return _trgm_disponivel
+
+
+def escapar_like(termo: str) -> str:
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def condicao_busca(colunas: Iterable, termo: str):
+    """Condição OR entre as colunas: contém o termo ou (com pg_trgm) é parecida com ele"""
+    padrao = f'%{escapar_like(termo)}%'
+    condicoes = [coluna.ilike(padrao, escape='\\') for coluna in colunas]
+
+    if trgm_disponivel() and len(termo) >= TAMANHO_MINIMO_SIMILARIDADE:
+        # termo <% coluna: similaridade de palavra acima de pg_trgm.word_similarity_threshold
+        condicoes.extend(literal(termo).op('<%')(coluna) for coluna in colunas)
+
+    return db.or_(*condicoes)
+
+
+def relevancia(colunas: Iterable, termo: str):
+    """Expressão de ranking (maior = mais relevante) ou None sem pg_trgm"""
+    if not trgm_disponivel():
+        return None
+    return func.greatest(*[
+        func.coalesce(func.word_similarity(termo, coluna), 0) for coluna in colunas
+    ])
+
+
+def aplicar_busca(query, colunas, termo: Optional[str], ordem_padrao=None, limite: Optional[int] = None):
+    """
+    Filtra a query pelo termo e ordena por relevância
+
+    Args:
+        query: Query SQLAlchemy
+        colunas: Colunas textuais pesquisadas
+        termo: Texto digitado (vazio = sem filtro)
+        ordem_padrao: Critério de desempate / ordenação quando não há termo
+        limite: Máximo de resultados (None = sem limite)
+    """
+    colunas = list(colunas)
+    termo = (termo or '').strip()
+
+    if termo:
+        query = query.filter(condicao_busca(colunas, termo))
+        rank = relevancia(colunas, termo)
+        if rank is not None:
+            query = query.order_by(rank.desc())
+
+    if ordem_padrao is not None:
+        query = query.order_by(ordem_padrao)
+
+    if limite:
+        query = query.limit(limite)
+
+    return query
@@ -0,0 +1,191 @@
+"""
+Cache de dados de referência (listas de opções, materiais, tabelas, classificações)
+
+Cada domínio tem um contador de versão na tabela versoes_referencia, incrementado
+depois do commit de qualquer transação que altere os modelos do domínio. As
+respostas são servidas com ETag derivado das versões: o navegador revalida com
+If-None-Match e recebe 304 sem que as listas sejam consultadas de novo. O JSON
+gerado também fica em memória enquanto a versão não muda.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Tuple
+
+from flask import current_app, make_response, request
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from app.models import (
+    db, MaterialBase, Fornecedor, Lote, MovimentacaoEstoque,
+    TabelaPreco, TabelaPrecoItem, ClassificacaoGrade
+)
+
+# Modelo → domínios invalidados por qualquer alteração
+DOMINIOS_POR_MODELO = {
+    MaterialBase: ('materiais',),
+    TabelaPrecoItem: ('materiais', 'tabelas_preco'),
+    TabelaPreco: ('tabelas_preco',),
+    Fornecedor: ('fornecedores',),
+    ClassificacaoGrade: ('classificacoes',),
+    MovimentacaoEstoque: ('localizacoes',),
+    Lote: ('lotes_status', 'localizacoes'),
+}
+
+# Para modelos muito gravados, atualizações só invalidam quando estas colunas mudam
+COLUNAS_RELEVANTES = {
+    Lote: {'status': 'lotes_status', 'localizacao_atual': 'localizacoes'},
+}
+
+_CHAVE_PENDENTES = 'cache_referencia_dominios'
+
+# Variantes podem vir de parâmetros da requisição: o cache em memória é limitado (LRU)
+MAX_PAYLOADS = 256
+
+_lock = threading.Lock()
+_payloads: 'OrderedDict[Tuple[str, str], Tuple[tuple, bytes]]' = OrderedDict()
+_eventos_registrados = False
+
+
+def _dominios_do_objeto(obj, atualizacao: bool) -> Iterable[str]:
+    classe = type(obj)
+    dominios = DOMINIOS_POR_MODELO.get(classe)
+    if not dominios:
+        return ()
+    colunas = COLUNAS_RELEVANTES.get(classe)
+    if not atualizacao or not colunas:
+        return dominios
+    estado = inspect(obj)
+    return tuple(
+        dominio for coluna, dominio in colunas.items()
+        if estado.attrs[coluna].history.has_changes()
+    )
+
+
+def marcar_alterado(*dominios: str, session=None):
+    """Marca domínios para incremento no próximo commit (para UPDATEs em SQL puro)"""
+    session = session or db.session()
+    session.info.setdefault(_CHAVE_PENDENTES, set()).update(dominios)
+
+
+def _after_flush(session, flush_context):
+    pendentes = set()
+    for obj in session.new:
+        pendentes.update(_dominios_do_objeto(obj, atualizacao=False))
+    for obj in session.deleted:
+        pendentes.update(_dominios_do_objeto(obj, atualizacao=False))
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            pendentes.update(_dominios_do_objeto(obj, atualizacao=True))
+    if pendentes:
+        session.info.setdefault(_CHAVE_PENDENTES, set()).update(pendentes)
+
+
+def _do_orm_execute(orm_execute_state):
+    # query.update()/delete() em massa não passam pelo flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    dominios = DOMINIOS_POR_MODELO.get(mapper.class_)
+    if dominios:
+        orm_execute_state.session.info.setdefault(_CHAVE_PENDENTES, set()).update(dominios)
+
+
+def _after_commit(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if pendentes:
+        incrementar_versoes(pendentes)
+
+
+def _after_rollback(session):
+    session.info.pop(_CHAVE_PENDENTES, None)
+
+
+def registrar_eventos():
+    """Registra os listeners de sessão (idempotente)"""
+    global _eventos_registrados
+    if _eventos_registrados:
+        return
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'do_orm_execute', _do_orm_execute)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_soft_rollback', lambda session, previous_transaction: _after_rollback(session))
+    _eventos_registrados = True
+
+
+def incrementar_versoes(dominios: Iterable[str]):
+    """Incrementa as versões fora da transação do chamador (executado após o commit)"""
+    try:
+        # Conexão própria: o after_commit não pode reutilizar a transação que acabou de fechar
+        with db.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO versoes_referencia (dominio, versao, data_atualizacao)
+                VALUES (:dominio, 2, NOW())
+                ON CONFLICT (dominio) DO UPDATE
+                SET versao = versoes_referencia.versao + 1, data_atualizacao = NOW()
+            """), [{'dominio': d} for d in sorted(dominios)])
+    except Exception as e:
+        print(f'Erro ao incrementar versões de referência {sorted(dominios)}: {e}')
+
+
+def obter_versoes(dominios: Iterable[str]) -> tuple:
+    dominios = sorted(set(dominios))
+    linhas = db.session.execute(
+        text('SELECT dominio, versao FROM versoes_referencia WHERE dominio = ANY(:dominios)'),
+        {'dominios': dominios}
+    ).fetchall()
+    por_dominio = {linha[0]: linha[1] for linha in linhas}
+    return tuple((d, por_dominio.get(d, 1)) for d in dominios)
+
+
+def resposta_referencia(
+    chave: str,
+    dominios: Iterable[str],
+    gerar: Callable[[], object],
+    variante: str = '',
+    max_age: int = 0
+):
+    """
+    Responde com o JSON de referência usando ETag forte e 304 quando possível
+
+    Args:
+        chave: Identificador do endpoint (ex.: 'wms.status_opcoes')
+        dominios: Domínios dos quais a resposta depende
+        gerar: Função que monta o payload (chamada apenas se a versão mudou)
+        variante: Diferencia respostas por perfil (ex.: 'admin')
+        max_age: Segundos de cache no navegador sem revalidar (0 = sempre revalida)
+    """
+    versoes = obter_versoes(dominios)
+    assinatura = f'{chave}|{variante}|{versoes}'
+    etag = hashlib.sha256(assinatura.encode()).hexdigest()[:32]
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        chave_cache = (chave, variante)
+        with _lock:
+            em_cache = _payloads.get(chave_cache)
+            if em_cache:
+                _payloads.move_to_end(chave_cache)
+        if em_cache and em_cache[0] == versoes:
+            corpo = em_cache[1]
+        else:
+            corpo = current_app.json.dumps(gerar()).encode('utf-8')
+            with _lock:
+                _payloads[chave_cache] = (versoes, corpo)
+                _payloads.move_to_end(chave_cache)
+                while len(_payloads) > MAX_PAYLOADS:
+                    _payloads.popitem(last=False)
+        response = make_response(corpo, 200)
+        response.mimetype = 'application/json'
+
+    response.set_etag(etag)
+    if max_age:
+        response.headers['Cache-Control'] = f'private, max-age={max_age}, must-revalidate'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Vary'] = 'Authorization'
+    return response
@@ -1,24 +1,150 @@
 """
 Utilitário de geocoding reverso (GPS → endereço)
 Usa Nominatim (OpenStreetMap) como fonte principal com fallback para ViaCEP
+
+Os resultados ficam na tabela geocache (chave = geohash da coordenada, CEP ou
+endereço normalizado) e só são buscados de novo depois de expirar.
 """
 
+import re
+import unicodedata
 import requests
+from datetime import datetime, timedelta
 from typing import Dict, Optional
 import time
 
-def reverse_geocode(lat: float, lng: float, max_retries: int = 3) -> Dict[str, Optional[str]]:
+from app.services import http_client
+
+# Endereços mudam raramente; o cache evita repetir chamadas e respeita o rate limit do Nominatim
+CACHE_TTL_GEOCODE = 24 * 3600
+
+# Validade das entradas persistidas na tabela geocache
+GEOCACHE_TTL_DIAS = 90
+GEOCACHE_TTL_NAO_ENCONTRADO_DIAS = 7
+
+# Precisão 8 ≈ 38m x 19m: coordenadas do mesmo endereço caem na mesma célula
+GEOHASH_PRECISAO = 8
+_GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat: float, lng: float, precisao: int = GEOHASH_PRECISAO) -> str:
+    """Codifica latitude/longitude em geohash"""
+    lat_intervalo = [-90.0, 90.0]
+    lng_intervalo = [-180.0, 180.0]
+    resultado = []
+    bits = 0
+    bit_atual = 0
+    par = True
+
+    while len(resultado) < precisao:
+        intervalo, valor = (lng_intervalo, lng) if par else (lat_intervalo, lat)
+        meio = (intervalo[0] + intervalo[1]) / 2
+        if valor >= meio:
+            bits = (bits << 1) | 1
+            intervalo[0] = meio
+        else:
+            bits = bits << 1
+            intervalo[1] = meio
+        par = not par
+        bit_atual += 1
+        if bit_atual == 5:
+            resultado.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_atual = 0
+
+    return ''.join(resultado)
+
+
+def normalizar_cep(cep: Optional[str]) -> str:
+    return re.sub(r'[^\d]', '', cep or '')
+
+
+def normalizar_texto_endereco(texto: Optional[str]) -> str:
+    """Minúsculas, sem acentos e sem espaços/pontuação repetidos"""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^\w\s]', ' ', texto.lower())
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+def _geocache_obter(tipo: str, chave: str):
+    """Retorna a entrada do geocache (mesmo expirada) ou None"""
+    try:
+        from app.models import GeoCache
+        return GeoCache.query.filter_by(tipo=tipo, chave=chave).first()
+    except Exception as e:
+        print(f'Geocache indisponível: {e}')
+        return None
+
+
+def _geocache_gravar(tipo: str, chave: str, dados: Dict, sucesso: bool = True):
     """
-    Converte coordenadas GPS em endereço completo
+    Grava (ou renova) a entrada do geocache
+
+    Roda numa conexão própria e é confirmada na hora: a gravação não faz commit
+    nem rollback da transação da rota que pediu o geocoding.
+    """
+    try:
+        from sqlalchemy.dialects.postgresql import insert
+        from app.models import db, GeoCache
+        dias = GEOCACHE_TTL_DIAS if sucesso else GEOCACHE_TTL_NAO_ENCONTRADO_DIAS
+        agora = datetime.utcnow()
+        valores = {
+            'dados': dados,
+            'sucesso': sucesso,
+            'expira_em': agora + timedelta(days=dias),
+            'data_atualizacao': agora,
+        }
+        comando = insert(GeoCache.__table__).values(
+            tipo=tipo, chave=chave, data_criacao=agora, **valores
+        ).on_conflict_do_update(
+            constraint='uq_geocache_tipo_chave', set_=valores
+        )
+        with db.engine.begin() as conn:
+            conn.execute(comando)
+    except Exception as e:
+        print(f'Erro ao gravar geocache: {e}')
+
+
+def _geocache_valido(registro) -> bool:
+    return registro is not None and registro.expira_em and registro.expira_em > datetime.utcnow()
+
+
+def reverse_geocode(lat: float, lng: float, max_retries: int = 3, forcar: bool = False) -> Dict[str, Optional[str]]:
+    """
+    Converte coordenadas GPS em endereço completo, consultando o geocache antes do Nominatim
     
     Args:
         lat: Latitude
         lng: Longitude
         max_retries: Número máximo de tentativas em caso de erro
+        forcar: Ignora a entrada em cache e consulta o serviço externo
     
     Returns:
         Dict com chaves: rua, numero, cep, bairro, cidade, estado, pais, endereco_completo, raw
     """
+    chave = geohash(float(lat), float(lng))
+    registro = _geocache_obter('coordenada', chave)
+    if not forcar and _geocache_valido(registro):
+        return registro.dados
+    
+    resultado = _reverse_geocode_nominatim(lat, lng, max_retries)
+    
+    if resultado.get('sucesso'):
+        _geocache_gravar('coordenada', chave, resultado)
+    elif resultado.get('erro') == _erro_nao_encontrado()['erro']:
+        _geocache_gravar('coordenada', chave, resultado, sucesso=False)
+    elif registro is not None:
+        # Serviço fora do ar ou rate limit: melhor um endereço antigo do que nenhum
+        return registro.dados
+    
+    return resultado
+
+
+def _reverse_geocode_nominatim(lat: float, lng: float, max_retries: int = 3) -> Dict[str, Optional[str]]:
+    """Consulta o Nominatim (OpenStreetMap) sem passar pelo geocache"""
     
     # Tentar Nominatim (OpenStreetMap) primeiro
     for tentativa in range(max_retries):
@@ -37,7 +163,10 @@ def reverse_geocode(lat: float, lng: float, max_retries: int = 3) -> Dict[str, O
                 'zoom': 18
             }
             
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            response = http_client.get(
+                url, params=params, headers=headers,
+                timeout=(3, 6), cache_ttl=CACHE_TTL_GEOCODE
+            )
             
             if response.status_code == 429:  # Rate limit
                 if tentativa < max_retries - 1:
@@ -112,15 +241,15 @@ def reverse_geocode(lat: float, lng: float, max_retries: int = 3) -> Dict[str, O
                 }
         
         except requests.Timeout:
-            if tentativa < max_retries - 1:
-                time.sleep(1)
-                continue
-            else:
-                return _erro_timeout()
+            # Servidor lento não melhora com nova tentativa; falhar rápido libera o worker
+            return _erro_timeout()
+        
+        except http_client.CircuitoAberto as e:
+            return _erro_conexao(str(e))
         
         except requests.RequestException as e:
             if tentativa < max_retries - 1:
-                time.sleep(1)
+                time.sleep(0.5)
                 continue
             else:
                 return _erro_conexao(str(e))
@@ -135,17 +264,68 @@ def _buscar_cep_viacep(rua: str, cidade: str, estado: str) -> Optional[str]:
     """
     Busca CEP usando ViaCEP (fallback para endereços brasileiros)
     """
+    if not estado or len(estado) != 2:
+        return None
+    
+    chave = '|'.join([
+        normalizar_texto_endereco(rua),
+        normalizar_texto_endereco(cidade),
+        estado.upper()
+    ])
+    registro = _geocache_obter('endereco', chave)
+    if _geocache_valido(registro):
+        return registro.dados.get('cep') or None
+    
+    cep = _buscar_cep_viacep_remoto(rua, cidade, estado)
+    if cep:
+        _geocache_gravar('endereco', chave, {'cep': cep})
+    elif registro is not None:
+        return registro.dados.get('cep') or None
+    
+    return cep
+
+
+def consultar_cep(cep: str, forcar: bool = False) -> Optional[Dict]:
+    """
+    Consulta um CEP no ViaCEP, usando o geocache antes da chamada externa
+    
+    Returns:
+        Dict no formato do ViaCEP ({'erro': True} quando o CEP não existe)
+        ou None se o serviço respondeu com erro HTTP
+    
+    Raises:
+        requests.RequestException: falha de rede sem entrada em cache
+    """
+    cep_limpo = normalizar_cep(cep)
+    registro = _geocache_obter('cep', cep_limpo)
+    if not forcar and _geocache_valido(registro):
+        return registro.dados
+    
+    try:
+        response = http_client.get(f'https://viacep.com.br/ws/{cep_limpo}/json/', timeout=5)
+    except requests.RequestException:
+        if registro is not None:
+            return registro.dados
+        raise
+    
+    if response.status_code != 200:
+        return registro.dados if registro is not None else None
+    
+    dados = response.json()
+    nao_encontrado = bool(dados.get('erro'))
+    _geocache_gravar('cep', cep_limpo, dados, sucesso=not nao_encontrado)
+    return dados
+
+
+def _buscar_cep_viacep_remoto(rua: str, cidade: str, estado: str) -> Optional[str]:
     try:
         # ViaCEP formato: GET https://viacep.com.br/ws/{UF}/{Cidade}/{Logradouro}/json/
-        if not estado or len(estado) != 2:
-            return None
-        
         # Limpar e formatar
         rua_limpa = rua.replace(' ', '%20')
         cidade_limpa = cidade.replace(' ', '%20')
         
         url = f'https://viacep.com.br/ws/{estado}/{cidade_limpa}/{rua_limpa}/json/'
-        response = requests.get(url, timeout=5)
+        response = http_client.get(url, timeout=(3, 5), cache_ttl=CACHE_TTL_GEOCODE)
         
         if response.status_code == 200:
             data = response.json()
@@ -0,0 +1,281 @@
+"""
+Entrega de imagens com cache HTTP e miniaturas em disco
+
+O ETag de cada resposta é o SHA-256 do conteúdo original (mais o tamanho da
+miniatura), então If-None-Match é respondido com 304 sem ler o arquivo.
+URLs que carregam a versão (?v=<início do hash>) mudam quando a imagem muda
+e podem ser guardadas pelo navegador como imutáveis; sem a versão o cliente
+revalida a cada uso.
+
+Miniaturas (TAMANHOS_MINIATURA) são geradas uma vez com Pillow e ficam em
+MEDIA_STORE_DIR/miniaturas/<tamanho>/, também nomeadas pelo hash do original.
+"""
+
+import hashlib
+import hmac
+import io
+import os
+import time
+from typing import Callable, Optional
+from urllib.parse import urlencode
+
+from flask import Response, current_app, request, send_file, send_from_directory
+from werkzeug.security import safe_join
+
+from app.utils import media_store
+
+TAMANHOS_MINIATURA = (64, 256)
+TAMANHO_VERSAO = 16  # caracteres do hash usados em ?v=
+CACHE_IMUTAVEL = 31536000  # 1 ano
+QUALIDADE_MINIATURA = 80
+EXTENSOES_IMAGEM = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+VALIDADE_ASSINATURA = int(os.getenv('IMAGEM_URL_VALIDADE', '3600'))  # segundos
+JANELA_ASSINATURA = 900
+CHAVES_INSEGURAS = {'', 'dev-secret-key'}
+
+_aviso_chave = {}
+
+
+def versao(hash_midia: Optional[str]) -> Optional[str]:
+    """Valor de ?v= para URLs da imagem"""
+    return hash_midia[:TAMANHO_VERSAO] if hash_midia else None
+
+
+def _chave_assinatura() -> Optional[bytes]:
+    """SECRET_KEY para as assinaturas; None quando é o valor padrão de desenvolvimento"""
+    chave = current_app.config.get('SECRET_KEY') or ''
+    if chave in CHAVES_INSEGURAS:
+        if not _aviso_chave.get('emitido'):
+            _aviso_chave['emitido'] = True
+            print("⚠️ SESSION_SECRET não configurado: URLs assinadas de imagens desativadas (use o token JWT)")
+        return None
+    return chave.encode('utf-8')
+
+
+def expiracao_padrao() -> int:
+    """
+    Instante (epoch) de expiração das URLs assinadas emitidas agora
+
+    Arredondado para cima em JANELA_ASSINATURA: URLs emitidas na mesma janela
+    são idênticas e continuam aproveitando o cache do navegador.
+    """
+    agora = int(time.time())
+    return (agora // JANELA_ASSINATURA + 1) * JANELA_ASSINATURA + VALIDADE_ASSINATURA
+
+
+def assinar(recurso: str, expira_em: int) -> Optional[str]:
+    """
+    Assinatura HMAC de um recurso (ex.: 'scanner:42:u7') válida até expira_em
+
+    Tags <img> não enviam o token JWT; a URL assinada entregue no JSON de quem
+    está logado substitui o login na rota da imagem por tempo limitado.
+    Retorna None se a SECRET_KEY for a padrão (não assina com chave conhecida).
+    """
+    chave = _chave_assinatura()
+    if chave is None:
+        return None
+    mensagem = f'{recurso}|{int(expira_em)}'.encode('utf-8')
+    return hmac.new(chave, mensagem, hashlib.sha256).hexdigest()[:32]
+
+
+def assinatura_valida(recurso: str, expira_em, assinatura: Optional[str]) -> bool:
+    if not assinatura or not expira_em:
+        return False
+    try:
+        expira_em = int(expira_em)
+    except (TypeError, ValueError):
+        return False
+    if expira_em < time.time():
+        return False
+    esperada = assinar(recurso, expira_em)
+    return esperada is not None and hmac.compare_digest(esperada, assinatura)
+
+
+def url(base: str, hash_midia: Optional[str] = None, tamanho: Optional[int] = None,
+        recurso: Optional[str] = None) -> str:
+    """URL da imagem com versão do conteúdo, miniatura e assinatura (com expiração) opcionais"""
+    parametros = {}
+    if hash_midia:
+        parametros['v'] = versao(hash_midia)
+    if tamanho:
+        parametros['tamanho'] = tamanho
+    if recurso:
+        expira_em = expiracao_padrao()
+        assinatura = assinar(recurso, expira_em)
+        if assinatura:
+            parametros['exp'] = expira_em
+            parametros['assinatura'] = assinatura
+    return f'{base}?{urlencode(parametros)}' if parametros else base
+
+
+def tamanho_miniatura(valor) -> Optional[int]:
+    """
+    Converte ?tamanho= em um dos TAMANHOS_MINIATURA (None = imagem original)
+
+    Raises:
+        ValueError: tamanho não suportado (evita gerar variantes arbitrárias)
+    """
+    if valor in (None, ''):
+        return None
+    try:
+        tamanho = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'Tamanho inválido: {valor}')
+    if tamanho not in TAMANHOS_MINIATURA:
+        raise ValueError(f'Tamanho inválido: {valor}. Use {", ".join(map(str, TAMANHOS_MINIATURA))}')
+    return tamanho
+
+
+def caminho_miniatura(hash_midia: str, tamanho: int) -> str:
+    media_store.caminho(hash_midia)  # valida o hash
+    return os.path.join(media_store.MEDIA_STORE_DIR, 'miniaturas', str(tamanho), hash_midia[:2], f'{hash_midia}.jpg')
+
+
+def gerar_miniatura(conteudo: bytes, tamanho: int) -> Optional[bytes]:
+    """JPEG com o maior lado igual a tamanho (None se a imagem não puder ser decodificada)"""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(conteudo)) as imagem:
+            imagem.draft('RGB', (tamanho, tamanho))  # JPEG: decodifica já reduzido
+            imagem = ImageOps.exif_transpose(imagem)
+            imagem.thumbnail((tamanho, tamanho))
+            if imagem.mode != 'RGB':
+                imagem = imagem.convert('RGB')
+            saida = io.BytesIO()
+            imagem.save(saida, 'JPEG', quality=QUALIDADE_MINIATURA, optimize=True)
+            return saida.getvalue()
+    except Exception as e:
+        print(f"⚠️ Não foi possível gerar miniatura {tamanho}px: {e}")
+        return None
+
+
+def obter_miniatura(hash_midia: str, tamanho: int, carregar: Callable[[], Optional[bytes]]) -> Optional[str]:
+    """Caminho da miniatura, gerando-a na primeira vez (None se não der para gerar)"""
+    destino = caminho_miniatura(hash_midia, tamanho)
+    if os.path.isfile(destino):
+        return destino
+
+    conteudo = carregar()
+    if not conteudo:
+        return None
+    miniatura = gerar_miniatura(conteudo, tamanho)
+    if miniatura is None:
+        return None
+    media_store.gravar_atomico(destino, miniatura)
+    return destino
+
+
+def _aplicar_cache(resposta: Response, imutavel: bool, privado: bool) -> Response:
+    resposta.cache_control.no_store = None
+    resposta.expires = None
+    if imutavel:
+        resposta.cache_control.no_cache = None
+        resposta.cache_control.max_age = CACHE_IMUTAVEL
+        resposta.cache_control.immutable = True
+    else:
+        # Pode guardar, mas revalida com If-None-Match (304 quando não mudou)
+        resposta.cache_control.no_cache = True
+        resposta.cache_control.max_age = 0
+    if privado:
+        resposta.cache_control.private = True
+        resposta.cache_control.public = None
+    else:
+        resposta.cache_control.public = True
+        resposta.cache_control.private = None
+    return resposta
+
+
+def responder(
+    hash_midia: Optional[str],
+    mimetype: Optional[str],
+    carregar: Callable[[], Optional[bytes]],
+    tamanho: Optional[int] = None,
+    privado: bool = False
+) -> Optional[Response]:
+    """
+    Resposta HTTP da imagem (ou da miniatura) com ETag, 304 e Range
+
+    Args:
+        hash_midia: SHA-256 do original; None para registros legados (calculado dos bytes)
+        mimetype: Tipo do original
+        carregar: Devolve os bytes do original; só é chamada quando necessário
+        tamanho: Um dos TAMANHOS_MINIATURA ou None para o original
+        privado: Cache só no navegador (imagens que exigem login)
+
+    Returns:
+        Response ou None se não houver imagem
+    """
+    lido = {}
+
+    def conteudo_original():
+        if 'conteudo' not in lido:
+            lido['conteudo'] = carregar()
+        return lido['conteudo']
+
+    if not hash_midia:
+        conteudo = conteudo_original()
+        if not conteudo:
+            return None
+        hash_midia = media_store.calcular_hash(conteudo)
+
+    etag = hash_midia if tamanho is None else f'{hash_midia}-{tamanho}'
+    imutavel = request.args.get('v') == versao(hash_midia)
+
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+        resposta.set_etag(etag)
+        return _aplicar_cache(resposta, imutavel, privado)
+
+    caminho = None
+    if tamanho is not None:
+        caminho = obter_miniatura(hash_midia, tamanho, conteudo_original)
+        if caminho is not None:
+            mimetype = 'image/jpeg'
+    if caminho is None and media_store.existe(hash_midia):
+        caminho = media_store.caminho(hash_midia)
+
+    mimetype = mimetype or 'image/jpeg'
+    if caminho is not None:
+        resposta = send_file(caminho, mimetype=mimetype, etag=etag, conditional=True, max_age=0)
+    else:
+        conteudo = conteudo_original()
+        if not conteudo:
+            return None
+        resposta = Response(conteudo, mimetype=mimetype)
+        resposta.set_etag(etag)
+        resposta.make_conditional(request, accept_ranges=True)
+
+    return _aplicar_cache(resposta, imutavel, privado)
+
+
+def responder_arquivo(diretorio: str, nome: str, tamanho: Optional[int] = None) -> Response:
+    """
+    Arquivo de uploads/ com ETag (data de modificação + tamanho) e revalidação
+
+    Os nomes em uploads/ podem ser regravados, então a resposta não é imutável:
+    o navegador guarda e recebe 304 enquanto o arquivo não mudar. Com tamanho,
+    imagens são entregues como miniatura (chave = caminho + mtime + tamanho).
+    """
+    diretorio = os.path.abspath(diretorio)
+    caminho = safe_join(diretorio, nome)
+
+    if tamanho is not None and caminho and os.path.splitext(nome)[1].lower() in EXTENSOES_IMAGEM \
+            and os.path.isfile(caminho):
+        info = os.stat(caminho)
+        chave = media_store.calcular_hash(f'{caminho}:{info.st_mtime_ns}:{info.st_size}'.encode('utf-8'))
+
+        def carregar():
+            with open(caminho, 'rb') as arquivo:
+                return arquivo.read()
+
+        miniatura = obter_miniatura(chave, tamanho, carregar)
+        if miniatura is not None:
+            resposta = send_file(miniatura, mimetype='image/jpeg', etag=f'{chave}-{tamanho}', conditional=True, max_age=0)
+            return _aplicar_cache(resposta, False, False)
+
+    resposta = send_from_directory(diretorio, nome, conditional=True, max_age=0)
+    return _aplicar_cache(resposta, False, False)
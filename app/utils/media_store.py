@@ -0,0 +1,85 @@
+"""
+Armazenamento de mídia endereçado por conteúdo (fotos de usuários, imagens do scanner)
+
+Cada arquivo é gravado uma única vez em MEDIA_STORE_DIR/<ab>/<cd>/<sha256>,
+onde o nome é o SHA-256 do conteúdo: o mesmo arquivo enviado duas vezes ocupa
+espaço uma vez só. As tabelas guardam apenas hash, tamanho e mimetype.
+
+Em produção MEDIA_STORE_DIR deve apontar para um volume persistente.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from typing import NamedTuple, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MEDIA_STORE_DIR = os.path.abspath(os.getenv('MEDIA_STORE_DIR') or os.path.join(BASE_DIR, 'uploads', 'media'))
+
+_HASH_VALIDO = re.compile(r'^[0-9a-f]{64}$')
+
+
+class Midia(NamedTuple):
+    hash: str
+    tamanho: int
+    mimetype: str
+
+
+def calcular_hash(conteudo: bytes) -> str:
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+def caminho(hash_midia: str) -> str:
+    """Caminho do arquivo no disco (o hash é validado para não permitir path traversal)"""
+    if not hash_midia or not _HASH_VALIDO.match(hash_midia):
+        raise ValueError(f'Hash de mídia inválido: {hash_midia!r}')
+    return os.path.join(MEDIA_STORE_DIR, hash_midia[:2], hash_midia[2:4], hash_midia)
+
+
+def existe(hash_midia: str) -> bool:
+    try:
+        return os.path.isfile(caminho(hash_midia))
+    except ValueError:
+        return False
+
+
+def gravar_atomico(destino: str, conteudo: bytes) -> None:
+    """
+    Grava num arquivo temporário do mesmo diretório e publica com os.replace,
+    então leitores nunca veem um arquivo pela metade
+    """
+    diretorio = os.path.dirname(destino)
+    os.makedirs(diretorio, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=diretorio, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, destino)
+    except Exception:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def salvar(conteudo: bytes, mimetype: Optional[str] = None) -> Midia:
+    """Grava o conteúdo (se ainda não existir) e devolve hash, tamanho e mimetype"""
+    if not conteudo:
+        raise ValueError('Conteúdo de mídia vazio')
+
+    hash_midia = calcular_hash(conteudo)
+    destino = caminho(hash_midia)
+
+    if not os.path.isfile(destino):
+        gravar_atomico(destino, conteudo)
+
+    return Midia(hash_midia, len(conteudo), mimetype or 'application/octet-stream')
+
+
+def ler(hash_midia: str) -> Optional[bytes]:
+    """Conteúdo do arquivo ou None se não estiver no disco"""
+    try:
+        with open(caminho(hash_midia), 'rb') as arquivo:
+            return arquivo.read()
+    except (FileNotFoundError, ValueError):
+        return None
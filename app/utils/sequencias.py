@@ -0,0 +1,86 @@
+"""
+Alocação de códigos sequenciais sem corrida (tabela sequencias)
+
+Cada chave (ex.: 'BAG-COBRE-', 'MAT', 'OP-20260101-') tem uma linha cujo valor
+é incrementado com UPDATE ... RETURNING, que trava só aquela linha. Na primeira
+vez que a chave é usada o valor parte do maior código já gravado, então os
+códigos antigos nunca são repetidos.
+
+O incremento roda numa conexão própria e é confirmado na hora: um rollback
+do chamador deixa um buraco na numeração, mas nunca um código duplicado, e
+transações longas não seguram a linha travada para as outras estações.
+"""
+
+import re
+from typing import Callable, Optional
+
+from sqlalchemy import Integer, cast, func, text
+
+from app.models import db
+
+_SQL_INCREMENTAR = text("""
+    UPDATE sequencias SET valor = valor + 1, data_atualizacao = NOW()
+    WHERE chave = :chave
+    RETURNING valor
+""")
+
+_SQL_CRIAR = text("""
+    INSERT INTO sequencias (chave, valor, data_atualizacao)
+    VALUES (:chave, :valor, NOW())
+    ON CONFLICT (chave) DO UPDATE
+    SET valor = sequencias.valor + 1, data_atualizacao = NOW()
+    RETURNING valor
+""")
+
+
+def maior_sufixo(coluna, prefixo: str) -> int:
+    """Maior número N entre os valores da coluna no formato '<prefixo>N' (0 se não houver)"""
+    padrao = f'^{re.escape(prefixo)}([0-9]+)$'
+    valor = db.session.query(
+        func.max(cast(func.substring(coluna, padrao), Integer))
+    ).scalar()
+    return int(valor or 0)
+
+
+def proximo_valor(chave: str, valor_atual: Optional[Callable[[], int]] = None) -> int:
+    """
+    Reserva o próximo número da chave
+
+    Args:
+        chave: Identificador da sequência
+        valor_atual: Função que devolve o maior número já usado (só chamada quando a chave é nova)
+    """
+    with db.engine.begin() as conn:
+        valor = conn.execute(_SQL_INCREMENTAR, {'chave': chave}).scalar()
+        if valor is not None:
+            return int(valor)
+
+    inicial = valor_atual() if valor_atual else 0
+
+    with db.engine.begin() as conn:
+        # Se outra estação criou a chave nesse intervalo, o ON CONFLICT apenas incrementa
+        return int(conn.execute(_SQL_CRIAR, {'chave': chave, 'valor': inicial + 1}).scalar())
+
+
+def proximo_codigo(
+    prefixo: str,
+    largura: int = 4,
+    separador: str = '-',
+    coluna=None
+) -> str:
+    """
+    Gera o próximo código no formato <prefixo><separador><número com zeros à esquerda>
+
+    Args:
+        prefixo: Parte fixa do código (também é a chave da sequência)
+        largura: Quantidade mínima de dígitos
+        separador: Texto entre prefixo e número
+        coluna: Coluna onde os códigos são gravados, usada para continuar a numeração existente
+
+    Exemplo:
+        proximo_codigo('BAG-COBRE', coluna=BagProducao.codigo) → 'BAG-COBRE-0042'
+    """
+    base = f'{prefixo}{separador}'
+    valor_atual = (lambda: maior_sufixo(coluna, base)) if coluna is not None else None
+    numero = proximo_valor(base, valor_atual)
+    return f'{base}{numero:0{largura}d}'
@@ -0,0 +1,167 @@
+"""
+Status canônicos dos lotes
+
+Os status passaram a ser gravados sempre em MAIÚSCULAS com underscore
+(Lote normaliza no @validates). Variações antigas ('aprovado', 'Em Estoque',
+'ATIVO', ...) são convertidas por normalizar_status e pela migração 027.
+O campo Lote.disponivel_producao é derivado do status a cada gravação e tem
+índice parcial, substituindo as listas IN com todas as grafias.
+"""
+
+from sqlalchemy import text
+
+ABERTO = 'ABERTO'
+AGUARDANDO_APROVACAO = 'AGUARDANDO_APROVACAO'
+APROVADO = 'APROVADO'
+REJEITADO = 'REJEITADO'
+FECHADO = 'FECHADO'
+RECEBIDO = 'RECEBIDO'
+EM_CONFERENCIA = 'EM_CONFERENCIA'
+CONFERIDO = 'CONFERIDO'
+AGUARDANDO_SEPARACAO = 'AGUARDANDO_SEPARACAO'
+EM_SEPARACAO = 'EM_SEPARACAO'
+CRIADO_SEPARACAO = 'CRIADO_SEPARACAO'
+PROCESSADO = 'PROCESSADO'
+EM_ESTOQUE = 'EM_ESTOQUE'
+LIBERADO = 'LIBERADO'
+RESERVADO = 'RESERVADO'
+EM_PRODUCAO = 'EM_PRODUCAO'
+CONCLUIDO = 'CONCLUIDO'
+BLOQUEADO = 'BLOQUEADO'
+BLOQUEADO_QC = 'BLOQUEADO_QC'
+BLOQUEADO_INVENTARIO = 'BLOQUEADO_INVENTARIO'
+DIVERGENTE_AGUARDANDO_ADM = 'DIVERGENTE_AGUARDANDO_ADM'
+ENCERRADO = 'ENCERRADO'
+
+STATUS_LABELS = {
+    ABERTO: 'Aberto',
+    AGUARDANDO_APROVACAO: 'Aguardando Aprovação',
+    APROVADO: 'Aprovado',
+    REJEITADO: 'Rejeitado',
+    FECHADO: 'Fechado',
+    RECEBIDO: 'Recebido',
+    EM_CONFERENCIA: 'Em Conferência',
+    CONFERIDO: 'Conferido',
+    AGUARDANDO_SEPARACAO: 'Aguardando Separação',
+    EM_SEPARACAO: 'Em Separação',
+    CRIADO_SEPARACAO: 'Criado na Separação',
+    PROCESSADO: 'Processado',
+    EM_ESTOQUE: 'Em Estoque',
+    LIBERADO: 'Liberado',
+    RESERVADO: 'Reservado',
+    EM_PRODUCAO: 'Em Produção',
+    CONCLUIDO: 'Concluído',
+    BLOQUEADO: 'Bloqueado',
+    BLOQUEADO_QC: 'Bloqueado QC',
+    BLOQUEADO_INVENTARIO: 'Bloqueado Inventário',
+    DIVERGENTE_AGUARDANDO_ADM: 'Divergente',
+    ENCERRADO: 'Encerrado',
+}
+
+STATUS_VALIDOS = frozenset(STATUS_LABELS)
+
+# Grafias antigas (já em maiúsculas/underscore) → status canônico
+ALIASES = {
+    'ESTOQUE': EM_ESTOQUE,
+    'DISPONIVEL': EM_ESTOQUE,
+    'ATIVO': EM_ESTOQUE,
+    'APROVADA': APROVADO,
+    'APROVADA_ADM': APROVADO,
+    'CONCLUIDO_CONFERENCIA': CONFERIDO,
+    'DISPONIVEL_PRODUCAO': LIBERADO,
+    'SEPARADO': PROCESSADO,
+    'FINALIZADO': ENCERRADO,
+}
+
+# Status em que o lote pode ser escolhido para uma ordem de produção
+STATUS_DISPONIVEIS_PRODUCAO = frozenset({
+    EM_ESTOQUE, APROVADO, CRIADO_SEPARACAO, EM_CONFERENCIA, CONFERIDO,
+    CONCLUIDO, RECEBIDO, LIBERADO,
+})
+
+# Máquina de estados: status atual → status permitidos a seguir
+TRANSICOES = {
+    ABERTO: {AGUARDANDO_APROVACAO, APROVADO, REJEITADO, FECHADO, EM_PRODUCAO},
+    AGUARDANDO_APROVACAO: {APROVADO, REJEITADO},
+    APROVADO: {EM_ESTOQUE, FECHADO, AGUARDANDO_SEPARACAO, EM_PRODUCAO},
+    REJEITADO: {ABERTO},
+    FECHADO: set(),
+    RECEBIDO: {EM_CONFERENCIA, AGUARDANDO_SEPARACAO, EM_ESTOQUE, EM_PRODUCAO},
+    EM_CONFERENCIA: {CONFERIDO, DIVERGENTE_AGUARDANDO_ADM, EM_PRODUCAO},
+    CONFERIDO: {AGUARDANDO_SEPARACAO, EM_ESTOQUE, EM_PRODUCAO},
+    DIVERGENTE_AGUARDANDO_ADM: {AGUARDANDO_SEPARACAO, REJEITADO, ENCERRADO},
+    AGUARDANDO_SEPARACAO: {EM_SEPARACAO},
+    EM_SEPARACAO: {PROCESSADO, AGUARDANDO_SEPARACAO},
+    CRIADO_SEPARACAO: {EM_ESTOQUE, EM_PRODUCAO, RESERVADO},
+    PROCESSADO: {ENCERRADO},
+    EM_ESTOQUE: {RESERVADO, EM_PRODUCAO, BLOQUEADO, BLOQUEADO_QC, BLOQUEADO_INVENTARIO},
+    LIBERADO: {RESERVADO, EM_PRODUCAO, EM_ESTOQUE},
+    RESERVADO: {EM_ESTOQUE, EM_PRODUCAO},
+    EM_PRODUCAO: {CONCLUIDO, EM_ESTOQUE},
+    CONCLUIDO: {EM_PRODUCAO, ENCERRADO},
+    BLOQUEADO: {EM_ESTOQUE},
+    BLOQUEADO_QC: {EM_ESTOQUE, REJEITADO},
+    BLOQUEADO_INVENTARIO: {EM_ESTOQUE},
+    ENCERRADO: set(),
+}
+
+
+def normalizar_status(status):
+    """'Em Estoque' / 'em_estoque' / 'disponivel' → 'EM_ESTOQUE' (None/vazio → None)"""
+    if status is None:
+        return None
+    valor = str(status).strip().upper().replace(' ', '_').replace('-', '_')
+    if not valor:
+        return None
+    return ALIASES.get(valor, valor)
+
+
+def disponivel_producao(status):
+    return normalizar_status(status) in STATUS_DISPONIVEIS_PRODUCAO
+
+
+def pode_transicionar(status_atual, novo_status):
+    atual = normalizar_status(status_atual)
+    novo = normalizar_status(novo_status)
+    if atual == novo:
+        return True
+    # Status fora da máquina (dados antigos) não bloqueiam a transição
+    if atual not in TRANSICOES:
+        return True
+    return novo in TRANSICOES[atual]
+
+
+def alterar_status(lote, novo_status):
+    """
+    Muda o status do lote respeitando a máquina de estados
+
+    Raises:
+        ValueError: transição não permitida
+    """
+    novo = normalizar_status(novo_status)
+    if not pode_transicionar(lote.status, novo):
+        raise ValueError(f'Transição de status inválida: {lote.status} → {novo}')
+    lote.status = novo
+    return lote
+
+
+def opcoes_status():
+    """Lista [{'value', 'label'}] dos status canônicos para filtros"""
+    return [{'value': s, 'label': STATUS_LABELS[s]} for s in sorted(STATUS_VALIDOS)]
+
+
+def normalizar_status_existentes(conn):
+    """Converte os status gravados para a forma canônica e recalcula disponivel_producao"""
+    casos = ' '.join(f"WHEN '{antigo}' THEN '{novo}'" for antigo, novo in ALIASES.items())
+    conn.execute(text(f"""
+        UPDATE lotes SET status = CASE s.valor {casos} ELSE s.valor END
+        FROM (
+            SELECT id, REPLACE(REPLACE(UPPER(TRIM(status)), ' ', '_'), '-', '_') AS valor FROM lotes
+        ) s
+        WHERE lotes.id = s.id AND lotes.status IS DISTINCT FROM (CASE s.valor {casos} ELSE s.valor END)
+    """))
+    disponiveis = ', '.join(f"'{s}'" for s in sorted(STATUS_DISPONIVEIS_PRODUCAO))
+    conn.execute(text(f"""
+        UPDATE lotes SET disponivel_producao = (status IN ({disponiveis}))
+        WHERE disponivel_producao IS DISTINCT FROM (status IN ({disponiveis}))
+    """))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Script para executar a migração 023 - Chaves normalizadas de endereço dos fornecedores"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+
+TAMANHO_LOTE = 500
+
+def executar_migracao():
+    """Executa a migração 023 e preenche as chaves dos fornecedores existentes"""
+    database_url = os.environ.get('DATABASE_URL')
+    
+    if not database_url:
+        print("❌ ERRO: DATABASE_URL não está definido!")
+        return False
+    
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    
+    print("=" * 60)
+    print("MIGRAÇÃO 023: Chaves normalizadas de endereço (fornecedores)")
+    print("=" * 60)
+    
+    sql_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', '023_add_fornecedor_chaves_endereco.sql')
+    
+    try:
+        from app.models import Fornecedor
+        
+        with open(sql_path, 'r', encoding='utf-8') as f:
+            sql_migration = f.read()
+        
+        print(f"\n🔗 Conectando ao banco de dados...")
+        engine = create_engine(database_url)
+        
+        print("\n📝 Criando colunas e índices...")
+        with engine.connect() as conn:
+            conn.execute(text(sql_migration))
+            conn.commit()
+        
+        print("\n🔄 Preenchendo chaves dos fornecedores existentes...")
+        total = 0
+        with engine.connect() as conn:
+            linhas = conn.execute(text("""
+                SELECT id, rua, numero, cidade, estado, cep
+                FROM fornecedores
+                ORDER BY id
+            """)).fetchall()
+            
+            for inicio in range(0, len(linhas), TAMANHO_LOTE):
+                parametros = []
+                for linha in linhas[inicio:inicio + TAMANHO_LOTE]:
+                    chave_endereco, chave_cep_numero = Fornecedor.gerar_chaves_endereco(
+                        linha.rua, linha.numero, linha.cidade, linha.estado, linha.cep
+                    )
+                    parametros.append({
+                        'id': linha.id,
+                        'chave_endereco': chave_endereco,
+                        'chave_cep_numero': chave_cep_numero
+                    })
+                
+                conn.execute(text("""
+                    UPDATE fornecedores
+                    SET chave_endereco = :chave_endereco, chave_cep_numero = :chave_cep_numero
+                    WHERE id = :id
+                """), parametros)
+                conn.commit()
+                total += len(parametros)
+                print(f"   ✓ {total}/{len(linhas)} fornecedores")
+        
+        print("\n" + "=" * 60)
+        print(f"✨ Migração concluída! {total} fornecedor(es) atualizados.")
+        print("=" * 60)
+        
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ Erro ao executar migração: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+if __name__ == '__main__':
+    sucesso = executar_migracao()
+    sys.exit(0 if sucesso else 1)
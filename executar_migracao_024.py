@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Script para executar a migração 024 - Índices trigram (pg_trgm) para busca"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+
+def executar_migracao():
+    """Executa a migração 024"""
+    database_url = os.environ.get('DATABASE_URL')
+    
+    if not database_url:
+        print("❌ ERRO: DATABASE_URL não está definido!")
+        return False
+    
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    
+    print("=" * 60)
+    print("MIGRAÇÃO 024: Índices trigram para busca textual")
+    print("=" * 60)
+    
+    sql_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', '024_add_indices_trigram_busca.sql')
+    
+    try:
+        with open(sql_path, 'r', encoding='utf-8') as f:
+            sql_migration = f.read()
+        
+        print(f"\n🔗 Conectando ao banco de dados...")
+        engine = create_engine(database_url)
+        
+        print("\n📝 Executando SQL...")
+        with engine.connect() as conn:
+            conn.execute(text(sql_migration))
+            conn.commit()
+        
+        print("\n🔍 Verificando índices criados...")
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT indexname FROM pg_indexes
+                WHERE indexname LIKE '%_trgm'
+                ORDER BY indexname
+            """))
+            for indice in result.fetchall():
+                print(f"   ✓ {indice[0]}")
+        
+        print("\n" + "=" * 60)
+        print("✨ Migração concluída! Reinicie a aplicação para ativar a busca por similaridade.")
+        print("=" * 60)
+        
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ Erro ao executar migração: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+if __name__ == '__main__':
+    sucesso = executar_migracao()
+    sys.exit(0 if sucesso else 1)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Script para executar a migração 032 - Fotos e imagens do scanner no media_store
+
+Aplica as colunas de hash/tamanho e copia os bytes que ainda estão em
+usuarios.foto_data e scanner_analyses.image_data para o media_store
+(MEDIA_STORE_DIR), em lotes ordenados por id. Com --limpar as colunas legadas
+são zeradas depois da cópia (rode sem --limpar primeiro e confira os arquivos).
+
+Uso: python executar_migracao_032.py [--limpar] [--lote N]
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils import media_store
+
+TABELAS = [
+    # tabela, coluna de bytes, coluna de hash, coluna de tamanho, coluna de mimetype
+    ('usuarios', 'foto_data', 'foto_hash', 'foto_tamanho', 'foto_mimetype'),
+    ('scanner_analyses', 'image_data', 'image_hash', 'image_size', 'image_mimetype'),
+]
+
+
+def _mover_blobs(engine, tabela, col_dados, col_hash, col_tamanho, col_mime, limpar, tamanho_lote):
+    limpar_sql = f", {col_dados} = NULL" if limpar else ""
+    ultimo_id = 0
+    movidos = 0
+    bytes_movidos = 0
+
+    while True:
+        with engine.begin() as conn:
+            linhas = conn.execute(text(f"""
+                SELECT id, {col_dados}, {col_mime} FROM {tabela}
+                WHERE id > :ultimo_id AND {col_dados} IS NOT NULL AND {col_hash} IS NULL
+                ORDER BY id
+                LIMIT :limite
+            """), {'ultimo_id': ultimo_id, 'limite': tamanho_lote}).fetchall()
+
+            if not linhas:
+                break
+
+            for linha in linhas:
+                midia = media_store.salvar(bytes(linha[1]), linha[2] or 'image/jpeg')
+                conn.execute(text(f"""
+                    UPDATE {tabela}
+                    SET {col_hash} = :hash, {col_tamanho} = :tamanho, {col_mime} = :mimetype{limpar_sql}
+                    WHERE id = :id
+                """), {'hash': midia.hash, 'tamanho': midia.tamanho, 'mimetype': midia.mimetype, 'id': linha[0]})
+                movidos += 1
+                bytes_movidos += midia.tamanho
+
+            ultimo_id = linhas[-1][0]
+        print(f"   ... {tabela}: {movidos} registro(s) até id {ultimo_id}")
+
+    if limpar:
+        # Registros copiados numa execução anterior sem --limpar
+        with engine.begin() as conn:
+            resultado = conn.execute(text(f"""
+                UPDATE {tabela} SET {col_dados} = NULL
+                WHERE {col_dados} IS NOT NULL AND {col_hash} IS NOT NULL
+            """))
+            if resultado.rowcount:
+                print(f"   🧹 {tabela}: {resultado.rowcount} blob(s) já copiados foram limpos")
+
+    return movidos, bytes_movidos
+
+
+def executar_migracao(limpar=False, tamanho_lote=200):
+    """Executa a migração 032"""
+    database_url = os.environ.get('DATABASE_URL')
+    
+    if not database_url:
+        print("❌ ERRO: DATABASE_URL não está definido!")
+        return False
+    
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    
+    print("=" * 60)
+    print("MIGRAÇÃO 032: Fotos e imagens do scanner no media_store")
+    print("=" * 60)
+    print(f"📁 MEDIA_STORE_DIR: {media_store.MEDIA_STORE_DIR}")
+    
+    sql_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', '032_add_media_store.sql')
+    
+    try:
+        with open(sql_path, 'r', encoding='utf-8') as f:
+            sql_migration = f.read()
+        
+        print(f"\n🔗 Conectando ao banco de dados...")
+        engine = create_engine(database_url)
+        
+        print("\n📝 Executando SQL...")
+        with engine.connect() as conn:
+            conn.execute(text(sql_migration))
+            conn.commit()
+        
+        print("\n📦 Copiando blobs para o media_store...")
+        for tabela, col_dados, col_hash, col_tamanho, col_mime in TABELAS:
+            movidos, total_bytes = _mover_blobs(
+                engine, tabela, col_dados, col_hash, col_tamanho, col_mime, limpar, tamanho_lote
+            )
+            print(f"   ✓ {tabela}: {movidos} arquivo(s), {total_bytes / 1024 / 1024:.1f} MB")
+        
+        print("\n" + "=" * 60)
+        if limpar:
+            print("✨ Migração concluída! Rode VACUUM FULL usuarios, scanner_analyses para devolver o espaço.")
+        else:
+            print("✨ Migração concluída! Colunas legadas mantidas; rode com --limpar depois de conferir os arquivos.")
+        print("=" * 60)
+        
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ Erro ao executar migração: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+if __name__ == '__main__':
+    lote = 200
+    if '--lote' in sys.argv:
+        lote = int(sys.argv[sys.argv.index('--lote') + 1])
+    sucesso = executar_migracao(limpar='--limpar' in sys.argv, tamanho_lote=lote)
+    sys.exit(0 if sucesso else 1)
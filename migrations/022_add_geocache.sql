@@ -0,0 +1,16 @@
+-- Migração 022: Cache persistente de geocoding
+-- Chaves: geohash da coordenada, CEP (8 dígitos) ou endereço normalizado (rua|cidade|uf)
+
+CREATE TABLE IF NOT EXISTS geocache (
+    id SERIAL PRIMARY KEY,
+    tipo VARCHAR(20) NOT NULL,
+    chave VARCHAR(300) NOT NULL,
+    dados JSON NOT NULL DEFAULT '{}',
+    sucesso BOOLEAN NOT NULL DEFAULT TRUE,
+    data_criacao TIMESTAMP NOT NULL DEFAULT NOW(),
+    data_atualizacao TIMESTAMP DEFAULT NOW(),
+    expira_em TIMESTAMP NOT NULL,
+    CONSTRAINT uq_geocache_tipo_chave UNIQUE (tipo, chave)
+);
+
+CREATE INDEX IF NOT EXISTS idx_geocache_expira ON geocache(expira_em);
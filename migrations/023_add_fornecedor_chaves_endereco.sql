@@ -0,0 +1,10 @@
+-- Migração 023: Chaves normalizadas de endereço em fornecedores
+-- Permite que a verificação de endereço duplicado seja uma busca indexada
+-- O preenchimento das linhas existentes é feito por executar_migracao_023.py
+-- (mesma normalização usada pelo modelo Fornecedor)
+
+ALTER TABLE fornecedores ADD COLUMN IF NOT EXISTS chave_endereco VARCHAR(400);
+ALTER TABLE fornecedores ADD COLUMN IF NOT EXISTS chave_cep_numero VARCHAR(40);
+
+CREATE INDEX IF NOT EXISTS ix_fornecedores_chave_endereco ON fornecedores(chave_endereco);
+CREATE INDEX IF NOT EXISTS ix_fornecedores_chave_cep_numero ON fornecedores(chave_cep_numero);
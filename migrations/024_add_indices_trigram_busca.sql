@@ -0,0 +1,14 @@
+-- Migração 024: Índices trigram (pg_trgm) para busca textual
+-- Permitem que filtros ILIKE '%termo%' e a busca por similaridade usem índice
+-- em vez de varrer fornecedores/materiais_base inteiros
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_fornecedores_nome_trgm ON fornecedores USING gin (nome gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_fornecedores_nome_social_trgm ON fornecedores USING gin (nome_social gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_fornecedores_cnpj_trgm ON fornecedores USING gin (cnpj gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_fornecedores_cpf_trgm ON fornecedores USING gin (cpf gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_fornecedores_email_trgm ON fornecedores USING gin (email gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_materiais_base_nome_trgm ON materiais_base USING gin (nome gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_materiais_base_codigo_trgm ON materiais_base USING gin (codigo gin_trgm_ops);
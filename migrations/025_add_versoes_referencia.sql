@@ -0,0 +1,8 @@
+-- Migração 025: Contadores de versão dos dados de referência
+-- Usados para ETag/304 das listas de opções (materiais, fornecedores, status, localizações, tabelas, classificações)
+
+CREATE TABLE IF NOT EXISTS versoes_referencia (
+    dominio VARCHAR(50) PRIMARY KEY,
+    versao BIGINT NOT NULL DEFAULT 1,
+    data_atualizacao TIMESTAMP DEFAULT NOW()
+);
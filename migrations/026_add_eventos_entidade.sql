@@ -0,0 +1,41 @@
+-- Migração 026: Histórico append-only de eventos por entidade
+-- Substitui os arrays JSON `auditoria` de lotes, OS, conferências, separações, resíduos e inventários.
+-- Cada ação passa a ser uma linha nova (delta compacto) em vez de regravar o array inteiro.
+
+CREATE TABLE IF NOT EXISTS eventos_entidade (
+    id BIGSERIAL PRIMARY KEY,
+    entidade VARCHAR(50) NOT NULL,
+    entidade_id INTEGER NOT NULL,
+    acao VARCHAR(100) NOT NULL,
+    usuario_id INTEGER,
+    ts TIMESTAMP NOT NULL DEFAULT NOW(),
+    dados JSON,
+    ip VARCHAR(50),
+    user_agent VARCHAR(500),
+    gps JSON,
+    device_id VARCHAR(255)
+);
+
+CREATE INDEX IF NOT EXISTS idx_eventos_entidade_entidade_ts
+    ON eventos_entidade (entidade, entidade_id, ts);
+
+-- Visão de leitura no formato antigo (um array de entradas por entidade),
+-- para relatórios e consultas ad-hoc que liam a coluna `auditoria`
+CREATE OR REPLACE VIEW vw_auditoria_entidade AS
+SELECT
+    entidade,
+    entidade_id,
+    json_agg(
+        (COALESCE(dados::jsonb, '{}'::jsonb) || jsonb_strip_nulls(jsonb_build_object(
+            'acao', acao,
+            'usuario_id', usuario_id,
+            'timestamp', to_char(ts, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+            'ip', ip,
+            'user_agent', user_agent,
+            'gps', gps,
+            'device_id', device_id
+        )))
+        ORDER BY ts, id
+    ) AS auditoria
+FROM eventos_entidade
+GROUP BY entidade, entidade_id;
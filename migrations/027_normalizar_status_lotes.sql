@@ -0,0 +1,32 @@
+-- Migração 027: Status canônicos dos lotes e disponibilidade para produção
+-- Converte as grafias antigas ('aprovado', 'Em Estoque', 'ATIVO', ...) para MAIÚSCULAS
+-- com underscore e cria a coluna derivada disponivel_producao com índice parcial.
+-- Mantenha os aliases em sincronia com app/utils/status_lote.py.
+
+ALTER TABLE lotes ADD COLUMN IF NOT EXISTS disponivel_producao BOOLEAN NOT NULL DEFAULT FALSE;
+
+UPDATE lotes SET status = CASE s.valor
+        WHEN 'ESTOQUE' THEN 'EM_ESTOQUE'
+        WHEN 'DISPONIVEL' THEN 'EM_ESTOQUE'
+        WHEN 'ATIVO' THEN 'EM_ESTOQUE'
+        WHEN 'APROVADA' THEN 'APROVADO'
+        WHEN 'APROVADA_ADM' THEN 'APROVADO'
+        WHEN 'CONCLUIDO_CONFERENCIA' THEN 'CONFERIDO'
+        WHEN 'DISPONIVEL_PRODUCAO' THEN 'LIBERADO'
+        WHEN 'SEPARADO' THEN 'PROCESSADO'
+        WHEN 'FINALIZADO' THEN 'ENCERRADO'
+        ELSE s.valor
+    END
+FROM (
+    SELECT id, REPLACE(REPLACE(UPPER(TRIM(status)), ' ', '_'), '-', '_') AS valor FROM lotes
+) s
+WHERE lotes.id = s.id;
+
+UPDATE lotes SET disponivel_producao = status IN (
+    'APROVADO', 'CONCLUIDO', 'CONFERIDO', 'CRIADO_SEPARACAO',
+    'EM_CONFERENCIA', 'EM_ESTOQUE', 'LIBERADO', 'RECEBIDO'
+);
+
+ALTER TABLE lotes ALTER COLUMN status SET DEFAULT 'ABERTO';
+
+CREATE INDEX IF NOT EXISTS idx_lotes_disponivel_producao ON lotes (id) WHERE disponivel_producao;
@@ -0,0 +1,16 @@
+-- Migração 028: Material do lote como coluna (antes só existia em observacoes 'MATERIAL:<nome> | ...')
+-- Permite agregar o estoque por material em SQL (producao /estoque-agregado)
+
+ALTER TABLE lotes ADD COLUMN IF NOT EXISTS material_id INTEGER REFERENCES materiais_base(id);
+ALTER TABLE lotes ADD COLUMN IF NOT EXISTS material_nome VARCHAR(200);
+
+CREATE INDEX IF NOT EXISTS ix_lotes_material_id ON lotes (material_id);
+CREATE INDEX IF NOT EXISTS ix_lotes_material_nome ON lotes (material_nome);
+
+UPDATE lotes
+SET material_nome = LEFT(NULLIF(TRIM(regexp_replace(split_part(observacoes, '|', 1), '^MATERIAL(_MANUAL)?:', '')), ''), 200)
+WHERE material_nome IS NULL AND observacoes ~ '^MATERIAL(_MANUAL)?:';
+
+UPDATE lotes l SET material_id = m.id
+FROM materiais_base m
+WHERE l.material_id IS NULL AND l.material_nome = m.nome;
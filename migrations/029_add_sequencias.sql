@@ -0,0 +1,9 @@
+-- Migração 029: Sequências de códigos (bags, OPs, materiais, tipos de lote, números de lote)
+-- Substitui o "último código + 1" via LIKE ... ORDER BY id DESC, que colide entre estações concorrentes.
+-- As chaves são criadas sob demanda por app/utils/sequencias.py, partindo do maior código já gravado.
+
+CREATE TABLE IF NOT EXISTS sequencias (
+    chave VARCHAR(100) PRIMARY KEY,
+    valor BIGINT NOT NULL DEFAULT 0,
+    data_atualizacao TIMESTAMP DEFAULT NOW()
+);
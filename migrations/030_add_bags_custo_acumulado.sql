@@ -0,0 +1,23 @@
+-- Migração 030: Acumuladores dos bags de produção passam a ser a fonte dos painéis de estoque
+-- peso_acumulado / custo_acumulado / quantidade_itens são mantidos por UPDATE relativo
+-- (app/services/bag_service.py) e corrigidos por scripts/reconciliar_bags.py
+
+ALTER TABLE bags_producao ADD COLUMN IF NOT EXISTS custo_acumulado NUMERIC(12, 2) NOT NULL DEFAULT 0;
+
+UPDATE bags_producao b
+SET peso_acumulado = t.peso, custo_acumulado = t.custo, quantidade_itens = t.itens
+FROM (
+    SELECT bag.id,
+           COALESCE(SUM(i.peso_kg), 0) AS peso,
+           COALESCE(SUM(i.custo_proporcional), 0) AS custo,
+           COUNT(i.id) AS itens
+    FROM bags_producao bag
+    LEFT JOIN itens_separados_producao i ON i.bag_id = bag.id
+    GROUP BY bag.id
+) t
+WHERE b.id = t.id
+  AND (b.peso_acumulado IS DISTINCT FROM t.peso
+       OR b.custo_acumulado IS DISTINCT FROM t.custo
+       OR b.quantidade_itens IS DISTINCT FROM t.itens);
+
+CREATE INDEX IF NOT EXISTS idx_item_separado_bag ON itens_separados_producao (bag_id);
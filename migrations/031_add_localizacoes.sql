@@ -0,0 +1,44 @@
+-- Migração 031: Tabela de localizações do armazém com ocupação por localização
+-- Dropdowns e mapa do WMS leem localizacoes (indexada) em vez de DISTINCT sobre
+-- lotes + todo o histórico de movimentações. A ocupação é ajustada a cada
+-- movimentação e corrigida por scripts/reconciliar_localizacoes.py
+
+CREATE TABLE IF NOT EXISTS localizacoes (
+    id SERIAL PRIMARY KEY,
+    codigo VARCHAR(100) NOT NULL UNIQUE,
+    descricao VARCHAR(200),
+    ativo BOOLEAN NOT NULL DEFAULT TRUE,
+    capacidade_kg DOUBLE PRECISION,
+    quantidade_lotes INTEGER NOT NULL DEFAULT 0,
+    peso_kg DOUBLE PRECISION NOT NULL DEFAULT 0,
+    data_criacao TIMESTAMP NOT NULL DEFAULT NOW(),
+    data_atualizacao TIMESTAMP DEFAULT NOW()
+);
+
+ALTER TABLE lotes ADD COLUMN IF NOT EXISTS localizacao_id INTEGER REFERENCES localizacoes(id);
+CREATE INDEX IF NOT EXISTS ix_lotes_localizacao_id ON lotes (localizacao_id);
+CREATE INDEX IF NOT EXISTS idx_lotes_localizacao_atual ON lotes (localizacao_atual);
+
+-- Posições padrão (ruas A-D, racks 1-5) e códigos já usados pelos lotes
+INSERT INTO localizacoes (codigo)
+SELECT rua || rack FROM unnest(ARRAY['A', 'B', 'C', 'D']) rua, generate_series(1, 5) rack
+ON CONFLICT (codigo) DO NOTHING;
+
+INSERT INTO localizacoes (codigo)
+SELECT DISTINCT localizacao_atual FROM lotes
+WHERE localizacao_atual IS NOT NULL AND localizacao_atual <> ''
+ON CONFLICT (codigo) DO NOTHING;
+
+UPDATE lotes l SET localizacao_id = loc.id
+FROM localizacoes loc
+WHERE loc.codigo = l.localizacao_atual AND l.localizacao_id IS DISTINCT FROM loc.id;
+
+UPDATE localizacoes loc
+SET quantidade_lotes = t.lotes, peso_kg = t.peso, data_atualizacao = NOW()
+FROM (
+    SELECT l2.id, COUNT(lt.id) AS lotes, COALESCE(SUM(lt.peso_total_kg), 0) AS peso
+    FROM localizacoes l2
+    LEFT JOIN lotes lt ON lt.localizacao_id = l2.id
+    GROUP BY l2.id
+) t
+WHERE loc.id = t.id;
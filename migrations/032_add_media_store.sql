@@ -0,0 +1,9 @@
+-- Migração 032: Fotos de usuários e imagens do scanner no media_store (disco, endereçado por SHA-256)
+-- As linhas guardam apenas hash, tamanho e mimetype. Os bytes existentes são copiados
+-- para o media_store por executar_migracao_032.py, que também pode limpar as colunas legadas.
+
+ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS foto_hash VARCHAR(64);
+ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS foto_tamanho INTEGER;
+
+ALTER TABLE scanner_analyses ADD COLUMN IF NOT EXISTS image_hash VARCHAR(64);
+ALTER TABLE scanner_analyses ADD COLUMN IF NOT EXISTS image_size INTEGER;
@@ -0,0 +1,17 @@
+-- Migração 033: Índice de hash perceptual (dHash) das imagens do scanner
+-- O hash de 64 bits é dividido em 4 faixas de 16 bits indexadas para a busca por vizinhos
+-- (distância de Hamming). Análises antigas são indexadas por scripts/indexar_scanner_hashes.py
+
+CREATE TABLE IF NOT EXISTS scanner_imagem_hashes (
+    analysis_id INTEGER PRIMARY KEY REFERENCES scanner_analyses(id) ON DELETE CASCADE,
+    phash BIGINT NOT NULL,
+    faixa0 INTEGER NOT NULL,
+    faixa1 INTEGER NOT NULL,
+    faixa2 INTEGER NOT NULL,
+    faixa3 INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_scanner_imagem_hashes_faixa0 ON scanner_imagem_hashes (faixa0);
+CREATE INDEX IF NOT EXISTS ix_scanner_imagem_hashes_faixa1 ON scanner_imagem_hashes (faixa1);
+CREATE INDEX IF NOT EXISTS ix_scanner_imagem_hashes_faixa2 ON scanner_imagem_hashes (faixa2);
+CREATE INDEX IF NOT EXISTS ix_scanner_imagem_hashes_faixa3 ON scanner_imagem_hashes (faixa3);
@@ -0,0 +1,5 @@
+-- Migração 034: Índice de gps_logs por OS e horário
+-- Usado pelo rastreio em lote (POST /api/os/<id>/gps/batch) para descartar
+-- pontos reenviados e para ler o trajeto de uma OS em ordem
+
+CREATE INDEX IF NOT EXISTS idx_gps_logs_os_timestamp ON gps_logs (os_id, timestamp);
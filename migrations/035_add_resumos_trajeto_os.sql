@@ -0,0 +1,20 @@
+-- Migração 035: Resumo do trajeto de cada OS (km, duração, paradas e trajeto simplificado)
+-- Calculado a partir de gps_logs ao finalizar a OS. OS já finalizadas são resumidas
+-- por scripts/calcular_resumos_trajeto.py
+
+CREATE TABLE IF NOT EXISTS resumos_trajeto_os (
+    os_id INTEGER PRIMARY KEY REFERENCES ordens_servico(id) ON DELETE CASCADE,
+    motorista_id INTEGER REFERENCES motoristas(id),
+    km_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+    duracao_segundos INTEGER NOT NULL DEFAULT 0,
+    tempo_parado_segundos INTEGER NOT NULL DEFAULT 0,
+    paradas INTEGER NOT NULL DEFAULT 0,
+    total_pontos INTEGER NOT NULL DEFAULT 0,
+    pontos_descartados INTEGER NOT NULL DEFAULT 0,
+    trajeto JSON,
+    inicio TIMESTAMP,
+    fim TIMESTAMP,
+    calculado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_resumo_trajeto_motorista_fim ON resumos_trajeto_os (motorista_id, fim);
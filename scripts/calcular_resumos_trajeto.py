@@ -0,0 +1,66 @@
+"""
+Calcula o resumo de trajeto (km, duração, paradas) das OS finalizadas
+
+Necessário uma vez para as OS finalizadas antes de resumos_trajeto_os;
+OS novas são resumidas ao receber o evento FINALIZEI.
+
+Uso: python scripts/calcular_resumos_trajeto.py [--lote N] [--todas]
+     --todas recalcula também as OS que já têm resumo
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import db, OrdemServico, ResumoTrajetoOS
+from app.services import trajeto_service
+
+
+def calcular(tamanho_lote=50, todas=False):
+    app = create_app()
+
+    with app.app_context():
+        ultimo_id = 0
+        calculadas = 0
+        km_total = 0.0
+
+        while True:
+            query = db.session.query(OrdemServico.id).filter(
+                OrdemServico.status == 'FINALIZADA',
+                OrdemServico.id > ultimo_id
+            )
+            if not todas:
+                query = query.outerjoin(
+                    ResumoTrajetoOS, ResumoTrajetoOS.os_id == OrdemServico.id
+                ).filter(ResumoTrajetoOS.os_id.is_(None))
+            ids = [os_id for (os_id,) in query.order_by(OrdemServico.id).limit(tamanho_lote).all()]
+
+            if not ids:
+                break
+
+            try:
+                for os_id in ids:
+                    resumo = trajeto_service.calcular_resumo(os_id)
+                    if resumo is not None:
+                        calculadas += 1
+                        km_total += resumo.km_total
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Erro ao calcular resumos após OS {ultimo_id}: {e}")
+                return False
+
+            ultimo_id = ids[-1]
+            db.session.expunge_all()
+            print(f"   ... {calculadas} OS resumida(s) até id {ultimo_id}")
+
+        print(f"✅ {calculadas} OS resumida(s), {km_total:.1f} km no total")
+        return True
+
+
+if __name__ == '__main__':
+    lote = 50
+    if '--lote' in sys.argv:
+        lote = int(sys.argv[sys.argv.index('--lote') + 1])
+    sys.exit(0 if calcular(lote, '--todas' in sys.argv) else 1)
@@ -0,0 +1,65 @@
+"""
+Calcula o hash perceptual das análises do scanner que ainda não estão indexadas
+
+Necessário uma vez para o histórico anterior ao índice scanner_imagem_hashes;
+análises novas são indexadas ao serem gravadas.
+
+Uso: python scripts/indexar_scanner_hashes.py [--lote N]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import db, ScannerAnalysis, ScannerImagemHash
+from app.services import scanner_dedup
+
+
+def indexar(tamanho_lote=100):
+    app = create_app()
+
+    with app.app_context():
+        ultimo_id = 0
+        indexadas = 0
+        sem_imagem = 0
+
+        while True:
+            analises = ScannerAnalysis.query.outerjoin(
+                ScannerImagemHash, ScannerImagemHash.analysis_id == ScannerAnalysis.id
+            ).filter(
+                ScannerImagemHash.analysis_id.is_(None),
+                ScannerAnalysis.id > ultimo_id
+            ).order_by(ScannerAnalysis.id).limit(tamanho_lote).all()
+
+            if not analises:
+                break
+
+            try:
+                for analysis in analises:
+                    conteudo = analysis.get_image_bytes() if analysis.has_image else None
+                    phash = scanner_dedup.calcular_dhash(conteudo) if conteudo else None
+                    if phash is None:
+                        sem_imagem += 1
+                        continue
+                    scanner_dedup.indexar(analysis, phash)
+                    indexadas += 1
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Erro ao indexar análises após id {ultimo_id}: {e}")
+                return False
+
+            ultimo_id = analises[-1].id
+            db.session.expunge_all()
+            print(f"   ... {indexadas} indexada(s) até id {ultimo_id}")
+
+        print(f"✅ {indexadas} análise(s) indexadas, {sem_imagem} sem imagem legível")
+        return True
+
+
+if __name__ == '__main__':
+    lote = 100
+    if '--lote' in sys.argv:
+        lote = int(sys.argv[sys.argv.index('--lote') + 1])
+    sys.exit(0 if indexar(lote) else 1)
@@ -0,0 +1,71 @@
+"""
+Pré-aquece o geocache com os endereços de todos os fornecedores
+
+- CEP principal e CEP do endereço alternativo (ViaCEP)
+- Coordenadas cadastradas (Nominatim, respeitando 1 requisição/segundo)
+
+Uso: python scripts/prewarm_geocache.py [--forcar]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import Fornecedor
+from app.utils.geolocation import (
+    consultar_cep, reverse_geocode, normalizar_cep, geohash,
+    _geocache_obter, _geocache_valido
+)
+
+# Política de uso do Nominatim: no máximo 1 requisição por segundo
+INTERVALO_NOMINATIM = 1.1
+
+
+def prewarm(forcar=False):
+    app = create_app()
+
+    with app.app_context():
+        fornecedores = Fornecedor.query.with_entities(
+            Fornecedor.id, Fornecedor.cep, Fornecedor.outro_cep,
+            Fornecedor.latitude, Fornecedor.longitude
+        ).all()
+        print(f"🔄 Pré-aquecendo geocache para {len(fornecedores)} fornecedor(es)...")
+
+        ceps = set()
+        coordenadas = set()
+        for f in fornecedores:
+            for cep in (f.cep, f.outro_cep):
+                cep_limpo = normalizar_cep(cep)
+                if len(cep_limpo) == 8:
+                    ceps.add(cep_limpo)
+            if f.latitude is not None and f.longitude is not None:
+                coordenadas.add((round(f.latitude, 6), round(f.longitude, 6)))
+
+        ceps_consultados = 0
+        for cep in sorted(ceps):
+            if not forcar and _geocache_valido(_geocache_obter('cep', cep)):
+                continue
+            try:
+                consultar_cep(cep, forcar=forcar)
+                ceps_consultados += 1
+            except Exception as e:
+                print(f"  ⚠️ CEP {cep}: {e}")
+
+        coords_consultadas = 0
+        for lat, lng in sorted(coordenadas):
+            if not forcar and _geocache_valido(_geocache_obter('coordenada', geohash(lat, lng))):
+                continue
+            resultado = reverse_geocode(lat, lng, forcar=forcar)
+            coords_consultadas += 1
+            if not resultado.get('sucesso'):
+                print(f"  ⚠️ ({lat}, {lng}): {resultado.get('erro')}")
+            time.sleep(INTERVALO_NOMINATIM)
+
+        print(f"✅ CEPs: {len(ceps)} únicos, {ceps_consultados} consultados")
+        print(f"✅ Coordenadas: {len(coordenadas)} únicas, {coords_consultadas} consultadas")
+
+
+if __name__ == '__main__':
+    prewarm(forcar='--forcar' in sys.argv)
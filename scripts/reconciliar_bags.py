@@ -0,0 +1,48 @@
+"""
+Reconcilia os acumuladores dos bags de produção com os itens separados
+
+Recalcula peso_acumulado, custo_acumulado e quantidade_itens de cada bag a partir
+de itens_separados_producao e corrige apenas os que divergirem. Pode rodar
+periodicamente (cron / Railway scheduled job) sem parar a produção.
+
+Uso: python scripts/reconciliar_bags.py [--simular] [bag_id ...]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import db
+from app.services import bag_service
+
+
+def reconciliar(bag_ids=None, simular=False):
+    app = create_app()
+
+    with app.app_context():
+        try:
+            corrigidos = bag_service.reconciliar(bag_ids)
+            if simular:
+                db.session.rollback()
+            else:
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Erro ao reconciliar bags: {e}")
+            return False
+
+        escopo = f"{len(bag_ids)} bag(s) informados" if bag_ids else "todos os bags"
+        if not corrigidos:
+            print(f"✅ Nenhuma divergência encontrada ({escopo})")
+        elif simular:
+            print(f"⚠️ {len(corrigidos)} bag(s) divergentes ({escopo}), nada gravado: {corrigidos}")
+        else:
+            print(f"✅ {len(corrigidos)} bag(s) corrigidos ({escopo}): {corrigidos}")
+        return True
+
+
+if __name__ == '__main__':
+    argumentos = [a for a in sys.argv[1:] if not a.startswith('--')]
+    ids = [int(a) for a in argumentos] or None
+    sys.exit(0 if reconciliar(ids, simular='--simular' in sys.argv) else 1)
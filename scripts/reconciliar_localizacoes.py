@@ -0,0 +1,46 @@
+"""
+Reconcilia a tabela localizacoes com os lotes
+
+Vincula lotes.localizacao_id ao código em localizacao_atual (criando códigos
+novos) e recalcula quantidade_lotes / peso_kg de cada localização. Pesos de
+lotes alterados fora das movimentações (conferência, separação) só entram na
+ocupação aqui, então o job deve rodar periodicamente.
+
+Uso: python scripts/reconciliar_localizacoes.py [--simular]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import db
+from app.services import localizacao_service
+
+
+def reconciliar(simular=False):
+    app = create_app()
+
+    with app.app_context():
+        try:
+            corrigidas = localizacao_service.reconciliar()
+            if simular:
+                db.session.rollback()
+            else:
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Erro ao reconciliar localizações: {e}")
+            return False
+
+        if not corrigidas:
+            print("✅ Ocupação das localizações sem divergências")
+        elif simular:
+            print(f"⚠️ {len(corrigidas)} localização(ões) divergentes, nada gravado: {', '.join(corrigidas)}")
+        else:
+            print(f"✅ {len(corrigidas)} localização(ões) corrigidas: {', '.join(corrigidas)}")
+        return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if reconciliar(simular='--simular' in sys.argv) else 1)
@@ -0,0 +1,73 @@
+"""
+Monta as rotas de coleta do dia para as OS pendentes (uso offline / agendado)
+
+Sem --confirmar apenas imprime o plano; com --confirmar atribui motorista,
+veículo e sequência às OS e grava as RotaOperacional.
+
+Uso: python scripts/roteirizar_dia.py [--data YYYY-MM-DD] [--base LAT,LNG]
+                                      [--saida HH:MM] [--retorno HH:MM] [--confirmar]
+"""
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import db
+from app.services import planejamento_rotas
+
+
+def _argumento(nome):
+    if nome in sys.argv:
+        return sys.argv[sys.argv.index(nome) + 1]
+    return None
+
+
+def roteirizar(dia, base=None, hora_saida=None, hora_retorno=None, confirmar=False):
+    app = create_app()
+
+    with app.app_context():
+        try:
+            plano = planejamento_rotas.planejar(dia, base=base, hora_saida=hora_saida, hora_retorno=hora_retorno)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
+
+        print(f"📅 {plano['data']}: {plano['total_os']} OS pendente(s), {plano['veiculos_disponiveis']} veículo(s)")
+        for rota in plano['rotas']:
+            print(f"\n🚚 {rota['codigo']} - veículo {rota['veiculo_id']} / motorista {rota['motorista_id']}"
+                  f" - {rota['km']:.1f} km, {rota['carga']:.0f} kg, volta {rota['retorno'][11:16]}")
+            for parada in rota['paradas']:
+                print(f"   {parada['sequencia']:>2}. {parada['inicio_atendimento'][11:16]} {parada['numero_os']}"
+                      f" {parada['fornecedor'] or ''} (+{parada['km_trecho']:.1f} km)")
+
+        print(f"\nTotal: {plano['km_total']:.1f} km (vizinho mais próximo: {plano['km_vizinho_mais_proximo']:.1f} km)"
+              f" em {plano['tempo_segundos']:.2f}s")
+        if plano['nao_atendidas']:
+            print(f"⚠️ Sem rota (capacidade/horário): OS {', '.join(map(str, plano['nao_atendidas']))}")
+        if plano['sem_coordenadas']:
+            print(f"⚠️ Fornecedor sem coordenadas: {', '.join(o['numero_os'] for o in plano['sem_coordenadas'])}")
+
+        if not confirmar:
+            print("\nℹ️ Nada foi gravado (use --confirmar para atribuir as OS)")
+            return True
+
+        try:
+            resultado = planejamento_rotas.aplicar(plano, None)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Erro ao gravar as rotas: {e}")
+            return False
+
+        print(f"\n✅ {resultado['agendadas']} OS agendada(s)")
+        if resultado['ignoradas']:
+            print(f"⚠️ Alteradas durante o planejamento (não gravadas): OS {', '.join(map(str, resultado['ignoradas']))}")
+        return True
+
+
+if __name__ == '__main__':
+    dia = date.fromisoformat(_argumento('--data')) if _argumento('--data') else date.today()
+    base = tuple(float(v) for v in _argumento('--base').split(',')) if _argumento('--base') else None
+    sys.exit(0 if roteirizar(dia, base, _argumento('--saida'), _argumento('--retorno'), '--confirmar' in sys.argv) else 1)
@@ -0,0 +1,74 @@
+"""
+Script para testar a classificação em lote do gemini_analyzer com o backend stub
+
+Sem rede e sem GEMINI_API_KEY: verifica ordem dos resultados, deduplicação de
+imagens repetidas, cache entre chamadas e o ganho das requisições em paralelo
+(GEMINI_STUB_LATENCIA simula o tempo de ida e volta da API).
+
+Uso:
+    python testar_gemini_lote.py [imagens] [latencia_segundos]
+"""
+import os
+import sys
+import time
+
+os.environ['GEMINI_BACKEND'] = 'stub'
+
+
+def testar_lote(quantidade=10, latencia=0.3):
+    os.environ['GEMINI_STUB_LATENCIA'] = str(latencia)
+    from app.services import gemini_analyzer
+
+    gemini_analyzer.limpar_cache()
+    imagens = [os.urandom(2048) for _ in range(quantidade)]
+    imagens.append(imagens[0])  # repetida: deve sair igual e sem nova chamada
+
+    print("🧪 TESTE - CLASSIFICAÇÃO EM LOTE (backend stub)\n")
+    print("=" * 80)
+    print(f"Imagens: {len(imagens)} ({quantidade} distintas)  |  Latência simulada: {latencia}s"
+          f"  |  Concorrência: {gemini_analyzer.MAX_CONCORRENCIA}")
+    print("=" * 80)
+
+    inicio = time.time()
+    resultados = gemini_analyzer.analyze_images(imagens, use_case='solicitacao')
+    duracao = time.time() - inicio
+    sequencial = quantidade * latencia
+
+    print(f"\nPrimeira chamada: {duracao:.2f}s (sequencial seria ~{sequencial:.2f}s)")
+
+    if len(resultados) != len(imagens):
+        print("❌ Quantidade de resultados diferente da de imagens")
+        return False
+    if any(r.get('erro') for r in resultados):
+        print(f"❌ Erros: {[r['erro'] for r in resultados if r.get('erro')]}")
+        return False
+    if resultados[0] != resultados[-1]:
+        print("❌ Imagem repetida recebeu resultados diferentes")
+        return False
+
+    esperadas = [gemini_analyzer._parse_gemini_response(gemini_analyzer._resposta_stub(i))['classificacao']
+                 for i in imagens]
+    if [r['classificacao'] for r in resultados] != esperadas:
+        print("❌ Resultados fora da ordem das imagens")
+        return False
+
+    inicio = time.time()
+    gemini_analyzer.analyze_images(imagens, use_case='solicitacao')
+    duracao_cache = time.time() - inicio
+    print(f"Segunda chamada (cache): {duracao_cache:.3f}s")
+
+    if latencia and duracao_cache >= latencia:
+        print("❌ Segunda chamada não usou o cache")
+        return False
+    if latencia and quantidade > gemini_analyzer.MAX_CONCORRENCIA and duracao >= sequencial * 0.9:
+        print("❌ Requisições não foram feitas em paralelo")
+        return False
+
+    print("\n✅ OK - ordem preservada, repetidas deduplicadas, cache e paralelismo funcionando")
+    return True
+
+
+if __name__ == '__main__':
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    latencia = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    sys.exit(0 if testar_lote(quantidade, latencia) else 1)
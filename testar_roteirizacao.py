@@ -0,0 +1,143 @@
+"""
+Benchmark da roteirização em dias sintéticos de 50 a 300 coletas
+
+Gera fornecedores espalhados num raio de ~25 km da base, com peso previsto
+aleatório e parte deles com janela de coleta, e compara:
+    - uma OS por vez (base → fornecedor → base, como a atribuição manual)
+    - vizinho mais próximo (construção)
+    - vizinho mais próximo + 2-opt/Or-opt (resultado final)
+
+Cada plano é validado de forma independente (parada atendida uma vez só,
+capacidade, janelas e volta à base no horário).
+
+Uso:
+    python testar_roteirizacao.py [tamanhos separados por vírgula] [semente]
+"""
+import math
+import sys
+
+import numpy as np
+
+from app.services import roteirizacao
+from app.services.roteirizacao import Configuracao, Parada, VeiculoRota
+
+BASE = (-23.5505, -46.6333)
+RAIO_KM = 25
+CAPACIDADE_KG = 4000
+FOLGA_FROTA = 1.2  # capacidade total da frota / peso previsto do dia
+
+
+def gerar_dia(quantidade, semente):
+    rng = np.random.default_rng(semente)
+    distancia = RAIO_KM * np.sqrt(rng.random(quantidade))
+    angulo = rng.random(quantidade) * 2 * math.pi
+    latitudes = BASE[0] + (distancia * np.sin(angulo)) / 111.32
+    longitudes = BASE[1] + (distancia * np.cos(angulo)) / (111.32 * math.cos(math.radians(BASE[0])))
+    demandas = rng.uniform(50, 800, quantidade).round(1)
+    com_janela = rng.random(quantidade) < 0.3
+
+    paradas = []
+    for i in range(quantidade):
+        inicio = fim = None
+        if com_janela[i]:
+            inicio = float(rng.choice([8, 9, 10, 11, 12, 13, 14]) * 60)
+            fim = inicio + float(rng.choice([120, 180, 240]))
+        paradas.append(Parada(i + 1, float(latitudes[i]), float(longitudes[i]), float(demandas[i]), inicio, fim))
+
+    veiculos = [
+        VeiculoRota(v + 1, CAPACIDADE_KG, v + 1)
+        for v in range(math.ceil(demandas.sum() * FOLGA_FROTA / CAPACIDADE_KG))
+    ]
+    return paradas, veiculos
+
+
+def km_uma_por_vez(paradas, config):
+    latitudes = [BASE[0]] + [p.latitude for p in paradas]
+    longitudes = [BASE[1]] + [p.longitude for p in paradas]
+    D = roteirizacao.matriz_distancias_km(latitudes, longitudes, config.fator_estrada)
+    return float(2 * D[0, 1:].sum())
+
+
+def validar(plano, paradas, veiculos, config):
+    """Retorna a lista de problemas encontrados (vazia = plano válido)"""
+    problemas = []
+    por_id = {p.id: p for p in paradas}
+    capacidades = {v.id: v.capacidade for v in veiculos}
+
+    vistas = [parada['id'] for rota in plano['rotas'] for parada in rota['paradas']]
+    if len(vistas) != len(set(vistas)):
+        problemas.append('parada atendida mais de uma vez')
+    if set(vistas) | set(plano['nao_atendidas']) != set(por_id):
+        problemas.append('paradas perdidas no plano')
+
+    for rota in plano['rotas']:
+        itens = [por_id[p['id']] for p in rota['paradas']]
+        carga = sum(p.demanda for p in itens)
+        if carga > capacidades[rota['veiculo_id']] + 1e-6:
+            problemas.append(f"veículo {rota['veiculo_id']} acima da capacidade ({carga:.0f} kg)")
+
+        pontos = [BASE] + [(p.latitude, p.longitude) for p in itens] + [BASE]
+        D = roteirizacao.matriz_distancias_km([p[0] for p in pontos], [p[1] for p in pontos], config.fator_estrada)
+        km = sum(D[i, i + 1] for i in range(len(pontos) - 1))
+        if abs(km - rota['km']) > 0.01:
+            problemas.append(f"km da rota {rota['veiculo_id']} não confere ({km:.2f} x {rota['km']:.2f})")
+
+        t = config.saida
+        for i, parada in enumerate(itens, start=1):
+            t += D[i - 1, i] / config.velocidade_kmh * 60
+            if parada.janela_inicio is not None:
+                t = max(t, parada.janela_inicio)
+            if parada.janela_fim is not None and t > parada.janela_fim + 1e-6:
+                problemas.append(f'parada {parada.id} fora da janela')
+            t += parada.tempo_servico
+        t += D[len(itens), len(itens) + 1] / config.velocidade_kmh * 60
+        if t > config.retorno + 1e-6:
+            problemas.append(f"veículo {rota['veiculo_id']} volta depois do horário")
+    return problemas
+
+
+def testar_roteirizacao(tamanhos=(50, 100, 200, 300), semente=42):
+    config = Configuracao()
+
+    print("🧪 BENCHMARK - ROTEIRIZAÇÃO (vizinho mais próximo + 2-opt/Or-opt)\n")
+    print("km por coleta atendida; 1 OS/vez = base → fornecedor → base para cada OS\n")
+    print("=" * 100)
+    print(f"{'Paradas':>8} {'Veíc.':>6} {'1 OS/vez':>9} {'Vizinho':>8} {'Final':>7} {'Km final':>9} "
+          f"{'Ganho NN':>9} {'Ganho 1/vez':>12} {'Sem rota':>9} {'Tempo':>8}")
+    print("=" * 100)
+
+    ok = True
+    for quantidade in tamanhos:
+        paradas, veiculos = gerar_dia(quantidade, semente + quantidade)
+        plano = roteirizacao.roteirizar(BASE, paradas, veiculos, config)
+
+        sem_rota = set(plano['nao_atendidas'])
+        atendidas = quantidade - len(sem_rota)
+        individual = km_uma_por_vez([p for p in paradas if p.id not in sem_rota], config) / max(atendidas, 1)
+        vizinho = plano['km_vizinho_mais_proximo'] / max(plano['atendidas_vizinho_mais_proximo'], 1)
+        final = plano['km_total'] / max(atendidas, 1)
+        ganho_nn = 100 * (1 - final / vizinho) if vizinho else 0
+        ganho_individual = 100 * (1 - final / individual) if individual else 0
+
+        print(f"{quantidade:>8} {len(plano['rotas']):>6} {individual:>9.2f} {vizinho:>8.2f} {final:>7.2f} "
+              f"{plano['km_total']:>9.1f} {ganho_nn:>8.1f}% {ganho_individual:>11.1f}% "
+              f"{len(sem_rota):>9} {plano['tempo_segundos']:>7.2f}s")
+
+        problemas = validar(plano, paradas, veiculos, config)
+        if problemas:
+            ok = False
+            for problema in problemas[:10]:
+                print(f"   ❌ {problema}")
+        if final > vizinho + 1e-6:
+            ok = False
+            print("   ❌ Melhoria local piorou o km por coleta")
+
+    print("=" * 100)
+    print("\n✅ OK - planos válidos" if ok else "\n❌ Problemas encontrados")
+    return ok
+
+
+if __name__ == '__main__':
+    tamanhos = tuple(int(t) for t in sys.argv[1].split(',')) if len(sys.argv) > 1 else (50, 100, 200, 300)
+    semente = int(sys.argv[2]) if len(sys.argv) > 2 else 42
+    sys.exit(0 if testar_roteirizacao(tamanhos, semente) else 1)
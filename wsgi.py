@@ -4,10 +4,12 @@ WSGI entry point para Gunicorn
 import eventlet
 eventlet.monkey_patch()
 from app import create_app, socketio
-from flask import send_from_directory, render_template
+import os
+from flask import render_template, request, jsonify
 from flask_socketio import join_room
 from flask_jwt_extended import decode_token
 from app.models import Usuario
+from app.utils import imagens
 
 # Cria a aplicação
 try:
@@ -20,9 +22,15 @@ except Exception as e:
     raise e
 
 # Rotas adicionais
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+
 @app.route('/uploads/<path:filename>')
 def serve_upload(filename):
-    return send_from_directory('uploads', filename)
+    try:
+        tamanho = imagens.tamanho_miniatura(request.args.get('tamanho'))
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    return imagens.responder_arquivo(UPLOAD_FOLDER, filename, tamanho)
 
 @app.route('/')
 def index():